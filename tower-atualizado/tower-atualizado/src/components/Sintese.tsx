@@ -32,7 +32,10 @@ const Sintese: React.FC = () => {
   useEffect(() => {
     (async () => {
       try {
-        const res = await axios.get("http://127.0.0.1:5000/api/sintese");
+        const token = localStorage.getItem("access_token");
+        const res = await axios.get("http://127.0.0.1:5000/api/sintese", {
+          headers: { Authorization: `Bearer ${token}` },
+        });
         // força o tipo (caso o backend retorne algo diferente, trate aqui)
         setDados(res.data as DadosSintese);
       } catch (err) {
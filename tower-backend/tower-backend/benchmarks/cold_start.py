@@ -0,0 +1,92 @@
+"""Tempo de inicialização a frio da aplicação
+
+Uso (a partir de tower-backend/tower-backend):
+
+    python -m benchmarks.cold_start --runs 7 --budget-ms 1000
+
+Cada execução é um interpretador novo que importa src.main e chama
+create_app() com dados em um diretório temporário. O comando falha (código 1)
+se a mediana de import + create_app passar do orçamento ou se alguma
+dependência pesada (carregada só no primeiro uso) for importada na subida.
+"""
+import json
+import os
+import statistics
+import subprocess
+import sys
+import tempfile
+import time
+import click
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+# Módulos que a subida não deve importar (ver src/wsgi.py:preload_dependencies)
+LAZY_MODULES = ('PIL', 'bcrypt', 'numpy')
+
+CHILD = '''
+import json, sys, time
+started = time.perf_counter()
+from src.main import create_app
+imported = time.perf_counter()
+app = create_app()
+created = time.perf_counter()
+print(json.dumps({
+    'import_ms': (imported - started) * 1000,
+    'create_app_ms': (created - imported) * 1000,
+    'loaded': [name for name in %r if name in sys.modules],
+}))
+''' % (LAZY_MODULES,)
+
+
+def run_once(workdir):
+    env = dict(os.environ,
+               INSTANCE_PATH=os.path.join(workdir, 'instance'),
+               DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'app.db')}",
+               UPLOAD_FOLDER=os.path.join(workdir, 'uploads'))
+    started = time.perf_counter()
+    result = subprocess.run([sys.executable, '-c', CHILD], cwd=BACKEND_ROOT, env=env,
+                            capture_output=True, text=True)
+    elapsed = (time.perf_counter() - started) * 1000
+    if result.returncode != 0:
+        raise click.ClickException(f'A aplicação não iniciou:\n{result.stderr[-2000:]}')
+    measurement = json.loads(result.stdout.strip().splitlines()[-1])
+    measurement['process_ms'] = elapsed
+    return measurement
+
+
+@click.command()
+@click.option('--runs', default=5, show_default=True, help='Interpretadores iniciados')
+@click.option('--budget-ms', default=1000.0, show_default=True,
+              help='Limite para a mediana de import + create_app')
+@click.option('--output', type=click.Path(dir_okay=False), help='Arquivo JSON com os resultados')
+def main(runs, budget_ms, output):
+    with tempfile.TemporaryDirectory(prefix='tower-cold-start-') as workdir:
+        run_once(workdir)  # primeira execução compila os .pyc
+        measurements = [run_once(workdir) for _ in range(runs)]
+
+    summary = {}
+    for key in ('import_ms', 'create_app_ms', 'process_ms'):
+        values = [measurement[key] for measurement in measurements]
+        summary[key] = {'median': round(statistics.median(values), 2), 'max': round(max(values), 2)}
+        click.echo(f"{key:14} mediana {summary[key]['median']:8.1f} ms  máx {summary[key]['max']:8.1f} ms")
+    startup_ms = statistics.median(m['import_ms'] + m['create_app_ms'] for m in measurements)
+    loaded = sorted({name for measurement in measurements for name in measurement['loaded']})
+    click.echo(f'import + create_app: {startup_ms:.1f} ms (orçamento: {budget_ms:.0f} ms)')
+
+    if output:
+        with open(output, 'w', encoding='utf-8') as f:
+            json.dump({'runs': runs, 'budget_ms': budget_ms, 'startup_ms': round(startup_ms, 2),
+                       'summary': summary, 'loaded_lazy_modules': loaded}, f, indent=2)
+
+    failures = []
+    if startup_ms > budget_ms:
+        failures.append(f'inicialização acima do orçamento ({startup_ms:.0f} ms > {budget_ms:.0f} ms)')
+    if loaded:
+        failures.append(f"dependências carregadas na subida: {', '.join(loaded)}")
+    if failures:
+        click.echo('\n'.join(failures), err=True)
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,441 @@
+"""Benchmark de carga com clientes sintéticos
+
+Uso (a partir de tower-backend/tower-backend):
+
+    python -m benchmarks.load --tenants 20 --rows 500 --requests 500 --concurrency 16 \\
+        --output benchmarks/results/atual.json --baseline benchmarks/results/base.json
+
+Sem --url o servidor é iniciado localmente (benchmarks.server) com banco,
+instância e uploads em um diretório temporário. Os clientes são criados
+pelo fluxo real de /api/auth/register e populados pela API (registros,
+configurações, produtos e vendas); depois cada endpoint é exercitado
+separadamente com a concorrência pedida. O resultado
+(p50/p95/p99 e vazão por endpoint) é gravado em JSON e, com --baseline,
+comparado com uma execução anterior.
+"""
+import http.client
+import io
+import json
+import os
+import platform
+import random
+import shutil
+import socket
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import quote, urlsplit
+import click
+
+BACKEND_ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+ENDPOINTS = ('login', 'data_list', 'data_create', 'data_update', 'data_delete',
+             'settings_get', 'settings_post', 'sintese', 'picture_upload')
+
+SERVER_START_TIMEOUT = 60  # segundos
+
+# Categorias dos produtos semeados (a síntese agrega por categoria)
+CATEGORIES = ('Bolos', 'Doces', 'Salgados', 'Bebidas', 'Tortas')
+
+
+class HttpSession:
+    """Conexões HTTP/1.1 persistentes, uma por thread"""
+
+    def __init__(self, base_url, timeout=60):
+        parts = urlsplit(base_url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.timeout = timeout
+        self._local = threading.local()
+
+    def _connection(self):
+        conn = getattr(self._local, 'conn', None)
+        if conn is None:
+            conn = self._local.conn = http.client.HTTPConnection(self.host, self.port, timeout=self.timeout)
+        return conn
+
+    def request(self, method, path, json_body=None, body=None, headers=None, token=None):
+        """Executa a requisição; retorna (status, corpo, segundos)"""
+        headers = dict(headers or {})
+        if json_body is not None:
+            body = json.dumps(json_body).encode('utf-8')
+            headers['Content-Type'] = 'application/json'
+        if token:
+            headers['Authorization'] = f'Bearer {token}'
+
+        for attempt in range(2):
+            conn = self._connection()
+            started = time.perf_counter()
+            try:
+                conn.request(method, path, body=body, headers=headers)
+                response = conn.getresponse()
+                data = response.read()
+            except (http.client.HTTPException, ConnectionError, socket.timeout):
+                # Conexão fechada pelo servidor: reabre uma vez
+                conn.close()
+                self._local.conn = None
+                if attempt:
+                    raise
+                continue
+            elapsed = time.perf_counter() - started
+            if response.getheader('Connection', '').lower() == 'close':
+                conn.close()
+                self._local.conn = None
+            return response.status, data, elapsed
+
+
+class Tenant:
+    """Cliente sintético: credenciais, token e ids dos registros semeados"""
+
+    def __init__(self, email, password, token):
+        self.email = email
+        self.password = password
+        self.token = token
+        self.data_ids = []
+        self.lock = threading.Lock()
+
+    def take_id(self, rng, remove=False):
+        with self.lock:
+            if not self.data_ids:
+                return None
+            index = rng.randrange(len(self.data_ids))
+            if remove:
+                return self.data_ids.pop(index)
+            return self.data_ids[index]
+
+
+def multipart(field, filename, content, content_type):
+    boundary = uuid.uuid4().hex
+    body = (f'--{boundary}\r\nContent-Disposition: form-data; name="{field}"; filename="{filename}"\r\n'
+            f'Content-Type: {content_type}\r\n\r\n').encode('utf-8') + content + f'\r\n--{boundary}--\r\n'.encode('utf-8')
+    return body, {'Content-Type': f'multipart/form-data; boundary={boundary}'}
+
+
+def sample_pictures(count, rng):
+    """Fotos JPEG distintas (o upload deduplica arquivos idênticos)"""
+    from PIL import Image
+
+    pictures = []
+    for _ in range(count):
+        image = Image.new('RGB', (800, 600), tuple(rng.randrange(256) for _ in range(3)))
+        for _ in range(200):
+            image.putpixel((rng.randrange(800), rng.randrange(600)), tuple(rng.randrange(256) for _ in range(3)))
+        buffer = io.BytesIO()
+        image.save(buffer, 'JPEG', quality=85)
+        pictures.append(buffer.getvalue())
+    return pictures
+
+
+class Benchmark:
+    def __init__(self, session, rng, pictures):
+        self.session = session
+        self.rng = rng
+        self.pictures = pictures
+        self.tenants = []
+
+    # --- preparação ---------------------------------------------------------
+
+    def register(self, index, password):
+        suffix = uuid.uuid4().hex[:12]
+        status, body, _ = self.session.request('POST', '/api/auth/register', json_body={
+            'username': f'bench{index}', 'email': f'bench-{suffix}@bench.local', 'password': password,
+            'client_name': f'Bench {index}', 'client_email': f'empresa-{suffix}@bench.local',
+        })
+        if status != 201:
+            raise click.ClickException(f'Cadastro falhou ({status}): {body[:200]!r}')
+        return Tenant(f'bench-{suffix}@bench.local', password, json.loads(body)['access_token'])
+
+    def populate(self, tenant, rows, settings, products, sales):
+        for row in range(rows):
+            self.session.request('POST', '/api/client/data', token=tenant.token,
+                                 json_body={'key': f'chave-{row}', 'value': 'x' * self.rng.randrange(10, 200)})
+        if settings:
+            self.session.request('POST', '/api/client/settings', token=tenant.token,
+                                 json_body={f'config_{i}': f'valor {i}' for i in range(settings)})
+
+        # Produtos e vendas alimentam as tabelas de síntese lidas por /api/sintese
+        produto_ids = []
+        for index in range(products):
+            status, body, _ = self.session.request('POST', '/api/produtos', token=tenant.token, json_body={
+                'codigo': f'P{index}', 'descricao': f'Produto {index}', 'categoria': CATEGORIES[index % len(CATEGORIES)],
+                'custo_unitario': round(self.rng.uniform(1, 20), 2), 'preco': round(self.rng.uniform(20, 60), 2)})
+            if status != 201:
+                raise click.ClickException(f'Cadastro de produto falhou ({status}): {body[:200]!r}')
+            produto_ids.append(json.loads(body)['id'])
+        for _ in range(sales if produto_ids else 0):
+            self.session.request('POST', '/api/vendas', token=tenant.token, json_body={
+                'produto_id': self.rng.choice(produto_ids), 'quantidade': self.rng.randrange(1, 10)})
+
+        after = None
+        while True:
+            path = '/api/client/data?fields=id&limit=1000' + (f'&after={quote(after)}' if after else '')
+            status, body, _ = self.session.request('GET', path, token=tenant.token)
+            page = json.loads(body)
+            tenant.data_ids.extend(item['id'] for item in page['data'])
+            after = page['next_cursor']
+            if not after:
+                break
+
+    def seed(self, tenants, rows, settings, products, sales, concurrency, password):
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            self.tenants = list(executor.map(lambda index: self.register(index, password), range(tenants)))
+            list(executor.map(lambda tenant: self.populate(tenant, rows, settings, products, sales), self.tenants))
+
+    # --- operações ----------------------------------------------------------
+    # Cada operação devolve (status, segundos, status esperados) ou None quando não há o que fazer
+
+    def op_login(self, tenant, rng):
+        status, _, elapsed = self.session.request('POST', '/api/auth/login',
+                                                  json_body={'email': tenant.email, 'password': tenant.password})
+        return status, elapsed, (200,)
+
+    def op_data_list(self, tenant, rng):
+        status, _, elapsed = self.session.request('GET', '/api/client/data?limit=100', token=tenant.token)
+        return status, elapsed, (200,)
+
+    def op_data_create(self, tenant, rng):
+        status, _, elapsed = self.session.request('POST', '/api/client/data', token=tenant.token,
+                                                  json_body={'key': f'novo-{rng.randrange(10 ** 6)}', 'value': 'v'})
+        return status, elapsed, (201,)
+
+    def op_data_update(self, tenant, rng):
+        data_id = tenant.take_id(rng)
+        if data_id is None:
+            return None
+        status, _, elapsed = self.session.request('PUT', f'/api/client/data/{data_id}', token=tenant.token,
+                                                  json_body={'value': f'atualizado {rng.random()}'})
+        return status, elapsed, (200,)
+
+    def op_data_delete(self, tenant, rng):
+        data_id = tenant.take_id(rng, remove=True)
+        if data_id is None:
+            return None
+        status, _, elapsed = self.session.request('DELETE', f'/api/client/data/{data_id}', token=tenant.token)
+        return status, elapsed, (200,)
+
+    def op_settings_get(self, tenant, rng):
+        status, _, elapsed = self.session.request('GET', '/api/client/settings', token=tenant.token)
+        return status, elapsed, (200,)
+
+    def op_settings_post(self, tenant, rng):
+        status, _, elapsed = self.session.request('POST', '/api/client/settings', token=tenant.token, json_body={
+            f'config_{rng.randrange(20)}': f'valor {rng.random()}' for _ in range(5)})
+        return status, elapsed, (200,)
+
+    def op_sintese(self, tenant, rng):
+        status, _, elapsed = self.session.request('GET', '/api/sintese', token=tenant.token)
+        return status, elapsed, (200,)
+
+    def op_picture_upload(self, tenant, rng):
+        body, headers = multipart('file', 'foto.jpg', rng.choice(self.pictures), 'image/jpeg')
+        status, _, elapsed = self.session.request('POST', '/api/profile/upload-picture', body=body,
+                                                  headers=headers, token=tenant.token)
+        # 503: fila de processamento cheia (comportamento esperado sob carga)
+        return status, elapsed, (200, 202)
+
+    # --- execução -----------------------------------------------------------
+
+    def run_endpoint(self, name, requests, concurrency, warmup, seed):
+        operation = getattr(self, f'op_{name}')
+        # Sementes por requisição: a sequência de clientes/ids não depende do agendamento das threads
+        plan = [random.Random(f'{seed}:{name}:{index}') for index in range(warmup + requests)]
+
+        def execute(rng):
+            return operation(rng.choice(self.tenants), rng)
+
+        with ThreadPoolExecutor(max_workers=concurrency) as executor:
+            list(executor.map(execute, plan[:warmup]))
+            started = time.perf_counter()
+            results = [result for result in executor.map(execute, plan[warmup:]) if result is not None]
+            elapsed = time.perf_counter() - started
+
+        return summarize(results, elapsed)
+
+
+def summarize(results, elapsed):
+    latencies = sorted(seconds * 1000 for _, seconds, _ in results)
+    errors = sum(1 for status, _, expected in results if status not in expected)
+    statuses = {}
+    for status, _, _ in results:
+        statuses[str(status)] = statuses.get(str(status), 0) + 1
+    if len(latencies) >= 2:
+        cuts = statistics.quantiles(latencies, n=100, method='inclusive')
+        p50, p95, p99 = cuts[49], cuts[94], cuts[98]
+    else:
+        p50 = p95 = p99 = latencies[0] if latencies else 0.0
+    return {
+        'requests': len(results),
+        'errors': errors,
+        'statuses': statuses,
+        'p50_ms': round(p50, 3),
+        'p95_ms': round(p95, 3),
+        'p99_ms': round(p99, 3),
+        'mean_ms': round(statistics.fmean(latencies), 3) if latencies else 0.0,
+        'max_ms': round(latencies[-1], 3) if latencies else 0.0,
+        'throughput_rps': round(len(results) / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+def compare(current, baseline, threshold):
+    """Compara com a execução de referência; retorna (linhas, regressões)"""
+    lines, regressions = [], []
+    if current['meta']['params'] != baseline.get('meta', {}).get('params'):
+        lines.append('Atenção: parâmetros diferentes dos da referência')
+    for name, result in current['endpoints'].items():
+        base = baseline.get('endpoints', {}).get(name)
+        if not base:
+            lines.append(f'{name:16} sem referência')
+            continue
+        p95 = _change(result['p95_ms'], base['p95_ms'])
+        throughput = _change(result['throughput_rps'], base['throughput_rps'])
+        error_rate = result['errors'] / max(result['requests'], 1)
+        base_error_rate = base['errors'] / max(base['requests'], 1)
+        problems = []
+        if p95 > threshold:
+            problems.append(f'p95 +{p95:.1f}%')
+        if throughput < -threshold:
+            problems.append(f'vazão {throughput:.1f}%')
+        if error_rate > base_error_rate:
+            problems.append(f'erros {base_error_rate:.1%} -> {error_rate:.1%}')
+        if problems:
+            regressions.append(name)
+        lines.append(f"{name:16} p95 {base['p95_ms']:9.2f} -> {result['p95_ms']:9.2f} ms ({p95:+6.1f}%)  "
+                     f"vazão {base['throughput_rps']:8.1f} -> {result['throughput_rps']:8.1f} req/s "
+                     f"({throughput:+6.1f}%)" + (f"  REGRESSÃO: {', '.join(problems)}" if problems else ''))
+    return lines, regressions
+
+
+def _change(value, base):
+    return (value - base) / base * 100 if base else 0.0
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+def start_server(workdir, port, bcrypt_rounds):
+    """Inicia benchmarks.server com dados isolados em workdir; retorna o processo"""
+    env = dict(os.environ,
+               INSTANCE_PATH=os.path.join(workdir, 'instance'),
+               DATABASE_URL=f"sqlite:///{os.path.join(workdir, 'app.db')}",
+               UPLOAD_FOLDER=os.path.join(workdir, 'uploads'),
+               BCRYPT_LOG_ROUNDS=str(bcrypt_rounds),
+               PYTHONPATH=BACKEND_ROOT)
+    log = open(os.path.join(workdir, 'server.log'), 'wb')
+    process = subprocess.Popen([sys.executable, '-m', 'benchmarks.server', '--port', str(port)],
+                               cwd=BACKEND_ROOT, env=env, stdout=log, stderr=subprocess.STDOUT)
+    deadline = time.monotonic() + SERVER_START_TIMEOUT
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise click.ClickException(f"O servidor terminou ao iniciar (ver {log.name})")
+        try:
+            socket.create_connection(('127.0.0.1', port), timeout=0.5).close()
+            return process
+        except OSError:
+            time.sleep(0.2)
+    process.terminate()
+    raise click.ClickException('O servidor não respondeu a tempo')
+
+
+def git_revision():
+    try:
+        return subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd=BACKEND_ROOT,
+                              capture_output=True, text=True, check=True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+@click.command()
+@click.option('--url', help='Servidor já em execução (padrão: inicia um servidor local descartável)')
+@click.option('--tenants', default=10, show_default=True, help='Clientes sintéticos criados via /register')
+@click.option('--rows', default=200, show_default=True, help='Registros de client_data por cliente')
+@click.option('--settings', default=20, show_default=True, help='Configurações por cliente')
+@click.option('--products', default=50, show_default=True, help='Produtos por cliente (5 categorias)')
+@click.option('--sales', default=200, show_default=True, help='Vendas por cliente')
+@click.option('--requests', 'requests_per_endpoint', default=300, show_default=True,
+              help='Requisições medidas por endpoint')
+@click.option('--warmup', default=20, show_default=True, help='Requisições de aquecimento por endpoint')
+@click.option('--concurrency', default=8, show_default=True)
+@click.option('--endpoint', 'endpoints', multiple=True, type=click.Choice(ENDPOINTS),
+              help='Endpoints a medir (pode ser repetido; padrão: todos)')
+@click.option('--seed', default=1, show_default=True, help='Semente dos dados e da sequência de requisições')
+@click.option('--bcrypt-rounds', default=12, show_default=True, help='BCRYPT_LOG_ROUNDS do servidor local')
+@click.option('--output', type=click.Path(dir_okay=False), help='Arquivo JSON com os resultados')
+@click.option('--baseline', type=click.Path(exists=True, dir_okay=False), help='Resultado anterior para comparação')
+@click.option('--threshold', default=10.0, show_default=True, help='Variação (%) considerada regressão')
+@click.option('--keep-data', is_flag=True, help='Não apaga o diretório temporário do servidor local')
+def main(url, tenants, rows, settings, products, sales, requests_per_endpoint, warmup, concurrency, endpoints, seed,
+         bcrypt_rounds, output, baseline, threshold, keep_data):
+    """Semeia clientes sintéticos e mede latência e vazão de cada endpoint"""
+    rng = random.Random(seed)
+    process, workdir = None, None
+    if url is None:
+        workdir = tempfile.mkdtemp(prefix='tower-bench-')
+        port = free_port()
+        process = start_server(workdir, port, bcrypt_rounds)
+        url = f'http://127.0.0.1:{port}'
+        click.echo(f'Servidor local em {url} (dados em {workdir})')
+
+    try:
+        session = HttpSession(url)
+        benchmark = Benchmark(session, rng, sample_pictures(16, rng))
+        password = f'senha-{seed}'
+
+        started = time.perf_counter()
+        benchmark.seed(tenants, rows, settings, products, sales, concurrency, password)
+        click.echo(f'{tenants} clientes com {rows} registros, {products} produtos e {sales} vendas criados '
+                   f'em {time.perf_counter() - started:.1f} s')
+
+        result = {
+            'meta': {
+                'timestamp': time.strftime('%Y-%m-%dT%H:%M:%S%z'),
+                'revision': git_revision(),
+                'python': platform.python_version(),
+                'platform': platform.platform(),
+                'url': url,
+                'params': {'tenants': tenants, 'rows': rows, 'settings': settings,
+                           'products': products, 'sales': sales,
+                           'requests': requests_per_endpoint, 'warmup': warmup,
+                           'concurrency': concurrency, 'seed': seed, 'bcrypt_rounds': bcrypt_rounds},
+            },
+            'endpoints': {},
+        }
+        for name in endpoints or ENDPOINTS:
+            summary = benchmark.run_endpoint(name, requests_per_endpoint, concurrency, warmup, seed)
+            result['endpoints'][name] = summary
+            click.echo(f"{name:16} p50 {summary['p50_ms']:8.2f}  p95 {summary['p95_ms']:8.2f}  "
+                       f"p99 {summary['p99_ms']:8.2f} ms  {summary['throughput_rps']:8.1f} req/s  "
+                       f"erros {summary['errors']}/{summary['requests']}")
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+        if workdir and not keep_data:
+            shutil.rmtree(workdir, ignore_errors=True)
+
+    if output:
+        os.makedirs(os.path.dirname(os.path.abspath(output)), exist_ok=True)
+        with open(output, 'w') as f:
+            json.dump(result, f, indent=2)
+        click.echo(f'Resultados gravados em {output}')
+
+    if baseline:
+        with open(baseline) as f:
+            lines, regressions = compare(result, json.load(f), threshold)
+        click.echo('\nComparação com a referência:')
+        for line in lines:
+            click.echo(line)
+        if regressions:
+            click.echo(f"\nRegressões: {', '.join(regressions)}", err=True)
+            raise SystemExit(1)
+
+
+if __name__ == '__main__':
+    main()
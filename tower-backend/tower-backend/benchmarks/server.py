@@ -0,0 +1,22 @@
+"""Servidor usado pelo benchmark: a aplicação no servidor WSGI do Werkzeug, com threads
+
+Os diretórios de dados vêm das variáveis INSTANCE_PATH, DATABASE_URL e
+UPLOAD_FOLDER, definidas por benchmarks.load ao iniciar o servidor.
+"""
+import click
+from werkzeug.serving import run_simple
+
+
+@click.command()
+@click.option('--host', default='127.0.0.1')
+@click.option('--port', default=5050, type=int)
+def main(host, port):
+    from src.main import create_app
+
+    # Banco descartável: o schema é criado na subida
+    app = create_app({'AUTO_MIGRATE': True})
+    run_simple(host, port, app, threaded=True, use_reloader=False, use_debugger=False)
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+# Servidor de produção: gunicorn -c gunicorn.conf.py src.wsgi:app
+# (antes de cada deploy: flask --app src.main migrate)
+import multiprocessing
+import os
+
+bind = os.environ.get('BIND', '0.0.0.0:5000')
+workers = int(os.environ.get('WEB_CONCURRENCY', multiprocessing.cpu_count() * 2 + 1))
+worker_class = 'gthread'
+# Conexões SSE (/api/client/events) ocupam uma thread cada, até EVENTS_MAX_STREAMS
+# por worker; as demais atendem as requisições comuns
+threads = int(os.environ.get('GUNICORN_THREADS', 16))
+
+# A aplicação é carregada uma vez no master e compartilhada no fork
+preload_app = True
+
+# Reciclagem dos workers para limitar o crescimento de memória
+max_requests = 2000
+max_requests_jitter = 200
+timeout = 60
+graceful_timeout = 30
+
+
+def post_fork(server, worker):
+    from src.wsgi import app, warm_up_worker
+
+    seconds, opened = warm_up_worker(app)
+    server.log.info('Worker %s pronto em %.0f ms (%d bancos de clientes abertos)', worker.pid, seconds * 1000, opened)
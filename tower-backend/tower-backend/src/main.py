@@ -1,60 +1,254 @@
 import os
 import sys
+import time
 sys.path.insert(0, os.path.dirname(os.path.dirname(__file__)))
 
-from flask import Flask, send_from_directory
+from flask import Flask, current_app, send_from_directory
 from flask_cors import CORS
 from flask_jwt_extended import JWTManager
 from src.models.user import db
 from src.models.client import Client
-from src.routes.user import user_bp
-from src.routes.auth import auth_bp
-from src.routes.profile import profile_bp
-from src.routes.client_data import client_data_bp
-from src.routes.sintese import sintese_bp # <-- import ajustado
-
-app = Flask(__name__, static_folder=os.path.join(os.path.dirname(__file__), 'static'))
-app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
-app.config['JWT_SECRET_KEY'] = 'jwt-secret-string-change-this-in-production'
-
-# CORS
-CORS(app, origins="*")
-
-# JWT
-jwt = JWTManager(app)
-
-# Registrar blueprints
-app.register_blueprint(user_bp, url_prefix='/api')
-app.register_blueprint(auth_bp, url_prefix='/api/auth')
-app.register_blueprint(profile_bp, url_prefix='/api/profile')
-app.register_blueprint(client_data_bp, url_prefix='/api/client')
-app.register_blueprint(sintese_bp, url_prefix='/api')   # <-- adicionado
-
-# Banco de dados
-app.config['SQLALCHEMY_DATABASE_URI'] = f"sqlite:///{os.path.join(os.path.dirname(__file__), 'database', 'app.db')}"
-app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
-app.config['UPLOAD_FOLDER'] = os.path.join(os.path.dirname(__file__), 'static', 'uploads')
-os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
-
-db.init_app(app)
-with app.app_context():
-    db.create_all()
-
-@app.route('/', defaults={'path': ''})
-@app.route('/<path:path>')
+from src.models.database_manager import init_database_manager
+from src.models.tenant_context import init_tenant_context
+from src.models.image_pipeline import init_image_pipeline
+from src.models.password_hasher import init_password_hasher
+from src.models.tenant_pool import init_tenant_pool, fill_tenant_pool_command
+from src.models.static_assets import init_static_manifest, get_static_manifest, asset_response, compress_static_command
+from src.models.tenant_migrations import migrate_tenants_command
+from src.models.sintese import rebuild_sintese_command
+from src.models.tenant_storage import tenant_storage_cli
+from src.models.metrics import init_metrics
+from src.models.profiler import init_profiler
+from src.models.schema import create_main_schema, migrate_command
+from src.models.json_provider import init_json_provider
+from src.models.change_log import prune_changes_command
+from src.models.events import init_event_broker
+from src.models.compression import init_compression
+from src.models.maintenance import maintenance_cli
+
+BASE_DIR = os.path.dirname(__file__)
+
+
+def register_blueprints(app):
+    # Importados aqui: só quem cria a aplicação paga pelo import das rotas
+    from src.routes.user import user_bp
+    from src.routes.auth import auth_bp
+    from src.routes.profile import profile_bp
+    from src.routes.client_data import client_data_bp
+    from src.routes.sintese import sintese_bp
+    from src.routes.produtos import produtos_bp
+    from src.routes.insumos import insumos_bp
+    from src.routes.metrics import metrics_bp
+    from src.routes.profiler import profiler_bp
+    from src.routes.changes import changes_bp
+    from src.routes.events import events_bp
+
+    app.register_blueprint(user_bp, url_prefix='/api')
+    app.register_blueprint(auth_bp, url_prefix='/api/auth')
+    app.register_blueprint(profile_bp, url_prefix='/api/profile')
+    app.register_blueprint(client_data_bp, url_prefix='/api/client')
+    app.register_blueprint(changes_bp, url_prefix='/api/client')
+    app.register_blueprint(events_bp, url_prefix='/api/client')
+    app.register_blueprint(sintese_bp, url_prefix='/api')
+    app.register_blueprint(produtos_bp, url_prefix='/api')
+    app.register_blueprint(insumos_bp, url_prefix='/api')
+    app.register_blueprint(metrics_bp)
+    app.register_blueprint(profiler_bp, url_prefix='/api/admin')
+
+
+def create_app(config=None):
+    """Cria a aplicação; config (dict) sobrescreve as configurações padrão abaixo
+
+    Não cria nem migra bancos: isso fica com `flask migrate`, executado uma
+    vez por deploy (ou AUTO_MIGRATE=1 em desenvolvimento).
+    """
+    started = time.perf_counter()
+
+    # INSTANCE_PATH, DATABASE_URL e UPLOAD_FOLDER permitem apontar os dados para outro
+    # diretório (ex.: o servidor descartável do benchmark)
+    app = Flask(__name__, static_folder=os.path.join(BASE_DIR, 'static'),
+                instance_path=(config or {}).get('INSTANCE_PATH', os.environ.get('INSTANCE_PATH')))
+    app.config['SECRET_KEY'] = 'asdf#FGSgvasgf$5$WGT'
+    app.config['JWT_SECRET_KEY'] = 'jwt-secret-string-change-this-in-production'
+
+    # Banco de dados
+    app.config['SQLALCHEMY_DATABASE_URI'] = os.environ.get(
+        'DATABASE_URL', f"sqlite:///{os.path.join(BASE_DIR, 'database', 'app.db')}")
+    app.config['SQLALCHEMY_TRACK_MODIFICATIONS'] = False
+    app.config['UPLOAD_FOLDER'] = os.environ.get('UPLOAD_FOLDER', os.path.join(BASE_DIR, 'static', 'uploads'))
+
+    # Bancos dos clientes (cache de conexões por processo)
+    app.config['TENANT_DB_MAX_OPEN'] = 64
+    app.config['TENANT_DB_IDLE_TIMEOUT'] = 300
+    app.config['TENANT_DB_BUSY_TIMEOUT'] = 5000
+    app.config['TENANT_DB_SYNCHRONOUS'] = 'NORMAL'
+
+    # Armazenamento de clientes novos: 'file' (um arquivo por cliente, em subdiretórios
+    # pelo hash do nome) ou 'shared' (banco único com tenant_id)
+    app.config['TENANT_STORAGE_DEFAULT'] = os.environ.get('TENANT_STORAGE_DEFAULT', 'file')
+    app.config['TENANT_DB_SHARD_DEPTH'] = 1
+
+    # Bancos de cliente prontos para novos cadastros (reabastecidos em segundo plano)
+    app.config['TENANT_DB_POOL_SIZE'] = 8
+
+    # Cache da resolução usuário -> cliente (invalidado quando User/Client mudam)
+    app.config['TENANT_CACHE_TTL'] = 60
+    app.config['TENANT_CACHE_MAX_SIZE'] = 10000
+
+    # bcrypt: fator de custo (hashes antigos são regravados no login) e limite de concorrência
+    app.config['BCRYPT_LOG_ROUNDS'] = int(os.environ.get('BCRYPT_LOG_ROUNDS', 12))
+    app.config['BCRYPT_MAX_CONCURRENCY'] = max(1, (os.cpu_count() or 2) // 2)
+    app.config['BCRYPT_MAX_PENDING'] = 16
+    app.config['BCRYPT_QUEUE_TIMEOUT'] = 5
+
+    # Processamento das fotos de perfil fora da requisição
+    app.config['PROFILE_PICTURE_SIZES'] = (300, 150, 64)
+    app.config['PROFILE_IMAGE_WORKERS'] = 2
+    app.config['PROFILE_IMAGE_MAX_PENDING'] = 32
+
+    # Fotos de perfil: tamanhos sob demanda (?size=) e envio pelo servidor web
+    app.config['PROFILE_PICTURE_MAX_SIZE'] = 1024
+    app.config['PROFILE_PICTURE_CACHE_MAX_BYTES'] = 256 * 1024 * 1024
+    app.config['PROFILE_PICTURE_MAX_AGE'] = 31536000
+    app.config['PROFILE_PICTURE_ACCEL_REDIRECT'] = os.environ.get('PROFILE_PICTURE_ACCEL_REDIRECT')
+    app.config['USE_X_SENDFILE'] = os.environ.get('USE_X_SENDFILE') == '1'
+
+    # Métricas por endpoint em /metrics e log das requisições lentas (com o SQL executado)
+    app.config['METRICS_ENABLED'] = os.environ.get('METRICS_ENABLED', '1') == '1'
+    app.config['METRICS_TOKEN'] = os.environ.get('METRICS_TOKEN')
+    # Sem METRICS_TOKEN /metrics só responde com METRICS_PUBLIC=1 (ex.: rede interna)
+    app.config['METRICS_PUBLIC'] = os.environ.get('METRICS_PUBLIC') == '1'
+    app.config['METRICS_SLOW_REQUEST_MS'] = 500
+    app.config['METRICS_MAX_STATEMENTS'] = 50
+
+    # Perfil sob demanda: header X-Profile: <PROFILING_TOKEN> (cProfile + pilhas) ou uma
+    # fração das requisições (só amostragem de pilhas); perfis em /api/admin/profiles
+    app.config['PROFILING_ENABLED'] = os.environ.get('PROFILING_ENABLED') == '1'
+    app.config['PROFILING_TOKEN'] = os.environ.get('PROFILING_TOKEN')
+    app.config['PROFILING_SAMPLE_RATE'] = float(os.environ.get('PROFILING_SAMPLE_RATE', 0))
+    app.config['PROFILING_INTERVAL'] = 0.005
+    app.config['PROFILING_MAX_FILES'] = 500
+    app.config['PROFILING_MAX_BYTES'] = 100 * 1024 * 1024
+
+    # Build do frontend servido da memória (variantes gzip/brotli prontas)
+    app.config['STATIC_COMPRESS_MIN_SIZE'] = 1024
+    app.config['STATIC_IMMUTABLE_MAX_AGE'] = 31536000
+    app.config['STATIC_DEFAULT_MAX_AGE'] = 3600
+
+    # Sincronização incremental (/api/client/changes): tombstones mais antigos que isso
+    # são descartados por `flask prune-changes` (cursores anteriores precisam recomeçar)
+    app.config['CHANGE_LOG_RETENTION_DAYS'] = 30
+
+    # Eventos (SSE em /api/client/events): 'socket' repassa os eventos entre os workers
+    # da mesma máquina, 'memory' fica no processo. Cada conexão ocupa uma thread do
+    # worker, por isso o limite por processo fica abaixo de GUNICORN_THREADS
+    app.config['EVENTS_BROKER'] = os.environ.get('EVENTS_BROKER', 'socket')
+    app.config['EVENTS_MAX_STREAMS'] = int(os.environ.get('EVENTS_MAX_STREAMS', 12))
+    app.config['EVENTS_MAX_PENDING'] = 64
+    app.config['EVENTS_HISTORY'] = 100
+    app.config['EVENTS_HEARTBEAT'] = 15
+    app.config['EVENTS_MAX_STREAM_SECONDS'] = 3600
+    app.config['EVENTS_RETRY_MS'] = 5000
+
+    # Compressão das respostas da API (gzip, ou brotli quando instalado) acima de
+    # COMPRESS_MIN_SIZE bytes; respostas em streaming são sempre comprimidas
+    app.config['COMPRESS_ENABLED'] = os.environ.get('COMPRESS_ENABLED', '1') == '1'
+    app.config['COMPRESS_MIN_SIZE'] = 1024
+    app.config['COMPRESS_LEVEL'] = int(os.environ.get('COMPRESS_LEVEL', 6))
+    app.config['COMPRESS_BROTLI_QUALITY'] = int(os.environ.get('COMPRESS_BROTLI_QUALITY', 4))
+
+    # Manutenção dos bancos de clientes (`flask maintenance run`, pelo cron): cada tarefa
+    # roda de novo após MAINTENANCE_INTERVALS segundos, só em bancos sem escritas há
+    # MAINTENANCE_IDLE_SECONDS; os backups ficam em MAINTENANCE_BACKUP_PATH
+    app.config['MAINTENANCE_BACKUP_PATH'] = os.environ.get('MAINTENANCE_BACKUP_PATH')
+    app.config['MAINTENANCE_BACKUP_KEEP'] = 7
+    app.config['MAINTENANCE_WORKERS'] = 1
+    app.config['MAINTENANCE_IDLE_SECONDS'] = 300
+    app.config['MAINTENANCE_PAUSE'] = 0.05
+    app.config['MAINTENANCE_PAGES'] = 256
+    app.config['MAINTENANCE_MIN_FREE_RATIO'] = 0.1
+    app.config['MAINTENANCE_INTERVALS'] = {'backup': 86400, 'compact': 86400,
+                                           'optimize': 7 * 86400, 'integrity': 7 * 86400}
+
+    # Inicialização: o schema do banco principal é criado por `flask migrate` (AUTO_MIGRATE=1
+    # cria na subida, para desenvolvimento); acima do orçamento a subida gera um aviso
+    app.config['AUTO_MIGRATE'] = os.environ.get('AUTO_MIGRATE') == '1'
+    app.config['STARTUP_BUDGET_MS'] = 500
+
+    # Conexões abertas por worker ao subir (bancos de clientes escritos mais recentemente)
+    app.config['TENANT_DB_WARMUP'] = 8
+
+    if config:
+        app.config.from_mapping(config)
+    os.makedirs(app.config['UPLOAD_FOLDER'], exist_ok=True)
+
+    # jsonify e respostas JSON com orjson (quando instalado)
+    init_json_provider(app)
+
+    # CORS
+    CORS(app, origins="*")
+
+    # JWT
+    JWTManager(app)
+
+    register_blueprints(app)
+
+    db.init_app(app)
+    init_database_manager(app)
+    init_tenant_pool(app)
+    init_tenant_context(app)
+    init_password_hasher(app)
+    init_image_pipeline(app)
+    init_static_manifest(app)
+    init_metrics(app)
+    init_profiler(app)
+    init_event_broker(app)
+    init_compression(app)
+    app.cli.add_command(migrate_command)
+    app.cli.add_command(migrate_tenants_command)
+    app.cli.add_command(rebuild_sintese_command)
+    app.cli.add_command(compress_static_command)
+    app.cli.add_command(fill_tenant_pool_command)
+    app.cli.add_command(tenant_storage_cli)
+    app.cli.add_command(prune_changes_command)
+    app.cli.add_command(maintenance_cli)
+
+    if app.config['AUTO_MIGRATE']:
+        with app.app_context():
+            create_main_schema()
+
+    app.add_url_rule('/', 'serve', serve, defaults={'path': ''})
+    app.add_url_rule('/<path:path>', 'serve', serve)
+
+    startup = time.perf_counter() - started
+    app.extensions['startup_seconds'] = startup
+    if startup * 1000 > app.config['STARTUP_BUDGET_MS']:
+        app.logger.warning('Inicialização levou %.0f ms (orçamento: %d ms)',
+                           startup * 1000, app.config['STARTUP_BUDGET_MS'])
+    return app
+
+
 def serve(path):
-    static_folder_path = app.static_folder
-    if static_folder_path is None:
+    if current_app.static_folder is None:
         return "Static folder not configured", 404
 
-    if path != "" and os.path.exists(os.path.join(static_folder_path, path)):
-        return send_from_directory(static_folder_path, path)
-    else:
-        index_path = os.path.join(static_folder_path, 'index.html')
-        if os.path.exists(index_path):
-            return send_from_directory(static_folder_path, 'index.html')
-        else:
-            return "index.html not found", 404
+    # Build do frontend indexado em memória na inicialização
+    manifest = get_static_manifest()
+    asset = manifest.get(path)
+    if asset is not None:
+        return asset_response(asset)
+
+    if path.startswith('uploads/'):
+        return send_from_directory(current_app.static_folder, path)
+
+    # Rotas do SPA sempre recebem o index.html
+    if manifest.index is None:
+        return "index.html not found", 404
+    return asset_response(manifest.index)
+
 
 if __name__ == '__main__':
-    app.run(host='0.0.0.0', port=5000, debug=True)
+    # Servidor de desenvolvimento (cria o schema na subida); em produção use
+    # gunicorn -c gunicorn.conf.py src.wsgi:app
+    app = create_app({'AUTO_MIGRATE': True})
+    app.run(host='0.0.0.0', port=5000, debug=os.environ.get('FLASK_DEBUG', '1') == '1')
@@ -0,0 +1,161 @@
+import json
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+# O log de alterações (change_log) é mantido pelos triggers criados na migração 7
+# (ver tenant_migrations.py). Aqui ficam o cursor, a leitura incremental e o
+# descarte dos tombstones antigos.
+#
+# O cursor é '<época>.<horizonte>.<seq>': a época muda quando o cliente troca de
+# armazenamento (os ids mudam) e o horizonte quando tombstones são descartados;
+# nos dois casos um cursor antigo pode ter perdido remoções e a sincronização
+# precisa recomeçar do início.
+
+
+class CursorExpiredError(Exception):
+    """O cursor não vale mais: a sincronização precisa recomeçar sem since"""
+
+
+def format_cursor(state, seq):
+    return f"{state['epoch']}.{state['horizon']}.{seq}"
+
+
+def parse_cursor(value):
+    """Converte ?since= em (época, horizonte, seq); None para começar do início"""
+    if not value:
+        return None
+    epoch, horizon, seq = value.split('.')
+    return epoch, int(horizon), int(seq)
+
+
+def get_state(db_manager, database_name):
+    """Época e horizonte do log do cliente (criados na primeira leitura)"""
+    query = "SELECT epoch, horizon FROM change_log_state WHERE tenant_id IS tenant()"
+    rows = db_manager.execute_query(database_name, query)
+    if rows:
+        return rows[0]
+
+    # Criado aqui e não na migração: bancos do pool são cópias do mesmo modelo
+    with db_manager.transaction(database_name):
+        db_manager.execute_query(database_name, '''
+            INSERT INTO change_log_state (tenant_id, epoch)
+            SELECT tenant(), lower(hex(randomblob(8)))
+            WHERE NOT EXISTS (SELECT 1 FROM change_log_state WHERE tenant_id IS tenant())
+        ''')
+    return db_manager.execute_query(database_name, query)[0]
+
+
+def is_expired(state, since):
+    epoch, horizon, seq = since
+    if epoch != state['epoch']:
+        return True
+    # Tombstones descartados depois da emissão do cursor e posteriores a ele
+    return horizon != state['horizon'] and seq < state['horizon']
+
+
+def read_changes(db_manager, database_name, since, limit, columns):
+    """Alterações do cliente depois do cursor, em ordem de seq
+
+    columns mapeia cada entidade para as colunas devolvidas em data. Sem
+    cursor devolve todos os registros existentes (sem os tombstones).
+    Retorna {'changes', 'cursor', 'has_more'}; CursorExpiredError se o
+    cursor não vale mais.
+    """
+    get_state(db_manager, database_name)
+
+    with db_manager.snapshot(database_name):
+        state = get_state(db_manager, database_name)
+        if since is not None and is_expired(state, since):
+            raise CursorExpiredError('Cursor expirado: sincronize novamente sem since')
+        after = since[2] if since else 0
+
+        entries = db_manager.execute_query(database_name, '''
+            SELECT seq, entity, entity_id, deleted FROM change_log
+            WHERE tenant_id IS tenant() AND seq > ? AND (deleted = 0 OR ?)
+            ORDER BY seq LIMIT ?
+        ''', (after, since is not None, limit + 1))
+        has_more = len(entries) > limit
+        entries = entries[:limit]
+
+        ids = {}
+        for entry in entries:
+            if not entry['deleted']:
+                ids.setdefault(entry['entity'], []).append(entry['entity_id'])
+        rows = {}
+        for entity, entity_ids in ids.items():
+            query = f'''
+                SELECT {columns[entity]} FROM {entity}
+                WHERE id IN (SELECT value FROM json_each(?)) AND tenant_id IS tenant()
+            '''
+            for row in db_manager.execute_query(database_name, query, (json.dumps(entity_ids),)):
+                rows[entity, row['id']] = row
+
+        if has_more:
+            seq = entries[-1]['seq']
+        else:
+            # Tudo até o fim do log foi visto (inclusive tombstones omitidos)
+            head = db_manager.execute_query(
+                database_name, "SELECT MAX(seq) AS seq FROM change_log WHERE tenant_id IS tenant()")[0]['seq']
+            seq = max(after, head or 0)
+
+    changes = []
+    for entry in entries:
+        change = {'entity': entry['entity'], 'id': entry['entity_id']}
+        if entry['deleted']:
+            change['op'] = 'delete'
+        else:
+            change['op'] = 'upsert'
+            change['data'] = rows.get((entry['entity'], entry['entity_id']))
+        changes.append(change)
+
+    return {'changes': changes, 'cursor': format_cursor(state, seq), 'has_more': has_more}
+
+
+def prune_tombstones(db_manager, database_name, days):
+    """Descarta tombstones com mais de `days` dias; retorna quantos saíram
+
+    Clientes com cursor anterior ao descarte recebem CursorExpiredError.
+    """
+    with db_manager.transaction(database_name):
+        horizon = db_manager.execute_query(database_name, '''
+            SELECT MAX(seq) AS seq FROM change_log
+            WHERE tenant_id IS tenant() AND deleted = 1 AND changed_at < datetime('now', ?)
+        ''', (f'-{int(days)} days',))[0]['seq']
+        if horizon is None:
+            return 0
+        pruned = db_manager.execute_query(
+            database_name, "DELETE FROM change_log WHERE tenant_id IS tenant() AND deleted = 1 AND seq <= ?",
+            (horizon,))
+        db_manager.execute_query(
+            database_name, "UPDATE change_log_state SET horizon = MAX(horizon, ?) WHERE tenant_id IS tenant()",
+            (horizon,))
+    return pruned
+
+
+@click.command('prune-changes')
+@click.option('--days', default=None, type=int,
+              help='Idade mínima dos tombstones descartados (padrão: CHANGE_LOG_RETENTION_DAYS)')
+@click.option('--database', 'database_names', multiple=True,
+              help='Banco a processar (pode ser repetido; padrão: todos)')
+@with_appcontext
+def prune_changes_command(days, database_names):
+    """Descarta os tombstones antigos do log de alterações dos clientes"""
+    from src.models.database_manager import get_database_manager
+
+    if days is None:
+        days = current_app.config['CHANGE_LOG_RETENTION_DAYS']
+    db_manager = get_database_manager()
+    names = database_names or db_manager.list_databases()
+    pruned, failed = 0, 0
+    with click.progressbar(names, label='Descartando tombstones') as bar:
+        for database_name in bar:
+            try:
+                pruned += prune_tombstones(db_manager, database_name, days)
+            except Exception as e:
+                failed += 1
+                click.echo(f'\n  {database_name}: {e}', err=True)
+
+    click.echo(f'Bancos processados: {len(names)}  Tombstones descartados: {pruned}  Falhas: {failed}')
+    if failed:
+        raise SystemExit(1)
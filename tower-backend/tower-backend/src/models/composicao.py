@@ -0,0 +1,108 @@
+import json
+
+# Composição dos produtos (produto_insumos): custo_unitario = soma de quantidade * preço
+# dos insumos. O índice idx_produto_insumos_insumo permite achar, a partir dos
+# insumos alterados, apenas os produtos que dependem deles.
+
+RECALCULAR_POR_INSUMOS = '''
+    UPDATE produtos SET custo_unitario = novos.custo, updated_at = CURRENT_TIMESTAMP
+    FROM (
+        SELECT pi.produto_id AS id, SUM(pi.quantidade * i.preco) AS custo
+        FROM produto_insumos pi
+        JOIN insumos i ON i.id = pi.insumo_id
+        WHERE pi.produto_id IN (
+            SELECT produto_id FROM produto_insumos
+            WHERE insumo_id IN (SELECT value FROM json_each(?)) AND tenant_id IS tenant()
+        )
+        GROUP BY pi.produto_id
+    ) AS novos
+    WHERE produtos.id = novos.id AND produtos.custo_unitario IS NOT novos.custo
+'''
+
+# Parte dos produtos informados: os que ficaram sem nenhum insumo passam a ter custo zero
+RECALCULAR_PRODUTOS = '''
+    UPDATE produtos SET custo_unitario = novos.custo, updated_at = CURRENT_TIMESTAMP
+    FROM (
+        SELECT p.id, COALESCE(SUM(pi.quantidade * i.preco), 0) AS custo
+        FROM produtos p
+        LEFT JOIN produto_insumos pi ON pi.produto_id = p.id
+        LEFT JOIN insumos i ON i.id = pi.insumo_id
+        WHERE p.id IN (SELECT value FROM json_each(?)) AND p.tenant_id IS tenant()
+        GROUP BY p.id
+    ) AS novos
+    WHERE produtos.id = novos.id AND produtos.custo_unitario IS NOT novos.custo
+'''
+
+
+def recalcular_por_insumos(db_manager, database_name, insumo_ids):
+    """Recalcula o custo apenas dos produtos que usam os insumos informados
+
+    Retorna o número de produtos cujo custo mudou.
+    """
+    if not insumo_ids:
+        return 0
+    return db_manager.execute_query(database_name, RECALCULAR_POR_INSUMOS, (json.dumps(list(insumo_ids)),))
+
+
+def recalcular_produtos(db_manager, database_name, produto_ids):
+    """Recalcula o custo dos produtos informados a partir da composição"""
+    if not produto_ids:
+        return 0
+    return db_manager.execute_query(database_name, RECALCULAR_PRODUTOS, (json.dumps(list(produto_ids)),))
+
+
+def definir_composicao(db_manager, database_name, produto_id, itens):
+    """Substitui a composição do produto e recalcula seu custo
+
+    itens: [(insumo_id, quantidade), ...]
+    """
+    with db_manager.transaction(database_name):
+        removidos = db_manager.execute_query(database_name, "DELETE FROM produto_insumos WHERE produto_id = ? AND tenant_id IS tenant()", (produto_id,))
+        if itens:
+            db_manager.execute_many(
+                database_name,
+                "INSERT INTO produto_insumos (tenant_id, produto_id, insumo_id, quantidade) VALUES (tenant(), ?, ?, ?)",
+                [(produto_id, insumo_id, quantidade) for insumo_id, quantidade in itens]
+            )
+        # Sem composição antes nem depois o custo continua o informado no produto
+        if itens or removidos:
+            recalcular_produtos(db_manager, database_name, [produto_id])
+
+
+def importar_lista_precos(db_manager, database_name, fornecedor, itens):
+    """Aplica a lista de preços de um fornecedor e propaga para os produtos
+
+    itens: [{'id': int, 'preco': ...}] ou [{'nome': ..., 'preco': ...}] (nome do
+    insumo deste fornecedor). Tudo acontece em uma única transação.
+    Retorna (resultado por item, número de produtos recalculados).
+    """
+    with db_manager.transaction(database_name):
+        insumos = db_manager.execute_query(
+            database_name, "SELECT id, nome, preco FROM insumos WHERE tenant_id IS tenant() AND fornecedor IS ?", (fornecedor,))
+        por_nome = {insumo['nome']: insumo for insumo in insumos}
+        por_id = {insumo['id']: insumo for insumo in insumos}
+
+        resultados = []
+        alterados = {}
+        for item in itens:
+            referencia = item.get('id', item.get('nome'))
+            insumo = por_id.get(item['id']) if 'id' in item else por_nome.get(item.get('nome'))
+            if insumo is None:
+                resultados.append({'insumo': referencia, 'status': 'not_found'})
+                continue
+            preco = float(item['preco'])
+            if preco == insumo['preco']:
+                resultados.append({'insumo': referencia, 'status': 'unchanged'})
+                continue
+            alterados[insumo['id']] = preco
+            resultados.append({'insumo': referencia, 'status': 'updated'})
+
+        if alterados:
+            db_manager.execute_many(
+                database_name,
+                "UPDATE insumos SET preco = ?, updated_at = CURRENT_TIMESTAMP WHERE id = ? AND tenant_id IS tenant()",
+                [(preco, insumo_id) for insumo_id, preco in alterados.items()]
+            )
+        produtos = recalcular_por_insumos(db_manager, database_name, alterados.keys())
+
+    return resultados, produtos
@@ -0,0 +1,150 @@
+import time
+import zlib
+from flask import current_app, request
+from src.models.static_assets import COMPRESSIBLE_TYPES
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional; sem ele as respostas saem só em gzip
+    brotli = None
+
+DEFAULT_MIN_SIZE = 1024
+DEFAULT_LEVEL = 6
+# Qualidades altas do brotli compensam só no build (ver compress-static), não por requisição
+DEFAULT_BROTLI_QUALITY = 4
+
+# SSE passa por COMPRESSIBLE_TYPES ('text/'), mas cada evento precisa sair na hora
+EXCLUDED_TYPES = ('text/event-stream',)
+
+
+class ResponseCompressor:
+    """Comprime as respostas da API conforme o Accept-Encoding (after_request)
+
+    Respostas com tamanho conhecido abaixo de min_size, arquivos enviados
+    direto (send_file, fotos de perfil), tipos não textuais e respostas já
+    codificadas passam sem alteração. Respostas em streaming são comprimidas
+    pedaço a pedaço, sem juntar o corpo em memória.
+    """
+
+    def __init__(self, min_size=DEFAULT_MIN_SIZE, level=DEFAULT_LEVEL,
+                 brotli_quality=DEFAULT_BROTLI_QUALITY, metrics=None):
+        self.min_size = min_size
+        self.level = level
+        self.brotli_quality = brotli_quality
+        self.metrics = metrics
+        self.encodings = ('br', 'gzip') if brotli is not None else ('gzip',)
+
+    def _compressor(self, encoding):
+        """Retorna (comprimir(pedaço), finalizar()) para a codificação"""
+        if encoding == 'br':
+            compressor = brotli.Compressor(quality=self.brotli_quality)
+            return compressor.process, compressor.finish
+        compressor = zlib.compressobj(self.level, zlib.DEFLATED, 31)  # 31: formato gzip
+        return compressor.compress, compressor.flush
+
+    def _eligible(self, response):
+        if response.status_code < 200 or response.status_code in (204, 206, 304):
+            return False
+        if response.direct_passthrough or 'Content-Encoding' in response.headers:
+            return False
+        mimetype = response.mimetype
+        if not mimetype or not mimetype.startswith(COMPRESSIBLE_TYPES) or mimetype in EXCLUDED_TYPES:
+            return False
+        if 'no-transform' in response.headers.get('Cache-Control', ''):
+            return False
+        if response.is_streamed:
+            return True
+        length = response.calculate_content_length()
+        return length is not None and length >= self.min_size
+
+    def process(self, response):
+        if response.status_code == 304:
+            return self._not_modified(response)
+        if not self._eligible(response):
+            return response
+
+        # A representação depende do Accept-Encoding mesmo quando não há compressão
+        response.vary.add('Accept-Encoding')
+        encoding = request.accept_encodings.best_match(self.encodings)
+        if encoding is None or request.method == 'HEAD':
+            return response
+
+        labels = (request.blueprint or '', request.endpoint or 'unmatched', encoding)
+        if response.is_streamed:
+            chunks = response.response
+            response.response = self._stream(chunks, encoding, labels)
+            response.headers.pop('Content-Length', None)
+            # O iterador original continua sendo encerrado com a resposta (com
+            # stream_with_context o teardown da requisição acontece no close)
+            close = getattr(chunks, 'close', None)
+            if close is not None:
+                response.call_on_close(close)
+        else:
+            body = response.get_data()
+            started = time.thread_time()
+            compress, finish = self._compressor(encoding)
+            compressed = compress(body) + finish()
+            self._observe(labels, len(body), len(compressed), time.thread_time() - started)
+            if len(compressed) >= len(body):
+                return response
+            response.set_data(compressed)
+
+        response.headers['Content-Encoding'] = encoding
+        # O corpo comprimido não é igual byte a byte: ETag fraco (If-None-Match
+        # usa comparação fraca, então make_conditional continua respondendo 304)
+        etag, weak = response.get_etag()
+        if etag and not weak:
+            response.set_etag(etag, weak=True)
+        return response
+
+    def _not_modified(self, response):
+        # 304 de uma resposta que saiu comprimida: repete o ETag fraco e o Vary
+        etag, weak = response.get_etag()
+        if etag and not weak and f'W/"{etag}"' in request.headers.get('If-None-Match', ''):
+            response.set_etag(etag, weak=True)
+            response.vary.add('Accept-Encoding')
+        return response
+
+    def _stream(self, chunks, encoding, labels):
+        compress, finish = self._compressor(encoding)
+        size_in = size_out = 0
+        cpu = 0.0
+        for chunk in chunks:
+            if isinstance(chunk, str):
+                chunk = chunk.encode('utf-8')
+            started = time.thread_time()
+            data = compress(chunk)
+            cpu += time.thread_time() - started
+            size_in += len(chunk)
+            if data:
+                size_out += len(data)
+                yield data
+        started = time.thread_time()
+        data = finish()
+        cpu += time.thread_time() - started
+        size_out += len(data)
+        yield data
+        self._observe(labels, size_in, size_out, cpu)
+
+    def _observe(self, labels, size_in, size_out, cpu_seconds):
+        if self.metrics is not None:
+            self.metrics.observe_compression(*labels, size_in, size_out, cpu_seconds)
+
+
+def _after_request(response):
+    return current_app.extensions['compression'].process(response)
+
+
+def init_compression(app):
+    """Registra a compressão das respostas (depois de init_metrics: as métricas
+    de tamanho de resposta passam a ver o corpo já comprimido)"""
+    compressor = ResponseCompressor(
+        min_size=app.config.get('COMPRESS_MIN_SIZE', DEFAULT_MIN_SIZE),
+        level=app.config.get('COMPRESS_LEVEL', DEFAULT_LEVEL),
+        brotli_quality=app.config.get('COMPRESS_BROTLI_QUALITY', DEFAULT_BROTLI_QUALITY),
+        metrics=app.extensions.get('metrics'),
+    )
+    app.extensions['compression'] = compressor
+    if app.config.get('COMPRESS_ENABLED', True):
+        app.after_request(_after_request)
+    return compressor
@@ -1,102 +1,571 @@
 import os
 import sqlite3
-from flask_sqlalchemy import SQLAlchemy
-from sqlalchemy import create_engine, text
+import threading
+import time
+from collections import OrderedDict
+from contextlib import ExitStack, closing, contextmanager
+from urllib.request import pathname2url
+from flask import current_app, g, has_request_context
+from src.models.tenant_migrations import apply_migrations, MIGRATIONS
+from src.models.tenant_storage import FileTenantStorage, SharedTenantStorage, TenantMovedError
+
+# Valores padrão do cache de conexões (podem ser sobrescritos via app.config)
+DEFAULT_MAX_OPEN = 64
+DEFAULT_IDLE_TIMEOUT = 300  # segundos
+DEFAULT_BUSY_TIMEOUT = 5000  # milissegundos
+DEFAULT_SYNCHRONOUS = 'NORMAL'
+
+SYNCHRONOUS_MODES = {'OFF', 'NORMAL', 'FULL', 'EXTRA'}
+
+# Tentativas de localizar o cliente quando ele muda de armazenamento
+CHECKOUT_ATTEMPTS = 5
+
+# Formato das linhas de iterate_query: sqlite3.Row, dict (montado uma vez, já
+# pronto para o codificador JSON) ou tupla na ordem do SELECT
+ROW_TYPES = ('row', 'dict', 'tuple')
+
+
+class TenantConnection(sqlite3.Connection):
+    """Conexão que sabe a qual cliente está servindo
+
+    A função SQL tenant() devolve a chave do cliente no banco compartilhado
+    (None nos bancos por arquivo), para filtros como `tenant_id IS tenant()`.
+    """
+
+    location = None
+
+    def current_tenant(self):
+        return self.location.key if self.location is not None else None
+
+
+class ConnectionCache:
+    """Cache LRU de conexões SQLite compartilhado por todo o processo
+
+    Cada conexão é usada por uma única thread de cada vez: ela é retirada do
+    cache com acquire() e devolvida com release(). Conexões ociosas ficam
+    ordenadas por último uso; quando o limite de conexões abertas é atingido
+    (ou quando ficam ociosas por muito tempo) as mais antigas são fechadas.
+    """
+
+    def __init__(self, max_open=DEFAULT_MAX_OPEN, idle_timeout=DEFAULT_IDLE_TIMEOUT,
+                 busy_timeout=DEFAULT_BUSY_TIMEOUT, synchronous=DEFAULT_SYNCHRONOUS):
+        self._lock = threading.Condition()
+        self._idle = OrderedDict()  # db_path -> [(conexão, devolvida_em), ...]
+        self._checked_out = {}  # id(conexão) -> db_path
+        self._discard = set()  # ids de conexões que devem ser fechadas ao voltar
+        self._open = 0
+        self._pid = os.getpid()
+        self.configure(max_open, idle_timeout, busy_timeout, synchronous)
+
+    def configure(self, max_open=None, idle_timeout=None, busy_timeout=None, synchronous=None):
+        """Atualiza os parâmetros do cache"""
+        if max_open is not None:
+            self.max_open = max(1, int(max_open))
+        if idle_timeout is not None:
+            self.idle_timeout = float(idle_timeout)
+        if busy_timeout is not None:
+            self.busy_timeout = int(busy_timeout)
+        if synchronous is not None:
+            synchronous = str(synchronous).upper()
+            if synchronous not in SYNCHRONOUS_MODES:
+                raise ValueError(f"Modo synchronous inválido: {synchronous}")
+            self.synchronous = synchronous
+
+    def _connect(self, db_path, migrations):
+        """Abre uma nova conexão já configurada (WAL, busy_timeout, synchronous)"""
+        uri = f"file:{pathname2url(db_path)}?mode=rw"
+        try:
+            conn = sqlite3.connect(uri, uri=True, timeout=self.busy_timeout / 1000, factory=TenantConnection,
+                                   isolation_level=None, check_same_thread=False)
+        except sqlite3.OperationalError:
+            if not os.path.exists(db_path):
+                raise FileNotFoundError(f"Database {db_path} not found")
+            raise
+        conn.row_factory = sqlite3.Row
+        conn.execute('PRAGMA journal_mode=WAL')
+        conn.execute(f'PRAGMA synchronous={self.synchronous}')
+        conn.execute(f'PRAGMA busy_timeout={self.busy_timeout}')
+        conn.create_function('tenant', 0, conn.current_tenant, deterministic=True)
+        # Migrações pendentes são aplicadas na primeira abertura do banco
+        apply_migrations(conn, migrations)
+        return conn
+
+    def _reset_after_fork(self):
+        """Descarta conexões herdadas de outro processo (ex.: após fork)"""
+        if self._pid != os.getpid():
+            self._idle.clear()
+            self._checked_out.clear()
+            self._discard.clear()
+            self._open = 0
+            self._pid = os.getpid()
+
+    def _close(self, conn):
+        self._open -= 1
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+    def _evict_expired(self, now):
+        """Fecha conexões ociosas há mais de idle_timeout segundos"""
+        for db_path in list(self._idle):
+            entries = self._idle[db_path]
+            while entries and now - entries[0][1] > self.idle_timeout:
+                self._close(entries.pop(0)[0])
+            if not entries:
+                del self._idle[db_path]
+
+    def _evict_lru(self):
+        """Fecha a conexão ociosa usada há mais tempo; retorna False se não houver"""
+        if not self._idle:
+            return False
+        db_path, entries = next(iter(self._idle.items()))
+        self._close(entries.pop(0)[0])
+        if not entries:
+            del self._idle[db_path]
+        return True
+
+    def acquire(self, db_path, migrations=MIGRATIONS):
+        """Retira uma conexão do cache (ou abre uma nova) para o banco informado"""
+        deadline = time.monotonic() + self.busy_timeout / 1000
+        with self._lock:
+            self._reset_after_fork()
+            self._evict_expired(time.monotonic())
+
+            entries = self._idle.get(db_path)
+            if entries:
+                conn, _ = entries.pop()
+                if not entries:
+                    del self._idle[db_path]
+                self._checked_out[id(conn)] = db_path
+                return conn
+
+            # Respeita o limite de conexões abertas, fechando as ociosas mais antigas
+            while self._open >= self.max_open:
+                if self._evict_lru():
+                    continue
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    raise sqlite3.OperationalError("Limite de conexões abertas atingido")
+                self._lock.wait(remaining)
+
+            self._open += 1
+
+        try:
+            conn = self._connect(db_path, migrations)
+        except Exception:
+            with self._lock:
+                self._open -= 1
+                self._lock.notify()
+            raise
+
+        with self._lock:
+            self._checked_out[id(conn)] = db_path
+        return conn
+
+    def release(self, conn, discard=False):
+        """Devolve a conexão ao cache; transações pendentes são desfeitas"""
+        with self._lock:
+            db_path = self._checked_out.pop(id(conn), None)
+            if db_path is None:
+                # Conexão de outro processo ou já devolvida
+                return
+            if id(conn) in self._discard:
+                self._discard.remove(id(conn))
+                discard = True
+
+            if not discard and conn.in_transaction:
+                try:
+                    conn.rollback()
+                except sqlite3.Error:
+                    discard = True
+
+            if discard:
+                self._close(conn)
+            else:
+                self._idle.setdefault(db_path, []).append((conn, time.monotonic()))
+                self._idle.move_to_end(db_path)
+            self._lock.notify()
+
+    def close_path(self, db_path):
+        """Fecha todas as conexões de um banco (usado antes de removê-lo)"""
+        with self._lock:
+            for conn, _ in self._idle.pop(db_path, []):
+                self._close(conn)
+            for conn_id, path in self._checked_out.items():
+                if path == db_path:
+                    self._discard.add(conn_id)
+            self._lock.notify_all()
+
+    def close_all(self):
+        """Fecha todas as conexões ociosas"""
+        with self._lock:
+            while self._evict_lru():
+                pass
+            self._lock.notify_all()
+
+    def stats(self):
+        """Resumo do estado do cache"""
+        with self._lock:
+            return {
+                'open': self._open,
+                'idle': sum(len(entries) for entries in self._idle.values()),
+                'checked_out': len(self._checked_out),
+                'max_open': self.max_open,
+            }
+
+
+# Cache único por processo, compartilhado por todas as instâncias de DatabaseManager
+connection_cache = ConnectionCache()
+
+# Contadores de versão dos dados por cliente (incrementados a cada escrita)
+_data_versions = {}
+_data_versions_lock = threading.Lock()
+
+# Conexões em uso fora de requisições, por thread
+_local = threading.local()
+
+
+def _file_signature(path):
+    try:
+        stat = os.stat(path)
+    except FileNotFoundError:
+        return None
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _set_row_type(cursor, row_type):
+    """Troca o formato das linhas do cursor (depois do execute, que define as colunas)"""
+    if row_type == 'dict':
+        keys = [column[0] for column in cursor.description or ()]
+        cursor.row_factory = lambda _, row: dict(zip(keys, row))
+    elif row_type == 'tuple':
+        cursor.row_factory = None
+    return cursor
+
+
+def _thread_connections():
+    if not hasattr(_local, 'connections'):
+        _local.connections = {}
+    return _local.connections
+
 
 class DatabaseManager:
-    """Gerenciador para criar e gerenciar bancos de dados únicos por cliente"""
-    
-    def __init__(self, base_path):
+    """Gerenciador para criar e gerenciar bancos de dados únicos por cliente
+
+    Os dados de cada cliente ficam em um dos armazenamentos (ver
+    tenant_storage.py): um arquivo por cliente ('file') ou o banco
+    compartilhado ('shared'). Clientes novos vão para default_storage.
+    """
+
+    def __init__(self, base_path, cache=None, default_storage='file', shard_depth=1):
         self.base_path = base_path
-        if not os.path.exists(base_path):
-            os.makedirs(base_path)
-    
+        self.cache = cache or connection_cache
+        self.storages = {
+            'file': FileTenantStorage(base_path, shard_depth),
+            'shared': SharedTenantStorage(os.path.join(base_path, 'shared', 'tenants.db'), self.cache),
+        }
+        if default_storage not in self.storages:
+            raise ValueError(f"Armazenamento inválido: {default_storage}")
+        self.default_storage = default_storage
+        self._locations = {}  # database_name -> TenantLocation
+        self.query_observers = []
+        os.makedirs(base_path, exist_ok=True)
+
+    def add_query_observer(self, observer):
+        """Registra observer(database_name, query, segundos), chamado após cada instrução"""
+        self.query_observers.append(observer)
+
+    def _timed(self, database_name, query, function, *args):
+        """Executa function(*args) avisando os observadores do tempo gasto"""
+        if not self.query_observers:
+            return function(*args)
+        started = time.perf_counter()
+        try:
+            return function(*args)
+        finally:
+            elapsed = time.perf_counter() - started
+            for observer in self.query_observers:
+                observer(database_name, query, elapsed)
+
     def create_client_database(self, database_name):
         """Cria um novo banco de dados para o cliente"""
-        db_path = os.path.join(self.base_path, f"{database_name}.db")
-        
-        # Verifica se o banco já existe
-        if os.path.exists(db_path):
-            return db_path
-        
-        # Cria o banco de dados
-        conn = sqlite3.connect(db_path)
-        cursor = conn.cursor()
-        
-        # Cria tabelas básicas para o cliente
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS client_data (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                key TEXT NOT NULL,
-                value TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS client_files (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                filename TEXT NOT NULL,
-                file_path TEXT NOT NULL,
-                file_type TEXT,
-                file_size INTEGER,
-                uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS client_settings (
-                id INTEGER PRIMARY KEY AUTOINCREMENT,
-                setting_key TEXT UNIQUE NOT NULL,
-                setting_value TEXT,
-                created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
-                updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
-            )
-        ''')
-        
-        conn.commit()
-        conn.close()
-        
-        return db_path
-    
+        location = self.storages[self.default_storage].create(database_name)
+        self._locations[database_name] = location
+        return location.path
+
+    def locate(self, database_name):
+        """Onde estão os dados do cliente (TenantLocation), com cache em memória"""
+        location = self._locations.get(database_name)
+        if location is None:
+            # Arquivo primeiro: durante uma mudança o arquivo de origem ainda vale
+            for storage in (self.storages['file'], self.storages['shared']):
+                location = storage.locate(database_name)
+                if location is not None:
+                    break
+            else:
+                raise FileNotFoundError(f"Database {database_name} not found")
+            self._locations[database_name] = location
+        return location
+
+    def forget(self, database_name):
+        """Descarta a localização em cache (o cliente foi movido ou removido)"""
+        self._locations.pop(database_name, None)
+
     def get_client_database_path(self, database_name):
         """Retorna o caminho do banco de dados do cliente"""
-        return os.path.join(self.base_path, f"{database_name}.db")
-    
+        return self.locate(database_name).path
+
+    def list_databases(self):
+        """Lista os nomes dos bancos de clientes existentes"""
+        return sorted(set(self.storages['file'].list()) | set(self.storages['shared'].list()))
+
+    def database_files(self):
+        """(caminho, migrações) de cada arquivo SQLite, incluindo o compartilhado"""
+        files = [(path, MIGRATIONS) for _, path in self.storages['file'].iter_files()]
+        shared = self.storages['shared']
+        if os.path.exists(shared.path):
+            files.append((shared.path, shared.migrations))
+        return files
+
+    def warm_up(self, limit):
+        """Abre conexões com os bancos escritos mais recentemente (ex.: ao subir um worker)
+
+        As conexões ficam ociosas no cache, já com as migrações verificadas;
+        retorna quantas foram abertas.
+        """
+        def last_write(item):
+            path = item[0]
+            return max((os.path.getmtime(p) for p in (path, path + '-wal') if os.path.exists(p)), default=0)
+
+        files = sorted(self.database_files(), key=last_write, reverse=True)
+        connections = []
+        try:
+            for path, migrations in files[:min(limit, self.cache.max_open)]:
+                try:
+                    connections.append(self.cache.acquire(path, migrations))
+                except (sqlite3.Error, OSError):
+                    continue  # banco removido ou inválido: fica para a primeira requisição
+        finally:
+            for conn in connections:
+                self.cache.release(conn)
+        return len(connections)
+
     def delete_client_database(self, database_name):
         """Remove o banco de dados do cliente"""
-        db_path = self.get_client_database_path(database_name)
-        if os.path.exists(db_path):
-            os.remove(db_path)
-            return True
-        return False
-    
+        try:
+            location = self.locate(database_name)
+        except FileNotFoundError:
+            return False
+        self.forget(database_name)
+        return location.storage.delete(database_name, self.cache)
+
+    def _checkout(self, database_name):
+        """Conexão do cache para o cliente, conferindo se ele não foi movido"""
+        for _ in range(CHECKOUT_ATTEMPTS):
+            location = self.locate(database_name)
+            try:
+                conn = self.cache.acquire(location.path, location.storage.migrations)
+            except FileNotFoundError:
+                # Removido por outro processo depois de localizado
+                self.forget(database_name)
+                continue
+            conn.location = location
+            if not location.storage.is_moved(conn, database_name):
+                return conn
+            self.cache.release(conn, discard=True)
+            self.forget(database_name)
+            if location.storage.name == 'file':
+                self.cache.close_path(location.path)
+        raise TenantMovedError('Os dados do cliente estão sendo movidos, tente novamente')
+
+    @contextmanager
+    def connection(self, database_name):
+        """Fornece uma conexão do cache para o banco do cliente
+
+        Durante uma requisição a mesma conexão é reaproveitada até o fim dela
+        (devolvida em release_request_connections). Fora de requisições
+        (CLI, threads de background) a conexão fica associada à thread
+        enquanto o bloco mais externo estiver aberto. Uma conexão cujo
+        cliente foi movido (location None) é trocada na próxima chamada.
+        """
+        if has_request_context():
+            connections = g.setdefault('_tenant_connections', {})
+        else:
+            connections = _thread_connections()
+
+        conn = connections.get(database_name)
+        if conn is not None and conn.location is not None:
+            yield conn
+            return
+
+        owner = conn is None and not has_request_context()
+        if conn is not None:
+            self.cache.release(conn, discard=True)
+        conn = connections[database_name] = self._checkout(database_name)
+        if not owner:
+            yield conn
+            return
+
+        try:
+            yield conn
+        finally:
+            self.cache.release(connections.pop(database_name))
+
+    @contextmanager
+    def transaction(self, database_name):
+        """Executa um bloco em uma única transação (BEGIN IMMEDIATE ... COMMIT)
+
+        Transações aninhadas participam da transação externa. Se o cliente
+        mudou de armazenamento a transação não começa (TenantMovedError).
+        """
+        with self.connection(database_name) as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+
+            changes = conn.total_changes
+            conn.execute('BEGIN IMMEDIATE')
+            if conn.location.storage.is_moved(conn, database_name):
+                conn.execute('ROLLBACK')
+                conn.location = None
+                self.forget(database_name)
+                raise TenantMovedError('Os dados do cliente foram movidos, tente novamente')
+            try:
+                yield conn
+            except BaseException:
+                conn.execute('ROLLBACK')
+                raise
+            conn.execute('COMMIT')
+            if conn.total_changes != changes:
+                self.bump_data_version(database_name)
+
+    @contextmanager
+    def snapshot(self, database_name):
+        """Executa as leituras de um bloco sobre a mesma versão do banco
+
+        Usa uma transação de leitura (BEGIN adiado): com WAL não trava as
+        escritas. Dentro de uma transação já aberta só participa dela.
+        """
+        with self.connection(database_name) as conn:
+            if conn.in_transaction:
+                yield conn
+                return
+
+            conn.execute('BEGIN')
+            try:
+                yield conn
+            finally:
+                if conn.in_transaction:
+                    conn.execute('COMMIT')
+
+    def _write(self, database_name, operation):
+        """Executa uma escrita avulsa em transação, repetindo se o cliente foi movido"""
+        for attempt in range(2):
+            try:
+                with self.transaction(database_name) as conn:
+                    return operation(conn)
+            except TenantMovedError:
+                # Nada foi executado: a transação é recusada logo após o BEGIN
+                if attempt:
+                    raise
+
     def execute_query(self, database_name, query, params=None):
         """Executa uma query no banco de dados do cliente"""
-        db_path = self.get_client_database_path(database_name)
-        if not os.path.exists(db_path):
-            raise FileNotFoundError(f"Database {database_name} not found")
-        
-        conn = sqlite3.connect(db_path)
-        conn.row_factory = sqlite3.Row  # Para retornar resultados como dicionários
-        cursor = conn.cursor()
-        
+        if query.strip().upper().startswith('SELECT'):
+            with self.connection(database_name) as conn:
+                # Para retornar resultados como dicionários
+                return self._timed(database_name, query,
+                                   lambda: _set_row_type(conn.execute(query, params or ()), 'dict').fetchall())
+
+        # Escritas avulsas também passam por transaction(), que confere se o
+        # cliente não foi movido antes de escrever
+        return self._write(database_name, lambda conn: self._timed(
+            database_name, query, conn.execute, query, params or ()).rowcount)
+
+    def execute_insert(self, database_name, query, params=None):
+        """Executa um INSERT e retorna o id da linha criada"""
+        return self._write(database_name, lambda conn: self._timed(
+            database_name, query, conn.execute, query, params or ()).lastrowid)
+
+    def execute_many(self, database_name, query, seq_of_params):
+        """Executa a mesma instrução para cada conjunto de parâmetros"""
+        return self._write(database_name, lambda conn: self._timed(
+            database_name, query, conn.executemany, query, seq_of_params).rowcount)
+
+    def bump_data_version(self, database_name):
+        """Incrementa o contador de versão dos dados do cliente (neste processo)"""
+        with _data_versions_lock:
+            _data_versions[database_name] = _data_versions.get(database_name, 0) + 1
+
+    def data_version(self, database_name):
+        """Versão atual dos dados do cliente, sem abrir o banco
+
+        Combina o contador deste processo com a assinatura (mtime/tamanho) do
+        arquivo e do WAL, que também muda com escritas feitas por outros
+        processos.
+        """
+        with _data_versions_lock:
+            counter = _data_versions.get(database_name, 0)
         try:
-            if params:
-                cursor.execute(query, params)
-            else:
-                cursor.execute(query)
-            
-            if query.strip().upper().startswith('SELECT'):
-                results = [dict(row) for row in cursor.fetchall()]
-                conn.close()
-                return results
-            else:
-                conn.commit()
-                conn.close()
-                return cursor.rowcount
-        except Exception as e:
-            conn.close()
-            raise e
+            db_path = self.get_client_database_path(database_name)
+        except FileNotFoundError:
+            return (counter, None, None)
+        return (counter, _file_signature(db_path), _file_signature(db_path + '-wal'))
+
+    def iterate_query(self, database_name, query, params=None, batch_size=500, row_type='row'):
+        """Executa um SELECT e devolve um iterador sobre as linhas
+
+        A query é executada imediatamente (erros aparecem na chamada); as
+        linhas são lidas do cursor em lotes à medida que o iterador avança.
+        row_type (ROW_TYPES) escolhe o formato: sqlite3.Row, dict ou tupla.
+        """
+        if row_type not in ROW_TYPES:
+            raise ValueError(f'Formato de linha inválido: {row_type}')
+        stack = ExitStack()
+        conn = stack.enter_context(self.connection(database_name))
+        try:
+            cursor = _set_row_type(self._timed(database_name, query, conn.execute, query, params or ()), row_type)
+        except BaseException:
+            stack.close()
+            raise
+
+        def rows():
+            with stack, closing(cursor):
+                while True:
+                    batch = cursor.fetchmany(batch_size)
+                    if not batch:
+                        break
+                    yield from batch
+
+        return rows()
+
+
+def release_request_connections(exc=None):
+    """Devolve ao cache as conexões usadas na requisição atual"""
+    connections = g.pop('_tenant_connections', None)
+    if not connections:
+        return
+    for conn in connections.values():
+        connection_cache.release(conn)
+
+
+def init_database_manager(app):
+    """Configura o cache de conexões e registra o gerenciador na aplicação"""
+    connection_cache.configure(
+        max_open=app.config.get('TENANT_DB_MAX_OPEN', DEFAULT_MAX_OPEN),
+        idle_timeout=app.config.get('TENANT_DB_IDLE_TIMEOUT', DEFAULT_IDLE_TIMEOUT),
+        busy_timeout=app.config.get('TENANT_DB_BUSY_TIMEOUT', DEFAULT_BUSY_TIMEOUT),
+        synchronous=app.config.get('TENANT_DB_SYNCHRONOUS', DEFAULT_SYNCHRONOUS),
+    )
+    app.extensions['database_manager'] = DatabaseManager(
+        os.path.join(app.instance_path, 'client_databases'),
+        default_storage=app.config.get('TENANT_STORAGE_DEFAULT', 'file'),
+        shard_depth=app.config.get('TENANT_DB_SHARD_DEPTH', 1),
+    )
+    app.teardown_request(release_request_connections)
+
 
+def get_database_manager():
+    """Retorna o gerenciador de banco de dados da aplicação atual"""
+    return current_app.extensions['database_manager']
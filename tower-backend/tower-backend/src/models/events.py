@@ -0,0 +1,258 @@
+import json
+import os
+import queue
+import socket
+import threading
+import uuid
+from collections import OrderedDict, deque, namedtuple
+from flask import current_app
+
+DEFAULT_HISTORY = 100  # eventos guardados por cliente para retomar (Last-Event-ID)
+DEFAULT_HISTORY_TENANTS = 1000
+DEFAULT_MAX_PENDING = 64  # eventos na fila de cada conexão antes de virar resync
+DEFAULT_MAX_STREAMS = 12
+MAX_EVENT_IDS = 100  # acima disso o evento sai sem a lista de ids
+
+# data já vem serializado em JSON: codificado uma vez para todas as conexões
+Event = namedtuple('Event', 'id type data')
+
+# Eventos podem ter se perdido (fila cheia, histórico insuficiente ou falha
+# entre processos): o navegador deve buscar /api/client/changes
+RESYNC = Event(None, 'resync', '{}')
+
+
+class TooManyStreamsError(Exception):
+    """Limite de conexões de eventos do processo atingido"""
+
+
+class Subscription:
+    """Fila de eventos de uma conexão SSE"""
+
+    def __init__(self, database_name, max_pending):
+        self.database_name = database_name
+        self.queue = queue.Queue(max_pending)
+        self.overflowed = False
+
+    def put(self, event):
+        try:
+            self.queue.put_nowait(event)
+        except queue.Full:
+            # Conexão lenta: quem publica nunca espera; os pendentes viram um resync
+            self.overflowed = True
+
+    def get(self, timeout):
+        """Próximo evento (RESYNC se algum se perdeu) ou None após timeout"""
+        if self.overflowed:
+            self.overflowed = False
+            while True:
+                try:
+                    self.queue.get_nowait()
+                except queue.Empty:
+                    return RESYNC
+        try:
+            return self.queue.get(timeout=timeout)
+        except queue.Empty:
+            return None
+
+
+class SocketTransport:
+    """Repassa os eventos aos outros processos da máquina (ex.: workers do gunicorn)
+
+    Cada processo com conexões abertas escuta em um socket Unix de datagrama
+    em `directory`; quem publica envia para todos os sockets do diretório.
+    Mensagens são numeradas por origem: um salto na numeração (fila do
+    receptor cheia) gera resync nas conexões do processo.
+    """
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._lock = threading.Lock()
+        self._pid = None
+        self._reset()
+
+    def _reset(self):
+        self._pid = os.getpid()
+        self.origin = uuid.uuid4().hex[:8]
+        self._sent = 0
+        self._received = {}
+        self._sender = None
+        self.path = None
+
+    def _check_fork(self):
+        if self._pid != os.getpid():
+            self._reset()
+
+    def start(self, broker):
+        """Passa a receber os eventos dos outros processos (na primeira conexão)"""
+        with self._lock:
+            self._check_fork()
+            if self.path is not None:
+                return
+            os.makedirs(self.directory, exist_ok=True)
+            path = os.path.join(self.directory, f'{os.getpid()}.sock')
+            if os.path.exists(path):
+                os.remove(path)  # processo anterior com o mesmo pid
+            receiver = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+            receiver.bind(path)
+            self.path = path
+        threading.Thread(target=self._receive, args=(broker, receiver),
+                         name='event-transport', daemon=True).start()
+
+    def send(self, database_name, event):
+        with self._lock:
+            self._check_fork()
+            if self._sender is None:
+                self._sender = socket.socket(socket.AF_UNIX, socket.SOCK_DGRAM)
+                self._sender.setblocking(False)
+            self._sent += 1
+            payload = json.dumps({'origin': self.origin, 'n': self._sent, 'db': database_name,
+                                  'id': event.id, 'type': event.type, 'data': event.data}).encode('utf-8')
+            try:
+                entries = list(os.scandir(self.directory))
+            except FileNotFoundError:
+                return
+            for entry in entries:
+                if not entry.name.endswith('.sock') or entry.path == self.path:
+                    continue
+                try:
+                    self._sender.sendto(payload, entry.path)
+                except (ConnectionRefusedError, FileNotFoundError):
+                    # Socket de um processo que já terminou
+                    try:
+                        os.remove(entry.path)
+                    except FileNotFoundError:
+                        pass
+                except OSError:
+                    pass  # fila do receptor cheia: ele percebe o salto na numeração
+
+    def _receive(self, broker, receiver):
+        while True:
+            try:
+                message = json.loads(receiver.recv(65536))
+            except (OSError, ValueError):
+                continue
+            last = self._received.get(message['origin'])
+            if last is not None and message['n'] != last + 1:
+                broker.resync_all()
+            if len(self._received) > 1000:
+                self._received.clear()
+            self._received[message['origin']] = message['n']
+            broker.deliver(message['db'], Event(message['id'], message['type'], message['data']))
+
+
+class EventBroker:
+    """Distribui os eventos de cada cliente para as conexões SSE abertas no processo"""
+
+    def __init__(self, history=DEFAULT_HISTORY, history_tenants=DEFAULT_HISTORY_TENANTS,
+                 max_pending=DEFAULT_MAX_PENDING, max_streams=DEFAULT_MAX_STREAMS, transport=None):
+        self.history = history
+        self.history_tenants = history_tenants
+        self.max_pending = max_pending
+        self.max_streams = max_streams
+        self.transport = transport
+        self._subscribers = {}
+        self._streams = 0
+        self._history = OrderedDict()
+        self._lock = threading.Lock()
+        self._origin = None
+        self._counter = 0
+
+    def _next_id(self):
+        # Único entre processos: o Last-Event-ID pode chegar a outro worker
+        if self._origin is None or self._origin[0] != os.getpid():
+            self._origin = (os.getpid(), uuid.uuid4().hex[:8])
+            self._counter = 0
+        self._counter += 1
+        return f'{self._origin[1]}-{self._counter}'
+
+    def subscribe(self, database_name, last_event_id=None):
+        """Registra uma conexão; retorna (subscription, eventos a repetir)
+
+        Os eventos a repetir são os posteriores a last_event_id, ou None se
+        ele já saiu do histórico (a conexão deve começar com RESYNC).
+        """
+        if self.transport is not None:
+            self.transport.start(self)
+        subscription = Subscription(database_name, self.max_pending)
+        with self._lock:
+            if self._streams >= self.max_streams:
+                raise TooManyStreamsError('Limite de conexões de eventos atingido')
+            self._streams += 1
+            self._subscribers.setdefault(database_name, set()).add(subscription)
+            if not last_event_id:
+                return subscription, []
+            events = list(self._history.get(database_name, ()))
+        ids = [event.id for event in events]
+        if last_event_id not in ids:
+            return subscription, None
+        return subscription, events[ids.index(last_event_id) + 1:]
+
+    def unsubscribe(self, subscription):
+        with self._lock:
+            subscribers = self._subscribers.get(subscription.database_name)
+            if subscribers is None or subscription not in subscribers:
+                return
+            self._streams -= 1
+            subscribers.discard(subscription)
+            if not subscribers:
+                del self._subscribers[subscription.database_name]
+
+    def publish(self, database_name, event_type, data):
+        with self._lock:
+            event = Event(self._next_id(), event_type, json.dumps(data, separators=(',', ':')))
+        self.deliver(database_name, event)
+        if self.transport is not None:
+            self.transport.send(database_name, event)
+
+    def deliver(self, database_name, event):
+        with self._lock:
+            events = self._history.get(database_name)
+            if events is None:
+                events = self._history[database_name] = deque(maxlen=self.history)
+                while len(self._history) > self.history_tenants:
+                    self._history.popitem(last=False)
+            else:
+                self._history.move_to_end(database_name)
+            events.append(event)
+            subscribers = list(self._subscribers.get(database_name, ()))
+        for subscription in subscribers:
+            subscription.put(event)
+
+    def resync_all(self):
+        with self._lock:
+            subscribers = [s for subscriptions in self._subscribers.values() for s in subscriptions]
+        for subscription in subscribers:
+            subscription.overflowed = True
+
+    def stats(self):
+        with self._lock:
+            return {'streams': self._streams, 'tenants': len(self._subscribers)}
+
+
+def publish_change(database_name, entity, op, ids=None):
+    """Avisa as conexões SSE do cliente que `entity` mudou (chamar após o commit)"""
+    broker = current_app.extensions.get('event_broker')
+    if broker is None:
+        return
+    if ids is not None and len(ids) > MAX_EVENT_IDS:
+        ids = None
+    broker.publish(database_name, 'change', {'entity': entity, 'op': op, 'ids': ids})
+
+
+def init_event_broker(app):
+    transport = None
+    if app.config['EVENTS_BROKER'] == 'socket':
+        if hasattr(socket, 'AF_UNIX'):
+            transport = SocketTransport(os.path.join(app.instance_path, 'events'))
+        else:
+            app.logger.warning('EVENTS_BROKER=socket indisponível nesta plataforma; usando memory')
+    broker = EventBroker(history=app.config['EVENTS_HISTORY'],
+                         max_pending=app.config['EVENTS_MAX_PENDING'],
+                         max_streams=app.config['EVENTS_MAX_STREAMS'],
+                         transport=transport)
+    app.extensions['event_broker'] = broker
+    return broker
+
+
+def get_event_broker():
+    return current_app.extensions['event_broker']
@@ -0,0 +1,374 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+logger = logging.getLogger(__name__)
+
+# Tamanhos gerados para cada foto (lado máximo, em pixels); o primeiro é o padrão
+PROFILE_PICTURE_SIZES = (300, 150, 64)
+
+# Formatos de upload aceitos (formato detectado pelo Pillow) e a extensão com que
+# são gravados: o mesmo conteúdo enviado como .jpg ou .jpeg vira um único arquivo
+ACCEPTED_FORMATS = {'JPEG': 'jpg', 'PNG': 'png', 'GIF': 'gif'}
+
+CHUNK_SIZE = 64 * 1024
+
+STATUS_PROCESSING = 'processing'
+STATUS_READY = 'ready'
+STATUS_FAILED = 'failed'
+
+# Limites dos tamanhos pedidos via ?size= (gerados sob demanda)
+MIN_VARIANT_SIZE = 16
+MAX_VARIANT_SIZE = 1024
+VARIANT_FORMATS = {'jpg': 'JPEG', 'png': 'PNG', 'webp': 'WEBP'}
+
+
+class PictureFile:
+    """Arquivo a servir para uma foto; path pode ainda não existir (variante sob demanda)"""
+
+    __slots__ = ('path', 'etag', 'immutable', 'negotiated', 'source', 'size')
+
+    def __init__(self, path, etag=None, immutable=True, negotiated=False, source=None, size=None):
+        self.path = path
+        self.etag = etag
+        self.immutable = immutable
+        self.negotiated = negotiated
+        self.source = source
+        self.size = size
+
+
+class VariantCache:
+    """Cache em disco das variantes geradas sob demanda, limitado pelo total de bytes
+
+    O mtime do arquivo marca o último uso; ao passar do limite os arquivos
+    menos usados são removidos. Cada processo mantém só uma estimativa do
+    total, corrigida por uma varredura do diretório a cada limpeza.
+    """
+
+    def __init__(self, folder, max_bytes):
+        self.folder = folder
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        os.makedirs(folder, exist_ok=True)
+        self._size = sum(entry.stat().st_size for entry in self._entries())
+
+    def _entries(self):
+        with os.scandir(self.folder) as entries:
+            return [entry for entry in entries if entry.is_file() and not entry.name.endswith('.tmp')]
+
+    def path(self, name):
+        return os.path.join(self.folder, name)
+
+    def touch(self, path):
+        try:
+            os.utime(path)
+            return True
+        except FileNotFoundError:
+            return False
+
+    def added(self, path):
+        with self._lock:
+            self._size += os.path.getsize(path)
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def _evict(self):
+        entries = sorted(((entry.stat().st_mtime, entry.stat().st_size, entry.path) for entry in self._entries()))
+        self._size = sum(size for _, size, _ in entries)
+        # Remove até ficar abaixo de 90% do limite, para não limpar a cada nova variante
+        for _, size, path in entries:
+            if self._size <= self.max_bytes * 0.9:
+                break
+            try:
+                os.remove(path)
+            except FileNotFoundError:
+                pass
+            self._size -= size
+
+    def remove_prefix(self, prefix):
+        for entry in self._entries():
+            if entry.name.startswith(prefix):
+                with self._lock:
+                    self._size -= entry.stat().st_size
+                os.remove(entry.path)
+
+
+class ImagePipeline:
+    """Processa as fotos de perfil fora da requisição
+
+    O upload é gravado uma única vez em originals/<hash>.<ext> (sha256 do
+    conteúdo, o que deduplica envios idênticos) e um pool limitado de threads
+    gera as variantes <hash>_<tamanho>.<jpg|png> e .webp. O manifesto
+    <hash>.json é gravado por último e indica que as variantes estão prontas.
+    """
+
+    def __init__(self, upload_folder, sizes=PROFILE_PICTURE_SIZES, max_workers=2, max_pending=32,
+                 cache_max_bytes=256 * 1024 * 1024, max_variant_size=MAX_VARIANT_SIZE):
+        self.upload_folder = upload_folder
+        self.originals_folder = os.path.join(upload_folder, 'originals')
+        self.cache = VariantCache(os.path.join(upload_folder, 'cache'), cache_max_bytes)
+        self.max_variant_size = max_variant_size
+        self.sizes = tuple(sorted(sizes, reverse=True))
+        self.max_workers = max_workers
+        self._slots = threading.BoundedSemaphore(max_pending)
+        self._pending = set()
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+        os.makedirs(self.originals_folder, exist_ok=True)
+
+    def _get_executor(self):
+        # Um pool por processo (o pool não sobrevive a um fork)
+        if self._pid != os.getpid():
+            self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='image-pipeline')
+            self._pid = os.getpid()
+            self._pending.clear()
+        return self._executor
+
+    def manifest_path(self, digest):
+        return os.path.join(self.upload_folder, f'{digest}.json')
+
+    def store_upload(self, stream):
+        """Grava o upload em disco calculando o hash; retorna o nome do original
+
+        A extensão do nome vem do formato detectado, não do arquivo enviado.
+
+        Levanta ValueError se o conteúdo não for uma imagem aceita.
+        """
+        temp_path = os.path.join(self.originals_folder, f'.{uuid.uuid4().hex}.tmp')
+        digest = hashlib.sha256()
+        try:
+            with open(temp_path, 'wb') as temp_file:
+                for chunk in iter(lambda: stream.read(CHUNK_SIZE), b''):
+                    digest.update(chunk)
+                    temp_file.write(chunk)
+
+            # Só o cabeçalho é lido aqui; a decodificação fica para o worker
+            # (o Pillow é importado no primeiro uso, fora da inicialização)
+            from PIL import Image
+
+            try:
+                with Image.open(temp_path) as img:
+                    image_format = img.format
+            except (OSError, Image.DecompressionBombError):
+                raise ValueError('Arquivo de imagem inválido')
+            if image_format not in ACCEPTED_FORMATS:
+                raise ValueError('Tipo de arquivo não permitido')
+
+            original_name = f'{digest.hexdigest()[:32]}.{ACCEPTED_FORMATS[image_format]}'
+            original_path = os.path.join(self.originals_folder, original_name)
+            if os.path.exists(original_path):
+                os.remove(temp_path)
+            else:
+                os.replace(temp_path, original_path)
+            return original_name
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    def submit(self, original_name):
+        """Agenda o processamento do original; retorna o status atual
+
+        Uploads já processados (mesmo hash) não são processados de novo.
+        Levanta RuntimeError quando a fila está cheia.
+        """
+        digest = original_name.rsplit('.', 1)[0]
+        status = self.status(digest)
+        if status != STATUS_PROCESSING:
+            return status
+
+        with self._lock:
+            executor = self._get_executor()
+            if digest in self._pending:
+                return STATUS_PROCESSING
+            if not self._slots.acquire(blocking=False):
+                raise RuntimeError('Fila de processamento de imagens cheia')
+            self._pending.add(digest)
+
+        try:
+            executor.submit(self._run, original_name)
+        except BaseException:
+            self._finish(digest)
+            raise
+        return STATUS_PROCESSING
+
+    def _finish(self, digest):
+        with self._lock:
+            self._pending.discard(digest)
+        self._slots.release()
+
+    def _run(self, original_name):
+        digest = original_name.rsplit('.', 1)[0]
+        try:
+            try:
+                manifest = self.process(original_name)
+            except Exception:
+                logger.exception('Falha ao processar a imagem %s', original_name)
+                manifest = {'status': STATUS_FAILED, 'original': original_name}
+            self._write_json(self.manifest_path(digest), manifest)
+        finally:
+            self._finish(digest)
+
+    def process(self, original_name):
+        """Gera todas as variantes do original e retorna o manifesto"""
+        digest = original_name.rsplit('.', 1)[0]
+        original_path = os.path.join(self.originals_folder, original_name)
+        largest = self.sizes[0]
+        from PIL import Image, ImageOps
+
+        with Image.open(original_path) as source:
+            # Em JPEG o draft decodifica já reduzido (1/2, 1/4 ou 1/8), bem mais barato
+            if source.format == 'JPEG':
+                source.draft('RGB', (largest, largest))
+            img = ImageOps.exif_transpose(source)
+
+            has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+            img = img.convert('RGBA' if has_alpha else 'RGB')
+            base_format, base_extension = ('PNG', 'png') if has_alpha else ('JPEG', 'jpg')
+
+            variants = {}
+            for size in self.sizes:
+                # Cada tamanho parte do anterior, que já é menor que o original
+                img.thumbnail((size, size), Image.Resampling.LANCZOS)
+                base_name = f'{digest}_{size}.{base_extension}'
+                webp_name = f'{digest}_{size}.webp'
+                self._save(img, base_name, base_format, optimize=True, quality=85)
+                self._save(img, webp_name, 'WEBP', quality=80, method=4)
+                variants[str(size)] = {base_extension: base_name, 'webp': webp_name,
+                                       'width': img.width, 'height': img.height}
+
+        return {
+            'status': STATUS_READY,
+            'original': original_name,
+            'default_size': str(largest),
+            'variants': variants
+        }
+
+    def _save(self, img, filename, image_format, **options):
+        path = os.path.join(self.upload_folder, filename)
+        temp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        img.save(temp_path, image_format, **options)
+        os.replace(temp_path, path)
+
+    def _write_json(self, path, data):
+        temp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        with open(temp_path, 'w') as f:
+            json.dump(data, f)
+        os.replace(temp_path, path)
+
+    def manifest(self, digest):
+        """Manifesto do hash, ou None enquanto não foi processado"""
+        try:
+            with open(self.manifest_path(digest)) as f:
+                return json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+    def status(self, digest):
+        manifest = self.manifest(digest)
+        return manifest['status'] if manifest else STATUS_PROCESSING
+
+    def remove(self, original_name):
+        """Remove o original, as variantes e o manifesto de um arquivo enviado"""
+        digest = original_name.rsplit('.', 1)[0]
+        paths = [
+            os.path.join(self.originals_folder, original_name),
+            # Fotos antigas, gravadas direto em uploads antes do pipeline
+            os.path.join(self.upload_folder, original_name),
+            self.manifest_path(digest),
+        ]
+        for size in self.sizes:
+            paths.extend(os.path.join(self.upload_folder, f'{digest}_{size}.{extension}')
+                         for extension in ('jpg', 'png', 'webp'))
+        for path in paths:
+            if os.path.exists(path):
+                os.remove(path)
+        self.cache.remove_prefix(f'{digest}_')
+
+    def resolve(self, filename, size=None, accepts_webp=False):
+        """Decide qual arquivo servir para a foto; None se ela não existe
+
+        Levanta ValueError para tamanhos fora dos limites.
+        """
+        if '.' not in filename:
+            return None
+        if size is not None and not MIN_VARIANT_SIZE <= size <= self.max_variant_size:
+            raise ValueError(f'Tamanho deve estar entre {MIN_VARIANT_SIZE} e {self.max_variant_size}')
+
+        digest = filename.rsplit('.', 1)[0]
+        manifest = self.manifest(digest)
+        ready = manifest is not None and manifest['status'] == STATUS_READY
+
+        # Variantes geradas pelo pipeline
+        if ready:
+            variant = manifest['variants'].get(str(size or manifest['default_size']))
+            if variant:
+                name = variant['webp'] if accepts_webp else next(
+                    value for key, value in variant.items() if key in ('jpg', 'png'))
+                return PictureFile(os.path.join(self.upload_folder, name), etag=name, negotiated=True)
+
+        source = os.path.join(self.originals_folder, filename)
+        if not os.path.exists(source):
+            # Fotos antigas, gravadas direto em uploads
+            source = os.path.join(self.upload_folder, filename)
+            if not os.path.exists(source):
+                return None
+            legacy = True
+        else:
+            legacy = False
+
+        if size is None:
+            # O original só é servido enquanto o processamento não termina; a
+            # mesma URL passa a servir a variante, então não pode ser imutável
+            return PictureFile(source, etag=filename, immutable=legacy)
+
+        if accepts_webp:
+            extension = 'webp'
+        else:
+            extension = 'png' if filename.rsplit('.', 1)[1].lower() in ('png', 'gif') else 'jpg'
+        name = f'{digest}_{size}.{extension}'
+        return PictureFile(self.cache.path(name), etag=name, negotiated=True, source=source, size=size)
+
+    def render(self, picture):
+        """Gera (se preciso) a variante sob demanda de picture no cache em disco"""
+        if picture.source is None or self.cache.touch(picture.path):
+            return
+        from PIL import Image, ImageOps
+
+        with Image.open(picture.source) as source:
+            if source.format == 'JPEG':
+                source.draft('RGB', (picture.size, picture.size))
+            img = ImageOps.exif_transpose(source)
+            has_alpha = img.mode in ('RGBA', 'LA') or (img.mode == 'P' and 'transparency' in img.info)
+            image_format = VARIANT_FORMATS[picture.path.rsplit('.', 1)[1]]
+            img = img.convert('RGBA' if has_alpha and image_format != 'JPEG' else 'RGB')
+            img.thumbnail((picture.size, picture.size), Image.Resampling.LANCZOS)
+
+            temp_path = f'{picture.path}.{uuid.uuid4().hex}.tmp'
+            img.save(temp_path, image_format, quality=85)
+        os.replace(temp_path, picture.path)
+        self.cache.added(picture.path)
+
+
+def init_image_pipeline(app):
+    """Cria o pipeline de imagens a partir da configuração da aplicação"""
+    pipeline = ImagePipeline(
+        app.config['UPLOAD_FOLDER'],
+        sizes=app.config.get('PROFILE_PICTURE_SIZES', PROFILE_PICTURE_SIZES),
+        max_workers=app.config.get('PROFILE_IMAGE_WORKERS', 2),
+        max_pending=app.config.get('PROFILE_IMAGE_MAX_PENDING', 32),
+        cache_max_bytes=app.config.get('PROFILE_PICTURE_CACHE_MAX_BYTES', 256 * 1024 * 1024),
+        max_variant_size=app.config.get('PROFILE_PICTURE_MAX_SIZE', MAX_VARIANT_SIZE),
+    )
+    app.extensions['image_pipeline'] = pipeline
+    return pipeline
+
+
+def get_image_pipeline():
+    return current_app.extensions['image_pipeline']
@@ -0,0 +1,94 @@
+import json
+from datetime import date
+from flask.json.provider import DefaultJSONProvider
+
+try:
+    import orjson
+except ImportError:  # orjson é opcional; sem ele usa o json da biblioteca padrão
+    orjson = None
+
+# Itens codificados por chamada ao gerar listas em pedaços
+STREAM_BATCH_SIZE = 256
+
+
+def _default(o):
+    # Datas em ISO 8601, como o orjson já faz com datetime
+    if isinstance(o, date):
+        return o.isoformat()
+    return DefaultJSONProvider.default(o)
+
+
+class FastJSONProvider(DefaultJSONProvider):
+    """JSON da aplicação: orjson quando instalado, com o json da biblioteca padrão como alternativa
+
+    Aceita os mesmos tipos do provider padrão do Flask; datas saem em ISO 8601
+    nos dois codificadores. Chaves não são ordenadas. Linhas do banco chegam
+    como dict (iterate_query com row_type='dict'), sem passar pelo default.
+    """
+
+    default = staticmethod(_default)
+    sort_keys = False
+
+    def _option(self):
+        option = orjson.OPT_NON_STR_KEYS
+        if self.sort_keys:
+            option |= orjson.OPT_SORT_KEYS
+        return option
+
+    def dumps_bytes(self, obj, **kwargs):
+        """Como dumps(), mas já em UTF-8 (evita decodificar e codificar de novo)"""
+        if orjson is not None and not kwargs:
+            try:
+                return orjson.dumps(obj, default=self.default, option=self._option())
+            except orjson.JSONEncodeError:
+                pass  # ex.: inteiros acima de 64 bits, que o json padrão aceita
+        return super().dumps(obj, **kwargs).encode('utf-8')
+
+    def dumps(self, obj, **kwargs):
+        if orjson is not None and not kwargs:
+            return self.dumps_bytes(obj).decode('utf-8')
+        return super().dumps(obj, **kwargs)
+
+    def loads(self, s, **kwargs):
+        if orjson is not None and not kwargs:
+            try:
+                return orjson.loads(s)
+            except orjson.JSONDecodeError:
+                pass  # NaN e inteiros enormes; o json padrão decide se é inválido
+        return super().loads(s, **kwargs)
+
+    def response(self, *args, **kwargs):
+        # Saída indentada (modo debug) fica com o provider padrão
+        if orjson is None or self.compact is False or (self.compact is None and self._app.debug):
+            return super().response(*args, **kwargs)
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(self.dumps_bytes(obj) + b'\n', mimetype=self.mimetype)
+
+    def stream_array(self, items, batch_size=STREAM_BATCH_SIZE):
+        """Gera uma lista JSON em pedaços (bytes), codificando batch_size itens por vez
+
+        items pode ser qualquer iterável (ex.: o iterador de iterate_query com
+        row_type='dict'): nem a lista nem o texto completo ficam em memória.
+        """
+        yield b'['
+        batch = []
+        first = True
+        for item in items:
+            batch.append(item)
+            if len(batch) == batch_size:
+                yield self._encode_batch(batch, first)
+                batch = []
+                first = False
+        if batch:
+            yield self._encode_batch(batch, first)
+        yield b']'
+
+    def _encode_batch(self, batch, first):
+        # Uma única chamada ao codificador por lote; os colchetes são descartados
+        body = self.dumps_bytes(batch)[1:-1]
+        return body if first else b',' + body
+
+
+def init_json_provider(app):
+    app.json = FastJSONProvider(app)
+    return app.json
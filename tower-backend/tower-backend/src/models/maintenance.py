@@ -0,0 +1,480 @@
+import logging
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from collections import namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from urllib.request import pathname2url
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from src.models.change_log import prune_tombstones
+from src.models.tenant_migrations import get_version, MOVED_VERSION
+from src.models.tenant_pool import _FileLock
+from src.models.tenant_storage import remove_database_file
+
+logger = logging.getLogger(__name__)
+
+# Tarefas na ordem em que rodam em cada banco: o backup sai antes de qualquer
+# escrita da manutenção e a verificação de integridade por último
+TASKS = ('backup', 'compact', 'optimize', 'integrity')
+
+# Intervalo padrão entre execuções bem-sucedidas de cada tarefa (segundos)
+DEFAULT_INTERVALS = {'backup': 86400, 'compact': 86400, 'optimize': 7 * 86400, 'integrity': 7 * 86400}
+DEFAULT_IDLE_SECONDS = 300
+DEFAULT_PAUSE = 0.05  # pausa entre passos (páginas do backup, lotes do vacuum)
+DEFAULT_PAGES = 256  # páginas por passo do backup e do incremental_vacuum
+DEFAULT_MIN_FREE_RATIO = 0.1
+DEFAULT_BACKUP_KEEP = 7
+ANALYSIS_LIMIT = 1000  # linhas examinadas por índice no ANALYZE
+FTS_MERGE_PAGES = 500
+FTS_MAX_MERGES = 100
+
+FTS_TABLE = 'client_data_fts'
+AUTO_VACUUM_INCREMENTAL = 2
+
+# Um arquivo SQLite a manter: um banco de cliente ou o compartilhado inteiro
+MaintenanceTarget = namedtuple('MaintenanceTarget', 'name storage path')
+
+
+class _BackupRestarted(Exception):
+    """O banco foi escrito por outra conexão durante o backup em passos"""
+
+
+def last_write(path):
+    """Momento da última escrita no banco (arquivo principal ou WAL)"""
+    return max((os.path.getmtime(p) for p in (path, path + '-wal') if os.path.exists(p)), default=0)
+
+
+def list_targets(db_manager, database_names=None):
+    """Arquivos a manter; o banco compartilhado aparece uma vez, como 'shared'"""
+    files = db_manager.storages['file']
+    targets = [MaintenanceTarget(name, 'file', path) for name, path in files.iter_files()]
+    shared = db_manager.storages['shared']
+    if os.path.exists(shared.path):
+        targets.append(MaintenanceTarget('shared', 'shared', shared.path))
+    if database_names:
+        targets = [target for target in targets if target.name in database_names]
+    return sorted(targets)
+
+
+class MaintenanceState:
+    """Última execução de cada tarefa por banco, em um SQLite fora de client_databases"""
+
+    def __init__(self, path):
+        self.path = path
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        self._lock = threading.Lock()
+        self._conn = sqlite3.connect(path, isolation_level=None, check_same_thread=False)
+        self._conn.row_factory = sqlite3.Row
+        self._conn.execute('PRAGMA journal_mode=WAL')
+        self._conn.execute('PRAGMA busy_timeout=5000')
+        self._conn.executescript('''
+            CREATE TABLE IF NOT EXISTS maintenance_tasks (
+                database_name TEXT NOT NULL,
+                task TEXT NOT NULL,
+                status TEXT NOT NULL,
+                detail TEXT,
+                finished_at REAL NOT NULL,
+                duration REAL NOT NULL,
+                last_ok_at REAL,
+                PRIMARY KEY (database_name, task)
+            );
+            CREATE TABLE IF NOT EXISTS maintenance_runs (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                started_at REAL NOT NULL,
+                finished_at REAL,
+                targets INTEGER NOT NULL DEFAULT 0,
+                ok INTEGER NOT NULL DEFAULT 0,
+                failed INTEGER NOT NULL DEFAULT 0,
+                skipped INTEGER NOT NULL DEFAULT 0
+            );
+        ''')
+
+    def last_ok(self, database_name):
+        """{tarefa: momento da última execução bem-sucedida}"""
+        with self._lock:
+            rows = self._conn.execute(
+                'SELECT task, last_ok_at FROM maintenance_tasks WHERE database_name = ?',
+                (database_name,)).fetchall()
+        return {row['task']: row['last_ok_at'] for row in rows}
+
+    def record(self, database_name, task, ok, detail, duration):
+        now = time.time()
+        with self._lock:
+            self._conn.execute('''
+                INSERT INTO maintenance_tasks (database_name, task, status, detail, finished_at, duration, last_ok_at)
+                VALUES (?, ?, ?, ?, ?, ?, ?)
+                ON CONFLICT (database_name, task) DO UPDATE SET
+                    status = excluded.status, detail = excluded.detail, finished_at = excluded.finished_at,
+                    duration = excluded.duration, last_ok_at = COALESCE(excluded.last_ok_at, last_ok_at)
+            ''', (database_name, task, 'ok' if ok else 'failed', detail, now, duration, now if ok else None))
+
+    def start_run(self):
+        with self._lock:
+            return self._conn.execute('INSERT INTO maintenance_runs (started_at) VALUES (?)',
+                                      (time.time(),)).lastrowid
+
+    def finish_run(self, run_id, targets, ok, failed, skipped):
+        with self._lock:
+            self._conn.execute('''
+                UPDATE maintenance_runs SET finished_at = ?, targets = ?, ok = ?, failed = ?, skipped = ?
+                WHERE id = ?
+            ''', (time.time(), targets, ok, failed, skipped, run_id))
+
+    def forget_missing(self, database_names):
+        """Descarta o estado de bancos que não existem mais"""
+        with self._lock:
+            names = [row[0] for row in self._conn.execute('SELECT DISTINCT database_name FROM maintenance_tasks')]
+            for name in set(names) - set(database_names):
+                self._conn.execute('DELETE FROM maintenance_tasks WHERE database_name = ?', (name,))
+
+    def query(self, sql, params=()):
+        with self._lock:
+            return [dict(row) for row in self._conn.execute(sql, params)]
+
+    def close(self):
+        self._conn.close()
+
+
+class MaintenanceRunner:
+    """Executa backup, compactação, estatísticas e verificação de integridade
+
+    Cada banco passa por um pool pequeno de threads (workers). Bancos com
+    escritas nos últimos idle_seconds são pulados (e também quando uma
+    escrita aparece entre duas tarefas), e o trabalho pesado é dividido em
+    passos curtos separados por pause segundos: backup em lotes de páginas,
+    incremental_vacuum em lotes e 'merge' do FTS em vez de 'optimize'. Assim
+    nenhuma transação da manutenção segura as escritas das requisições.
+    """
+
+    def __init__(self, db_manager, state, backup_path, workers=1, idle_seconds=DEFAULT_IDLE_SECONDS,
+                 pause=DEFAULT_PAUSE, pages=DEFAULT_PAGES, min_free_ratio=DEFAULT_MIN_FREE_RATIO,
+                 backup_keep=DEFAULT_BACKUP_KEEP, intervals=None, retention_days=None):
+        self.db_manager = db_manager
+        self.state = state
+        self.backup_path = backup_path
+        self.workers = max(1, int(workers))
+        self.idle_seconds = idle_seconds
+        self.pause = pause
+        self.pages = pages
+        self.min_free_ratio = min_free_ratio
+        self.backup_keep = backup_keep
+        self.intervals = {**DEFAULT_INTERVALS, **(intervals or {})}
+        self.retention_days = retention_days
+
+    def run(self, targets, tasks=TASKS, force=False, full=False, on_done=None):
+        """Mantém os bancos; retorna {nome: {tarefa: (ok, detalhe)}} ou {nome: motivo} se pulado
+
+        force ignora os intervalos e a atividade recente; full troca o
+        incremental_vacuum por um VACUUM completo (reescreve o arquivo).
+        """
+        run_id = self.state.start_run()
+        results = {}
+        with ThreadPoolExecutor(max_workers=self.workers, thread_name_prefix='maintenance') as executor:
+            futures = {executor.submit(self.maintain, target, tasks, force, full): target for target in targets}
+            for future, target in futures.items():
+                try:
+                    results[target.name] = future.result()
+                except Exception as e:
+                    logger.exception('Falha na manutenção de %s', target.name)
+                    results[target.name] = {'maintenance': (False, str(e))}
+                if on_done is not None:
+                    on_done(target, results[target.name])
+
+        done = [result for result in results.values() if isinstance(result, dict)]
+        failed = sum(1 for result in done if not all(ok for ok, _ in result.values()))
+        self.state.finish_run(run_id, len(targets), len(done) - failed, failed, len(results) - len(done))
+        return results
+
+    def _due(self, target, tasks, force):
+        if force:
+            return list(tasks)
+        last_ok = self.state.last_ok(target.name)
+        now = time.time()
+        return [task for task in tasks if now - (last_ok.get(task) or 0) >= self.intervals[task]]
+
+    def maintain(self, target, tasks=TASKS, force=False, full=False):
+        """Executa as tarefas vencidas em um banco; retorna {tarefa: (ok, detalhe)} ou o motivo do pulo"""
+        due = self._due(target, tasks, force)
+        if not due:
+            return 'em dia'
+        if not os.path.exists(target.path):
+            return 'removido'
+        if not force and time.time() - last_write(target.path) < self.idle_seconds:
+            return 'ativo'
+
+        conn = self._open(target.path)
+        try:
+            if get_version(conn) == MOVED_VERSION:
+                return 'movido'
+            results = {}
+            checked = last_write(target.path)
+            for task in due:
+                # Escrita de outra conexão desde o fim da tarefa anterior: o
+                # cliente voltou a usar o banco e o resto fica para a próxima vez
+                if not force and last_write(target.path) > checked:
+                    break
+                started = time.perf_counter()
+                try:
+                    detail, ok = getattr(self, f'_{task}')(conn, target, full), True
+                except Exception as e:
+                    detail, ok = str(e), False
+                    if conn.in_transaction:
+                        conn.execute('ROLLBACK')
+                self.state.record(target.name, task, ok, detail, time.perf_counter() - started)
+                results[task] = (ok, detail)
+                checked = last_write(target.path)
+                time.sleep(self.pause)
+            return results
+        finally:
+            conn.close()
+
+    def _open(self, path):
+        # Conexão própria, fora do cache: VACUUM e backup não podem disputar as das requisições
+        busy_timeout = self.db_manager.cache.busy_timeout
+        conn = sqlite3.connect(f"file:{pathname2url(path)}?mode=rw", uri=True, isolation_level=None,
+                               timeout=busy_timeout / 1000, check_same_thread=False)
+        conn.execute(f'PRAGMA busy_timeout={busy_timeout}')
+        return conn
+
+    def _has_table(self, conn, name):
+        return conn.execute("SELECT 1 FROM sqlite_master WHERE name = ?", (name,)).fetchone() is not None
+
+    def backup_directory(self, target):
+        """Diretório dos backups do banco (mesma estrutura de client_databases)"""
+        relative = os.path.relpath(target.path, self.db_manager.base_path)[:-len('.db')]
+        return os.path.join(self.backup_path, relative)
+
+    def _backup(self, conn, target, full=False):
+        """Cópia consistente com a API de backup do SQLite, verificada com quick_check"""
+        directory = self.backup_directory(target)
+        os.makedirs(directory, exist_ok=True)
+        backup_path = os.path.join(directory, time.strftime('%Y%m%dT%H%M%SZ', time.gmtime()) + '.db')
+        temp_path = os.path.join(directory, f'.{uuid.uuid4().hex}.tmp')
+
+        copy = sqlite3.connect(temp_path, isolation_level=None)
+        try:
+            remaining = []
+
+            def progress(status, left, total):
+                # O backup recomeça do início quando outra conexão escreve no banco
+                if remaining and left > remaining[-1]:
+                    raise _BackupRestarted()
+                remaining.append(left)
+                time.sleep(self.pause)
+
+            try:
+                conn.backup(copy, pages=self.pages, progress=progress)
+            except _BackupRestarted:
+                # Com WAL a cópia em um único passo é uma leitura: não trava as escritas
+                conn.backup(copy)
+            copy.execute('PRAGMA journal_mode=DELETE')
+            check = copy.execute('PRAGMA quick_check').fetchone()[0]
+            if check != 'ok':
+                raise sqlite3.DatabaseError(f'Cópia inválida: {check}')
+        except BaseException:
+            copy.close()
+            remove_database_file(temp_path)
+            raise
+        copy.close()
+        os.replace(temp_path, backup_path)
+
+        backups = sorted(name for name in os.listdir(directory) if name.endswith('.db'))
+        for name in backups[:-max(1, self.backup_keep)]:
+            os.remove(os.path.join(directory, name))
+        return f'{os.path.getsize(backup_path)} bytes'
+
+    def _compact(self, conn, target, full=False):
+        """Descarta tombstones antigos e devolve as páginas livres ao sistema"""
+        pruned = 0
+        if self.retention_days is not None and self._has_table(conn, 'change_log'):
+            names = [target.name] if target.storage == 'file' else self.db_manager.storages['shared'].list()
+            for database_name in names:
+                pruned += prune_tombstones(self.db_manager, database_name, self.retention_days)
+
+        page_size = conn.execute('PRAGMA page_size').fetchone()[0]
+        pages = conn.execute('PRAGMA page_count').fetchone()[0]
+        free = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        incremental = conn.execute('PRAGMA auto_vacuum').fetchone()[0] == AUTO_VACUUM_INCREMENTAL
+        reclaimable = free > 0 and free >= pages * self.min_free_ratio
+
+        left = free
+        if full or (reclaimable and not incremental and target.storage == 'file'):
+            # Reescreve o arquivo, travando as escritas até o fim; bancos criados
+            # antes do auto_vacuum incremental passam a tê-lo
+            conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+            conn.execute('VACUUM')
+            left = conn.execute('PRAGMA freelist_count').fetchone()[0]
+        elif reclaimable and incremental:
+            while True:
+                # Cada lote é uma transação curta; o PRAGMA só avança com fetchall
+                conn.execute(f'PRAGMA incremental_vacuum({int(self.pages)})').fetchall()
+                previous, left = left, conn.execute('PRAGMA freelist_count').fetchone()[0]
+                if not left or left >= previous:
+                    break
+                time.sleep(self.pause)
+        elif reclaimable:
+            return f'{pruned} tombstones; {free} páginas livres (banco compartilhado: use --full)'
+
+        if left < free:
+            # No modo WAL o arquivo só diminui no checkpoint
+            conn.execute('PRAGMA wal_checkpoint(TRUNCATE)').fetchall()
+        return f'{pruned} tombstones; {(free - left) * page_size} bytes liberados'
+
+    def _optimize(self, conn, target, full=False):
+        """Estatísticas do planejador (ANALYZE aproximado) e fusão dos segmentos do FTS"""
+        conn.execute(f'PRAGMA analysis_limit = {ANALYSIS_LIMIT}')
+        conn.execute('ANALYZE')
+        conn.execute('PRAGMA optimize')
+        merges = 0
+        if self._has_table(conn, FTS_TABLE):
+            # 'merge' negativo junta todos os níveis aos poucos (mesmo resultado do
+            # 'optimize', sem uma única transação longa); para quando não há o que juntar
+            while merges < FTS_MAX_MERGES:
+                changes = conn.total_changes
+                conn.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rank) VALUES ('merge', ?)",
+                             (-FTS_MERGE_PAGES,))
+                merges += 1
+                if conn.total_changes - changes < 2:
+                    break
+                time.sleep(self.pause)
+        return f'{merges} passos de merge do FTS'
+
+    def _integrity(self, conn, target, full=False):
+        """PRAGMA integrity_check e integrity-check do índice FTS contra client_data"""
+        problems = [row[0] for row in conn.execute('PRAGMA integrity_check(20)')]
+        if problems != ['ok']:
+            raise sqlite3.DatabaseError('; '.join(problems))
+        if self._has_table(conn, FTS_TABLE):
+            conn.execute(f"INSERT INTO {FTS_TABLE} ({FTS_TABLE}, rank) VALUES ('integrity-check', 1)")
+        return 'ok'
+
+
+def create_maintenance_runner(app):
+    """Executor da manutenção com as configurações da aplicação (comandos `flask maintenance`)"""
+    state = MaintenanceState(os.path.join(app.instance_path, 'maintenance', 'state.db'))
+    runner = MaintenanceRunner(
+        app.extensions['database_manager'], state,
+        backup_path=app.config.get('MAINTENANCE_BACKUP_PATH') or os.path.join(app.instance_path, 'backups'),
+        workers=app.config.get('MAINTENANCE_WORKERS', 1),
+        idle_seconds=app.config.get('MAINTENANCE_IDLE_SECONDS', DEFAULT_IDLE_SECONDS),
+        pause=app.config.get('MAINTENANCE_PAUSE', DEFAULT_PAUSE),
+        pages=app.config.get('MAINTENANCE_PAGES', DEFAULT_PAGES),
+        min_free_ratio=app.config.get('MAINTENANCE_MIN_FREE_RATIO', DEFAULT_MIN_FREE_RATIO),
+        backup_keep=app.config.get('MAINTENANCE_BACKUP_KEEP', DEFAULT_BACKUP_KEEP),
+        intervals=app.config.get('MAINTENANCE_INTERVALS'),
+        retention_days=app.config.get('CHANGE_LOG_RETENTION_DAYS'),
+    )
+    return runner
+
+
+def _format_time(timestamp):
+    if not timestamp:
+        return 'nunca'
+    return time.strftime('%Y-%m-%d %H:%M:%S', time.localtime(timestamp))
+
+
+@click.group('maintenance')
+def maintenance_cli():
+    """Manutenção dos bancos de clientes (backup, compactação, estatísticas e integridade)"""
+
+
+def _run(tasks, database_names, force, full, workers):
+    from src.models.database_manager import get_database_manager
+
+    runner = create_maintenance_runner(current_app)
+    if workers:
+        runner.workers = workers
+    lock_path = os.path.join(os.path.dirname(runner.state.path), '.lock')
+    with _FileLock(lock_path) as acquired:
+        if not acquired:
+            click.echo('Outra manutenção está em andamento', err=True)
+            raise SystemExit(1)
+
+        targets = list_targets(get_database_manager(), database_names)
+        with click.progressbar(length=len(targets), label='Mantendo bancos') as bar:
+            results = runner.run(targets, tasks, force=force, full=full, on_done=lambda *_: bar.update(1))
+        if not database_names:
+            runner.state.forget_missing([target.name for target in targets])
+        runner.state.close()
+
+    skipped, failures = {}, []
+    for name, result in results.items():
+        if isinstance(result, dict):
+            failures.extend((name, task, detail) for task, (ok, detail) in result.items() if not ok)
+        else:
+            skipped[result] = skipped.get(result, 0) + 1
+    done = len(results) - sum(skipped.values())
+    click.echo(f'Bancos processados: {done}  Pulados: '
+               + (', '.join(f'{count} {reason}' for reason, count in sorted(skipped.items())) or '0')
+               + f'  Falhas: {len(failures)}')
+    for name, task, detail in failures:
+        click.echo(f'  {name} ({task}): {detail}', err=True)
+    if failures:
+        current_app.logger.error('Falha na manutenção de %d bancos de clientes', len({f[0] for f in failures}))
+        raise SystemExit(1)
+
+
+@maintenance_cli.command('run')
+@click.option('--task', 'tasks', multiple=True, type=click.Choice(TASKS),
+              help='Tarefa a executar (pode ser repetida; padrão: todas as que estiverem vencidas)')
+@click.option('--database', 'database_names', multiple=True,
+              help="Banco a processar (pode ser repetido; 'shared' é o compartilhado; padrão: todos)")
+@click.option('--force', is_flag=True, help='Ignora os intervalos e a atividade recente dos bancos')
+@click.option('--full', is_flag=True, help='VACUUM completo em vez do incremental (trava as escritas)')
+@click.option('--workers', type=int, default=None, help='Threads usadas (padrão: MAINTENANCE_WORKERS)')
+@with_appcontext
+def run_command(tasks, database_names, force, full, workers):
+    """Executa as tarefas vencidas em todos os bancos (para rodar pelo cron, ex.: de hora em hora)"""
+    _run(tasks or TASKS, database_names, force, full, workers)
+
+
+@maintenance_cli.command('backup')
+@click.option('--database', 'database_names', multiple=True,
+              help="Banco a copiar (pode ser repetido; 'shared' é o compartilhado; padrão: todos)")
+@with_appcontext
+def backup_command(database_names):
+    """Backup imediato dos bancos com a aplicação no ar (API de backup do SQLite)"""
+    _run(('backup',), database_names, True, False, None)
+
+
+@maintenance_cli.command('status')
+@click.option('--failures', 'show_failures', is_flag=True, help='Lista as falhas da última execução de cada tarefa')
+@with_appcontext
+def status_command(show_failures):
+    """Resumo da manutenção: última execução, tarefas atrasadas e falhas"""
+    from src.models.database_manager import get_database_manager
+
+    runner = create_maintenance_runner(current_app)
+    state = runner.state
+    targets = list_targets(get_database_manager())
+    names = {target.name for target in targets}
+
+    runs = state.query('SELECT * FROM maintenance_runs ORDER BY id DESC LIMIT 1')
+    if runs:
+        run = runs[0]
+        click.echo(f"Última execução: {_format_time(run['started_at'])} "
+                   f"({'em andamento' if run['finished_at'] is None else 'concluída'}) - "
+                   f"{run['targets']} bancos, {run['ok']} ok, {run['failed']} com falha, {run['skipped']} pulados")
+    else:
+        click.echo('Última execução: nunca')
+    click.echo(f'Bancos: {len(targets)}  Backups em: {runner.backup_path}')
+
+    rows = state.query('SELECT * FROM maintenance_tasks')
+    now = time.time()
+    for task in TASKS:
+        entries = {row['database_name']: row for row in rows if row['task'] == task and row['database_name'] in names}
+        failed = [row for row in entries.values() if row['status'] == 'failed']
+        overdue = sum(1 for name in names
+                      if now - ((entries.get(name) or {}).get('last_ok_at') or 0) >= runner.intervals[task])
+        # Backup (ou verificação) mais antigo entre os bancos; 'nunca' se algum ainda não teve
+        oldest = min(((entries.get(name) or {}).get('last_ok_at') or 0 for name in names), default=0)
+        click.echo(f'  {task:<10} atrasados: {overdue:<6} falhas: {len(failed):<6} '
+                   f'mais antigo: {_format_time(oldest)}')
+        if show_failures:
+            for row in failed:
+                click.echo(f"    {row['database_name']} ({_format_time(row['finished_at'])}): {row['detail']}")
+    state.close()
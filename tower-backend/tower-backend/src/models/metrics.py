@@ -0,0 +1,294 @@
+import logging
+import threading
+import time
+from flask import current_app, g, has_request_context, request
+from sqlalchemy import event
+
+logger = logging.getLogger(__name__)
+
+# Limites dos histogramas (segundos, bytes e instruções por requisição)
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10)
+SIZE_BUCKETS = (100, 1000, 10000, 100000, 1000000, 10000000)
+QUERY_COUNT_BUCKETS = (0, 1, 2, 5, 10, 20, 50, 100)
+
+DEFAULT_SLOW_REQUEST_MS = 500
+DEFAULT_MAX_STATEMENTS = 50
+SQL_LOG_LENGTH = 300  # caracteres de cada instrução no log de requisição lenta
+
+DATABASES = ('main', 'tenant')
+
+
+class Histogram:
+    """Contagem por faixa, soma e total (formato de histograma do Prometheus)"""
+
+    __slots__ = ('buckets', 'counts', 'sum', 'count')
+
+    def __init__(self, buckets):
+        self.buckets = buckets
+        self.counts = [0] * len(buckets)
+        self.sum = 0.0
+        self.count = 0
+
+    def observe(self, value):
+        for index, bound in enumerate(self.buckets):
+            if value <= bound:
+                self.counts[index] += 1
+                break
+        self.sum += value
+        self.count += 1
+
+
+class RequestStats:
+    """Medições de uma requisição em andamento (guardadas em g)"""
+
+    __slots__ = ('started', 'queries', 'query_seconds', 'statements', 'max_statements', 'status',
+                 'response_bytes')
+
+    def __init__(self, max_statements):
+        self.started = time.perf_counter()
+        self.queries = dict.fromkeys(DATABASES, 0)
+        self.query_seconds = dict.fromkeys(DATABASES, 0.0)
+        self.statements = []
+        self.max_statements = max_statements
+        self.status = None
+        self.response_bytes = None
+
+    def add_query(self, database, statement, seconds):
+        self.queries[database] += 1
+        self.query_seconds[database] += seconds
+        if len(self.statements) < self.max_statements:
+            self.statements.append((database, seconds, statement))
+
+
+class MetricsRegistry:
+    """Métricas por endpoint, acumuladas em memória neste processo
+
+    Com vários workers cada processo expõe os próprios números em /metrics
+    (o Prometheus agrega pelas séries de cada instância).
+    """
+
+    def __init__(self, slow_request_ms=DEFAULT_SLOW_REQUEST_MS, max_statements=DEFAULT_MAX_STATEMENTS):
+        self.slow_request_ms = slow_request_ms
+        self.max_statements = max_statements
+        self._lock = threading.Lock()
+        self.requests = {}  # (blueprint, endpoint, method, status) -> total
+        self.latency = {}  # (blueprint, endpoint, method) -> Histogram
+        self.request_size = {}  # (blueprint, endpoint) -> Histogram
+        self.response_size = {}
+        self.queries = {}  # (blueprint, endpoint, database) -> [total, segundos]
+        self.queries_per_request = {}  # (blueprint, endpoint, database) -> Histogram
+        self.slow_requests = {}  # (blueprint, endpoint) -> total
+        self.compression = {}  # (blueprint, endpoint, encoding) -> [respostas, bytes antes, depois, CPU]
+
+    def _histogram(self, series, key, buckets):
+        histogram = series.get(key)
+        if histogram is None:
+            histogram = series[key] = Histogram(buckets)
+        return histogram
+
+    def observe(self, stats, blueprint, endpoint, method, status, request_bytes, response_bytes):
+        duration = time.perf_counter() - stats.started
+        endpoint_key = (blueprint, endpoint)
+        with self._lock:
+            key = (blueprint, endpoint, method, str(status))
+            self.requests[key] = self.requests.get(key, 0) + 1
+            self._histogram(self.latency, (blueprint, endpoint, method), LATENCY_BUCKETS).observe(duration)
+            if request_bytes is not None:
+                self._histogram(self.request_size, endpoint_key, SIZE_BUCKETS).observe(request_bytes)
+            if response_bytes is not None:
+                self._histogram(self.response_size, endpoint_key, SIZE_BUCKETS).observe(response_bytes)
+            for database in DATABASES:
+                totals = self.queries.setdefault(endpoint_key + (database,), [0, 0.0])
+                totals[0] += stats.queries[database]
+                totals[1] += stats.query_seconds[database]
+                self._histogram(self.queries_per_request, endpoint_key + (database,),
+                                QUERY_COUNT_BUCKETS).observe(stats.queries[database])
+            slow = duration * 1000 >= self.slow_request_ms
+            if slow:
+                self.slow_requests[endpoint_key] = self.slow_requests.get(endpoint_key, 0) + 1
+
+        if slow:
+            self.log_slow_request(stats, endpoint, method, status, duration)
+
+    def observe_compression(self, blueprint, endpoint, encoding, size_in, size_out, cpu_seconds):
+        with self._lock:
+            totals = self.compression.setdefault((blueprint, endpoint, encoding), [0, 0, 0, 0.0])
+            totals[0] += 1
+            totals[1] += size_in
+            totals[2] += size_out
+            totals[3] += cpu_seconds
+
+    def log_slow_request(self, stats, endpoint, method, status, duration):
+        lines = [f'Requisição lenta: {method} {endpoint} -> {status} em {duration * 1000:.1f} ms '
+                 f"(main: {stats.queries['main']} queries/{stats.query_seconds['main'] * 1000:.1f} ms, "
+                 f"tenant: {stats.queries['tenant']} queries/{stats.query_seconds['tenant'] * 1000:.1f} ms)"]
+        for database, seconds, statement in stats.statements:
+            statement = ' '.join(statement.split())[:SQL_LOG_LENGTH]
+            lines.append(f'  [{database}] {seconds * 1000:.2f} ms  {statement}')
+        omitted = sum(stats.queries.values()) - len(stats.statements)
+        if omitted > 0:
+            lines.append(f'  ... mais {omitted} instruções')
+        logger.warning('\n'.join(lines))
+
+    def render(self, gauges=None, counters=None):
+        """Métricas no formato texto do Prometheus
+
+        gauges e counters: {nome: (descrição, valor)} de fora do registro.
+        """
+        out = []
+        with self._lock:
+            _counter(out, 'http_requests_total', 'Requisições atendidas',
+                     ('blueprint', 'endpoint', 'method', 'status'), self.requests)
+            _histograms(out, 'http_request_duration_seconds', 'Duração das requisições',
+                        ('blueprint', 'endpoint', 'method'), self.latency)
+            _histograms(out, 'http_request_size_bytes', 'Tamanho do corpo das requisições',
+                        ('blueprint', 'endpoint'), self.request_size)
+            _histograms(out, 'http_response_size_bytes', 'Tamanho do corpo das respostas',
+                        ('blueprint', 'endpoint'), self.response_size)
+            _counter(out, 'db_queries_total', 'Instruções SQL executadas',
+                     ('blueprint', 'endpoint', 'database'),
+                     {key: totals[0] for key, totals in self.queries.items()})
+            _counter(out, 'db_query_seconds_total', 'Tempo gasto em instruções SQL',
+                     ('blueprint', 'endpoint', 'database'),
+                     {key: totals[1] for key, totals in self.queries.items()})
+            _histograms(out, 'db_queries_per_request', 'Instruções SQL por requisição',
+                        ('blueprint', 'endpoint', 'database'), self.queries_per_request)
+            _counter(out, 'http_slow_requests_total', 'Requisições acima do limite de lentidão',
+                     ('blueprint', 'endpoint'), self.slow_requests)
+            # Razão de compressão: output_bytes / input_bytes
+            for index, (name, help_text) in enumerate((
+                    ('http_compressed_responses_total', 'Respostas comprimidas'),
+                    ('http_compression_input_bytes_total', 'Bytes das respostas antes da compressão'),
+                    ('http_compression_output_bytes_total', 'Bytes das respostas depois da compressão'),
+                    ('http_compression_cpu_seconds_total', 'Tempo de CPU gasto comprimindo respostas'))):
+                _counter(out, name, help_text, ('blueprint', 'endpoint', 'encoding'),
+                         {key: totals[index] for key, totals in self.compression.items()})
+        for name, (help_text, value) in (counters or {}).items():
+            _counter(out, name, help_text, (), {(): value})
+        for name, (help_text, value) in (gauges or {}).items():
+            out.append(f'# HELP {name} {help_text}')
+            out.append(f'# TYPE {name} gauge')
+            out.append(f'{name} {_number(value)}')
+        return '\n'.join(out) + '\n'
+
+
+def _escape(value):
+    return str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n')
+
+
+def _labels(names, values, extra=None):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return '{' + ','.join(pairs) + '}' if pairs else ''
+
+
+def _number(value):
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+def _le(bound):
+    return f'le="{bound}"'
+
+
+def _counter(out, name, help_text, label_names, series):
+    out.append(f'# HELP {name} {help_text}')
+    out.append(f'# TYPE {name} counter')
+    for key, value in sorted(series.items()):
+        out.append(f'{name}{_labels(label_names, key)} {_number(value)}')
+
+
+def _histograms(out, name, help_text, label_names, series):
+    out.append(f'# HELP {name} {help_text}')
+    out.append(f'# TYPE {name} histogram')
+    for key, histogram in sorted(series.items()):
+        cumulative = 0
+        for bound, count in zip(histogram.buckets, histogram.counts):
+            cumulative += count
+            out.append(f'{name}_bucket{_labels(label_names, key, _le(bound))} {cumulative}')
+        out.append(f'{name}_bucket{_labels(label_names, key, _le("+Inf"))} {histogram.count}')
+        out.append(f'{name}_sum{_labels(label_names, key)} {_number(histogram.sum)}')
+        out.append(f'{name}_count{_labels(label_names, key)} {histogram.count}')
+
+
+def _current_stats():
+    if has_request_context():
+        return g.get('_request_metrics')
+    return None
+
+
+def _record_query(database, statement, seconds):
+    stats = _current_stats()
+    if stats is not None:
+        stats.add_query(database, statement, seconds)
+
+
+def _before_request():
+    g._request_metrics = RequestStats(current_app.extensions['metrics'].max_statements)
+
+
+def _after_request(response):
+    stats = g.get('_request_metrics')
+    if stats is not None:
+        stats.status = response.status_code
+        # Tamanho desconhecido em respostas em streaming
+        stats.response_bytes = None if response.is_streamed else response.calculate_content_length()
+    return response
+
+
+def _teardown_request(exc=None):
+    # A medição fecha no teardown: com stream_with_context ele só roda depois
+    # que a resposta foi enviada, então as queries do streaming também entram.
+    # Sem after_request (exceção não tratada) a requisição conta como 500.
+    stats = g.pop('_request_metrics', None)
+    if stats is None:
+        return
+    current_app.extensions['metrics'].observe(
+        stats, request.blueprint or '', request.endpoint or 'unmatched', request.method,
+        stats.status or 500, request.content_length, stats.response_bytes)
+
+
+def init_metrics(app):
+    """Instrumenta requisições, o banco principal (eventos do SQLAlchemy) e os bancos de clientes"""
+    registry = MetricsRegistry(
+        slow_request_ms=app.config.get('METRICS_SLOW_REQUEST_MS', DEFAULT_SLOW_REQUEST_MS),
+        max_statements=app.config.get('METRICS_MAX_STATEMENTS', DEFAULT_MAX_STATEMENTS),
+    )
+    app.extensions['metrics'] = registry
+    if not app.config.get('METRICS_ENABLED', True):
+        return registry
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+
+    app.extensions['database_manager'].add_query_observer(
+        lambda database_name, statement, seconds: _record_query('tenant', statement, seconds))
+
+    from src.models.user import db
+    with app.app_context():
+        engine = db.engine
+
+    @event.listens_for(engine, 'before_cursor_execute')
+    def _before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        conn.info.setdefault('_metrics_started', []).append(time.perf_counter())
+
+    @event.listens_for(engine, 'after_cursor_execute')
+    def _after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        started = conn.info['_metrics_started'].pop()
+        _record_query('main', statement, time.perf_counter() - started)
+
+    @event.listens_for(engine, 'handle_error')
+    def _handle_error(context):
+        # Instrução que falhou: after_cursor_execute não roda e o início ficaria
+        # acumulado na conexão (que volta para o pool)
+        if context.connection is not None:
+            started = context.connection.info.get('_metrics_started')
+            if started:
+                started.pop()
+
+    return registry
+
+
+def get_metrics():
+    return current_app.extensions['metrics']
@@ -0,0 +1,75 @@
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+from flask import current_app
+
+
+class PasswordHasherBusy(Exception):
+    """Fila de hashes cheia: o login deve ser tentado de novo mais tarde"""
+
+
+class PasswordHasher:
+    """Executa o bcrypt em um pool limitado de threads
+
+    O bcrypt libera o GIL, então o pool limita quantos hashes rodam ao mesmo
+    tempo (e quantos podem esperar na fila) sem bloquear as demais requisições
+    do processo em rajadas de login.
+    """
+
+    def __init__(self, rounds=12, max_workers=2, max_pending=16, queue_timeout=5):
+        self.rounds = rounds
+        self.max_workers = max_workers
+        self.queue_timeout = queue_timeout
+        self._slots = threading.BoundedSemaphore(max_workers + max_pending)
+        self._lock = threading.Lock()
+        self._executor = None
+        self._pid = None
+
+    def _get_executor(self):
+        # Um pool por processo (o pool não sobrevive a um fork)
+        with self._lock:
+            if self._pid != os.getpid():
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix='bcrypt')
+                self._pid = os.getpid()
+            return self._executor
+
+    def _run(self, function, *args):
+        if not self._slots.acquire(timeout=self.queue_timeout):
+            raise PasswordHasherBusy('Muitas tentativas simultâneas, tente novamente')
+        try:
+            return self._get_executor().submit(function, *args).result()
+        finally:
+            self._slots.release()
+
+    def hash(self, password):
+        import bcrypt  # importado no primeiro uso (inicialização mais rápida)
+
+        salt = bcrypt.gensalt(rounds=self.rounds)
+        return self._run(bcrypt.hashpw, password.encode('utf-8'), salt).decode('utf-8')
+
+    def verify(self, password, password_hash):
+        import bcrypt
+
+        return self._run(bcrypt.checkpw, password.encode('utf-8'), password_hash.encode('utf-8'))
+
+    def needs_rehash(self, password_hash):
+        """True se o hash foi gerado com outro fator de custo ($2b$<custo>$...)"""
+        try:
+            return int(password_hash.split('$')[2]) != self.rounds
+        except (IndexError, ValueError):
+            return True
+
+
+def init_password_hasher(app):
+    hasher = PasswordHasher(
+        rounds=app.config.get('BCRYPT_LOG_ROUNDS', 12),
+        max_workers=app.config.get('BCRYPT_MAX_CONCURRENCY', 2),
+        max_pending=app.config.get('BCRYPT_MAX_PENDING', 16),
+        queue_timeout=app.config.get('BCRYPT_QUEUE_TIMEOUT', 5),
+    )
+    app.extensions['password_hasher'] = hasher
+    return hasher
+
+
+def get_password_hasher():
+    return current_app.extensions['password_hasher']
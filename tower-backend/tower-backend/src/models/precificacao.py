@@ -0,0 +1,184 @@
+import threading
+from collections import OrderedDict
+import numpy as np
+
+# Campos do produto que podem ser ajustados em um cenário
+AJUSTE_FIELDS = ('custo_embalagem', 'qtd_embalagem', 'custo_unitario', 'preco')
+
+# Catálogos carregados mantidos em memória (por cliente e versão dos dados)
+CATALOGO_CACHE_SIZE = 4
+
+_catalogos = OrderedDict()
+_catalogos_lock = threading.Lock()
+
+
+class Catalogo:
+    """Catálogo de produtos do cliente carregado em arrays NumPy (uma posição por produto)"""
+
+    def __init__(self, ids, categorias, qtd_embalagem, custo_embalagem, custo_unitario, preco, com_composicao):
+        self.ids = ids
+        # Categorias como códigos inteiros, para agregações com bincount
+        self.nomes_categorias, self.codigos_categoria = np.unique(categorias, return_inverse=True)
+        self.qtd_embalagem = qtd_embalagem
+        self.custo_embalagem = custo_embalagem
+        self.custo_unitario = custo_unitario
+        self.preco = preco
+        # Produtos com composição (produto_insumos): o custo vem dos insumos, não da embalagem
+        self.com_composicao = com_composicao
+        # Produtos cuja embalagem foi ajustada no cenário (custo unitário é derivado dela)
+        self.embalagem_ajustada = np.zeros(len(ids), dtype=bool)
+
+    @classmethod
+    def load(cls, db_manager, database_name):
+        query = '''
+            SELECT id, categoria, qtd_embalagem, custo_embalagem, custo_unitario, preco,
+                   EXISTS (SELECT 1 FROM produto_insumos pi WHERE pi.produto_id = produtos.id) AS com_composicao
+            FROM produtos WHERE tenant_id IS tenant() ORDER BY id
+        '''
+        rows = list(db_manager.iterate_query(database_name, query, row_type='tuple'))
+        columns = list(zip(*rows)) if rows else [()] * 7
+        return cls(
+            np.array(columns[0], dtype=np.int64),
+            np.array(columns[1], dtype=object).astype(str),
+            np.array(columns[2], dtype=np.float64),
+            np.array(columns[3], dtype=np.float64),
+            np.array(columns[4], dtype=np.float64),
+            np.array(columns[5], dtype=np.float64),
+            np.array(columns[6], dtype=bool),
+        )
+
+    def __len__(self):
+        return len(self.ids)
+
+    def copy(self):
+        catalogo = Catalogo.__new__(Catalogo)
+        catalogo.ids = self.ids
+        catalogo.nomes_categorias = self.nomes_categorias
+        catalogo.codigos_categoria = self.codigos_categoria
+        catalogo.com_composicao = self.com_composicao
+        catalogo.embalagem_ajustada = self.embalagem_ajustada.copy()
+        for field in AJUSTE_FIELDS:
+            setattr(catalogo, field, getattr(self, field).copy())
+        return catalogo
+
+    def mascara_categorias(self, categorias):
+        """Máscara dos produtos pertencentes às categorias informadas (None = todos)"""
+        if not categorias:
+            return np.ones(len(self), dtype=bool)
+        codigos = np.flatnonzero(np.isin(self.nomes_categorias, list(categorias)))
+        return np.isin(self.codigos_categoria, codigos)
+
+    def margens(self):
+        """Margem sobre o preço de venda de cada produto (0 quando o preço é zero)"""
+        margem = np.zeros(len(self))
+        np.divide(self.preco - self.custo_unitario, self.preco, out=margem, where=self.preco > 0)
+        return margem
+
+
+def carregar_catalogo(db_manager, database_name):
+    """Catálogo do cliente, reaproveitado enquanto a versão dos dados não mudar
+
+    O catálogo devolvido não deve ser alterado; use copy() para simulações.
+    """
+    version = db_manager.data_version(database_name)
+    with _catalogos_lock:
+        cached = _catalogos.get(database_name)
+        if cached and cached[0] == version:
+            _catalogos.move_to_end(database_name)
+            return cached[1]
+
+    catalogo = Catalogo.load(db_manager, database_name)
+    with _catalogos_lock:
+        _catalogos[database_name] = (version, catalogo)
+        _catalogos.move_to_end(database_name)
+        while len(_catalogos) > CATALOGO_CACHE_SIZE:
+            _catalogos.popitem(last=False)
+    return catalogo
+
+
+def aplicar_ajustes(catalogo, ajustes):
+    """Aplica ajustes percentuais, ex.: {'campo': 'custo_embalagem', 'percentual': 8, 'categoria': 'X'}"""
+    for ajuste in ajustes:
+        campo = ajuste['campo']
+        if campo not in AJUSTE_FIELDS:
+            raise ValueError(f"Campo de ajuste inválido: {campo}")
+        fator = 1 + float(ajuste['percentual']) / 100
+        categoria = ajuste.get('categoria')
+        mascara = catalogo.mascara_categorias([categoria] if categoria else None)
+        valores = getattr(catalogo, campo)
+        valores[mascara] *= fator
+        if campo in ('custo_embalagem', 'qtd_embalagem'):
+            catalogo.embalagem_ajustada |= mascara
+
+
+def recalcular(catalogo, margem_alvo=None, categorias=None, derivar_custo=False):
+    """Recalcula custo unitário (a partir da embalagem) e, opcionalmente, o preço
+
+    O custo unitário só é derivado da embalagem nos produtos sem composição
+    cuja embalagem foi ajustada no cenário, ou em todos eles com
+    derivar_custo. margem_alvo é a margem desejada sobre o preço de venda,
+    em percentual.
+    """
+    com_embalagem = (catalogo.custo_embalagem > 0) & (catalogo.qtd_embalagem > 0) & ~catalogo.com_composicao
+    if not derivar_custo:
+        com_embalagem &= catalogo.embalagem_ajustada
+    np.divide(catalogo.custo_embalagem, catalogo.qtd_embalagem,
+              out=catalogo.custo_unitario, where=com_embalagem)
+
+    if margem_alvo is not None:
+        margem = float(margem_alvo) / 100
+        if not 0 <= margem < 1:
+            raise ValueError('Margem alvo deve estar entre 0 e 100%')
+        mascara = catalogo.mascara_categorias(categorias)
+        catalogo.preco[mascara] = np.round(catalogo.custo_unitario[mascara] / (1 - margem), 2)
+
+
+def agregados_por_categoria(catalogo):
+    """Totais e médias por categoria (uma linha por categoria)"""
+    codigos = catalogo.codigos_categoria
+    total_categorias = len(catalogo.nomes_categorias)
+    produtos = np.bincount(codigos, minlength=total_categorias)
+    custo = np.bincount(codigos, weights=catalogo.custo_unitario, minlength=total_categorias)
+    preco = np.bincount(codigos, weights=catalogo.preco, minlength=total_categorias)
+    margem = np.bincount(codigos, weights=catalogo.margens(), minlength=total_categorias)
+
+    resultado = []
+    for index, nome in enumerate(catalogo.nomes_categorias):
+        quantidade = int(produtos[index])
+        resultado.append({
+            'categoria': str(nome),
+            'produtos': quantidade,
+            'custo_medio': round(float(custo[index] / quantidade), 2) if quantidade else 0,
+            'preco_medio': round(float(preco[index] / quantidade), 2) if quantidade else 0,
+            'margem_media': f"{round(float(margem[index] / quantidade) * 100, 1)}%" if quantidade else '0%'
+        })
+    return resultado
+
+
+def produtos_alterados(original, novo):
+    """Índices dos produtos com embalagem, custo ou preço alterados"""
+    return np.flatnonzero(
+        ~np.isclose(original.custo_unitario, novo.custo_unitario) |
+        ~np.isclose(original.preco, novo.preco) |
+        ~np.isclose(original.custo_embalagem, novo.custo_embalagem) |
+        ~np.isclose(original.qtd_embalagem, novo.qtd_embalagem)
+    )
+
+
+def salvar(db_manager, database_name, catalogo, indices):
+    """Grava os produtos alterados em uma única transação"""
+    query = '''
+        UPDATE produtos SET
+            qtd_embalagem = ?, custo_embalagem = ?, custo_unitario = ?, preco = ?,
+            updated_at = CURRENT_TIMESTAMP
+        WHERE id = ? AND tenant_id IS tenant()
+    '''
+    params = zip(
+        catalogo.qtd_embalagem[indices].tolist(),
+        catalogo.custo_embalagem[indices].tolist(),
+        catalogo.custo_unitario[indices].tolist(),
+        catalogo.preco[indices].tolist(),
+        catalogo.ids[indices].tolist(),
+    )
+    with db_manager.transaction(database_name):
+        db_manager.execute_many(database_name, query, params)
@@ -0,0 +1,345 @@
+import cProfile
+import hmac
+import json
+import os
+import random
+import re
+import sys
+import threading
+import time
+import uuid
+from collections import Counter
+from datetime import datetime
+from flask import current_app, g, request
+
+PROFILE_HEADER = 'X-Profile'
+PROFILE_ID_HEADER = 'X-Profile-Id'
+
+DEFAULT_INTERVAL = 0.005  # segundos entre amostras da pilha
+DEFAULT_MAX_FILES = 500  # perfis guardados (cada um tem .json, .collapsed e às vezes .pstats)
+DEFAULT_MAX_BYTES = 100 * 1024 * 1024
+
+PROFILE_ID = re.compile(r'^[\w.-]+$')
+KINDS = ('json', 'collapsed', 'pstats')
+
+# Um cProfile ativo por processo: no Python 3.12+ ele usa sys.monitoring e um
+# segundo enable() concorrente levanta ValueError
+_cprofile_lock = threading.Lock()
+
+
+def _frame_name(frame):
+    code = frame.f_code
+    name = getattr(code, 'co_qualname', code.co_name)
+    return f"{frame.f_globals.get('__name__', '?')}:{name}"
+
+
+def collapse_stack(frame):
+    """Pilha no formato "collapsed" (raiz primeiro, separada por ';') usado pelo flamegraph"""
+    names = []
+    while frame is not None:
+        names.append(_frame_name(frame))
+        frame = frame.f_back
+    names.reverse()
+    return ';'.join(names)
+
+
+class StackSampler:
+    """Thread que lê periodicamente a pilha das threads com requisição perfilada
+
+    Só acorda enquanto há perfis em andamento; o custo na requisição é a
+    disputa pelo GIL a cada intervalo, sem hook em cada chamada de função.
+    """
+
+    def __init__(self, interval=DEFAULT_INTERVAL):
+        self.interval = interval
+        self._active = {}  # thread id -> Counter de pilhas
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def start(self, thread_id):
+        samples = Counter()
+        with self._condition:
+            self._active[thread_id] = samples
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name='stack-sampler', daemon=True)
+                self._thread.start()
+            self._condition.notify()
+        return samples
+
+    def stop(self, thread_id):
+        with self._condition:
+            return self._active.pop(thread_id, None)
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._active:
+                    self._condition.wait()
+            time.sleep(self.interval)
+            frames = sys._current_frames()
+            with self._condition:
+                for thread_id, samples in self._active.items():
+                    frame = frames.get(thread_id)
+                    if frame is not None:
+                        samples[collapse_stack(frame)] += 1
+            del frames
+
+
+class ProfileSession:
+    """Perfil de uma requisição em andamento (guardado em g)"""
+
+    __slots__ = ('id', 'trigger', 'profile', 'samples', 'thread_id', 'started', 'status')
+
+    def __init__(self, profile_id, trigger, profile, samples, thread_id):
+        self.id = profile_id
+        self.trigger = trigger
+        self.profile = profile
+        self.samples = samples
+        self.thread_id = thread_id
+        self.started = time.perf_counter()
+        self.status = None
+
+
+class ProfileStore:
+    """Diretório limitado com os perfis: <id>.json (metadados), <id>.collapsed e <id>.pstats
+
+    Passando de max_files perfis ou max_bytes os mais antigos são apagados.
+    Todos os workers gravam no mesmo diretório, então a agregação enxerga
+    as requisições de todos os processos.
+    """
+
+    def __init__(self, directory, max_files=DEFAULT_MAX_FILES, max_bytes=DEFAULT_MAX_BYTES):
+        self.directory = directory
+        self.max_files = max_files
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+    def path(self, profile_id, kind):
+        if kind not in KINDS or not PROFILE_ID.match(profile_id):
+            return None
+        path = os.path.join(self.directory, f'{profile_id}.{kind}')
+        return path if os.path.exists(path) else None
+
+    def _write(self, path, write):
+        temp_path = f'{path}.{uuid.uuid4().hex}.tmp'
+        try:
+            write(temp_path)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+
+    def save(self, metadata, samples, profile=None):
+        os.makedirs(self.directory, exist_ok=True)
+        base = os.path.join(self.directory, metadata['id'])
+
+        def write_collapsed(path):
+            with open(path, 'w', encoding='utf-8') as f:
+                for stack, count in samples.most_common():
+                    f.write(f'{stack} {count}\n')
+
+        def write_metadata(path):
+            with open(path, 'w', encoding='utf-8') as f:
+                json.dump(metadata, f)
+
+        if profile is not None:
+            self._write(f'{base}.pstats', profile.dump_stats)
+        self._write(f'{base}.collapsed', write_collapsed)
+        # Metadados por último: só perfis completos aparecem na listagem
+        self._write(f'{base}.json', write_metadata)
+        self.prune()
+
+    def prune(self):
+        with self._lock:
+            groups = {}
+            try:
+                names = os.listdir(self.directory)
+            except FileNotFoundError:
+                return
+            for name in names:
+                profile_id, _, kind = name.rpartition('.')
+                if kind not in KINDS:
+                    continue
+                try:
+                    stat = os.stat(os.path.join(self.directory, name))
+                except FileNotFoundError:
+                    continue
+                group = groups.setdefault(profile_id, [stat.st_mtime, 0])
+                group[0] = min(group[0], stat.st_mtime)
+                group[1] += stat.st_size
+
+            total = sum(size for _, size in groups.values())
+            oldest_first = sorted(groups.items(), key=lambda item: item[1][0])
+            while oldest_first and (len(oldest_first) > self.max_files or total > self.max_bytes):
+                profile_id, (_, size) = oldest_first.pop(0)
+                for kind in KINDS:
+                    try:
+                        os.remove(os.path.join(self.directory, f'{profile_id}.{kind}'))
+                    except FileNotFoundError:
+                        pass
+                total -= size
+
+    def list(self, blueprint=None, endpoint=None):
+        """Metadados dos perfis guardados, mais recentes primeiro"""
+        profiles = []
+        try:
+            names = os.listdir(self.directory)
+        except FileNotFoundError:
+            return profiles
+        for name in names:
+            if not name.endswith('.json'):
+                continue
+            try:
+                with open(os.path.join(self.directory, name), encoding='utf-8') as f:
+                    metadata = json.load(f)
+            except (FileNotFoundError, ValueError):
+                continue
+            if blueprint is not None and metadata.get('blueprint') != blueprint:
+                continue
+            if endpoint is not None and metadata.get('endpoint') != endpoint:
+                continue
+            profiles.append(metadata)
+        profiles.sort(key=lambda metadata: metadata['created_at'], reverse=True)
+        return profiles
+
+    def aggregate(self, blueprint, endpoint=None):
+        """Soma das pilhas amostradas dos perfis guardados do blueprint (formato collapsed)"""
+        totals = Counter()
+        profiles = self.list(blueprint=blueprint, endpoint=endpoint)
+        for metadata in profiles:
+            path = self.path(metadata['id'], 'collapsed')
+            if path is None:
+                continue
+            with open(path, encoding='utf-8') as f:
+                for line in f:
+                    stack, _, count = line.rstrip('\n').rpartition(' ')
+                    if stack:
+                        totals[stack] += int(count)
+        return totals, len(profiles)
+
+
+class RequestProfiler:
+    """Decide quais requisições perfilar e grava o resultado no ProfileStore
+
+    Com o header X-Profile: <PROFILING_TOKEN> a requisição roda sob o cProfile
+    (.pstats) e o amostrador de pilhas; pela taxa PROFILING_SAMPLE_RATE só o
+    amostrador, que tem custo baixo o bastante para ficar ligado em produção.
+    """
+
+    def __init__(self, store, sampler, token=None, sample_rate=0.0):
+        self.store = store
+        self.sampler = sampler
+        self.token = token
+        self.sample_rate = sample_rate
+
+    def authorized(self, value):
+        return bool(self.token) and hmac.compare_digest(value or '', self.token)
+
+    def trigger(self):
+        if self.authorized(request.headers.get(PROFILE_HEADER)):
+            return 'header'
+        if self.sample_rate and random.random() < self.sample_rate:
+            return 'sampled'
+        return None
+
+    def start(self, trigger):
+        profile_id = '{}-{}-{}'.format(
+            datetime.utcnow().strftime('%Y%m%dT%H%M%S%f'), request.endpoint or 'unmatched', uuid.uuid4().hex[:8])
+        thread_id = threading.get_ident()
+        profile = None
+        # Com outra requisição sob o cProfile esta fica só com o amostrador
+        if trigger == 'header' and _cprofile_lock.acquire(blocking=False):
+            profile = cProfile.Profile()
+        samples = self.sampler.start(thread_id)
+        session = ProfileSession(profile_id, trigger, profile, samples, thread_id)
+        if profile is not None:
+            try:
+                profile.enable()
+            except Exception as e:
+                # Outra ferramenta de perfil ativa (ex.: cobertura): o perfil não derruba a requisição
+                session.profile = None
+                _cprofile_lock.release()
+                current_app.logger.warning('cProfile indisponível no perfil %s: %s', profile_id, e)
+        return session
+
+    def finish(self, session, status, tenant=None):
+        if session.profile is not None:
+            try:
+                session.profile.disable()
+            finally:
+                _cprofile_lock.release()
+        self.sampler.stop(session.thread_id)
+        duration = time.perf_counter() - session.started
+        metadata = {
+            'id': session.id,
+            'created_at': datetime.utcnow().isoformat(),
+            'blueprint': request.blueprint or '',
+            'endpoint': request.endpoint or 'unmatched',
+            'method': request.method,
+            'path': request.path,
+            'status': status,
+            'duration_ms': round(duration * 1000, 3),
+            'trigger': session.trigger,
+            'samples': sum(session.samples.values()),
+            'tenant': tenant,
+            'pstats': session.profile is not None,
+        }
+        self.store.save(metadata, session.samples, session.profile)
+        return metadata
+
+
+def _before_request():
+    # Os próprios endpoints de perfis não são perfilados
+    if request.blueprint == 'profiler':
+        return
+    profiler = current_app.extensions['profiler']
+    trigger = profiler.trigger()
+    if trigger is not None:
+        g._profile_session = profiler.start(trigger)
+
+
+def _after_request(response):
+    session = g.get('_profile_session')
+    if session is not None:
+        session.status = response.status_code
+        response.headers[PROFILE_ID_HEADER] = session.id
+    return response
+
+
+def _teardown_request(exc=None):
+    # Fecha no teardown para incluir o streaming da resposta (como as métricas)
+    session = g.pop('_profile_session', None)
+    if session is None:
+        return
+    tenant = g.tenant.database_name if 'tenant' in g else None
+    try:
+        current_app.extensions['profiler'].finish(session, session.status or 500, tenant)
+    except OSError:
+        current_app.logger.exception('Falha ao gravar o perfil %s', session.id)
+
+
+def init_profiler(app):
+    """Perfil sob demanda das requisições (desligado sem PROFILING_ENABLED)"""
+    store = ProfileStore(
+        app.config.get('PROFILING_DIR') or os.path.join(app.instance_path, 'profiles'),
+        max_files=app.config.get('PROFILING_MAX_FILES', DEFAULT_MAX_FILES),
+        max_bytes=app.config.get('PROFILING_MAX_BYTES', DEFAULT_MAX_BYTES),
+    )
+    profiler = RequestProfiler(
+        store,
+        StackSampler(app.config.get('PROFILING_INTERVAL', DEFAULT_INTERVAL)),
+        token=app.config.get('PROFILING_TOKEN'),
+        sample_rate=app.config.get('PROFILING_SAMPLE_RATE', 0.0),
+    )
+    app.extensions['profiler'] = profiler
+    if not app.config.get('PROFILING_ENABLED', False):
+        return profiler
+
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
+    return profiler
+
+
+def get_profiler():
+    return current_app.extensions['profiler']
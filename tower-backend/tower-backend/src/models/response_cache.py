@@ -0,0 +1,76 @@
+import hashlib
+import threading
+from collections import OrderedDict
+
+
+class CachedResponse:
+    """Corpo de resposta já serializado, com a versão dos dados que o gerou"""
+
+    __slots__ = ('version', 'body', 'etag')
+
+    def __init__(self, version, body):
+        self.version = version
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()
+
+
+class ResponseCache:
+    """Cache LRU de respostas por cliente, limitado pelo total de bytes
+
+    Cada entrada guarda a versão dos dados do cliente no momento em que foi
+    gerada; se a versão atual for diferente a entrada é descartada.
+    """
+
+    def __init__(self, max_bytes):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def get(self, key, version):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry.version == version:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry
+            if entry is not None:
+                self._remove(key)
+            self.misses += 1
+            return None
+
+    def put(self, key, version, body):
+        entry = CachedResponse(version, body)
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if len(body) > self.max_bytes:
+                return entry
+            self._entries[key] = entry
+            self._size += len(body)
+            while self._size > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+        return entry
+
+    def _remove(self, key):
+        self._size -= len(self._entries.pop(key).body)
+
+    def invalidate(self, key):
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'entries': len(self._entries),
+                'bytes': self._size,
+                'max_bytes': self.max_bytes,
+                'hits': self.hits,
+                'misses': self.misses,
+                'evictions': self.evictions,
+            }
@@ -0,0 +1,40 @@
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from src.models.user import db
+from src.models.client import Client  # noqa: F401 (tabela registrada no metadata)
+from src.models.tenant_migrations import migrate_tenants_command
+
+
+def create_main_schema():
+    """Cria as tabelas e os índices do banco principal (usuários e clientes)"""
+    db.create_all()
+    # create_all não cria índices novos em tabelas que já existem
+    for table in db.metadata.sorted_tables:
+        for index in table.indexes:
+            index.create(bind=db.engine, checkfirst=True)
+
+
+@click.command('migrate')
+@click.option('--tenants/--no-tenants', default=True, show_default=True,
+              help='Também migra os bancos de clientes (migrate-tenants)')
+@click.option('--workers', default=None, type=int, help='Processos usados na migração dos clientes')
+@click.pass_context
+@with_appcontext
+def migrate_command(ctx, tenants, workers):
+    """Prepara os bancos antes de subir os workers (executar a cada deploy)
+
+    Cria o schema do banco principal, o banco compartilhado (se for o
+    armazenamento padrão) e o banco modelo do pool de cadastro.
+    """
+    create_main_schema()
+    click.echo('Banco principal atualizado')
+
+    db_manager = current_app.extensions['database_manager']
+    if db_manager.default_storage == 'shared':
+        db_manager.storages['shared'].ensure()
+    current_app.extensions['tenant_pool'].ensure_template()
+
+    if tenants:
+        options = {} if workers is None else {'workers': workers}
+        ctx.invoke(migrate_tenants_command, **options)
@@ -0,0 +1,140 @@
+import click
+from flask.cli import with_appcontext
+
+# As tabelas sintese_produto e sintese_categoria são mantidas pelos triggers
+# criados na migração 3 (ver tenant_migrations.py); aqui ficam a leitura
+# do resumo e a reconstrução completa para corrigir eventuais divergências.
+
+# Faixas de desempenho: total vendido pelo produto em relação à média da categoria
+DESEMPENHO_ALTO = 1.2
+DESEMPENHO_MEDIO = 0.8
+
+# Produtos listados por categoria no resumo (os de maior total vendido)
+MAX_PRODUTOS_POR_CATEGORIA = 50
+
+
+def calcular_margem(custo, preco):
+    """Margem sobre o preço de venda, formatada como no dashboard (ex.: '30%')"""
+    if not preco:
+        return '0%'
+    return f"{round((preco - custo) / preco * 100)}%"
+
+
+def classificar_desempenho(total_vendas, media_categoria):
+    if media_categoria <= 0:
+        return 'Baixo'
+    ratio = total_vendas / media_categoria
+    if ratio >= DESEMPENHO_ALTO:
+        return 'Alto'
+    if ratio >= DESEMPENHO_MEDIO:
+        return 'Médio'
+    return 'Baixo'
+
+
+def build_sintese(db_manager, database_name, max_produtos=MAX_PRODUTOS_POR_CATEGORIA):
+    """Monta o resumo de vendas do cliente a partir das tabelas de síntese
+
+    Cada categoria traz só os max_produtos produtos de maior total vendido
+    (total_produtos informa quantos ela tem), lidos em ordem do índice
+    idx_sintese_produto_ranking: o custo depende do número de categorias,
+    não do catálogo. As duas leituras usam a mesma versão do banco, para que
+    os totais das categorias batam com os produtos listados.
+    """
+    with db_manager.snapshot(database_name):
+        categorias = db_manager.execute_query(database_name, '''
+            SELECT categoria, produtos, vendas, total_vendas
+            FROM sintese_categoria
+            WHERE tenant_id IS tenant() AND produtos > 0
+            ORDER BY total_vendas DESC, categoria
+        ''')
+        produtos = db_manager.execute_query(database_name, '''
+            SELECT c.categoria, p.nome, p.custo, p.preco, p.vendas, p.total_vendas
+            FROM sintese_categoria c
+            JOIN sintese_produto p ON p.produto_id IN (
+                SELECT produto_id FROM sintese_produto
+                WHERE tenant_id IS c.tenant_id AND categoria = c.categoria
+                ORDER BY total_vendas DESC, nome
+                LIMIT ?)
+            WHERE c.tenant_id IS tenant() AND c.produtos > 0
+            ORDER BY p.total_vendas DESC, p.nome
+        ''', (max_produtos,))
+
+    por_categoria = {}
+    for produto in produtos:
+        por_categoria.setdefault(produto['categoria'], []).append(produto)
+
+    resultado = []
+    for categoria in categorias:
+        media = categoria['total_vendas'] / categoria['produtos']
+        resultado.append({
+            'nome': categoria['categoria'],
+            'vendas': round(categoria['vendas'], 2),
+            'total_vendas': round(categoria['total_vendas'], 2),
+            'total_produtos': categoria['produtos'],
+            'produtos': [
+                {
+                    'nome': produto['nome'],
+                    'custo': round(produto['custo'], 2),
+                    'preco': round(produto['preco'], 2),
+                    'margem': calcular_margem(produto['custo'], produto['preco']),
+                    'desempenho': classificar_desempenho(produto['total_vendas'], media),
+                    'vendas': round(produto['vendas'], 2),
+                    'total_vendas': round(produto['total_vendas'], 2)
+                }
+                for produto in por_categoria.get(categoria['categoria'], [])
+            ]
+        })
+
+    return {
+        'total_vendas': round(sum(categoria['total_vendas'] for categoria in categorias), 2),
+        'categorias_ativas': len(categorias),
+        'categorias': resultado
+    }
+
+
+def rebuild_sintese(db_manager, database_name):
+    """Recalcula as tabelas de síntese a partir de produtos e vendas"""
+    with db_manager.transaction(database_name):
+        db_manager.execute_query(database_name, 'DELETE FROM sintese_produto WHERE tenant_id IS tenant()')
+        db_manager.execute_query(database_name, 'DELETE FROM sintese_categoria WHERE tenant_id IS tenant()')
+        db_manager.execute_query(database_name, '''
+            INSERT INTO sintese_produto (produto_id, tenant_id, categoria, nome, custo, preco, vendas, total_vendas)
+            SELECT p.id, p.tenant_id, p.categoria, p.descricao, p.custo_unitario, p.preco,
+                   COALESCE(SUM(v.quantidade), 0),
+                   COALESCE(SUM(v.quantidade * v.preco_unitario), 0)
+            FROM produtos p
+            LEFT JOIN vendas v ON v.produto_id = p.id
+            WHERE p.tenant_id IS tenant()
+            GROUP BY p.id
+        ''')
+        db_manager.execute_query(database_name, '''
+            INSERT INTO sintese_categoria (tenant_id, categoria, produtos, vendas, total_vendas)
+            SELECT tenant_id, categoria, COUNT(*), SUM(vendas), SUM(total_vendas)
+            FROM sintese_produto
+            WHERE tenant_id IS tenant()
+            GROUP BY categoria
+        ''')
+
+
+@click.command('rebuild-sintese')
+@click.option('--database', 'database_names', multiple=True,
+              help='Banco a reconstruir (pode ser repetido; padrão: todos)')
+@with_appcontext
+def rebuild_sintese_command(database_names):
+    """Reconstrói as tabelas de síntese dos bancos de clientes"""
+    from src.models.database_manager import get_database_manager
+
+    db_manager = get_database_manager()
+    names = database_names or db_manager.list_databases()
+    failed = 0
+    with click.progressbar(names, label='Reconstruindo síntese') as bar:
+        for database_name in bar:
+            try:
+                rebuild_sintese(db_manager, database_name)
+            except Exception as e:
+                failed += 1
+                click.echo(f'\n  {database_name}: {e}', err=True)
+
+    click.echo(f'Bancos processados: {len(names)}  Falhas: {failed}')
+    if failed:
+        raise SystemExit(1)
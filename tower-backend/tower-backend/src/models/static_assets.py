@@ -0,0 +1,188 @@
+import gzip
+import hashlib
+import mimetypes
+import os
+import re
+import click
+from flask import current_app, request
+from flask.cli import with_appcontext
+
+try:
+    import brotli
+except ImportError:  # brotli é opcional; sem ele só há variantes gzip
+    brotli = None
+
+# Arquivos gerados pelo Vite com hash no nome (assets/index-CNQCz4e-.js)
+HASHED_ASSET = re.compile(r'^assets/.+-[A-Za-z0-9_-]{8}\.[A-Za-z0-9]+$')
+
+COMPRESSIBLE_TYPES = ('text/', 'application/javascript', 'application/json', 'image/svg+xml',
+                      'image/x-icon', 'image/vnd.microsoft.icon', 'application/manifest+json')
+
+# Diretórios do static que não fazem parte do build do frontend
+EXCLUDED_DIRS = {'uploads'}
+
+
+class StaticAsset:
+    """Arquivo do build com seu conteúdo e variantes comprimidas em memória"""
+
+    __slots__ = ('path', 'mimetype', 'etag', 'immutable', 'body', 'encodings', 'mtime')
+
+    def __init__(self, path, mimetype, body, immutable, mtime):
+        self.path = path
+        self.mimetype = mimetype
+        self.body = body
+        self.etag = hashlib.sha1(body).hexdigest()
+        self.immutable = immutable
+        self.encodings = {}
+        self.mtime = mtime
+
+
+def is_compressible(mimetype):
+    return mimetype is not None and mimetype.startswith(COMPRESSIBLE_TYPES)
+
+
+def compress(body, encoding):
+    if encoding == 'br':
+        return brotli.compress(body, quality=11)
+    return gzip.compress(body, compresslevel=9, mtime=0)
+
+
+def available_encodings():
+    return ('br', 'gzip') if brotli is not None else ('gzip',)
+
+
+ENCODING_SUFFIXES = {'br': '.br', 'gzip': '.gz'}
+
+
+class StaticManifest:
+    """Índice em memória do build do frontend, montado na inicialização
+
+    Cada arquivo é lido uma vez; as variantes .gz/.br geradas no build (flask
+    compress-static) são reaproveitadas e as que faltam são comprimidas aqui.
+    Depois disso servir um asset ou uma rota do SPA não toca o disco.
+    """
+
+    def __init__(self, static_folder, compress_min_size=1024):
+        self.static_folder = static_folder
+        self.compress_min_size = compress_min_size
+        self.assets = {}
+        self.index = None
+        if static_folder and os.path.isdir(static_folder):
+            self._build()
+
+    def _build(self):
+        for relative_path, full_path in iter_static_files(self.static_folder):
+            with open(full_path, 'rb') as f:
+                body = f.read()
+            mimetype = mimetypes.guess_type(relative_path)[0] or 'application/octet-stream'
+            asset = StaticAsset(relative_path, mimetype, body,
+                                bool(HASHED_ASSET.match(relative_path)), os.path.getmtime(full_path))
+
+            if is_compressible(mimetype) and len(body) >= self.compress_min_size:
+                for encoding in available_encodings():
+                    compressed = read_precompressed(full_path, encoding) or compress(body, encoding)
+                    # Só vale a pena se a variante for realmente menor
+                    if len(compressed) < len(body):
+                        asset.encodings[encoding] = compressed
+
+            self.assets[relative_path] = asset
+
+        self.index = self.assets.get('index.html')
+
+    def get(self, path):
+        return self.assets.get(path)
+
+    def stats(self):
+        return {
+            'files': len(self.assets),
+            'bytes': sum(len(asset.body) for asset in self.assets.values()),
+            'compressed_bytes': sum(len(body) for asset in self.assets.values() for body in asset.encodings.values())
+        }
+
+
+def iter_static_files(static_folder):
+    """(caminho relativo com '/', caminho completo) dos arquivos do build"""
+    for root, dirs, files in os.walk(static_folder):
+        if root == static_folder:
+            dirs[:] = [d for d in dirs if d not in EXCLUDED_DIRS]
+        for name in files:
+            if name.endswith(('.gz', '.br')) or name.startswith('.'):
+                continue
+            full_path = os.path.join(root, name)
+            yield os.path.relpath(full_path, static_folder).replace(os.sep, '/'), full_path
+
+
+def read_precompressed(full_path, encoding):
+    """Conteúdo do .gz/.br gerado no build, se existir e estiver atualizado"""
+    compressed_path = full_path + ENCODING_SUFFIXES[encoding]
+    try:
+        if os.path.getmtime(compressed_path) < os.path.getmtime(full_path):
+            return None
+        with open(compressed_path, 'rb') as f:
+            return f.read()
+    except FileNotFoundError:
+        return None
+
+
+def asset_response(asset):
+    """Resposta de um asset, escolhendo a variante pelo Accept-Encoding"""
+    encoding = None
+    for candidate in available_encodings():
+        if candidate in asset.encodings and request.accept_encodings[candidate]:
+            encoding = candidate
+            break
+
+    body = asset.encodings[encoding] if encoding else asset.body
+    response = current_app.response_class(body, mimetype=asset.mimetype)
+    # ETag por representação: a versão comprimida não é igual byte a byte
+    response.set_etag(f'{asset.etag}-{encoding}' if encoding else asset.etag)
+    if encoding:
+        response.headers['Content-Encoding'] = encoding
+    if asset.encodings:
+        response.vary.add('Accept-Encoding')
+
+    if asset.immutable:
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config.get('STATIC_IMMUTABLE_MAX_AGE', 31536000)
+        response.cache_control.immutable = True
+    elif asset is current_app.extensions['static_manifest'].index:
+        # index.html aponta para os bundles atuais: sempre revalidar
+        response.cache_control.no_cache = True
+    else:
+        response.cache_control.public = True
+        response.cache_control.max_age = current_app.config.get('STATIC_DEFAULT_MAX_AGE', 3600)
+
+    response.last_modified = asset.mtime
+    return response.make_conditional(request)
+
+
+@click.command('compress-static')
+@with_appcontext
+def compress_static_command():
+    """Gera as variantes .gz (e .br, se o brotli estiver instalado) do build do frontend"""
+    static_folder = current_app.static_folder
+    total = 0
+    for relative_path, full_path in iter_static_files(static_folder):
+        if not is_compressible(mimetypes.guess_type(relative_path)[0]):
+            continue
+        with open(full_path, 'rb') as f:
+            body = f.read()
+        if len(body) < current_app.config.get('STATIC_COMPRESS_MIN_SIZE', 1024):
+            continue
+        for encoding in available_encodings():
+            compressed = compress(body, encoding)
+            with open(full_path + ENCODING_SUFFIXES[encoding], 'wb') as f:
+                f.write(compressed)
+            click.echo(f"{relative_path}{ENCODING_SUFFIXES[encoding]}: {len(body)} -> {len(compressed)} bytes")
+            total += 1
+    click.echo(f"{total} arquivos gerados")
+
+
+def init_static_manifest(app):
+    manifest = StaticManifest(app.static_folder, app.config.get('STATIC_COMPRESS_MIN_SIZE', 1024))
+    app.extensions['static_manifest'] = manifest
+    return manifest
+
+
+def get_static_manifest():
+    return current_app.extensions['static_manifest']
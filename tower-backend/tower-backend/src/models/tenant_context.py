@@ -0,0 +1,201 @@
+import threading
+import time
+from collections import OrderedDict
+from functools import wraps
+from flask import g, jsonify
+from flask_jwt_extended import jwt_required, get_jwt_identity
+from sqlalchemy import event
+from sqlalchemy.orm import Session, object_session
+from src.models.user import User
+from src.models.client import Client
+
+DEFAULT_TTL = 60  # segundos
+DEFAULT_MAX_SIZE = 10000
+
+
+class TenantIdentity:
+    """Dados do usuário e do cliente resolvidos a partir do token (sem objetos ORM)"""
+
+    __slots__ = ('user_id', 'client_id', 'database_name', 'client_active',
+                 'user_data', 'client_data', 'expires_at')
+
+    def __init__(self, user, client, expires_at):
+        self.user_id = user.id
+        self.client_id = user.client_id
+        self.database_name = client.database_name if client else None
+        self.client_active = bool(client and client.is_active)
+        self.user_data = user.to_dict()
+        self.client_data = client.to_dict() if client else None
+        self.expires_at = expires_at
+
+
+class TenantCache:
+    """Cache TTL (com limite de tamanho) de usuário -> cliente
+
+    As entradas são invalidadas quando alterações em User ou Client são
+    confirmadas (commit) neste processo; nos demais processos o TTL limita o
+    tempo de desatualização. Uma leitura que começou antes de uma invalidação
+    não é guardada, para não devolver ao cache a linha antiga.
+    """
+
+    def __init__(self, ttl=DEFAULT_TTL, max_size=DEFAULT_MAX_SIZE):
+        self.ttl = ttl
+        self.max_size = max_size
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self._generation = 0  # incrementado a cada invalidação
+
+    def get(self, user_id):
+        with self._lock:
+            identity = self._entries.get(user_id)
+            if identity is None:
+                return None
+            if identity.expires_at < time.monotonic():
+                del self._entries[user_id]
+                return None
+            self._entries.move_to_end(user_id)
+            return identity
+
+    def load(self, user_id):
+        """Busca o usuário e o cliente no banco principal e guarda no cache"""
+        with self._lock:
+            generation = self._generation
+        user = User.query.get(user_id)
+        if not user:
+            return None
+        client = Client.query.get(user.client_id)
+        identity = TenantIdentity(user, client, time.monotonic() + self.ttl)
+        with self._lock:
+            if generation != self._generation:
+                return identity
+            self._entries[user_id] = identity
+            self._entries.move_to_end(user_id)
+            while len(self._entries) > self.max_size:
+                self._entries.popitem(last=False)
+        return identity
+
+    def resolve(self, user_id):
+        return self.get(user_id) or self.load(user_id)
+
+    def invalidate_user(self, user_id):
+        with self._lock:
+            self._generation += 1
+            self._entries.pop(user_id, None)
+
+    def invalidate_client(self, client_id):
+        with self._lock:
+            self._generation += 1
+            for user_id in [uid for uid, identity in self._entries.items()
+                            if identity.client_id == client_id]:
+                del self._entries[user_id]
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+tenant_cache = TenantCache()
+
+
+# Os eventos do mapper rodam no flush, antes do commit: as chaves alteradas ficam
+# na sessão e só saem do cache depois do commit (um rollback as descarta)
+@event.listens_for(User, 'after_update')
+@event.listens_for(User, 'after_delete')
+def _invalidate_user(mapper, connection, target):
+    object_session(target).info.setdefault('_tenant_cache_users', set()).add(target.id)
+
+
+@event.listens_for(Client, 'after_update')
+@event.listens_for(Client, 'after_delete')
+def _invalidate_client(mapper, connection, target):
+    object_session(target).info.setdefault('_tenant_cache_clients', set()).add(target.id)
+
+
+@event.listens_for(Session, 'after_commit')
+def _evict_committed(session):
+    for user_id in session.info.pop('_tenant_cache_users', ()):
+        tenant_cache.invalidate_user(user_id)
+    for client_id in session.info.pop('_tenant_cache_clients', ()):
+        tenant_cache.invalidate_client(client_id)
+
+
+@event.listens_for(Session, 'after_rollback')
+def _discard_rolled_back(session):
+    session.info.pop('_tenant_cache_users', None)
+    session.info.pop('_tenant_cache_clients', None)
+
+
+class TenantContext:
+    """Contexto do cliente da requisição atual (disponível em g.tenant)"""
+
+    def __init__(self, identity):
+        self.identity = identity
+        self._user = None
+        self._client = None
+
+    @property
+    def user_id(self):
+        return self.identity.user_id
+
+    @property
+    def client_id(self):
+        return self.identity.client_id
+
+    @property
+    def database_name(self):
+        return self.identity.database_name
+
+    @property
+    def client_active(self):
+        return self.identity.client_active
+
+    @property
+    def user_data(self):
+        return self.identity.user_data
+
+    @property
+    def client_data(self):
+        return self.identity.client_data
+
+    @property
+    def user(self):
+        """Objeto User (carregado do banco principal só quando necessário)"""
+        if self._user is None:
+            self._user = User.query.get(self.user_id)
+        return self._user
+
+    @property
+    def client(self):
+        """Objeto Client (carregado do banco principal só quando necessário)"""
+        if self._client is None:
+            self._client = Client.query.get(self.client_id)
+        return self._client
+
+
+def tenant_required(require_client=True, locations=None):
+    """Exige JWT válido e coloca o contexto do cliente em g.tenant
+
+    locations restringe onde o token é procurado (padrão: JWT_TOKEN_LOCATION).
+    """
+    def decorator(fn):
+        @wraps(fn)
+        @jwt_required(locations=locations)
+        def wrapper(*args, **kwargs):
+            identity = tenant_cache.resolve(get_jwt_identity())
+
+            if identity is None:
+                return jsonify({'error': 'Usuário não encontrado'}), 404
+
+            if require_client and identity.database_name is None:
+                return jsonify({'error': 'Cliente não encontrado'}), 404
+
+            g.tenant = TenantContext(identity)
+            return fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def init_tenant_context(app):
+    """Configura o cache de resolução usuário -> cliente"""
+    tenant_cache.ttl = app.config.get('TENANT_CACHE_TTL', DEFAULT_TTL)
+    tenant_cache.max_size = app.config.get('TENANT_CACHE_MAX_SIZE', DEFAULT_MAX_SIZE)
@@ -0,0 +1,670 @@
+import os
+import sqlite3
+from concurrent.futures import ProcessPoolExecutor
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+
+# Busca textual em client_data: tabela FTS5 de conteúdo externo (só o índice; o texto
+# continua em client_data) mantida por triggers. As colunas são as mesmas nos dois
+# esquemas; tenant_id só tem termos no banco compartilhado, onde restringe a busca
+# ao cliente. No rank a chave pesa o dobro do valor e tenant_id não conta.
+CLIENT_DATA_FTS = [
+    '''
+    CREATE VIRTUAL TABLE IF NOT EXISTS client_data_fts USING fts5(
+        tenant_id, key, value,
+        content='client_data', content_rowid='id',
+        tokenize='unicode61 remove_diacritics 2'
+    )
+    ''',
+    "INSERT INTO client_data_fts (client_data_fts, rank) VALUES ('rank', 'bm25(0.0, 2.0, 1.0)')",
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_client_data_fts_insert AFTER INSERT ON client_data
+    BEGIN
+        INSERT INTO client_data_fts (rowid, tenant_id, key, value) VALUES (NEW.id, NEW.tenant_id, NEW.key, NEW.value);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_client_data_fts_delete AFTER DELETE ON client_data
+    BEGIN
+        INSERT INTO client_data_fts (client_data_fts, rowid, tenant_id, key, value)
+        VALUES ('delete', OLD.id, OLD.tenant_id, OLD.key, OLD.value);
+    END
+    ''',
+    '''
+    CREATE TRIGGER IF NOT EXISTS trg_client_data_fts_update AFTER UPDATE OF tenant_id, key, value ON client_data
+    BEGIN
+        INSERT INTO client_data_fts (client_data_fts, rowid, tenant_id, key, value)
+        VALUES ('delete', OLD.id, OLD.tenant_id, OLD.key, OLD.value);
+        INSERT INTO client_data_fts (rowid, tenant_id, key, value) VALUES (NEW.id, NEW.tenant_id, NEW.key, NEW.value);
+    END
+    ''',
+    # Indexa os registros que já existiam
+    "INSERT INTO client_data_fts (client_data_fts) VALUES ('rebuild')",
+]
+
+# Log de alterações para a sincronização incremental (/api/client/changes): uma
+# linha por registro com a seq da última alteração (a anterior é apagada) e
+# deleted = 1 para os removidos (tombstones). change_log_state guarda por cliente
+# a época do log (nova a cada mudança de armazenamento) e até onde os tombstones
+# já foram descartados. Ver change_log.py.
+CHANGE_LOG_ENTITIES = ('client_data', 'client_settings', 'produtos', 'insumos')
+
+
+def _change_log_triggers(table):
+    # DELETE + INSERT em vez de REPLACE: o ON CONFLICT da instrução externa
+    # (ex.: upsert de client_settings) substituiria o REPLACE dentro do trigger
+    log = {
+        'insert': ('NEW', 0),
+        'update': ('NEW', 0),
+        'delete': ('OLD', 1),
+    }
+    return [
+        f'''
+        CREATE TRIGGER IF NOT EXISTS trg_{table}_changes_{event} AFTER {event.upper()} ON {table}
+        BEGIN
+            DELETE FROM change_log WHERE entity = '{table}' AND entity_id = {row}.id;
+            INSERT INTO change_log (tenant_id, entity, entity_id, deleted) VALUES ({row}.tenant_id, '{table}', {row}.id, {deleted});
+        END
+        '''
+        for event, (row, deleted) in log.items()
+    ] + [
+        # Registros que já existiam entram no log (a primeira sincronização os recebe)
+        f"INSERT OR IGNORE INTO change_log (tenant_id, entity, entity_id) SELECT tenant_id, '{table}', id FROM {table}",
+    ]
+
+
+CHANGE_LOG = [
+    '''
+    CREATE TABLE IF NOT EXISTS change_log (
+        seq INTEGER PRIMARY KEY AUTOINCREMENT,
+        tenant_id TEXT,
+        entity TEXT NOT NULL,
+        entity_id INTEGER NOT NULL,
+        deleted INTEGER NOT NULL DEFAULT 0,
+        changed_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+        UNIQUE (entity, entity_id)
+    )
+    ''',
+    'CREATE INDEX IF NOT EXISTS idx_change_log_tenant_seq ON change_log (tenant_id, seq)',
+    '''
+    CREATE TABLE IF NOT EXISTS change_log_state (
+        tenant_id TEXT UNIQUE,
+        epoch TEXT NOT NULL,
+        horizon INTEGER NOT NULL DEFAULT 0
+    )
+    ''',
+] + [statement for table in CHANGE_LOG_ENTITIES for statement in _change_log_triggers(table)]
+
+# Produtos de maior total vendido de cada categoria (/api/sintese) lidos direto do
+# índice; o índice antigo por categoria é um prefixo deste e deixa de ser necessário
+SINTESE_RANKING = [
+    '''
+    CREATE INDEX IF NOT EXISTS idx_sintese_produto_ranking
+    ON sintese_produto (tenant_id, categoria, total_vendas DESC, nome)
+    ''',
+    'DROP INDEX IF EXISTS idx_sintese_produto_categoria',
+]
+
+
+# Migrações dos bancos dos clientes: (versão, descrição, instruções SQL).
+# A versão aplicada fica registrada em PRAGMA user_version de cada banco;
+# novas migrações devem ser sempre adicionadas ao final da lista.
+MIGRATIONS = [
+    (1, 'tabelas básicas', [
+        '''
+        CREATE TABLE IF NOT EXISTS client_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            key TEXT NOT NULL,
+            value TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS client_files (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            filename TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            file_type TEXT,
+            file_size INTEGER,
+            uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS client_settings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            setting_key TEXT UNIQUE NOT NULL,
+            setting_value TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+    ]),
+    (2, 'índices da listagem e da busca por chave em client_data', [
+        'CREATE INDEX IF NOT EXISTS idx_client_data_created_at ON client_data (created_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_client_data_key ON client_data (key)',
+    ]),
+    (3, 'produtos, vendas e tabelas de síntese mantidas por triggers', [
+        '''
+        CREATE TABLE IF NOT EXISTS produtos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            codigo TEXT UNIQUE NOT NULL,
+            descricao TEXT NOT NULL,
+            tipo TEXT,
+            categoria TEXT NOT NULL,
+            unidade TEXT,
+            qtd_embalagem REAL NOT NULL DEFAULT 1,
+            custo_embalagem REAL NOT NULL DEFAULT 0,
+            custo_unitario REAL NOT NULL DEFAULT 0,
+            preco REAL NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_produtos_categoria ON produtos (categoria)',
+        '''
+        CREATE TABLE IF NOT EXISTS vendas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            produto_id INTEGER NOT NULL REFERENCES produtos (id),
+            quantidade REAL NOT NULL,
+            preco_unitario REAL NOT NULL,
+            vendido_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_vendas_produto ON vendas (produto_id)',
+        # Agregados por produto e por categoria (lidos por /api/sintese)
+        '''
+        CREATE TABLE IF NOT EXISTS sintese_produto (
+            produto_id INTEGER PRIMARY KEY,
+            categoria TEXT NOT NULL,
+            nome TEXT NOT NULL,
+            custo REAL NOT NULL DEFAULT 0,
+            preco REAL NOT NULL DEFAULT 0,
+            vendas REAL NOT NULL DEFAULT 0,
+            total_vendas REAL NOT NULL DEFAULT 0
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_sintese_produto_categoria ON sintese_produto (categoria)',
+        '''
+        CREATE TABLE IF NOT EXISTS sintese_categoria (
+            categoria TEXT PRIMARY KEY,
+            produtos INTEGER NOT NULL DEFAULT 0,
+            vendas REAL NOT NULL DEFAULT 0,
+            total_vendas REAL NOT NULL DEFAULT 0
+        )
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_sintese_insert AFTER INSERT ON produtos
+        BEGIN
+            INSERT INTO sintese_produto (produto_id, categoria, nome, custo, preco)
+            VALUES (NEW.id, NEW.categoria, NEW.descricao, NEW.custo_unitario, NEW.preco);
+            INSERT INTO sintese_categoria (categoria, produtos) VALUES (NEW.categoria, 1)
+            ON CONFLICT (categoria) DO UPDATE SET produtos = produtos + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_sintese_update
+        AFTER UPDATE OF descricao, categoria, custo_unitario, preco ON produtos
+        BEGIN
+            -- Troca de categoria: move as vendas acumuladas para a nova categoria
+            UPDATE sintese_categoria SET
+                produtos = produtos - 1,
+                vendas = vendas - (SELECT vendas FROM sintese_produto WHERE produto_id = OLD.id),
+                total_vendas = total_vendas - (SELECT total_vendas FROM sintese_produto WHERE produto_id = OLD.id)
+            WHERE categoria = OLD.categoria AND OLD.categoria IS NOT NEW.categoria;
+            INSERT INTO sintese_categoria (categoria, produtos, vendas, total_vendas)
+            SELECT NEW.categoria, 1, vendas, total_vendas FROM sintese_produto
+            WHERE produto_id = OLD.id AND OLD.categoria IS NOT NEW.categoria
+            ON CONFLICT (categoria) DO UPDATE SET
+                produtos = produtos + 1,
+                vendas = vendas + excluded.vendas,
+                total_vendas = total_vendas + excluded.total_vendas;
+            UPDATE sintese_produto SET
+                categoria = NEW.categoria,
+                nome = NEW.descricao,
+                custo = NEW.custo_unitario,
+                preco = NEW.preco
+            WHERE produto_id = OLD.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_sintese_before_delete BEFORE DELETE ON produtos
+        BEGIN
+            -- As vendas do produto são removidas junto (e descontadas pelos triggers de vendas)
+            DELETE FROM vendas WHERE produto_id = OLD.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_sintese_delete AFTER DELETE ON produtos
+        BEGIN
+            UPDATE sintese_categoria SET produtos = produtos - 1 WHERE categoria = OLD.categoria;
+            DELETE FROM sintese_produto WHERE produto_id = OLD.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_vendas_sintese_insert AFTER INSERT ON vendas
+        BEGIN
+            UPDATE sintese_produto SET
+                vendas = vendas + NEW.quantidade,
+                total_vendas = total_vendas + NEW.quantidade * NEW.preco_unitario
+            WHERE produto_id = NEW.produto_id;
+            UPDATE sintese_categoria SET
+                vendas = vendas + NEW.quantidade,
+                total_vendas = total_vendas + NEW.quantidade * NEW.preco_unitario
+            WHERE categoria = (SELECT categoria FROM sintese_produto WHERE produto_id = NEW.produto_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_vendas_sintese_update
+        AFTER UPDATE OF produto_id, quantidade, preco_unitario ON vendas
+        BEGIN
+            UPDATE sintese_produto SET
+                vendas = vendas - OLD.quantidade,
+                total_vendas = total_vendas - OLD.quantidade * OLD.preco_unitario
+            WHERE produto_id = OLD.produto_id;
+            UPDATE sintese_categoria SET
+                vendas = vendas - OLD.quantidade,
+                total_vendas = total_vendas - OLD.quantidade * OLD.preco_unitario
+            WHERE categoria = (SELECT categoria FROM sintese_produto WHERE produto_id = OLD.produto_id);
+            UPDATE sintese_produto SET
+                vendas = vendas + NEW.quantidade,
+                total_vendas = total_vendas + NEW.quantidade * NEW.preco_unitario
+            WHERE produto_id = NEW.produto_id;
+            UPDATE sintese_categoria SET
+                vendas = vendas + NEW.quantidade,
+                total_vendas = total_vendas + NEW.quantidade * NEW.preco_unitario
+            WHERE categoria = (SELECT categoria FROM sintese_produto WHERE produto_id = NEW.produto_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_vendas_sintese_delete AFTER DELETE ON vendas
+        BEGIN
+            UPDATE sintese_produto SET
+                vendas = vendas - OLD.quantidade,
+                total_vendas = total_vendas - OLD.quantidade * OLD.preco_unitario
+            WHERE produto_id = OLD.produto_id;
+            UPDATE sintese_categoria SET
+                vendas = vendas - OLD.quantidade,
+                total_vendas = total_vendas - OLD.quantidade * OLD.preco_unitario
+            WHERE categoria = (SELECT categoria FROM sintese_produto WHERE produto_id = OLD.produto_id);
+        END
+        ''',
+    ]),
+    (4, 'insumos e composição dos produtos (índice insumo -> produtos)', [
+        '''
+        CREATE TABLE IF NOT EXISTS insumos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            nome TEXT NOT NULL,
+            tipo TEXT,
+            categoria TEXT,
+            preco REAL NOT NULL DEFAULT 0,
+            fornecedor TEXT,
+            estoque REAL NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_insumos_fornecedor_nome ON insumos (fornecedor, nome)',
+        '''
+        CREATE TABLE IF NOT EXISTS produto_insumos (
+            produto_id INTEGER NOT NULL REFERENCES produtos (id),
+            insumo_id INTEGER NOT NULL REFERENCES insumos (id),
+            quantidade REAL NOT NULL,
+            PRIMARY KEY (produto_id, insumo_id)
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_produto_insumos_insumo ON produto_insumos (insumo_id, produto_id)',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_composicao_delete AFTER DELETE ON produtos
+        BEGIN
+            DELETE FROM produto_insumos WHERE produto_id = OLD.id;
+        END
+        ''',
+    ]),
+    (5, 'coluna tenant_id (nula nos bancos por arquivo, usada no banco compartilhado)', [
+        f'ALTER TABLE {table} ADD COLUMN tenant_id TEXT'
+        for table in ('client_data', 'client_files', 'client_settings', 'produtos', 'vendas',
+                      'sintese_produto', 'sintese_categoria', 'insumos', 'produto_insumos')
+    ]),
+    (6, 'busca textual (FTS5) em client_data', CLIENT_DATA_FTS),
+    (7, 'log de alterações e tombstones (sincronização incremental)', CHANGE_LOG),
+    (8, 'índice do ranking de produtos por categoria na síntese', SINTESE_RANKING),
+]
+
+# Banco compartilhado (shared/tenants.db): as mesmas tabelas com tenant_id obrigatório,
+# chaves e índices começando por tenant_id e triggers de síntese por cliente.
+SHARED_MIGRATIONS = [
+    (1, 'esquema compartilhado entre clientes', [
+        '''
+        CREATE TABLE IF NOT EXISTS tenants (
+            tenant_id TEXT PRIMARY KEY,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS client_data (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tenant_id TEXT NOT NULL,
+            key TEXT NOT NULL,
+            value TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_client_data_created_at ON client_data (tenant_id, created_at, id)',
+        'CREATE INDEX IF NOT EXISTS idx_client_data_key ON client_data (tenant_id, key)',
+        '''
+        CREATE TABLE IF NOT EXISTS client_files (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tenant_id TEXT NOT NULL,
+            filename TEXT NOT NULL,
+            file_path TEXT NOT NULL,
+            file_type TEXT,
+            file_size INTEGER,
+            uploaded_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_client_files_tenant ON client_files (tenant_id)',
+        '''
+        CREATE TABLE IF NOT EXISTS client_settings (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tenant_id TEXT NOT NULL,
+            setting_key TEXT NOT NULL,
+            setting_value TEXT,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (tenant_id, setting_key)
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS produtos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tenant_id TEXT NOT NULL,
+            codigo TEXT NOT NULL,
+            descricao TEXT NOT NULL,
+            tipo TEXT,
+            categoria TEXT NOT NULL,
+            unidade TEXT,
+            qtd_embalagem REAL NOT NULL DEFAULT 1,
+            custo_embalagem REAL NOT NULL DEFAULT 0,
+            custo_unitario REAL NOT NULL DEFAULT 0,
+            preco REAL NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            UNIQUE (tenant_id, codigo)
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_produtos_categoria ON produtos (tenant_id, categoria)',
+        '''
+        CREATE TABLE IF NOT EXISTS vendas (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tenant_id TEXT NOT NULL,
+            produto_id INTEGER NOT NULL REFERENCES produtos (id),
+            quantidade REAL NOT NULL,
+            preco_unitario REAL NOT NULL,
+            vendido_em TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_vendas_produto ON vendas (produto_id)',
+        'CREATE INDEX IF NOT EXISTS idx_vendas_tenant ON vendas (tenant_id)',
+        '''
+        CREATE TABLE IF NOT EXISTS sintese_produto (
+            produto_id INTEGER PRIMARY KEY,
+            tenant_id TEXT NOT NULL,
+            categoria TEXT NOT NULL,
+            nome TEXT NOT NULL,
+            custo REAL NOT NULL DEFAULT 0,
+            preco REAL NOT NULL DEFAULT 0,
+            vendas REAL NOT NULL DEFAULT 0,
+            total_vendas REAL NOT NULL DEFAULT 0
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_sintese_produto_categoria ON sintese_produto (tenant_id, categoria)',
+        '''
+        CREATE TABLE IF NOT EXISTS sintese_categoria (
+            tenant_id TEXT NOT NULL,
+            categoria TEXT NOT NULL,
+            produtos INTEGER NOT NULL DEFAULT 0,
+            vendas REAL NOT NULL DEFAULT 0,
+            total_vendas REAL NOT NULL DEFAULT 0,
+            PRIMARY KEY (tenant_id, categoria)
+        ) WITHOUT ROWID
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS insumos (
+            id INTEGER PRIMARY KEY AUTOINCREMENT,
+            tenant_id TEXT NOT NULL,
+            nome TEXT NOT NULL,
+            tipo TEXT,
+            categoria TEXT,
+            preco REAL NOT NULL DEFAULT 0,
+            fornecedor TEXT,
+            estoque REAL NOT NULL DEFAULT 0,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            updated_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_insumos_fornecedor_nome ON insumos (tenant_id, fornecedor, nome)',
+        '''
+        CREATE TABLE IF NOT EXISTS produto_insumos (
+            produto_id INTEGER NOT NULL REFERENCES produtos (id),
+            insumo_id INTEGER NOT NULL REFERENCES insumos (id),
+            quantidade REAL NOT NULL,
+            tenant_id TEXT NOT NULL,
+            PRIMARY KEY (produto_id, insumo_id)
+        ) WITHOUT ROWID
+        ''',
+        'CREATE INDEX IF NOT EXISTS idx_produto_insumos_insumo ON produto_insumos (insumo_id, produto_id)',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_sintese_insert AFTER INSERT ON produtos
+        BEGIN
+            INSERT INTO sintese_produto (produto_id, tenant_id, categoria, nome, custo, preco)
+            VALUES (NEW.id, NEW.tenant_id, NEW.categoria, NEW.descricao, NEW.custo_unitario, NEW.preco);
+            INSERT INTO sintese_categoria (tenant_id, categoria, produtos) VALUES (NEW.tenant_id, NEW.categoria, 1)
+            ON CONFLICT (tenant_id, categoria) DO UPDATE SET produtos = produtos + 1;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_sintese_update
+        AFTER UPDATE OF descricao, categoria, custo_unitario, preco ON produtos
+        BEGIN
+            UPDATE sintese_categoria SET
+                produtos = produtos - 1,
+                vendas = vendas - (SELECT vendas FROM sintese_produto WHERE produto_id = OLD.id),
+                total_vendas = total_vendas - (SELECT total_vendas FROM sintese_produto WHERE produto_id = OLD.id)
+            WHERE tenant_id = OLD.tenant_id AND categoria = OLD.categoria AND OLD.categoria IS NOT NEW.categoria;
+            INSERT INTO sintese_categoria (tenant_id, categoria, produtos, vendas, total_vendas)
+            SELECT NEW.tenant_id, NEW.categoria, 1, vendas, total_vendas FROM sintese_produto
+            WHERE produto_id = OLD.id AND OLD.categoria IS NOT NEW.categoria
+            ON CONFLICT (tenant_id, categoria) DO UPDATE SET
+                produtos = produtos + 1,
+                vendas = vendas + excluded.vendas,
+                total_vendas = total_vendas + excluded.total_vendas;
+            UPDATE sintese_produto SET
+                categoria = NEW.categoria,
+                nome = NEW.descricao,
+                custo = NEW.custo_unitario,
+                preco = NEW.preco
+            WHERE produto_id = OLD.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_sintese_before_delete BEFORE DELETE ON produtos
+        BEGIN
+            DELETE FROM vendas WHERE produto_id = OLD.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_sintese_delete AFTER DELETE ON produtos
+        BEGIN
+            UPDATE sintese_categoria SET produtos = produtos - 1
+            WHERE tenant_id = OLD.tenant_id AND categoria = OLD.categoria;
+            DELETE FROM sintese_produto WHERE produto_id = OLD.id;
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_vendas_sintese_insert AFTER INSERT ON vendas
+        BEGIN
+            UPDATE sintese_produto SET
+                vendas = vendas + NEW.quantidade,
+                total_vendas = total_vendas + NEW.quantidade * NEW.preco_unitario
+            WHERE produto_id = NEW.produto_id;
+            UPDATE sintese_categoria SET
+                vendas = vendas + NEW.quantidade,
+                total_vendas = total_vendas + NEW.quantidade * NEW.preco_unitario
+            WHERE tenant_id = NEW.tenant_id
+              AND categoria = (SELECT categoria FROM sintese_produto WHERE produto_id = NEW.produto_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_vendas_sintese_update
+        AFTER UPDATE OF produto_id, quantidade, preco_unitario ON vendas
+        BEGIN
+            UPDATE sintese_produto SET
+                vendas = vendas - OLD.quantidade,
+                total_vendas = total_vendas - OLD.quantidade * OLD.preco_unitario
+            WHERE produto_id = OLD.produto_id;
+            UPDATE sintese_categoria SET
+                vendas = vendas - OLD.quantidade,
+                total_vendas = total_vendas - OLD.quantidade * OLD.preco_unitario
+            WHERE tenant_id = OLD.tenant_id
+              AND categoria = (SELECT categoria FROM sintese_produto WHERE produto_id = OLD.produto_id);
+            UPDATE sintese_produto SET
+                vendas = vendas + NEW.quantidade,
+                total_vendas = total_vendas + NEW.quantidade * NEW.preco_unitario
+            WHERE produto_id = NEW.produto_id;
+            UPDATE sintese_categoria SET
+                vendas = vendas + NEW.quantidade,
+                total_vendas = total_vendas + NEW.quantidade * NEW.preco_unitario
+            WHERE tenant_id = NEW.tenant_id
+              AND categoria = (SELECT categoria FROM sintese_produto WHERE produto_id = NEW.produto_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_vendas_sintese_delete AFTER DELETE ON vendas
+        BEGIN
+            UPDATE sintese_produto SET
+                vendas = vendas - OLD.quantidade,
+                total_vendas = total_vendas - OLD.quantidade * OLD.preco_unitario
+            WHERE produto_id = OLD.produto_id;
+            UPDATE sintese_categoria SET
+                vendas = vendas - OLD.quantidade,
+                total_vendas = total_vendas - OLD.quantidade * OLD.preco_unitario
+            WHERE tenant_id = OLD.tenant_id
+              AND categoria = (SELECT categoria FROM sintese_produto WHERE produto_id = OLD.produto_id);
+        END
+        ''',
+        '''
+        CREATE TRIGGER IF NOT EXISTS trg_produtos_composicao_delete AFTER DELETE ON produtos
+        BEGIN
+            DELETE FROM produto_insumos WHERE produto_id = OLD.id;
+        END
+        ''',
+    ]),
+    (2, 'busca textual (FTS5) em client_data', CLIENT_DATA_FTS),
+    (3, 'log de alterações e tombstones (sincronização incremental)', CHANGE_LOG),
+    (4, 'índice do ranking de produtos por categoria na síntese', SINTESE_RANKING),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+# user_version gravado no banco de origem quando um cliente muda de armazenamento
+# (maior que qualquer versão, para que as migrações nunca o sobrescrevam)
+MOVED_VERSION = 2 ** 31 - 1
+
+
+def get_version(conn):
+    return conn.execute('PRAGMA user_version').fetchone()[0]
+
+
+def apply_migrations(conn, migrations=MIGRATIONS):
+    """Aplica as migrações pendentes; retorna (versão_inicial, versão_final)
+
+    Cada migração roda em sua própria transação junto com a atualização de
+    user_version, então uma execução interrompida pode ser retomada.
+    A conexão deve estar em modo autocommit (isolation_level=None).
+    """
+    start = get_version(conn)
+    if start >= migrations[-1][0]:
+        return start, start
+
+    if start == 0 and conn.execute('SELECT 1 FROM sqlite_master').fetchone() is None:
+        # Banco novo: auto_vacuum incremental, para que a manutenção devolva o
+        # espaço livre sem reescrever o arquivo (ver maintenance.py). Só vale
+        # antes da primeira tabela; o VACUUM de um banco vazio é instantâneo.
+        conn.execute('PRAGMA auto_vacuum = INCREMENTAL')
+        conn.execute('VACUUM')
+
+    for version, _, statements in migrations:
+        if version <= start:
+            continue
+        conn.execute('BEGIN IMMEDIATE')
+        try:
+            # Outro processo pode ter aplicado a migração enquanto esperávamos o lock
+            if get_version(conn) >= version:
+                conn.execute('ROLLBACK')
+                continue
+            for statement in statements:
+                conn.execute(statement)
+            conn.execute(f'PRAGMA user_version = {int(version)}')
+            conn.execute('COMMIT')
+        except BaseException:
+            conn.execute('ROLLBACK')
+            raise
+
+    return start, get_version(conn)
+
+
+def migrate_database_file(db_path, migrations=MIGRATIONS):
+    """Migra um único arquivo de banco (executado nos processos do pool)"""
+    try:
+        conn = sqlite3.connect(db_path, isolation_level=None, timeout=30)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            start, end = apply_migrations(conn, migrations)
+        finally:
+            conn.close()
+        return db_path, start, end, None
+    except Exception as e:
+        return db_path, None, None, str(e)
+
+
+@click.command('migrate-tenants')
+@click.option('--workers', default=os.cpu_count() or 1, show_default=True,
+              help='Número de processos usados na migração')
+@click.option('--chunk-size', default=16, show_default=True,
+              help='Bancos enviados a cada processo por vez')
+@with_appcontext
+def migrate_tenants_command(workers, chunk_size):
+    """Aplica as migrações pendentes em todos os bancos de clientes
+
+    Bancos já migrados são ignorados, então o comando pode ser executado
+    novamente para retomar uma migração interrompida.
+    """
+    from src.models.database_manager import get_database_manager
+
+    db_manager = get_database_manager()
+    files = db_manager.database_files()
+    paths = [path for path, _ in files]
+    click.echo(f'{len(paths)} bancos encontrados (versão alvo: {LATEST_VERSION})')
+
+    migrated, up_to_date, failed = 0, 0, []
+    with ProcessPoolExecutor(max_workers=max(1, workers)) as executor:
+        results = executor.map(migrate_database_file, paths, [migrations for _, migrations in files],
+                               chunksize=max(1, chunk_size))
+        with click.progressbar(results, length=len(paths), label='Migrando') as bar:
+            for db_path, start, end, error in bar:
+                if error:
+                    failed.append((db_path, error))
+                elif start == end:
+                    up_to_date += 1
+                else:
+                    migrated += 1
+
+    click.echo(f'Migrados: {migrated}  Já atualizados: {up_to_date}  Falhas: {len(failed)}')
+    for db_path, error in failed:
+        click.echo(f'  {os.path.basename(db_path)}: {error}', err=True)
+    if failed:
+        current_app.logger.error('Falha ao migrar %d bancos de clientes', len(failed))
+        raise SystemExit(1)
@@ -0,0 +1,195 @@
+import logging
+import os
+import shutil
+import sqlite3
+import threading
+import uuid
+import click
+from flask import current_app
+from flask.cli import with_appcontext
+from src.models.tenant_migrations import apply_migrations, get_version, LATEST_VERSION
+
+try:
+    import fcntl
+except ImportError:  # sem fcntl (Windows) cada processo reabastece sem coordenação
+    fcntl = None
+
+logger = logging.getLogger(__name__)
+
+READY_PREFIX = 'ready-'
+
+
+class TenantDatabasePool:
+    """Bancos de cliente criados antecipadamente, prontos para o cadastro
+
+    Um banco modelo (template.db) já migrado é copiado para pool/ready-*.db por
+    uma thread de reabastecimento; o cadastro só renomeia um desses arquivos
+    para o nome do cliente (rename é atômico, então dois processos nunca
+    pegam o mesmo arquivo). Com o pool vazio o modelo é copiado na hora.
+    """
+
+    def __init__(self, db_manager, size=8):
+        self.db_manager = db_manager
+        self.size = size
+        self.pool_path = os.path.join(db_manager.base_path, 'pool')
+        self.template_path = os.path.join(self.pool_path, 'template.db')
+        self._wakeup = threading.Event()
+        self._template_lock = threading.Lock()
+        self._refiller = None
+        self._pid = None
+        os.makedirs(self.pool_path, exist_ok=True)
+
+    def _template_is_current(self):
+        if not os.path.exists(self.template_path):
+            return False
+        conn = sqlite3.connect(f'file:{self.template_path}?mode=ro&immutable=1', uri=True)
+        try:
+            return get_version(conn) >= LATEST_VERSION
+        finally:
+            conn.close()
+
+    def ensure_template(self):
+        """Cria (ou recria, se houver migração nova) o banco modelo"""
+        with self._template_lock:
+            if self._template_is_current():
+                return
+
+            temp_path = os.path.join(self.pool_path, f'.{uuid.uuid4().hex}.tmp')
+            conn = sqlite3.connect(temp_path, isolation_level=None)
+            try:
+                conn.execute('PRAGMA journal_mode=WAL')
+                apply_migrations(conn)
+                # Tudo no arquivo principal, para que a cópia seja um único arquivo
+                conn.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+            finally:
+                conn.close()
+            for suffix in ('-wal', '-shm'):
+                if os.path.exists(temp_path + suffix):
+                    os.remove(temp_path + suffix)
+            os.replace(temp_path, self.template_path)
+
+            # Bancos copiados do modelo antigo ficam desatualizados
+            for name in self.ready_files():
+                self._remove(os.path.join(self.pool_path, name))
+
+    def ready_files(self):
+        with os.scandir(self.pool_path) as entries:
+            return [entry.name for entry in entries if entry.name.startswith(READY_PREFIX)]
+
+    def _clone(self, target_path):
+        temp_path = os.path.join(self.pool_path, f'.{uuid.uuid4().hex}.tmp')
+        shutil.copyfile(self.template_path, temp_path)
+        os.replace(temp_path, target_path)
+
+    def _remove(self, path):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    def claim(self, target_path):
+        """Entrega um banco pronto no caminho do cliente; retorna o caminho"""
+        if os.path.exists(target_path):
+            return target_path
+
+        for name in self.ready_files():
+            try:
+                os.rename(os.path.join(self.pool_path, name), target_path)
+            except FileNotFoundError:
+                continue  # outro processo pegou este arquivo antes
+            self._notify()
+            return target_path
+
+        # Pool vazio: cópia do modelo, ainda sem executar nenhum CREATE TABLE
+        self.ensure_template()
+        self._clone(target_path)
+        self._notify()
+        return target_path
+
+    def fill(self):
+        """Completa o pool até o tamanho configurado; retorna quantos foram criados"""
+        self.ensure_template()
+        created = 0
+        with self._fill_lock() as acquired:
+            if not acquired:
+                return 0
+            missing = self.size - len(self.ready_files())
+            for _ in range(max(missing, 0)):
+                self._clone(os.path.join(self.pool_path, f'{READY_PREFIX}{uuid.uuid4().hex}.db'))
+                created += 1
+        return created
+
+    def _fill_lock(self):
+        return _FileLock(os.path.join(self.pool_path, '.lock'))
+
+    def _notify(self):
+        self._start_refiller()
+        self._wakeup.set()
+
+    def _start_refiller(self):
+        # Uma thread por processo (threads não sobrevivem a um fork)
+        if self._pid == os.getpid() and self._refiller is not None:
+            return
+        self._pid = os.getpid()
+        self._refiller = threading.Thread(target=self._refill_loop, name='tenant-pool-refiller', daemon=True)
+        self._refiller.start()
+
+    def _refill_loop(self):
+        while True:
+            self._wakeup.wait()
+            self._wakeup.clear()
+            try:
+                self.fill()
+            except Exception:
+                logger.exception('Falha ao reabastecer o pool de bancos de cliente')
+
+    def stats(self):
+        return {'ready': len(self.ready_files()), 'size': self.size}
+
+
+class _FileLock:
+    """Lock exclusivo não bloqueante entre processos (flock)"""
+
+    def __init__(self, path):
+        self.path = path
+        self.file = None
+
+    def __enter__(self):
+        if fcntl is None:
+            return True
+        self.file = open(self.path, 'a')
+        try:
+            fcntl.flock(self.file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            return True
+        except OSError:
+            self.file.close()
+            self.file = None
+            return False
+
+    def __exit__(self, *exc):
+        if self.file is not None:
+            fcntl.flock(self.file, fcntl.LOCK_UN)
+            self.file.close()
+            self.file = None
+
+
+@click.command('fill-tenant-pool')
+@with_appcontext
+def fill_tenant_pool_command():
+    """Cria os bancos de cliente do pool (ex.: no deploy, antes de subir os workers)"""
+    pool = get_tenant_pool()
+    created = pool.fill()
+    click.echo(f"{created} bancos criados; {pool.stats()['ready']} prontos no pool")
+
+
+def init_tenant_pool(app):
+    db_manager = app.extensions['database_manager']
+    pool = TenantDatabasePool(db_manager, size=app.config.get('TENANT_DB_POOL_SIZE', 8))
+    # Bancos por arquivo novos saem do pool
+    db_manager.storages['file'].pool = pool
+    app.extensions['tenant_pool'] = pool
+    return pool
+
+
+def get_tenant_pool():
+    return current_app.extensions['tenant_pool']
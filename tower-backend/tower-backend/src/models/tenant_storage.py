@@ -0,0 +1,437 @@
+import hashlib
+import os
+import re
+import sqlite3
+import uuid
+from collections import namedtuple
+import click
+from flask.cli import with_appcontext
+from src.models.tenant_migrations import (apply_migrations, get_version, MIGRATIONS, MOVED_VERSION,
+                                          SHARED_MIGRATIONS)
+
+# Subdiretórios de shard: dois dígitos hexadecimais do sha1 do nome por nível
+SHARD_DIR = re.compile(r'^[0-9a-f]{2}$')
+
+# Tabelas copiadas ao mover um cliente (as de síntese são refeitas pelos triggers).
+# A ordem importa: produtos antes de vendas e da composição.
+COPIED_TABLES = (
+    ('produtos', ('codigo', 'descricao', 'tipo', 'categoria', 'unidade', 'qtd_embalagem',
+                  'custo_embalagem', 'custo_unitario', 'preco', 'created_at', 'updated_at'), {}),
+    ('insumos', ('nome', 'tipo', 'categoria', 'preco', 'fornecedor', 'estoque', 'created_at', 'updated_at'), {}),
+    ('vendas', ('produto_id', 'quantidade', 'preco_unitario', 'vendido_em'), {'produto_id': 'produtos'}),
+    ('produto_insumos', ('produto_id', 'insumo_id', 'quantidade'),
+     {'produto_id': 'produtos', 'insumo_id': 'insumos'}),
+    ('client_data', ('key', 'value', 'created_at', 'updated_at'), {}),
+    ('client_files', ('filename', 'file_path', 'file_type', 'file_size', 'uploaded_at'), {}),
+    ('client_settings', ('setting_key', 'setting_value', 'created_at', 'updated_at'), {}),
+)
+WITHOUT_ID = {'produto_insumos'}
+
+# Remoção dos dados de um cliente no banco compartilhado (a composição também
+# sai pelo trigger de produtos). O log de alterações vem por último: os triggers
+# das outras tabelas gravam tombstones nele. Ele não é copiado ao mover o
+# cliente; o destino ganha uma nova época e os clientes sincronizam do início.
+PURGED_TABLES = ('tenants', 'produtos', 'vendas', 'sintese_produto', 'sintese_categoria', 'insumos',
+                 'produto_insumos', 'client_data', 'client_files', 'client_settings',
+                 'change_log', 'change_log_state')
+
+# Onde estão os dados de um cliente: backend, arquivo SQLite e valor de tenant()
+TenantLocation = namedtuple('TenantLocation', 'storage path key')
+
+
+class TenantMovedError(Exception):
+    """Os dados do cliente mudaram de armazenamento: a operação pode ser repetida"""
+
+
+def remove_database_file(db_path):
+    for path in (db_path, db_path + '-wal', db_path + '-shm'):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+
+class FileTenantStorage:
+    """Um arquivo SQLite por cliente, distribuído em subdiretórios pelo hash do nome
+
+    Bancos criados antes do shard (direto em client_databases/) continuam
+    sendo encontrados até serem movidos com `flask tenant-storage shard-legacy`.
+    """
+
+    name = 'file'
+    migrations = MIGRATIONS
+
+    def __init__(self, base_path, shard_depth=1):
+        self.base_path = base_path
+        self.shard_depth = shard_depth
+        self.pool = None  # TenantDatabasePool, anexado por init_tenant_pool
+
+    def shard_path(self, database_name):
+        digest = hashlib.sha1(database_name.encode('utf-8')).hexdigest()
+        shards = [digest[2 * level:2 * level + 2] for level in range(self.shard_depth)]
+        return os.path.join(self.base_path, *shards, f"{database_name}.db")
+
+    def legacy_path(self, database_name):
+        return os.path.join(self.base_path, f"{database_name}.db")
+
+    def locate(self, database_name):
+        for path in (self.shard_path(database_name), self.legacy_path(database_name)):
+            if os.path.exists(path):
+                return TenantLocation(self, path, None)
+        return None
+
+    def is_moved(self, conn, database_name):
+        return get_version(conn) == MOVED_VERSION
+
+    def create(self, database_name):
+        location = self.locate(database_name)
+        if location is not None:
+            return location
+
+        db_path = self.shard_path(database_name)
+        os.makedirs(os.path.dirname(db_path), exist_ok=True)
+        if self.pool is not None:
+            self.pool.claim(db_path)
+        else:
+            conn = sqlite3.connect(db_path, isolation_level=None)
+            try:
+                conn.execute('PRAGMA journal_mode=WAL')
+                apply_migrations(conn)
+            finally:
+                conn.close()
+        return TenantLocation(self, db_path, None)
+
+    def delete(self, database_name, cache):
+        location = self.locate(database_name)
+        if location is None:
+            return False
+        cache.close_path(location.path)
+        remove_database_file(location.path)
+        return True
+
+    def iter_files(self):
+        """(nome, caminho) de cada banco, nos shards e no diretório antigo"""
+        pending = [(self.base_path, 0)]
+        while pending:
+            path, depth = pending.pop()
+            with os.scandir(path) as entries:
+                for entry in entries:
+                    if entry.name.endswith('.db') and entry.is_file():
+                        yield entry.name[:-3], entry.path
+                    elif depth < self.shard_depth and SHARD_DIR.match(entry.name) and entry.is_dir():
+                        pending.append((entry.path, depth + 1))
+
+    def list(self):
+        return [name for name, _ in self.iter_files()]
+
+
+class SharedTenantStorage:
+    """Um único banco para vários clientes, com tenant_id em todas as tabelas
+
+    As conexões filtram pela função SQL tenant(), que devolve o cliente
+    associado à conexão (ver DatabaseManager.connection).
+    """
+
+    name = 'shared'
+    migrations = SHARED_MIGRATIONS
+
+    def __init__(self, path, cache):
+        self.path = path
+        self.cache = cache
+
+    def ensure(self):
+        """Cria o banco compartilhado na primeira vez em que é usado"""
+        if os.path.exists(self.path):
+            return
+        os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        conn = sqlite3.connect(self.path, isolation_level=None)
+        try:
+            conn.execute('PRAGMA journal_mode=WAL')
+            apply_migrations(conn, SHARED_MIGRATIONS)
+        finally:
+            conn.close()
+
+    def contains(self, conn, database_name):
+        return conn.execute('SELECT 1 FROM tenants WHERE tenant_id = ?', (database_name,)).fetchone() is not None
+
+    def locate(self, database_name):
+        if not os.path.exists(self.path):
+            return None
+        conn = self.cache.acquire(self.path, SHARED_MIGRATIONS)
+        try:
+            found = self.contains(conn, database_name)
+        finally:
+            self.cache.release(conn)
+        return TenantLocation(self, self.path, database_name) if found else None
+
+    def is_moved(self, conn, database_name):
+        return not self.contains(conn, database_name)
+
+    def create(self, database_name):
+        self.ensure()
+        conn = self.cache.acquire(self.path, SHARED_MIGRATIONS)
+        try:
+            conn.execute('INSERT OR IGNORE INTO tenants (tenant_id) VALUES (?)', (database_name,))
+        finally:
+            self.cache.release(conn)
+        return TenantLocation(self, self.path, database_name)
+
+    def purge(self, conn, database_name):
+        """Remove as linhas do cliente (dentro da transação de quem chama)"""
+        for table in PURGED_TABLES:
+            conn.execute(f'DELETE FROM main.{table} WHERE tenant_id = ?', (database_name,))
+
+    def delete(self, database_name, cache):
+        if not os.path.exists(self.path):
+            return False
+        conn = cache.acquire(self.path, SHARED_MIGRATIONS)
+        try:
+            conn.execute('BEGIN IMMEDIATE')
+            found = self.contains(conn, database_name)
+            self.purge(conn, database_name)
+            conn.execute('COMMIT')
+        finally:
+            cache.release(conn)
+        return found
+
+    def list(self):
+        if not os.path.exists(self.path):
+            return []
+        conn = self.cache.acquire(self.path, SHARED_MIGRATIONS)
+        try:
+            return [row[0] for row in conn.execute('SELECT tenant_id FROM tenants')]
+        finally:
+            self.cache.release(conn)
+
+
+def _open(db_path, busy_timeout):
+    conn = sqlite3.connect(db_path, isolation_level=None, timeout=busy_timeout / 1000)
+    conn.execute(f'PRAGMA busy_timeout={busy_timeout}')
+    return conn
+
+
+def move_tenant(db_manager, database_name, target):
+    """Move os dados de um cliente para outro armazenamento com a aplicação no ar
+
+    O banco de origem fica travado para escrita (BEGIN IMMEDIATE) durante a
+    cópia; só depois que o destino é gravado a origem é marcada como movida e
+    removida. Escritas concorrentes recebem TenantMovedError e podem ser
+    repetidas; leituras continuam na origem até a troca.
+    Retorna a nova TenantLocation.
+    """
+    db_manager.forget(database_name)
+    source = db_manager.locate(database_name)
+    storage = db_manager.storages[target]
+
+    if target == 'shared':
+        if source.storage is not storage:
+            _file_to_shared(db_manager, database_name, source, storage)
+    elif source.storage.name == 'shared':
+        _shared_to_file(db_manager, database_name, source, storage)
+    elif source.path != storage.shard_path(database_name):
+        _file_to_shard(db_manager, database_name, source, storage)
+
+    db_manager.forget(database_name)
+    return db_manager.locate(database_name)
+
+
+def _lock_source_file(source, busy_timeout):
+    """Abre o banco de origem e trava suas escritas; retorna a conexão"""
+    lock = _open(source.path, busy_timeout)
+    try:
+        apply_migrations(lock)
+        lock.execute('BEGIN IMMEDIATE')
+        if get_version(lock) == MOVED_VERSION:
+            raise TenantMovedError('O banco de origem já foi movido')
+    except BaseException:
+        lock.close()
+        raise
+    return lock
+
+
+def _release_source_file(db_manager, lock, source):
+    """Marca a origem como movida (quem ainda a usa vai relocalizar) e a remove"""
+    lock.execute(f'PRAGMA user_version = {MOVED_VERSION}')
+    lock.execute('COMMIT')
+    lock.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+    lock.close()
+    db_manager.cache.close_path(source.path)
+    remove_database_file(source.path)
+
+
+def _file_to_shared(db_manager, database_name, source, shared):
+    busy_timeout = db_manager.cache.busy_timeout
+    shared.ensure()
+    lock = _lock_source_file(source, busy_timeout)
+    try:
+        conn = _open(shared.path, busy_timeout)
+        try:
+            conn.execute('ATTACH DATABASE ? AS origem', (source.path,))
+            # BEGIN adiado: o primeiro DELETE trava só o banco compartilhado
+            conn.execute('BEGIN')
+            # Restos de uma mudança interrompida (o arquivo ainda vale)
+            shared.purge(conn, database_name)
+            conn.execute('INSERT INTO tenants (tenant_id) VALUES (?)', (database_name,))
+
+            # Os ids são globais no banco compartilhado: cada tabela é deslocada
+            # para depois do maior id existente, e as referências acompanham
+            offsets = {}
+            for table, columns, references in COPIED_TABLES:
+                values = [f'{column} + {offsets[references[column]]}' if column in references else column
+                          for column in columns]
+                if table not in WITHOUT_ID:
+                    offsets[table] = conn.execute(f'''
+                        SELECT MAX(COALESCE((SELECT seq FROM main.sqlite_sequence WHERE name = '{table}'), 0),
+                                   COALESCE((SELECT MAX(id) FROM main.{table}), 0))
+                    ''').fetchone()[0]
+                    columns = ('id',) + columns
+                    values = [f'id + {offsets[table]}'] + values
+                conn.execute(f'''
+                    INSERT INTO main.{table} (tenant_id, {', '.join(columns)})
+                    SELECT ?, {', '.join(values)} FROM origem.{table}
+                ''', (database_name,))
+
+            conn.execute('COMMIT')
+        except BaseException:
+            if conn.in_transaction:
+                conn.execute('ROLLBACK')
+            raise
+        finally:
+            conn.close()
+    except BaseException:
+        lock.close()
+        raise
+    _release_source_file(db_manager, lock, source)
+
+
+def _shared_to_file(db_manager, database_name, source, files):
+    busy_timeout = db_manager.cache.busy_timeout
+    target_path = files.shard_path(database_name)
+    if os.path.exists(target_path):
+        raise FileExistsError(f"Database {target_path} already exists")
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    temp_path = os.path.join(os.path.dirname(target_path), f'.{uuid.uuid4().hex}.tmp')
+
+    conn = _open(source.path, busy_timeout)
+    try:
+        conn.execute('BEGIN IMMEDIATE')
+        if not source.storage.contains(conn, database_name):
+            raise TenantMovedError('O cliente não está mais no banco compartilhado')
+
+        # Os ids são mantidos: no arquivo só existem os dados deste cliente
+        copy = sqlite3.connect(temp_path, isolation_level=None)
+        try:
+            copy.execute('PRAGMA journal_mode=WAL')
+            apply_migrations(copy)
+            copy.execute('ATTACH DATABASE ? AS origem', (source.path,))
+            copy.execute('BEGIN')
+            for table, columns, _ in COPIED_TABLES:
+                if table not in WITHOUT_ID:
+                    columns = ('id',) + columns
+                columns = ', '.join(columns)
+                copy.execute(f'''
+                    INSERT INTO main.{table} ({columns})
+                    SELECT {columns} FROM origem.{table} WHERE tenant_id = ?
+                ''', (database_name,))
+            copy.execute('COMMIT')
+            copy.execute('DETACH DATABASE origem')
+            copy.execute('PRAGMA wal_checkpoint(TRUNCATE)')
+        finally:
+            copy.close()
+
+        os.rename(temp_path, target_path)
+        try:
+            source.storage.purge(conn, database_name)
+            conn.execute('COMMIT')
+        except BaseException:
+            remove_database_file(target_path)
+            raise
+    except BaseException:
+        if conn.in_transaction:
+            conn.execute('ROLLBACK')
+        remove_database_file(temp_path)
+        raise
+    finally:
+        conn.close()
+
+
+def _file_to_shard(db_manager, database_name, source, files):
+    """Copia um banco do diretório antigo para o seu shard (API de backup)"""
+    target_path = files.shard_path(database_name)
+    os.makedirs(os.path.dirname(target_path), exist_ok=True)
+    temp_path = os.path.join(os.path.dirname(target_path), f'.{uuid.uuid4().hex}.tmp')
+
+    lock = _lock_source_file(source, db_manager.cache.busy_timeout)
+    try:
+        reader = sqlite3.connect(source.path)
+        copy = sqlite3.connect(temp_path)
+        try:
+            reader.backup(copy)
+        finally:
+            copy.close()
+            reader.close()
+        os.rename(temp_path, target_path)
+    except BaseException:
+        lock.close()
+        remove_database_file(temp_path)
+        raise
+    _release_source_file(db_manager, lock, source)
+
+
+@click.group('tenant-storage')
+def tenant_storage_cli():
+    """Armazenamento dos bancos de clientes (arquivo por cliente ou compartilhado)"""
+
+
+@tenant_storage_cli.command('move')
+@click.argument('database_names', nargs=-1, required=True)
+@click.option('--to', 'target', type=click.Choice(['file', 'shared']), required=True)
+@with_appcontext
+def move_command(database_names, target):
+    """Move clientes para outro armazenamento com a aplicação no ar"""
+    from src.models.database_manager import get_database_manager
+
+    db_manager = get_database_manager()
+    failed = 0
+    for database_name in database_names:
+        try:
+            location = move_tenant(db_manager, database_name, target)
+            click.echo(f'{database_name}: {location.storage.name} ({location.path})')
+        except Exception as e:
+            failed += 1
+            click.echo(f'{database_name}: {e}', err=True)
+    if failed:
+        raise SystemExit(1)
+
+
+@tenant_storage_cli.command('shard-legacy')
+@with_appcontext
+def shard_legacy_command():
+    """Move os bancos do diretório antigo (sem shard) para os subdiretórios"""
+    from src.models.database_manager import get_database_manager
+
+    db_manager = get_database_manager()
+    files = db_manager.storages['file']
+    legacy = [name for name, path in files.iter_files() if path == files.legacy_path(name)]
+    failed = 0
+    with click.progressbar(legacy, label='Movendo bancos') as bar:
+        for database_name in bar:
+            try:
+                move_tenant(db_manager, database_name, 'file')
+            except Exception as e:
+                failed += 1
+                click.echo(f'\n  {database_name}: {e}', err=True)
+
+    click.echo(f'Bancos movidos: {len(legacy) - failed}  Falhas: {failed}')
+    if failed:
+        raise SystemExit(1)
+
+
+@tenant_storage_cli.command('status')
+@with_appcontext
+def status_command():
+    """Quantidade de clientes em cada armazenamento"""
+    from src.models.database_manager import get_database_manager
+
+    for name, storage in get_database_manager().storages.items():
+        click.echo(f'{name}: {len(storage.list())}')
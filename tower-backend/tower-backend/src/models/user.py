@@ -1,7 +1,7 @@
 from flask_sqlalchemy import SQLAlchemy
 from datetime import datetime
 import uuid
-import bcrypt
+from src.models.password_hasher import get_password_hasher
 
 db = SQLAlchemy()
 
@@ -10,7 +10,7 @@ class User(db.Model):
     
     id = db.Column(db.String(36), primary_key=True, default=lambda: str(uuid.uuid4()))
     username = db.Column(db.String(80), nullable=False)
-    email = db.Column(db.String(120), nullable=False)
+    email = db.Column(db.String(120), nullable=False, index=True)
     password_hash = db.Column(db.String(128), nullable=False)
     profile_picture = db.Column(db.String(255), nullable=True)
     created_at = db.Column(db.DateTime, default=datetime.utcnow)
@@ -19,19 +19,27 @@ class User(db.Model):
     # Chave estrangeira para o cliente
     client_id = db.Column(db.String(36), db.ForeignKey('clients.id'), nullable=False)
     
-    def __init__(self, username, email, password, client_id):
+    def __init__(self, username, email, password, client_id, password_hash=None):
         self.username = username
         self.email = email
         self.client_id = client_id
-        self.set_password(password)
+        # password_hash permite calcular o hash antes de abrir a transação
+        if password_hash:
+            self.password_hash = password_hash
+        else:
+            self.set_password(password)
     
     def set_password(self, password):
         """Hash da senha usando bcrypt"""
-        self.password_hash = bcrypt.hashpw(password.encode('utf-8'), bcrypt.gensalt()).decode('utf-8')
+        self.password_hash = get_password_hasher().hash(password)
     
     def check_password(self, password):
         """Verifica se a senha está correta"""
-        return bcrypt.checkpw(password.encode('utf-8'), self.password_hash.encode('utf-8'))
+        return get_password_hasher().verify(password, self.password_hash)
+    
+    def password_needs_rehash(self):
+        """True se o hash usa um fator de custo diferente do configurado"""
+        return get_password_hasher().needs_rehash(self.password_hash)
     
     def to_dict(self):
         return {
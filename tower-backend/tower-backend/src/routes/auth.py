@@ -1,9 +1,10 @@
-from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import create_access_token, jwt_required, get_jwt_identity
+from flask import Blueprint, request, jsonify, g
+from flask_jwt_extended import create_access_token, jwt_required
 from src.models.user import db, User
 from src.models.client import Client
-from src.models.database_manager import DatabaseManager
-import os
+from src.models.database_manager import get_database_manager
+from src.models.tenant_context import tenant_required
+from src.models.password_hasher import get_password_hasher, PasswordHasherBusy
 
 auth_bp = Blueprint('auth', __name__)
 
@@ -32,19 +33,27 @@ def register():
         if existing_user:
             return jsonify({'error': 'Usuário já existe com este email'}), 400
         
-        # Criar novo cliente
-        new_client = Client(name=client_name, email=client_email)
-        db.session.add(new_client)
-        db.session.flush()  # Para obter o ID do cliente
-        
-        # Criar banco de dados único para o cliente
-        db_manager = DatabaseManager(os.path.join(current_app.instance_path, 'client_databases'))
-        db_manager.create_client_database(new_client.database_name)
+        # Hash calculado antes de qualquer escrita, sem segurar o lock do banco
+        password_hash = get_password_hasher().hash(password)
         
-        # Criar novo usuário
-        new_user = User(username=username, email=email, password=password, client_id=new_client.id)
-        db.session.add(new_user)
-        db.session.commit()
+        # Banco do cliente criado (retirado do pool, no armazenamento por arquivo)
+        # antes da transação do banco principal
+        new_client = Client(name=client_name, email=client_email)
+        get_database_manager().create_client_database(new_client.database_name)
+        
+        try:
+            db.session.add(new_client)
+            db.session.flush()  # Para obter o ID do cliente
+            
+            # Criar novo usuário
+            new_user = User(username=username, email=email, password=password, client_id=new_client.id,
+                            password_hash=password_hash)
+            db.session.add(new_user)
+            db.session.commit()
+        except Exception:
+            db.session.rollback()
+            get_database_manager().delete_client_database(new_client.database_name)
+            raise
         
         # Criar token de acesso
         access_token = create_access_token(identity=new_user.id)
@@ -56,6 +65,9 @@ def register():
             'client': new_client.to_dict()
         }), 201
         
+    except PasswordHasherBusy as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
@@ -82,6 +94,11 @@ def login():
         if not client or not client.is_active:
             return jsonify({'error': 'Cliente inativo'}), 401
         
+        # Fator de custo mudou desde o último login: regrava o hash
+        if user.password_needs_rehash():
+            user.set_password(password)
+            db.session.commit()
+        
         # Criar token de acesso
         access_token = create_access_token(identity=user.id)
         
@@ -92,24 +109,19 @@ def login():
             'client': client.to_dict()
         }), 200
         
+    except PasswordHasherBusy as e:
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
+        db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
 @auth_bp.route('/me', methods=['GET'])
-@jwt_required()
+@tenant_required(require_client=False)
 def get_current_user():
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        
-        if not user:
-            return jsonify({'error': 'Usuário não encontrado'}), 404
-        
-        client = Client.query.get(user.client_id)
-        
         return jsonify({
-            'user': user.to_dict(),
-            'client': client.to_dict() if client else None
+            'user': g.tenant.user_data,
+            'client': g.tenant.client_data
         }), 200
         
     except Exception as e:
@@ -0,0 +1,48 @@
+from flask import Blueprint, request, jsonify, g
+from src.models.database_manager import get_database_manager
+from src.models.tenant_context import tenant_required
+from src.models.change_log import CursorExpiredError, parse_cursor, read_changes
+from src.routes.client_data import DATA_FIELDS
+from src.routes.produtos import PRODUTO_COLUMNS
+from src.routes.insumos import INSUMO_COLUMNS
+
+changes_bp = Blueprint('changes', __name__)
+
+# Colunas de cada entidade em data (as mesmas das listagens)
+CHANGE_COLUMNS = {
+    'client_data': ', '.join(DATA_FIELDS),
+    'client_settings': 'id, setting_key, setting_value, created_at, updated_at',
+    'produtos': PRODUTO_COLUMNS,
+    'insumos': INSUMO_COLUMNS,
+}
+DEFAULT_CHANGES_LIMIT = 500
+MAX_CHANGES_LIMIT = 1000
+
+@changes_bp.route('/changes', methods=['GET'])
+@tenant_required()
+def get_changes():
+    """Registros criados, alterados ou removidos desde o cursor ?since=
+
+    Sem since devolve todos os registros (primeira sincronização). Cada item
+    é {entity, id, op: upsert|delete, data}; o cursor da resposta vai no
+    próximo since, e has_more indica que há mais páginas. 410 quando o
+    cursor expirou: descartar os dados locais e recomeçar sem since.
+    """
+    try:
+        try:
+            since = parse_cursor(request.args.get('since'))
+            limit = int(request.args.get('limit', DEFAULT_CHANGES_LIMIT))
+            if not 1 <= limit <= MAX_CHANGES_LIMIT:
+                raise ValueError
+        except ValueError:
+            return jsonify({'error': 'Parâmetros inválidos'}), 400
+
+        try:
+            result = read_changes(get_database_manager(), g.tenant.database_name, since, limit, CHANGE_COLUMNS)
+        except CursorExpiredError as e:
+            return jsonify({'error': str(e), 'resync': True}), 410
+
+        return jsonify(result), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
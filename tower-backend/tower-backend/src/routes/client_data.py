@@ -1,58 +1,233 @@
-from flask import Blueprint, request, jsonify, current_app
-from flask_jwt_extended import jwt_required, get_jwt_identity
-from src.models.user import User
-from src.models.client import Client
-from src.models.database_manager import DatabaseManager
-import os
+from flask import Blueprint, Response, request, jsonify, g, current_app, stream_with_context
+from src.models.database_manager import get_database_manager
+from src.models.tenant_context import tenant_required
+from src.models.events import publish_change
+import json
+import threading
+import time
 
 client_data_bp = Blueprint('client_data', __name__)
 
-def get_database_manager():
-    """Retorna uma instância do gerenciador de banco de dados"""
-    return DatabaseManager(os.path.join(current_app.instance_path, 'client_databases'))
+DATA_FIELDS = ('id', 'key', 'value', 'created_at', 'updated_at')
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+TOTAL_COUNT_TTL = 30  # segundos
+
+# Busca textual (/data/search)
+DEFAULT_SEARCH_PAGE_SIZE = 20
+MAX_SEARCH_PAGE_SIZE = 100
+MAX_SEARCH_TERMS = 16
+MIN_PREFIX_LENGTH = 2  # "a*" percorreria boa parte do índice
+SNIPPET_TOKENS = 12  # palavras no trecho destacado do valor
+# Acima disso o bm25 de todas as ocorrências fica caro: a busca passa a ordenar
+# pelos registros mais recentes (respondido em "order")
+MAX_RANKED_MATCHES = 20000
+
+# No banco compartilhado o termo do cliente entra no MATCH, para que o índice só
+# percorra as linhas dele (o filtro por tenant_id no JOIN garante o isolamento)
+SEARCH_MATCH = """client_data_fts MATCH (
+    CASE WHEN tenant() IS NULL THEN :expression
+    ELSE 'tenant_id : "' || tenant() || '" AND ' || :expression END)"""
+
+# Cache do total de registros por banco: database_name -> (total, expira_em)
+_total_counts = {}
+_total_counts_lock = threading.Lock()
+
+def parse_fields(value):
+    """Valida a projeção de colunas pedida em ?fields="""
+    if not value:
+        return list(DATA_FIELDS)
+    fields = [field.strip() for field in value.split(',') if field.strip()]
+    if not fields or any(field not in DATA_FIELDS for field in fields):
+        raise ValueError('Campo inválido')
+    # Sem repetições: as colunas projetadas e os nomes das linhas precisam andar juntos
+    return list(dict.fromkeys(fields))
+
+def parse_cursor(value):
+    """Converte o cursor '<created_at>,<id>' em tupla"""
+    if not value:
+        return None
+    created_at, _, data_id = value.rpartition(',')
+    if not created_at:
+        raise ValueError('Cursor inválido')
+    return created_at, int(data_id)
+
+def get_total_count(db_manager, database_name):
+    """Total de registros do cliente, mantido em cache por TOTAL_COUNT_TTL"""
+    now = time.monotonic()
+    with _total_counts_lock:
+        cached = _total_counts.get(database_name)
+    if cached and cached[1] > now:
+        return cached[0]
+    
+    result = db_manager.execute_query(database_name, "SELECT COUNT(*) AS total FROM client_data WHERE tenant_id IS tenant()")
+    total = result[0]['total']
+    with _total_counts_lock:
+        _total_counts[database_name] = (total, now + TOTAL_COUNT_TTL)
+    return total
+
+def invalidate_total_count(database_name):
+    with _total_counts_lock:
+        _total_counts.pop(database_name, None)
+
+def stream_page(rows, fields, columns, limit, total):
+    """Gera a resposta JSON da página à medida que as linhas (tuplas) saem do cursor"""
+    json_provider = current_app.json
+    page = {'last': None, 'has_more': False}
+
+    def items():
+        # As colunas pedidas vêm primeiro no SELECT: o zip deixa de fora as do
+        # cursor, quando extras, e cada linha vira um único dict
+        for index, row in enumerate(rows):
+            if index == limit:
+                page['has_more'] = True
+                return
+            page['last'] = row
+            yield dict(zip(fields, row))
+
+    yield b'{"data":'
+    yield from json_provider.stream_array(items())
+    last = page['last']
+    next_cursor = None
+    if page['has_more']:
+        next_cursor = f"{last[columns.index('created_at')]},{last[columns.index('id')]}"
+    # Demais campos codificados como objeto; o "{" inicial é trocado pela vírgula
+    trailer = {'next_cursor': next_cursor, 'has_more': page['has_more'], 'total': total}
+    yield b',' + json_provider.dumps_bytes(trailer)[1:]
 
 @client_data_bp.route('/data', methods=['GET'])
-@jwt_required()
+@tenant_required()
 def get_client_data():
+    """Lista os dados do cliente com paginação por cursor (keyset)
+
+    Parâmetros: after=<created_at>,<id> (cursor devolvido em next_cursor),
+    limit (1..MAX_PAGE_SIZE) e fields (lista de colunas separadas por vírgula).
+    """
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        
-        if not user:
-            return jsonify({'error': 'Usuário não encontrado'}), 404
+        try:
+            limit = int(request.args.get('limit', DEFAULT_PAGE_SIZE))
+            if not 1 <= limit <= MAX_PAGE_SIZE:
+                raise ValueError
+            fields = parse_fields(request.args.get('fields'))
+            after = parse_cursor(request.args.get('after'))
+        except ValueError:
+            return jsonify({'error': 'Parâmetros de paginação inválidos'}), 400
+        
+        database_name = g.tenant.database_name
+        db_manager = get_database_manager()
         
-        client = Client.query.get(user.client_id)
-        if not client:
-            return jsonify({'error': 'Cliente não encontrado'}), 404
+        # Colunas do cursor sempre são lidas, mesmo fora da projeção
+        columns = list(dict.fromkeys(fields + ['id', 'created_at']))
+        query = f"SELECT {', '.join(columns)} FROM client_data WHERE tenant_id IS tenant()"
+        params = []
+        if after:
+            query += " AND (created_at < ? OR (created_at = ? AND id < ?))"
+            params = [after[0], after[0], after[1]]
+        query += " ORDER BY created_at DESC, id DESC LIMIT ?"
+        params.append(limit + 1)
         
-        db_manager = get_database_manager()
+        rows = db_manager.iterate_query(database_name, query, params, row_type='tuple')
+        total = get_total_count(db_manager, database_name)
         
-        # Buscar todos os dados do cliente
-        query = "SELECT * FROM client_data ORDER BY created_at DESC"
-        data = db_manager.execute_query(client.database_name, query)
+        return Response(stream_with_context(stream_page(rows, fields, columns, limit, total)),
+                        mimetype='application/json'), 200
         
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def parse_search(value):
+    """Converte ?q= em uma expressão FTS5 sobre key e value
+
+    Cada palavra vira uma frase entre aspas (sem operadores do FTS5 vindos do
+    usuário); palavra terminada em * busca por prefixo (mínimo de
+    MIN_PREFIX_LENGTH caracteres). Todas precisam aparecer.
+    """
+    terms = []
+    for word in (value or '').split()[:MAX_SEARCH_TERMS]:
+        prefix = word.endswith('*')
+        word = word.rstrip('*')
+        if prefix and len(word) < MIN_PREFIX_LENGTH:
+            raise ValueError('Prefixo curto demais')
+        if word:
+            terms.append('"{}"{}'.format(word.replace('"', '""'), '*' if prefix else ''))
+    if not terms:
+        raise ValueError('Busca vazia')
+    return '{key value} : (' + ' '.join(terms) + ')'
+
+@client_data_bp.route('/data/search', methods=['GET'])
+@tenant_required()
+def search_client_data():
+    """Busca textual em key e value, ordenada por relevância (bm25)
+
+    Parâmetros: q (palavras; "abc*" busca por prefixo), limit (1..MAX_SEARCH_PAGE_SIZE),
+    offset, fields e order (rank ou recent; rank vira recent acima de
+    MAX_RANKED_MATCHES ocorrências). Cada resultado traz highlight com a chave
+    e um trecho do valor com os termos entre <mark></mark>.
+    """
+    try:
+        try:
+            expression = parse_search(request.args.get('q'))
+            limit = int(request.args.get('limit', DEFAULT_SEARCH_PAGE_SIZE))
+            offset = int(request.args.get('offset', 0))
+            if not 1 <= limit <= MAX_SEARCH_PAGE_SIZE or offset < 0:
+                raise ValueError
+            if request.args.get('order', 'rank') not in ('rank', 'recent'):
+                raise ValueError
+            fields = parse_fields(request.args.get('fields'))
+        except ValueError:
+            return jsonify({'error': 'Parâmetros de busca inválidos'}), 400
+
+        db_manager = get_database_manager()
+        database_name = g.tenant.database_name
+        params = {'expression': expression, 'limit': limit, 'offset': offset}
+
+        total = db_manager.execute_query(
+            database_name, f"SELECT COUNT(*) AS total FROM client_data_fts WHERE {SEARCH_MATCH}", params)[0]['total']
+        order = request.args.get('order', 'rank')
+        if order == 'rank' and total > MAX_RANKED_MATCHES:
+            order = 'recent'
+
+        # Ordena e limita só no índice; o JOIN com client_data e os destaques
+        # ficam restritos à página
+        query = f"""
+            SELECT {', '.join('d.' + field for field in fields)}, hits.highlight_key, hits.highlight_value
+            FROM (
+                SELECT rowid AS id, rank,
+                       highlight(client_data_fts, 1, '<mark>', '</mark>') AS highlight_key,
+                       snippet(client_data_fts, 2, '<mark>', '</mark>', '…', {SNIPPET_TOKENS}) AS highlight_value
+                FROM client_data_fts
+                WHERE {SEARCH_MATCH}
+                ORDER BY {'rank' if order == 'rank' else 'rowid DESC'}
+                LIMIT :limit OFFSET :offset
+            ) AS hits
+            JOIN client_data d ON d.id = hits.id
+            WHERE d.tenant_id IS tenant()
+            ORDER BY {'hits.rank' if order == 'rank' else 'hits.id DESC'}
+        """
+        rows = db_manager.execute_query(database_name, query, params)
+
+        results = []
+        for row in rows:
+            result = {field: row[field] for field in fields}
+            result['highlight'] = {'key': row['highlight_key'], 'value': row['highlight_value']}
+            results.append(result)
+
+        has_more = offset + limit < total
         return jsonify({
-            'data': data,
-            'total': len(data)
+            'data': results,
+            'order': order,
+            'total': total,
+            'has_more': has_more,
+            'next_offset': offset + limit if has_more else None
         }), 200
-        
+
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @client_data_bp.route('/data', methods=['POST'])
-@jwt_required()
+@tenant_required()
 def create_client_data():
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        
-        if not user:
-            return jsonify({'error': 'Usuário não encontrado'}), 404
-        
-        client = Client.query.get(user.client_id)
-        if not client:
-            return jsonify({'error': 'Cliente não encontrado'}), 404
-        
         data = request.get_json()
         
         if not data or 'key' not in data:
@@ -64,8 +239,10 @@ def create_client_data():
         db_manager = get_database_manager()
         
         # Inserir dados
-        query = "INSERT INTO client_data (key, value) VALUES (?, ?)"
-        db_manager.execute_query(client.database_name, query, (key, value))
+        query = "INSERT INTO client_data (tenant_id, key, value) VALUES (tenant(), ?, ?)"
+        data_id = db_manager.execute_insert(g.tenant.database_name, query, (key, value))
+        invalidate_total_count(g.tenant.database_name)
+        publish_change(g.tenant.database_name, 'client_data', 'create', [data_id])
         
         return jsonify({'message': 'Dados criados com sucesso'}), 201
         
@@ -73,19 +250,9 @@ def create_client_data():
         return jsonify({'error': str(e)}), 500
 
 @client_data_bp.route('/data/<int:data_id>', methods=['PUT'])
-@jwt_required()
+@tenant_required()
 def update_client_data(data_id):
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        
-        if not user:
-            return jsonify({'error': 'Usuário não encontrado'}), 404
-        
-        client = Client.query.get(user.client_id)
-        if not client:
-            return jsonify({'error': 'Cliente não encontrado'}), 404
-        
         data = request.get_json()
         
         if not data:
@@ -93,31 +260,35 @@ def update_client_data(data_id):
         
         db_manager = get_database_manager()
         
-        # Verificar se o registro existe
-        check_query = "SELECT id FROM client_data WHERE id = ?"
-        existing = db_manager.execute_query(client.database_name, check_query, (data_id,))
-        
-        if not existing:
-            return jsonify({'error': 'Registro não encontrado'}), 404
-        
-        # Atualizar dados
-        update_fields = []
-        params = []
-        
-        if 'key' in data:
-            update_fields.append("key = ?")
-            params.append(data['key'])
-        
-        if 'value' in data:
-            update_fields.append("value = ?")
-            params.append(data['value'])
+        with db_manager.transaction(g.tenant.database_name):
+            # Verificar se o registro existe
+            check_query = "SELECT id FROM client_data WHERE id = ? AND tenant_id IS tenant()"
+            existing = db_manager.execute_query(g.tenant.database_name, check_query, (data_id,))
+            
+            if not existing:
+                return jsonify({'error': 'Registro não encontrado'}), 404
+            
+            # Atualizar dados
+            update_fields = []
+            params = []
+            
+            if 'key' in data:
+                update_fields.append("key = ?")
+                params.append(data['key'])
+            
+            if 'value' in data:
+                update_fields.append("value = ?")
+                params.append(data['value'])
+            
+            if update_fields:
+                update_fields.append("updated_at = CURRENT_TIMESTAMP")
+                params.append(data_id)
+                
+                query = f"UPDATE client_data SET {', '.join(update_fields)} WHERE id = ? AND tenant_id IS tenant()"
+                db_manager.execute_query(g.tenant.database_name, query, params)
         
         if update_fields:
-            update_fields.append("updated_at = CURRENT_TIMESTAMP")
-            params.append(data_id)
-            
-            query = f"UPDATE client_data SET {', '.join(update_fields)} WHERE id = ?"
-            db_manager.execute_query(client.database_name, query, params)
+            publish_change(g.tenant.database_name, 'client_data', 'update', [data_id])
         
         return jsonify({'message': 'Dados atualizados com sucesso'}), 200
         
@@ -125,31 +296,25 @@ def update_client_data(data_id):
         return jsonify({'error': str(e)}), 500
 
 @client_data_bp.route('/data/<int:data_id>', methods=['DELETE'])
-@jwt_required()
+@tenant_required()
 def delete_client_data(data_id):
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        
-        if not user:
-            return jsonify({'error': 'Usuário não encontrado'}), 404
-        
-        client = Client.query.get(user.client_id)
-        if not client:
-            return jsonify({'error': 'Cliente não encontrado'}), 404
-        
         db_manager = get_database_manager()
         
-        # Verificar se o registro existe
-        check_query = "SELECT id FROM client_data WHERE id = ?"
-        existing = db_manager.execute_query(client.database_name, check_query, (data_id,))
-        
-        if not existing:
-            return jsonify({'error': 'Registro não encontrado'}), 404
+        with db_manager.transaction(g.tenant.database_name):
+            # Verificar se o registro existe
+            check_query = "SELECT id FROM client_data WHERE id = ? AND tenant_id IS tenant()"
+            existing = db_manager.execute_query(g.tenant.database_name, check_query, (data_id,))
+            
+            if not existing:
+                return jsonify({'error': 'Registro não encontrado'}), 404
+            
+            # Deletar dados
+            query = "DELETE FROM client_data WHERE id = ? AND tenant_id IS tenant()"
+            db_manager.execute_query(g.tenant.database_name, query, (data_id,))
         
-        # Deletar dados
-        query = "DELETE FROM client_data WHERE id = ?"
-        db_manager.execute_query(client.database_name, query, (data_id,))
+        invalidate_total_count(g.tenant.database_name)
+        publish_change(g.tenant.database_name, 'client_data', 'delete', [data_id])
         
         return jsonify({'message': 'Dados deletados com sucesso'}), 200
         
@@ -157,24 +322,18 @@ def delete_client_data(data_id):
         return jsonify({'error': str(e)}), 500
 
 @client_data_bp.route('/settings', methods=['GET'])
-@jwt_required()
+@tenant_required()
 def get_client_settings():
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        
-        if not user:
-            return jsonify({'error': 'Usuário não encontrado'}), 404
-        
-        client = Client.query.get(user.client_id)
-        if not client:
-            return jsonify({'error': 'Cliente não encontrado'}), 404
-        
         db_manager = get_database_manager()
         
         # Buscar configurações do cliente
-        query = "SELECT * FROM client_settings ORDER BY setting_key"
-        settings = db_manager.execute_query(client.database_name, query)
+        query = """
+            SELECT id, setting_key, setting_value, created_at, updated_at
+            FROM client_settings WHERE tenant_id IS tenant() ORDER BY setting_key
+        """
+        # Linhas já como dict no cursor vão direto para o codificador JSON em raw_settings
+        settings = list(db_manager.iterate_query(g.tenant.database_name, query, row_type='dict'))
         
         # Converter para formato de dicionário
         settings_dict = {setting['setting_key']: setting['setting_value'] for setting in settings}
@@ -188,43 +347,56 @@ def get_client_settings():
         return jsonify({'error': str(e)}), 500
 
 @client_data_bp.route('/settings', methods=['POST'])
-@jwt_required()
+@tenant_required()
 def update_client_settings():
+    """Grava as configurações enviadas em uma única transação
+
+    Chaves com valor null são removidas; as demais são inseridas ou
+    atualizadas (upsert). A resposta informa o resultado de cada chave.
+    """
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        
-        if not user:
-            return jsonify({'error': 'Usuário não encontrado'}), 404
-        
-        client = Client.query.get(user.client_id)
-        if not client:
-            return jsonify({'error': 'Cliente não encontrado'}), 404
-        
         data = request.get_json()
         
-        if not data:
+        if not data or not isinstance(data, dict):
             return jsonify({'error': 'Configurações são obrigatórias'}), 400
         
+        upserts = [(str(key), str(value)) for key, value in data.items() if value is not None]
+        deletes = [(str(key),) for key, value in data.items() if value is None]
+        
         db_manager = get_database_manager()
+        database_name = g.tenant.database_name
         
-        # Atualizar ou inserir configurações
-        for key, value in data.items():
-            # Verificar se a configuração já existe
-            check_query = "SELECT id FROM client_settings WHERE setting_key = ?"
-            existing = db_manager.execute_query(client.database_name, check_query, (key,))
+        with db_manager.transaction(database_name):
+            # Chaves que já existem (uma única consulta para todo o lote)
+            check_query = "SELECT setting_key FROM client_settings WHERE tenant_id IS tenant() AND setting_key IN (SELECT value FROM json_each(?))"
+            existing = {row['setting_key'] for row in db_manager.execute_query(
+                database_name, check_query, (json.dumps(list(map(str, data))),))}
             
-            if existing:
-                # Atualizar
-                update_query = "UPDATE client_settings SET setting_value = ?, updated_at = CURRENT_TIMESTAMP WHERE setting_key = ?"
-                db_manager.execute_query(client.database_name, update_query, (str(value), key))
-            else:
-                # Inserir
-                insert_query = "INSERT INTO client_settings (setting_key, setting_value) VALUES (?, ?)"
-                db_manager.execute_query(client.database_name, insert_query, (key, str(value)))
+            if upserts:
+                upsert_query = """
+                    INSERT INTO client_settings (tenant_id, setting_key, setting_value) VALUES (tenant(), ?, ?)
+                    ON CONFLICT DO UPDATE SET
+                        setting_value = excluded.setting_value,
+                        updated_at = CURRENT_TIMESTAMP
+                """
+                db_manager.execute_many(database_name, upsert_query, upserts)
+            
+            if deletes:
+                delete_query = "DELETE FROM client_settings WHERE setting_key = ? AND tenant_id IS tenant()"
+                db_manager.execute_many(database_name, delete_query, deletes)
+        
+        publish_change(database_name, 'client_settings', 'update')
         
-        return jsonify({'message': 'Configurações atualizadas com sucesso'}), 200
+        results = {}
+        for key, _ in upserts:
+            results[key] = 'updated' if key in existing else 'created'
+        for (key,) in deletes:
+            results[key] = 'deleted' if key in existing else 'not_found'
+        
+        return jsonify({
+            'message': 'Configurações atualizadas com sucesso',
+            'results': results
+        }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
-
@@ -0,0 +1,61 @@
+import time
+from flask import Blueprint, Response, request, jsonify, g, current_app
+from flask_jwt_extended import get_jwt
+from src.models.events import RESYNC, TooManyStreamsError, get_event_broker
+from src.models.tenant_context import tenant_required
+
+events_bp = Blueprint('events', __name__)
+
+def format_event(event):
+    lines = [f'id: {event.id}'] if event.id else []
+    lines += [f'event: {event.type}', f'data: {event.data}']
+    return ('\n'.join(lines) + '\n\n').encode('utf-8')
+
+def stream_events(subscription, replay, heartbeat, deadline, retry_ms):
+    # Sem stream_with_context: a conexão com o banco e o contexto da requisição
+    # são liberados antes do stream, que só espera na fila
+    yield f'retry: {retry_ms}\n\n'.encode('utf-8')
+    if replay is None:
+        yield format_event(RESYNC)
+    else:
+        for event in replay:
+            yield format_event(event)
+
+    while True:
+        remaining = deadline - time.monotonic()
+        if remaining <= 0:
+            return  # o navegador reconecta (com Last-Event-ID)
+        event = subscription.get(min(heartbeat, remaining))
+        # Comentário SSE: mantém proxies abertos e detecta conexões encerradas
+        yield format_event(event) if event is not None else b': ping\n\n'
+
+@events_bp.route('/events', methods=['GET'])
+@tenant_required(locations=['headers', 'query_string'])
+def client_events():
+    """Stream SSE (text/event-stream) com as alterações dos dados do cliente
+
+    Autenticação pelo header Authorization ou por ?jwt= (EventSource não envia
+    headers). Eventos "change" trazem {entity, op, ids}; "resync" indica que
+    eventos podem ter se perdido e os dados devem ser buscados de novo
+    (/api/client/changes). Retoma a partir do header Last-Event-ID.
+    """
+    config = current_app.config
+    broker = get_event_broker()
+    try:
+        subscription, replay = broker.subscribe(g.tenant.database_name, request.headers.get('Last-Event-ID'))
+    except TooManyStreamsError as e:
+        response = jsonify({'error': str(e)})
+        response.headers['Retry-After'] = str(config['EVENTS_RETRY_MS'] // 1000)
+        return response, 503
+
+    # A conexão termina antes de o token expirar; a reconexão exige um token válido
+    lifetime = min(config['EVENTS_MAX_STREAM_SECONDS'], get_jwt()['exp'] - time.time())
+    deadline = time.monotonic() + max(lifetime, 0)
+
+    response = Response(stream_events(subscription, replay, config['EVENTS_HEARTBEAT'], deadline,
+                                      config['EVENTS_RETRY_MS']),
+                        mimetype='text/event-stream')
+    response.headers['Cache-Control'] = 'no-cache'
+    response.headers['X-Accel-Buffering'] = 'no'  # nginx não deve acumular o stream
+    response.call_on_close(lambda: broker.unsubscribe(subscription))
+    return response
@@ -0,0 +1,247 @@
+from flask import Blueprint, request, jsonify, g
+from src.models.database_manager import get_database_manager
+from src.models.tenant_context import tenant_required
+from src.models import composicao
+from src.models.events import publish_change
+import json
+
+insumos_bp = Blueprint('insumos', __name__)
+
+INSUMO_FIELDS = ('nome', 'tipo', 'categoria', 'preco', 'fornecedor', 'estoque')
+INSUMO_NUMERIC_FIELDS = ('preco', 'estoque')
+INSUMO_COLUMNS = ', '.join(('id',) + INSUMO_FIELDS + ('created_at', 'updated_at'))
+
+def parse_insumo(data, partial=False):
+    """Valida os campos de insumo enviados; retorna (campos, erro)"""
+    fields = {field: data[field] for field in INSUMO_FIELDS if field in data}
+
+    if not partial and not fields.get('nome'):
+        return None, 'Nome é obrigatório'
+
+    for field in INSUMO_NUMERIC_FIELDS:
+        if field in fields:
+            try:
+                fields[field] = float(fields[field])
+            except (TypeError, ValueError):
+                return None, f"Campo {field} deve ser numérico"
+            if fields[field] < 0:
+                return None, f"Campo {field} não pode ser negativo"
+
+    return fields, None
+
+@insumos_bp.route('/insumos', methods=['GET'])
+@tenant_required()
+def get_insumos():
+    try:
+        db_manager = get_database_manager()
+
+        query = f"SELECT {INSUMO_COLUMNS} FROM insumos WHERE tenant_id IS tenant() ORDER BY nome"
+        insumos = db_manager.execute_query(g.tenant.database_name, query)
+
+        return jsonify({
+            'insumos': insumos,
+            'total': len(insumos)
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@insumos_bp.route('/insumos', methods=['POST'])
+@tenant_required()
+def create_insumo():
+    try:
+        fields, error = parse_insumo(request.get_json() or {})
+        if error:
+            return jsonify({'error': error}), 400
+
+        db_manager = get_database_manager()
+
+        columns = ', '.join(fields)
+        placeholders = ', '.join('?' for _ in fields)
+        query = f"INSERT INTO insumos (tenant_id, {columns}) VALUES (tenant(), {placeholders})"
+        insumo_id = db_manager.execute_insert(g.tenant.database_name, query, list(fields.values()))
+        publish_change(g.tenant.database_name, 'insumos', 'create', [insumo_id])
+
+        return jsonify({'message': 'Insumo criado com sucesso', 'id': insumo_id}), 201
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@insumos_bp.route('/insumos/<int:insumo_id>', methods=['PUT'])
+@tenant_required()
+def update_insumo(insumo_id):
+    try:
+        fields, error = parse_insumo(request.get_json() or {}, partial=True)
+        if error:
+            return jsonify({'error': error}), 400
+
+        if not fields:
+            return jsonify({'error': 'Dados são obrigatórios'}), 400
+
+        db_manager = get_database_manager()
+        database_name = g.tenant.database_name
+
+        assignments = ', '.join(f"{field} = ?" for field in fields)
+        query = f"UPDATE insumos SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE id = ? AND tenant_id IS tenant()"
+
+        with db_manager.transaction(database_name):
+            updated = db_manager.execute_query(database_name, query, list(fields.values()) + [insumo_id])
+            if not updated:
+                return jsonify({'error': 'Insumo não encontrado'}), 404
+
+            # Só os produtos que usam este insumo são recalculados
+            produtos = 0
+            if 'preco' in fields:
+                produtos = composicao.recalcular_por_insumos(db_manager, database_name, [insumo_id])
+
+        publish_change(database_name, 'insumos', 'update', [insumo_id])
+        if produtos:
+            publish_change(database_name, 'produtos', 'update')
+
+        return jsonify({
+            'message': 'Insumo atualizado com sucesso',
+            'produtos_recalculados': produtos
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@insumos_bp.route('/insumos/<int:insumo_id>', methods=['DELETE'])
+@tenant_required()
+def delete_insumo(insumo_id):
+    try:
+        db_manager = get_database_manager()
+        database_name = g.tenant.database_name
+
+        with db_manager.transaction(database_name):
+            query = "SELECT produto_id FROM produto_insumos WHERE insumo_id = ? AND tenant_id IS tenant()"
+            produto_ids = [row['produto_id'] for row in db_manager.execute_query(database_name, query, (insumo_id,))]
+
+            deleted = db_manager.execute_query(database_name, "DELETE FROM insumos WHERE id = ? AND tenant_id IS tenant()", (insumo_id,))
+            if not deleted:
+                return jsonify({'error': 'Insumo não encontrado'}), 404
+
+            db_manager.execute_query(database_name, "DELETE FROM produto_insumos WHERE insumo_id = ? AND tenant_id IS tenant()", (insumo_id,))
+            produtos = composicao.recalcular_produtos(db_manager, database_name, produto_ids)
+
+        publish_change(database_name, 'insumos', 'delete', [insumo_id])
+        if produtos:
+            publish_change(database_name, 'produtos', 'update', produto_ids)
+
+        return jsonify({
+            'message': 'Insumo deletado com sucesso',
+            'produtos_recalculados': produtos
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@insumos_bp.route('/insumos/importar', methods=['POST'])
+@tenant_required()
+def importar_precos():
+    """Importa a lista de preços de um fornecedor
+
+    Corpo: {"fornecedor": "...", "precos": [{"nome" ou "id": ..., "preco": ...}]}
+    """
+    try:
+        data = request.get_json()
+
+        if not data or not isinstance(data.get('precos'), list):
+            return jsonify({'error': 'Lista de preços é obrigatória'}), 400
+
+        for item in data['precos']:
+            if not isinstance(item, dict) or 'preco' not in item or not ('id' in item or 'nome' in item):
+                return jsonify({'error': 'Cada item deve ter id ou nome e preco'}), 400
+            try:
+                if float(item['preco']) < 0:
+                    raise ValueError
+            except (TypeError, ValueError):
+                return jsonify({'error': 'Preço inválido'}), 400
+            if 'id' in item:
+                try:
+                    item['id'] = int(item['id'])
+                except (TypeError, ValueError):
+                    return jsonify({'error': 'Id de insumo inválido'}), 400
+
+        resultados, produtos = composicao.importar_lista_precos(
+            get_database_manager(), g.tenant.database_name, data.get('fornecedor'), data['precos'])
+        if any(resultado['status'] == 'updated' for resultado in resultados):
+            publish_change(g.tenant.database_name, 'insumos', 'update')
+        if produtos:
+            publish_change(g.tenant.database_name, 'produtos', 'update')
+
+        return jsonify({
+            'message': 'Lista de preços importada com sucesso',
+            'resultados': resultados,
+            'produtos_recalculados': produtos
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@insumos_bp.route('/produtos/<int:produto_id>/insumos', methods=['GET'])
+@tenant_required()
+def get_composicao(produto_id):
+    try:
+        db_manager = get_database_manager()
+
+        query = """
+            SELECT pi.insumo_id, i.nome, i.fornecedor, i.preco, pi.quantidade,
+                   pi.quantidade * i.preco AS custo
+            FROM produto_insumos pi
+            JOIN insumos i ON i.id = pi.insumo_id
+            WHERE pi.produto_id = ? AND pi.tenant_id IS tenant()
+            ORDER BY i.nome
+        """
+        itens = db_manager.execute_query(g.tenant.database_name, query, (produto_id,))
+
+        return jsonify({
+            'insumos': itens,
+            'custo_total': sum(item['custo'] for item in itens)
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@insumos_bp.route('/produtos/<int:produto_id>/insumos', methods=['PUT'])
+@tenant_required()
+def update_composicao(produto_id):
+    """Substitui a composição do produto: [{"insumo_id": ..., "quantidade": ...}]"""
+    try:
+        data = request.get_json()
+
+        if not isinstance(data, list):
+            return jsonify({'error': 'Lista de insumos é obrigatória'}), 400
+
+        try:
+            itens = [(int(item['insumo_id']), float(item['quantidade'])) for item in data]
+        except (KeyError, TypeError, ValueError):
+            return jsonify({'error': 'Cada item deve ter insumo_id e quantidade numéricos'}), 400
+
+        if any(quantidade <= 0 for _, quantidade in itens):
+            return jsonify({'error': 'Quantidade deve ser positiva'}), 400
+
+        insumo_ids = {insumo_id for insumo_id, _ in itens}
+        if len(insumo_ids) != len(itens):
+            return jsonify({'error': 'Insumo repetido na composição'}), 400
+
+        db_manager = get_database_manager()
+        database_name = g.tenant.database_name
+
+        with db_manager.transaction(database_name):
+            if not db_manager.execute_query(database_name, "SELECT id FROM produtos WHERE id = ? AND tenant_id IS tenant()", (produto_id,)):
+                return jsonify({'error': 'Produto não encontrado'}), 404
+
+            query = "SELECT COUNT(*) AS total FROM insumos WHERE tenant_id IS tenant() AND id IN (SELECT value FROM json_each(?))"
+            encontrados = db_manager.execute_query(database_name, query, (json.dumps(list(insumo_ids)),))
+            if encontrados[0]['total'] != len(insumo_ids):
+                return jsonify({'error': 'Insumo não encontrado'}), 404
+
+            composicao.definir_composicao(db_manager, database_name, produto_id, itens)
+
+        publish_change(database_name, 'produtos', 'update', [produto_id])
+
+        return jsonify({'message': 'Composição atualizada com sucesso'}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
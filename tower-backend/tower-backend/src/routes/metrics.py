@@ -0,0 +1,45 @@
+import hmac
+from flask import Blueprint, Response, current_app, request, jsonify
+from src.models.database_manager import connection_cache
+from src.models.metrics import get_metrics
+from src.models.tenant_pool import get_tenant_pool
+from src.routes.sintese import sintese_cache
+
+metrics_bp = Blueprint('metrics', __name__)
+
+@metrics_bp.route('/metrics', methods=['GET'])
+def get_prometheus_metrics():
+    """Métricas deste processo no formato texto do Prometheus
+
+    Exige Authorization: Bearer <METRICS_TOKEN>; sem token configurado só
+    responde com METRICS_PUBLIC ligado.
+    """
+    try:
+        token = current_app.config.get('METRICS_TOKEN')
+        if token:
+            if not hmac.compare_digest(request.headers.get('Authorization', ''), f'Bearer {token}'):
+                return jsonify({'error': 'Não autorizado'}), 401
+        elif not current_app.config.get('METRICS_PUBLIC'):
+            return jsonify({'error': 'Métricas desabilitadas: configure METRICS_TOKEN ou METRICS_PUBLIC'}), 403
+
+        cache = connection_cache.stats()
+        sintese = sintese_cache.stats()
+        gauges = {
+            'tenant_db_connections_open': ('Conexões abertas com bancos de clientes', cache['open']),
+            'tenant_db_connections_idle': ('Conexões ociosas no cache', cache['idle']),
+            'tenant_db_connections_checked_out': ('Conexões em uso', cache['checked_out']),
+            'tenant_db_pool_ready': ('Bancos prontos no pool de cadastro', get_tenant_pool().stats()['ready']),
+            'sintese_cache_bytes': ('Bytes no cache de /api/sintese', sintese['bytes']),
+            'app_startup_seconds': ('Duração de create_app() neste processo',
+                                    current_app.extensions['startup_seconds']),
+        }
+
+        counters = {
+            'sintese_cache_hits_total': ('Acertos do cache de /api/sintese', sintese['hits']),
+            'sintese_cache_misses_total': ('Faltas do cache de /api/sintese', sintese['misses']),
+        }
+
+        return Response(get_metrics().render(gauges, counters), mimetype='text/plain; version=0.0.4')
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
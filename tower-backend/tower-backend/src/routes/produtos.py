@@ -0,0 +1,249 @@
+from flask import Blueprint, request, jsonify, g
+from src.models.database_manager import get_database_manager
+from src.models.tenant_context import tenant_required
+from src.models.events import publish_change
+import sqlite3
+import time
+
+produtos_bp = Blueprint('produtos', __name__)
+
+PRODUTO_FIELDS = ('codigo', 'descricao', 'tipo', 'categoria', 'unidade',
+                  'qtd_embalagem', 'custo_embalagem', 'custo_unitario', 'preco')
+PRODUTO_NUMERIC_FIELDS = ('qtd_embalagem', 'custo_embalagem', 'custo_unitario', 'preco')
+PRODUTO_COLUMNS = ', '.join(('id',) + PRODUTO_FIELDS + ('created_at', 'updated_at'))
+
+def parse_produto(data, partial=False):
+    """Valida os campos de produto enviados; retorna (campos, erro)"""
+    fields = {field: data[field] for field in PRODUTO_FIELDS if field in data}
+
+    if not partial:
+        missing = [field for field in ('codigo', 'descricao', 'categoria') if not fields.get(field)]
+        if missing:
+            return None, f"Campos obrigatórios: {', '.join(missing)}"
+
+    for field in PRODUTO_NUMERIC_FIELDS:
+        if field in fields:
+            try:
+                fields[field] = float(fields[field])
+            except (TypeError, ValueError):
+                return None, f"Campo {field} deve ser numérico"
+            if fields[field] < 0:
+                return None, f"Campo {field} não pode ser negativo"
+
+    # Custo unitário derivado da embalagem quando não informado
+    if 'custo_unitario' not in fields and 'custo_embalagem' in fields and fields.get('qtd_embalagem'):
+        fields['custo_unitario'] = fields['custo_embalagem'] / fields['qtd_embalagem']
+
+    return fields, None
+
+@produtos_bp.route('/produtos', methods=['GET'])
+@tenant_required()
+def get_produtos():
+    try:
+        db_manager = get_database_manager()
+
+        categoria = request.args.get('categoria')
+        if categoria:
+            query = f"SELECT {PRODUTO_COLUMNS} FROM produtos WHERE tenant_id IS tenant() AND categoria = ? ORDER BY descricao"
+            produtos = db_manager.execute_query(g.tenant.database_name, query, (categoria,))
+        else:
+            query = f"SELECT {PRODUTO_COLUMNS} FROM produtos WHERE tenant_id IS tenant() ORDER BY categoria, descricao"
+            produtos = db_manager.execute_query(g.tenant.database_name, query)
+
+        return jsonify({
+            'produtos': produtos,
+            'total': len(produtos)
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@produtos_bp.route('/produtos', methods=['POST'])
+@tenant_required()
+def create_produto():
+    try:
+        fields, error = parse_produto(request.get_json() or {})
+        if error:
+            return jsonify({'error': error}), 400
+
+        db_manager = get_database_manager()
+
+        columns = ', '.join(fields)
+        placeholders = ', '.join('?' for _ in fields)
+        query = f"INSERT INTO produtos (tenant_id, {columns}) VALUES (tenant(), {placeholders})"
+        produto_id = db_manager.execute_insert(g.tenant.database_name, query, list(fields.values()))
+        publish_change(g.tenant.database_name, 'produtos', 'create', [produto_id])
+
+        return jsonify({'message': 'Produto criado com sucesso', 'id': produto_id}), 201
+
+    except sqlite3.IntegrityError:
+        return jsonify({'error': 'Código de produto já cadastrado'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@produtos_bp.route('/produtos/<int:produto_id>', methods=['PUT'])
+@tenant_required()
+def update_produto(produto_id):
+    try:
+        fields, error = parse_produto(request.get_json() or {}, partial=True)
+        if error:
+            return jsonify({'error': error}), 400
+
+        if not fields:
+            return jsonify({'error': 'Dados são obrigatórios'}), 400
+
+        db_manager = get_database_manager()
+
+        assignments = ', '.join(f"{field} = ?" for field in fields)
+        query = f"UPDATE produtos SET {assignments}, updated_at = CURRENT_TIMESTAMP WHERE id = ? AND tenant_id IS tenant()"
+        updated = db_manager.execute_query(g.tenant.database_name, query, list(fields.values()) + [produto_id])
+
+        if not updated:
+            return jsonify({'error': 'Produto não encontrado'}), 404
+        publish_change(g.tenant.database_name, 'produtos', 'update', [produto_id])
+
+        return jsonify({'message': 'Produto atualizado com sucesso'}), 200
+
+    except sqlite3.IntegrityError:
+        return jsonify({'error': 'Código de produto já cadastrado'}), 400
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@produtos_bp.route('/produtos/<int:produto_id>', methods=['DELETE'])
+@tenant_required()
+def delete_produto(produto_id):
+    try:
+        db_manager = get_database_manager()
+
+        # As vendas do produto são removidas pelo trigger de produtos
+        query = "DELETE FROM produtos WHERE id = ? AND tenant_id IS tenant()"
+        deleted = db_manager.execute_query(g.tenant.database_name, query, (produto_id,))
+
+        if not deleted:
+            return jsonify({'error': 'Produto não encontrado'}), 404
+        publish_change(g.tenant.database_name, 'produtos', 'delete', [produto_id])
+
+        return jsonify({'message': 'Produto deletado com sucesso'}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@produtos_bp.route('/produtos/precificacao', methods=['POST'])
+@tenant_required()
+def precificar_produtos():
+    """Reprecifica o catálogo inteiro de forma vetorizada
+
+    Corpo (todos opcionais): ajustes = [{campo, percentual, categoria}],
+    margem_alvo (percentual sobre o preço), categorias (limita a margem alvo),
+    recalcular_custo (deriva o custo unitário da embalagem em todos os produtos
+    sem composição) e aplicar (grava o resultado; padrão false = apenas simulação).
+    """
+    # numpy só é importado quando a reprecificação é usada
+    from src.models import precificacao
+
+    try:
+        data = request.get_json() or {}
+        ajustes = data.get('ajustes') or []
+        aplicar = bool(data.get('aplicar', False))
+
+        if not isinstance(ajustes, list) or not all(
+                isinstance(ajuste, dict) and 'campo' in ajuste and 'percentual' in ajuste for ajuste in ajustes):
+            return jsonify({'error': 'Ajustes devem ter campo e percentual'}), 400
+
+        db_manager = get_database_manager()
+        database_name = g.tenant.database_name
+
+        # Leitura, cálculo e gravação na mesma transação para não sobrescrever escritas concorrentes
+        with db_manager.transaction(database_name):
+            inicio = time.perf_counter()
+            original = precificacao.carregar_catalogo(db_manager, database_name)
+            carregado = time.perf_counter()
+
+            try:
+                cenario = original.copy()
+                precificacao.aplicar_ajustes(cenario, ajustes)
+                precificacao.recalcular(cenario, data.get('margem_alvo'), data.get('categorias'),
+                                        bool(data.get('recalcular_custo', False)))
+            except (TypeError, ValueError) as e:
+                return jsonify({'error': str(e)}), 400
+
+            alterados = precificacao.produtos_alterados(original, cenario)
+            calculado = time.perf_counter()
+
+            if aplicar and len(alterados):
+                precificacao.salvar(db_manager, database_name, cenario, alterados)
+
+        if aplicar and len(alterados):
+            publish_change(database_name, 'produtos', 'update')
+
+        return jsonify({
+            'produtos': len(original),
+            'produtos_alterados': len(alterados),
+            'aplicado': aplicar,
+            'categorias_antes': precificacao.agregados_por_categoria(original),
+            'categorias_depois': precificacao.agregados_por_categoria(cenario),
+            'tempo_carga_ms': round((carregado - inicio) * 1000, 2),
+            'tempo_calculo_ms': round((calculado - carregado) * 1000, 2)
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@produtos_bp.route('/vendas', methods=['POST'])
+@tenant_required()
+def create_venda():
+    try:
+        data = request.get_json()
+
+        if not data or not all(k in data for k in ('produto_id', 'quantidade')):
+            return jsonify({'error': 'Produto e quantidade são obrigatórios'}), 400
+
+        try:
+            quantidade = float(data['quantidade'])
+            preco_unitario = float(data['preco_unitario']) if data.get('preco_unitario') is not None else None
+        except (TypeError, ValueError):
+            return jsonify({'error': 'Quantidade e preço devem ser numéricos'}), 400
+
+        if quantidade <= 0:
+            return jsonify({'error': 'Quantidade deve ser positiva'}), 400
+
+        db_manager = get_database_manager()
+        database_name = g.tenant.database_name
+
+        with db_manager.transaction(database_name):
+            check_query = "SELECT preco FROM produtos WHERE id = ? AND tenant_id IS tenant()"
+            produto = db_manager.execute_query(database_name, check_query, (data['produto_id'],))
+            if not produto:
+                return jsonify({'error': 'Produto não encontrado'}), 404
+
+            # Sem preço informado, a venda usa o preço atual do produto
+            if preco_unitario is None:
+                preco_unitario = produto[0]['preco']
+
+            query = "INSERT INTO vendas (tenant_id, produto_id, quantidade, preco_unitario) VALUES (tenant(), ?, ?, ?)"
+            venda_id = db_manager.execute_insert(database_name, query, (data['produto_id'], quantidade, preco_unitario))
+
+        publish_change(database_name, 'vendas', 'create', [venda_id])
+
+        return jsonify({'message': 'Venda registrada com sucesso', 'id': venda_id}), 201
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+@produtos_bp.route('/vendas/<int:venda_id>', methods=['DELETE'])
+@tenant_required()
+def delete_venda(venda_id):
+    try:
+        db_manager = get_database_manager()
+
+        query = "DELETE FROM vendas WHERE id = ? AND tenant_id IS tenant()"
+        deleted = db_manager.execute_query(g.tenant.database_name, query, (venda_id,))
+
+        if not deleted:
+            return jsonify({'error': 'Venda não encontrada'}), 404
+        publish_change(g.tenant.database_name, 'vendas', 'delete', [venda_id])
+
+        return jsonify({'message': 'Venda deletada com sucesso'}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
@@ -1,11 +1,11 @@
-from flask import Blueprint, request, jsonify, current_app, url_for
-from flask_jwt_extended import jwt_required, get_jwt_identity
+from flask import Blueprint, request, jsonify, current_app, url_for, g, send_file
 from werkzeug.utils import secure_filename
 from src.models.user import db, User
-from src.models.client import Client
+from src.models.tenant_context import tenant_required
+from src.models.image_pipeline import get_image_pipeline, STATUS_READY
+from src.models.password_hasher import PasswordHasherBusy
 import os
-import uuid
-from PIL import Image
+import mimetypes
 
 profile_bp = Blueprint('profile', __name__)
 
@@ -14,38 +14,38 @@ ALLOWED_EXTENSIONS = {'png', 'jpg', 'jpeg', 'gif'}
 def allowed_file(filename):
     return '.' in filename and filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
 
-def resize_image(image_path, max_size=(300, 300)):
-    """Redimensiona a imagem mantendo a proporção"""
-    with Image.open(image_path) as img:
-        img.thumbnail(max_size, Image.Resampling.LANCZOS)
-        img.save(image_path, optimize=True, quality=85)
+def remove_unused_picture(profile_picture):
+    """Remove os arquivos de uma foto que nenhum usuário usa mais
+
+    Uploads idênticos compartilham os mesmos arquivos (hash do conteúdo),
+    então a busca é pelo hash: fotos gravadas antes da extensão canônica
+    podem ter o mesmo hash com extensões diferentes (.jpg e .jpeg).
+    """
+    if not profile_picture:
+        return
+    filename = os.path.basename(profile_picture)
+    digest = filename.rsplit('.', 1)[0]
+    if User.query.filter(User.profile_picture.like(f'%/{digest}.%')).count():
+        return
+    get_image_pipeline().remove(filename)
 
 @profile_bp.route('/', methods=['GET'])
-@jwt_required()
+@tenant_required(require_client=False)
 def get_profile():
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
-        
-        if not user:
-            return jsonify({'error': 'Usuário não encontrado'}), 404
-        
-        client = Client.query.get(user.client_id)
-        
         return jsonify({
-            'user': user.to_dict(),
-            'client': client.to_dict() if client else None
+            'user': g.tenant.user_data,
+            'client': g.tenant.client_data
         }), 200
         
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @profile_bp.route('/', methods=['PUT'])
-@jwt_required()
+@tenant_required(require_client=False)
 def update_profile():
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = g.tenant.user
         
         if not user:
             return jsonify({'error': 'Usuário não encontrado'}), 404
@@ -75,11 +75,10 @@ def update_profile():
         return jsonify({'error': str(e)}), 500
 
 @profile_bp.route('/upload-picture', methods=['POST'])
-@jwt_required()
+@tenant_required(require_client=False)
 def upload_profile_picture():
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = g.tenant.user
         
         if not user:
             return jsonify({'error': 'Usuário não encontrado'}), 404
@@ -93,34 +92,32 @@ def upload_profile_picture():
             return jsonify({'error': 'Nenhum arquivo selecionado'}), 400
         
         if file and allowed_file(file.filename):
-            # Gerar nome único para o arquivo
-            filename = secure_filename(file.filename)
-            file_extension = filename.rsplit('.', 1)[1].lower()
-            unique_filename = f"{uuid.uuid4()}.{file_extension}"
-            
-            # Salvar arquivo
-            file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], unique_filename)
-            file.save(file_path)
-            
-            # Redimensionar imagem
-            resize_image(file_path)
-            
-            # Remover foto anterior se existir
-            if user.profile_picture:
-                old_file_path = os.path.join(current_app.config['UPLOAD_FOLDER'], 
-                                           os.path.basename(user.profile_picture))
-                if os.path.exists(old_file_path):
-                    os.remove(old_file_path)
-            
-            # Atualizar usuário
-            user.profile_picture = f"/api/profile/picture/{unique_filename}"
+            pipeline = get_image_pipeline()
+
+            # Grava o original; as variantes são geradas em segundo plano
+            try:
+                original_name = pipeline.store_upload(file.stream)
+            except ValueError as e:
+                return jsonify({'error': str(e)}), 400
+
+            try:
+                status = pipeline.submit(original_name)
+            except RuntimeError as e:
+                return jsonify({'error': str(e)}), 503, {'Retry-After': '5'}
+
+            old_picture = user.profile_picture
+            user.profile_picture = f"/api/profile/picture/{original_name}"
             db.session.commit()
-            
+
+            if old_picture and old_picture != user.profile_picture:
+                remove_unused_picture(old_picture)
+
             return jsonify({
                 'message': 'Foto de perfil atualizada com sucesso',
                 'profile_picture': user.profile_picture,
+                'profile_picture_status': status,
                 'user': user.to_dict()
-            }), 200
+            }), 202 if status != STATUS_READY else 200
         
         return jsonify({'error': 'Tipo de arquivo não permitido'}), 400
         
@@ -128,20 +125,100 @@ def upload_profile_picture():
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
 
+@profile_bp.route('/picture/status', methods=['GET'])
+@tenant_required(require_client=False)
+def get_profile_picture_status():
+    """Status do processamento da foto de perfil atual"""
+    try:
+        profile_picture = g.tenant.user_data.get('profile_picture')
+        if not profile_picture:
+            return jsonify({'profile_picture': None, 'status': None}), 200
+
+        pipeline = get_image_pipeline()
+        filename = os.path.basename(profile_picture)
+        manifest = pipeline.manifest(filename.rsplit('.', 1)[0])
+
+        # Se o processamento foi interrompido (ex.: reinício), agenda de novo
+        if manifest is None and os.path.exists(os.path.join(pipeline.originals_folder, filename)):
+            pipeline.submit(filename)
+
+        return jsonify({
+            'profile_picture': profile_picture,
+            'status': manifest['status'] if manifest else 'processing',
+            'variants': manifest.get('variants', {}) if manifest else {}
+        }), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def send_picture(picture):
+    """Resposta da foto com ETag forte e cache imutável (nomes derivados do conteúdo)
+
+    Com USE_X_SENDFILE o envio do arquivo fica com o servidor web (Apache/lighttpd);
+    com PROFILE_PICTURE_ACCEL_REDIRECT (prefixo de um location interno do nginx
+    apontando para UPLOAD_FOLDER) a resposta leva só o X-Accel-Redirect.
+    """
+    pipeline = get_image_pipeline()
+    accel_prefix = current_app.config.get('PROFILE_PICTURE_ACCEL_REDIRECT')
+
+    if accel_prefix:
+        relative_path = os.path.relpath(picture.path, pipeline.upload_folder).replace(os.sep, '/')
+        response = current_app.response_class(mimetype=mimetypes.guess_type(picture.path)[0])
+        response.headers['X-Accel-Redirect'] = accel_prefix.rstrip('/') + '/' + relative_path
+    else:
+        response = send_file(picture.path, etag=False, conditional=False)
+
+    set_picture_headers(response, picture)
+    return response.make_conditional(request)
+
+def set_picture_headers(response, picture):
+    response.set_etag(picture.etag)
+    response.cache_control.public = True
+    if picture.immutable:
+        response.cache_control.no_cache = None
+        response.cache_control.max_age = current_app.config.get('PROFILE_PICTURE_MAX_AGE', 31536000)
+        response.cache_control.immutable = True
+    else:
+        response.cache_control.no_cache = True
+    if picture.negotiated:
+        response.vary.add('Accept')
+
 @profile_bp.route('/picture/<filename>')
 def get_profile_picture(filename):
-    """Serve as fotos de perfil"""
+    """Serve as fotos de perfil
+
+    Sem ?size= serve a variante padrão (WebP quando aceito); com ?size=N serve
+    a variante pronta do pipeline ou gera uma sob demanda no cache em disco.
+    """
     try:
-        return current_app.send_static_file(f'uploads/{filename}')
+        pipeline = get_image_pipeline()
+        accepts_webp = 'image/webp' in request.accept_mimetypes.values()
+
+        try:
+            picture = pipeline.resolve(secure_filename(filename), request.args.get('size', type=int), accepts_webp)
+        except ValueError as e:
+            return jsonify({'error': str(e)}), 400
+
+        if picture is None:
+            return jsonify({'error': 'Imagem não encontrada'}), 404
+
+        # O ETag é o nome do arquivo: revalidações não precisam abrir nem gerar nada
+        if request.if_none_match.contains(picture.etag):
+            response = current_app.response_class(status=304)
+            set_picture_headers(response, picture)
+            return response
+
+        pipeline.render(picture)
+        return send_picture(picture)
+
     except Exception as e:
         return jsonify({'error': 'Imagem não encontrada'}), 404
 
 @profile_bp.route('/change-password', methods=['POST'])
-@jwt_required()
+@tenant_required(require_client=False)
 def change_password():
     try:
-        current_user_id = get_jwt_identity()
-        user = User.query.get(current_user_id)
+        user = g.tenant.user
         
         if not user:
             return jsonify({'error': 'Usuário não encontrado'}), 404
@@ -164,6 +241,9 @@ def change_password():
         
         return jsonify({'message': 'Senha alterada com sucesso'}), 200
         
+    except PasswordHasherBusy as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 503, {'Retry-After': '1'}
     except Exception as e:
         db.session.rollback()
         return jsonify({'error': str(e)}), 500
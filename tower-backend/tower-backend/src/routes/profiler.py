@@ -0,0 +1,70 @@
+from functools import wraps
+from flask import Blueprint, Response, request, jsonify, send_file
+from src.models.profiler import get_profiler
+
+profiler_bp = Blueprint('profiler', __name__)
+
+MIMETYPES = {
+    'json': 'application/json',
+    'collapsed': 'text/plain; charset=utf-8',
+    'pstats': 'application/octet-stream',
+}
+
+
+def profiler_token_required(fn):
+    """Exige Authorization: Bearer <PROFILING_TOKEN> (sem token configurado tudo é recusado)"""
+    @wraps(fn)
+    def wrapper(*args, **kwargs):
+        header = request.headers.get('Authorization', '')
+        token = header[len('Bearer '):] if header.startswith('Bearer ') else None
+        if not get_profiler().authorized(token):
+            return jsonify({'error': 'Não autorizado'}), 401
+        return fn(*args, **kwargs)
+    return wrapper
+
+
+@profiler_bp.route('/profiles', methods=['GET'])
+@profiler_token_required
+def list_profiles():
+    """Perfis guardados, mais recentes primeiro (filtros ?blueprint= e ?endpoint=)"""
+    try:
+        profiles = get_profiler().store.list(
+            blueprint=request.args.get('blueprint'), endpoint=request.args.get('endpoint'))
+        return jsonify({'profiles': profiles, 'count': len(profiles)}), 200
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@profiler_bp.route('/profiles/<profile_id>.<kind>', methods=['GET'])
+@profiler_token_required
+def download_profile(profile_id, kind):
+    """Arquivo de um perfil: .json, .collapsed ou .pstats (abrir com pstats/snakeviz)"""
+    try:
+        path = get_profiler().store.path(profile_id, kind)
+        if path is None:
+            return jsonify({'error': 'Perfil não encontrado'}), 404
+
+        return send_file(path, mimetype=MIMETYPES[kind], as_attachment=kind != 'json',
+                         download_name=f'{profile_id}.{kind}', max_age=0)
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+
+@profiler_bp.route('/profiles/aggregate/<blueprint>', methods=['GET'])
+@profiler_token_required
+def aggregate_profiles(blueprint):
+    """Pilhas somadas de todos os perfis guardados do blueprint, prontas para o flamegraph.pl
+
+    ?endpoint= restringe a um endpoint.
+    """
+    try:
+        totals, profiles = get_profiler().store.aggregate(blueprint, endpoint=request.args.get('endpoint'))
+        body = ''.join(f'{stack} {count}\n' for stack, count in totals.most_common())
+        response = Response(body, mimetype='text/plain')
+        response.headers['X-Profile-Count'] = str(profiles)
+        return response
+
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
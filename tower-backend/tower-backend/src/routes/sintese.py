@@ -1,66 +1,40 @@
-from flask import Blueprint, jsonify
+from flask import Blueprint, current_app, jsonify, g, request
+from src.models.database_manager import get_database_manager
+from src.models.response_cache import ResponseCache
+from src.models.sintese import build_sintese
+from src.models.tenant_context import tenant_required
 
 sintese_bp = Blueprint("sintese", __name__)
 
+SINTESE_CACHE_MAX_BYTES = 32 * 1024 * 1024
+
+# Respostas de /api/sintese por cliente, válidas enquanto a versão dos dados não mudar
+sintese_cache = ResponseCache(SINTESE_CACHE_MAX_BYTES)
+
 @sintese_bp.route("/sintese", methods=["GET"])
+@tenant_required()
 def get_sintese():
-    # Exemplo de dados simulados (depois você pode puxar do banco)
-    dados = {
-        "total_vendas": 125000,
-        "categorias_ativas": 3,
-        "categorias": [
-            {
-                "nome": "Eletrônicos",
-                "produtos": [
-                    {
-                        "nome": "Notebook Gamer",
-                        "custo": 3500,
-                        "preco": 5000,
-                        "margem": "30%",
-                        "desempenho": "Alto",
-                        "vendas": 120,
-                        "total_vendas": 600000
-                    },
-                    {
-                        "nome": "Smartphone X",
-                        "custo": 1500,
-                        "preco": 2500,
-                        "margem": "40%",
-                        "desempenho": "Médio",
-                        "vendas": 300,
-                        "total_vendas": 750000
-                    }
-                ]
-            },
-            {
-                "nome": "Eletrodomésticos",
-                "produtos": [
-                    {
-                        "nome": "Geladeira",
-                        "custo": 2000,
-                        "preco": 3200,
-                        "margem": "35%",
-                        "desempenho": "Alto",
-                        "vendas": 80,
-                        "total_vendas": 256000
-                    }
-                ]
-            },
-            {
-                "nome": "Móveis",
-                "produtos": [
-                    {
-                        "nome": "Sofá 3 lugares",
-                        "custo": 900,
-                        "preco": 1500,
-                        "margem": "40%",
-                        "desempenho": "Baixo",
-                        "vendas": 45,
-                        "total_vendas": 67500
-                    }
-                ]
-            }
-        ]
-    }
+    try:
+        db_manager = get_database_manager()
+        database_name = g.tenant.database_name
+
+        # A versão é obtida sem abrir o banco; com cache válido o banco não é tocado
+        version = db_manager.data_version(database_name)
+        entry = sintese_cache.get(database_name, version)
+        cache_status = "HIT"
+
+        if entry is None:
+            # Lê apenas as tabelas de síntese, mantidas pelos triggers de produtos/vendas
+            dados = build_sintese(db_manager, database_name)
+            body = current_app.json.dumps_bytes(dados)
+            entry = sintese_cache.put(database_name, version, body)
+            cache_status = "MISS"
+
+        response = current_app.response_class(entry.body, mimetype="application/json")
+        response.set_etag(entry.etag)
+        response.headers["Cache-Control"] = "private, no-cache"
+        response.headers["X-Cache"] = cache_status
+        return response.make_conditional(request)
 
-    return jsonify(dados)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 500
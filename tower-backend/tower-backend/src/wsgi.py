@@ -0,0 +1,36 @@
+"""Entrada de produção: gunicorn -c gunicorn.conf.py src.wsgi:app
+
+Com preload_app (gunicorn.conf.py) a aplicação e as dependências pesadas são
+carregadas uma vez no processo master e compartilhadas pelos workers no fork;
+cada worker então abre as próprias conexões em warm_up_worker(). O schema
+não é criado aqui: rode `flask --app src.main migrate` antes de subir.
+"""
+import time
+from src.main import create_app
+from src.models.user import db
+
+
+def preload_dependencies():
+    """Importa já as dependências que a aplicação só carrega no primeiro uso"""
+    import bcrypt  # noqa: F401
+    from PIL import Image, ImageOps  # noqa: F401
+    from src.models import precificacao  # noqa: F401 (numpy)
+
+
+def warm_up_worker(app):
+    """Prepara um worker recém-criado: conexões do banco principal e dos clientes
+
+    Retorna (segundos, bancos de clientes abertos).
+    """
+    started = time.perf_counter()
+    with app.app_context():
+        # Conexões herdadas do master não podem ser usadas por outro processo
+        db.engine.dispose(close=False)
+        with db.engine.connect() as conn:
+            conn.exec_driver_sql('SELECT 1')
+        opened = app.extensions['database_manager'].warm_up(app.config.get('TENANT_DB_WARMUP', 8))
+    return time.perf_counter() - started, opened
+
+
+app = create_app()
+preload_dependencies()
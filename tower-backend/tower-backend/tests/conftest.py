@@ -0,0 +1,70 @@
+import itertools
+import pytest
+from src.main import create_app
+from src.models.database_manager import connection_cache
+from src.models.tenant_context import tenant_cache
+
+_emails = itertools.count()
+
+
+@pytest.fixture
+def storage():
+    """Armazenamento dos clientes novos; parametrize com 'shared' para o banco único"""
+    return 'file'
+
+
+@pytest.fixture
+def make_app(tmp_path, storage):
+    """Cria aplicações isoladas em tmp_path (banco principal, clientes e uploads)"""
+    def factory(**config):
+        settings = {
+            'TESTING': True,
+            'INSTANCE_PATH': str(tmp_path / 'instance'),
+            'SQLALCHEMY_DATABASE_URI': f"sqlite:///{tmp_path / 'app.db'}",
+            'UPLOAD_FOLDER': str(tmp_path / 'uploads'),
+            'AUTO_MIGRATE': True,
+            'TENANT_STORAGE_DEFAULT': storage,
+            'TENANT_DB_POOL_SIZE': 0,
+            'TENANT_DB_WARMUP': 0,
+            'BCRYPT_LOG_ROUNDS': 4,
+            'EVENTS_BROKER': 'memory',
+            'STARTUP_BUDGET_MS': 60000,
+        }
+        settings.update(config)
+        return create_app(settings)
+
+    yield factory
+    # Cache de conexões e de usuários são do processo: nada passa para o próximo teste
+    tenant_cache.clear()
+    connection_cache.close_all()
+
+
+@pytest.fixture
+def app(make_app):
+    return make_app()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def register(client):
+    """Cadastra um usuário com cliente novo; retorna (headers, corpo da resposta)"""
+    def factory(**fields):
+        number = next(_emails)
+        data = {
+            'username': f'user{number}',
+            'email': f'user{number}@example.com',
+            'password': 'secret',
+            'client_name': f'Cliente {number}',
+            'client_email': f'client{number}@example.com',
+        }
+        data.update(fields)
+        response = client.post('/api/auth/register', json=data)
+        assert response.status_code == 201, response.get_json()
+        body = response.get_json()
+        return {'Authorization': f"Bearer {body['access_token']}"}, body
+
+    return factory
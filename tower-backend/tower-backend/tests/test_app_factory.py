@@ -0,0 +1,87 @@
+import json
+import logging
+import os
+import sqlite3
+import pytest
+from click.testing import CliRunner
+from benchmarks.cold_start import main as cold_start
+from src.models.tenant_migrations import LATEST_VERSION
+
+
+def main_tables(tmp_path):
+    path = tmp_path / 'app.db'
+    if not path.exists():
+        return set()
+    conn = sqlite3.connect(path)
+    try:
+        return {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type IN ('table', 'index')")}
+    finally:
+        conn.close()
+
+
+def test_factory_does_not_create_the_schema(make_app, tmp_path):
+    make_app(AUTO_MIGRATE=False)
+    assert 'users' not in main_tables(tmp_path)
+
+
+@pytest.mark.parametrize('storage', ['file', 'shared'])
+def test_migrate_prepares_the_databases(make_app, tmp_path, storage):
+    app = make_app(AUTO_MIGRATE=False)
+    result = app.test_cli_runner().invoke(args=['migrate'])
+    assert result.exit_code == 0, result.output
+    assert 'Banco principal atualizado' in result.output
+    assert {'users', 'clients', 'ix_users_email'} <= main_tables(tmp_path)
+
+    db_manager = app.extensions['database_manager']
+    assert os.path.exists(app.extensions['tenant_pool'].template_path)
+    assert os.path.exists(db_manager.storages['shared'].path) == (storage == 'shared')
+
+    response = app.test_client().post('/api/auth/register', json={
+        'username': 'u', 'email': 'migrate@example.com', 'password': 'p',
+        'client_name': 'c', 'client_email': 'migrate-client@example.com'})
+    assert response.status_code == 201
+
+
+def test_migrate_also_updates_tenant_databases(app, register):
+    _, body = register()
+    with app.app_context():
+        path = app.extensions['database_manager'].get_client_database_path(body['client']['database_name'])
+    app.extensions['database_manager'].cache.close_path(path)
+    # Banco parado na versão anterior à última migração
+    conn = sqlite3.connect(path)
+    conn.execute('DROP INDEX idx_sintese_produto_ranking')
+    conn.execute(f'PRAGMA user_version = {LATEST_VERSION - 1}')
+    conn.close()
+
+    result = app.test_cli_runner().invoke(args=['migrate', '--workers', '1'])
+    assert result.exit_code == 0, result.output
+    conn = sqlite3.connect(path)
+    try:
+        assert conn.execute('PRAGMA user_version').fetchone()[0] == LATEST_VERSION
+        assert conn.execute("SELECT 1 FROM sqlite_master WHERE name = 'idx_sintese_produto_ranking'").fetchone()
+    finally:
+        conn.close()
+
+    skipped = app.test_cli_runner().invoke(args=['migrate', '--no-tenants'])
+    assert skipped.output.strip() == 'Banco principal atualizado'
+
+
+def test_requests_without_a_schema_fail_cleanly(make_app):
+    client = make_app(AUTO_MIGRATE=False).test_client()
+    response = client.post('/api/auth/login', json={'email': 'a@example.com', 'password': 'x'})
+    assert response.status_code == 500
+    assert 'no such table' in response.get_json()['error']
+
+
+def test_startup_over_budget_is_logged(make_app, caplog):
+    with caplog.at_level(logging.WARNING):
+        app = make_app(STARTUP_BUDGET_MS=0)
+    assert app.extensions['startup_seconds'] > 0
+    assert any('Inicialização levou' in record.getMessage() for record in caplog.records)
+
+
+def test_cold_start_does_not_load_lazy_dependencies(tmp_path):
+    output = tmp_path / 'cold_start.json'
+    result = CliRunner().invoke(cold_start, ['--runs', '1', '--budget-ms', '60000', '--output', str(output)])
+    assert result.exit_code == 0, result.output
+    assert json.loads(output.read_text())['loaded_lazy_modules'] == []
@@ -0,0 +1,86 @@
+import pytest
+from sqlalchemy import text
+from src.models.client import Client
+from src.models.password_hasher import PasswordHasher, PasswordHasherBusy
+from src.models.user import db, User
+
+
+def login(client, email, password='secret'):
+    return client.post('/api/auth/login', json={'email': email, 'password': password})
+
+
+def stored_hash(app, email):
+    with app.app_context():
+        return User.query.filter_by(email=email).one().password_hash
+
+
+def test_login_returns_a_token(client, register):
+    _, body = register()
+    response = login(client, body['user']['email'])
+    assert response.status_code == 200
+    token = response.get_json()['access_token']
+    me = client.get('/api/auth/me', headers={'Authorization': f'Bearer {token}'})
+    assert me.get_json()['user']['id'] == body['user']['id']
+
+
+@pytest.mark.parametrize('email, password', [('user@example.com', 'errada'), ('ninguem@example.com', 'secret')])
+def test_wrong_credentials_are_rejected(client, register, email, password):
+    register(email='user@example.com')
+    response = login(client, email, password)
+    assert response.status_code == 401
+    assert response.get_json() == {'error': 'Credenciais inválidas'}
+
+
+def test_hash_is_rewritten_when_the_work_factor_changes(make_app, register):
+    _, body = register()
+    email = body['user']['email']
+
+    app = make_app(BCRYPT_LOG_ROUNDS=5)
+    assert stored_hash(app, email).startswith('$2b$04$')
+    assert login(app.test_client(), email).status_code == 200
+    assert stored_hash(app, email).startswith('$2b$05$')
+
+    # Hash já no custo atual não é regravado
+    rewritten = stored_hash(app, email)
+    assert login(app.test_client(), email).status_code == 200
+    assert stored_hash(app, email) == rewritten
+
+
+def test_inactive_client_cannot_log_in(app, client, register):
+    _, body = register()
+    with app.app_context():
+        db.session.get(Client, body['client']['id']).is_active = False
+        db.session.commit()
+
+    response = login(client, body['user']['email'])
+    assert response.status_code == 401
+    assert response.get_json() == {'error': 'Cliente inativo'}
+
+
+def test_full_hasher_queue_answers_503(make_app, register):
+    _, body = register()
+    app = make_app(BCRYPT_MAX_CONCURRENCY=1, BCRYPT_MAX_PENDING=0, BCRYPT_QUEUE_TIMEOUT=0.01)
+    app.extensions['password_hasher']._slots.acquire()
+
+    response = login(app.test_client(), body['user']['email'])
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '1'
+
+
+def test_hasher_limits_concurrent_work():
+    hasher = PasswordHasher(rounds=4, max_workers=1, max_pending=0, queue_timeout=0.01)
+    password_hash = hasher.hash('secret')
+    assert hasher.verify('secret', password_hash)
+    assert not hasher.needs_rehash(password_hash)
+    assert hasher.needs_rehash('sem-custo')
+
+    hasher._slots.acquire()
+    with pytest.raises(PasswordHasherBusy):
+        hasher.verify('secret', password_hash)
+
+
+def test_login_lookup_uses_the_email_index(app):
+    with app.app_context():
+        plan = db.session.execute(text(
+            "EXPLAIN QUERY PLAN SELECT * FROM users WHERE email = 'a' AND is_active = 1")).all()
+    assert any('USING INDEX ix_users_email' in row[-1] for row in plan)
@@ -0,0 +1,52 @@
+import json
+from click.testing import CliRunner
+from benchmarks.load import compare, main, summarize
+
+
+def result(p95, throughput, errors=0, params=None):
+    return {'meta': {'params': params or {'seed': 1}},
+            'endpoints': {'login': {'p95_ms': p95, 'throughput_rps': throughput, 'errors': errors, 'requests': 100}}}
+
+
+def test_summary_percentiles_and_statuses():
+    results = [(200, index / 1000, (200,)) for index in range(1, 101)] + [(500, 0.2, (200,))]
+    summary = summarize(results, elapsed=2.0)
+    assert summary['requests'] == 101 and summary['errors'] == 1
+    assert summary['statuses'] == {'200': 100, '500': 1}
+    assert summary['p50_ms'] == 51.0
+    assert summary['max_ms'] == 200.0
+    assert summary['throughput_rps'] == 50.5
+    assert summarize([], 0)['p95_ms'] == 0.0
+
+
+def test_compare_flags_regressions_beyond_the_threshold():
+    lines, regressions = compare(result(10.5, 98), result(10, 100), threshold=10)
+    assert regressions == [] and 'REGRESSÃO' not in lines[0]
+
+    _, regressions = compare(result(12, 100), result(10, 100), threshold=10)
+    assert regressions == ['login']
+    _, regressions = compare(result(10, 100, errors=1), result(10, 100), threshold=10)
+    assert regressions == ['login']
+
+    lines, _ = compare(result(10, 100, params={'seed': 2}), result(10, 100), threshold=10)
+    assert lines[0] == 'Atenção: parâmetros diferentes dos da referência'
+
+
+def test_run_against_a_local_server(tmp_path):
+    output = tmp_path / 'resultado.json'
+    args = ['--tenants', '2', '--rows', '3', '--settings', '2', '--products', '2', '--sales', '2',
+            '--requests', '4', '--warmup', '1', '--concurrency', '2', '--bcrypt-rounds', '4',
+            '--endpoint', 'data_list', '--endpoint', 'sintese', '--output', str(output)]
+    response = CliRunner().invoke(main, args)
+    assert response.exit_code == 0, response.output
+
+    current = json.loads(output.read_text())
+    assert set(current['endpoints']) == {'data_list', 'sintese'}
+    assert all(summary['errors'] == 0 and summary['requests'] == 4 for summary in current['endpoints'].values())
+
+    # A mesma execução como referência não é regressão por parâmetros
+    baseline = tmp_path / 'base.json'
+    baseline.write_text(json.dumps(current))
+    response = CliRunner().invoke(main, args + ['--baseline', str(baseline), '--threshold', '1000'])
+    assert response.exit_code == 0, response.output
+    assert 'parâmetros diferentes' not in response.output
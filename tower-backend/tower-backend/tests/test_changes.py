@@ -0,0 +1,114 @@
+import pytest
+from src.models.change_log import prune_tombstones
+
+
+@pytest.fixture
+def tenant(client, register):
+    """Cliente com três registros; retorna (headers, banco, ids em ordem de criação)"""
+    headers, body = register()
+    for index in range(3):
+        client.post('/api/client/data', json={'key': f'k{index}', 'value': 'v'}, headers=headers)
+    ids = sorted(row['id'] for row in client.get('/api/client/data', headers=headers).get_json()['data'])
+    return headers, body['client']['database_name'], ids
+
+
+def changes(client, headers, **params):
+    return client.get('/api/client/changes', query_string=params, headers=headers)
+
+
+def sync(client, headers, since=None, limit=500):
+    """Segue as páginas até o fim; retorna (alterações, cursor)"""
+    collected = []
+    while True:
+        body = changes(client, headers, limit=limit, **({'since': since} if since else {})).get_json()
+        collected += body['changes']
+        since = body['cursor']
+        if not body['has_more']:
+            return collected, since
+
+
+def age_tombstones(app, database_name):
+    with app.app_context():
+        app.extensions['database_manager'].execute_query(
+            database_name, "UPDATE change_log SET changed_at = datetime('now', '-10 days') WHERE deleted = 1")
+
+
+@pytest.mark.parametrize('storage', ['file', 'shared'])
+def test_first_sync_returns_every_record_and_then_only_changes(client, tenant):
+    headers, _, ids = tenant
+    first, cursor = sync(client, headers, limit=2)
+    assert [(change['op'], change['id']) for change in first] == [('upsert', data_id) for data_id in ids]
+    assert first[0]['data']['key'] == 'k0'
+
+    client.put(f'/api/client/data/{ids[1]}', json={'value': 'novo'}, headers=headers)
+    client.delete(f'/api/client/data/{ids[2]}', headers=headers)
+    later, cursor = sync(client, headers, since=cursor)
+    assert [(change['op'], change['id']) for change in later] == [('upsert', ids[1]), ('delete', ids[2])]
+    assert later[0]['data']['value'] == 'novo'
+    assert 'data' not in later[1]
+
+    assert sync(client, headers, since=cursor) == ([], cursor)
+
+
+def test_deleted_records_are_left_out_of_the_first_sync(client, tenant):
+    headers, _, ids = tenant
+    client.delete(f'/api/client/data/{ids[0]}', headers=headers)
+    first, _ = sync(client, headers)
+    assert [change['id'] for change in first] == ids[1:]
+
+
+def test_changes_cover_other_entities(client, tenant):
+    headers, _, _ = tenant
+    _, cursor = sync(client, headers)
+    client.post('/api/client/settings', json={'tema': 'escuro'}, headers=headers)
+    client.post('/api/produtos', json={'codigo': 'p', 'descricao': 'p', 'categoria': 'X'}, headers=headers)
+    later, _ = sync(client, headers, since=cursor)
+    assert [change['entity'] for change in later] == ['client_settings', 'produtos']
+
+
+def test_cursor_before_pruned_tombstones_expires(app, client, tenant):
+    headers, database_name, ids = tenant
+    _, old_cursor = sync(client, headers)
+    client.delete(f'/api/client/data/{ids[0]}', headers=headers)
+    _, current_cursor = sync(client, headers, since=old_cursor)
+
+    age_tombstones(app, database_name)
+    with app.app_context():
+        assert prune_tombstones(app.extensions['database_manager'], database_name, days=1) == 1
+
+    response = changes(client, headers, since=old_cursor)
+    assert response.status_code == 410
+    assert response.get_json()['resync'] is True
+    # Quem já tinha visto a remoção continua sincronizando
+    assert changes(client, headers, since=current_cursor).status_code == 200
+
+
+def test_recent_tombstones_are_kept(app, client, tenant):
+    headers, database_name, ids = tenant
+    client.delete(f'/api/client/data/{ids[0]}', headers=headers)
+    with app.app_context():
+        assert prune_tombstones(app.extensions['database_manager'], database_name, days=1) == 0
+
+
+def test_moving_the_tenant_starts_a_new_epoch(app, client, tenant):
+    headers, database_name, _ = tenant
+    _, cursor = sync(client, headers)
+    result = app.test_cli_runner().invoke(args=['tenant-storage', 'move', database_name, '--to', 'shared'])
+    assert result.exit_code == 0, result.output
+    assert changes(client, headers, since=cursor).status_code == 410
+    assert len(sync(client, headers)[0]) == 3
+
+
+def test_prune_changes_command(app, client, tenant):
+    headers, database_name, ids = tenant
+    client.delete(f'/api/client/data/{ids[0]}', headers=headers)
+    age_tombstones(app, database_name)
+    result = app.test_cli_runner().invoke(args=['prune-changes', '--days', '1'])
+    assert result.exit_code == 0, result.output
+    assert 'Tombstones descartados: 1  Falhas: 0' in result.output
+
+
+@pytest.mark.parametrize('params', [{'since': 'lixo'}, {'since': 'a.b.c'}, {'limit': 0}, {'limit': 1001}])
+def test_invalid_parameters_are_rejected(client, tenant, params):
+    headers, _, _ = tenant
+    assert changes(client, headers, **params).status_code == 400
@@ -0,0 +1,71 @@
+import pytest
+
+
+@pytest.fixture
+def tenant(client, register):
+    headers, _ = register()
+    for index in range(7):
+        response = client.post('/api/client/data', json={'key': f'k{index}', 'value': f'v{index}'}, headers=headers)
+        assert response.status_code == 201
+    return headers
+
+
+def fetch_all(client, headers, **params):
+    pages, after = [], None
+    while True:
+        query = dict(params, **({'after': after} if after else {}))
+        body = client.get('/api/client/data', query_string=query, headers=headers).get_json()
+        pages.append(body)
+        if not body['has_more']:
+            return pages
+        after = body['next_cursor']
+
+
+@pytest.mark.parametrize('storage', ['file', 'shared'])
+def test_keyset_pages_cover_every_row_once(client, tenant):
+    pages = fetch_all(client, tenant, limit=3)
+
+    assert [len(page['data']) for page in pages] == [3, 3, 1]
+    keys = [row['key'] for page in pages for row in page['data']]
+    assert keys == [f'k{index}' for index in reversed(range(7))]
+    assert pages[0]['total'] == 7
+    assert pages[-1]['next_cursor'] is None
+
+
+def test_rows_inserted_while_paging_do_not_shift_the_cursor(client, tenant):
+    first = client.get('/api/client/data', query_string={'limit': 3}, headers=tenant).get_json()
+    client.post('/api/client/data', json={'key': 'novo'}, headers=tenant)
+
+    second = client.get('/api/client/data', query_string={'limit': 3, 'after': first['next_cursor']},
+                        headers=tenant).get_json()
+    assert [row['key'] for row in second['data']] == ['k3', 'k2', 'k1']
+
+
+def test_projection_returns_only_requested_fields(client, tenant):
+    body = client.get('/api/client/data', query_string={'fields': 'key,key', 'limit': 2},
+                      headers=tenant).get_json()
+    assert body['data'] == [{'key': 'k6'}, {'key': 'k5'}]
+
+    # O cursor continua funcionando sem id e created_at na projeção
+    after = client.get('/api/client/data', query_string={'fields': 'value', 'limit': 2, 'after': body['next_cursor']},
+                       headers=tenant).get_json()
+    assert after['data'] == [{'value': 'v4'}, {'value': 'v3'}]
+
+
+@pytest.mark.parametrize('params', [
+    {'limit': 0},
+    {'limit': 'x'},
+    {'fields': 'key,senha'},
+    {'after': 'sem-virgula'},
+    {'after': '2024-01-01,abc'},
+])
+def test_invalid_paging_parameters(client, tenant, params):
+    response = client.get('/api/client/data', query_string=params, headers=tenant)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Parâmetros de paginação inválidos'}
+
+
+def test_tenants_do_not_see_each_other(client, register, tenant):
+    other, _ = register()
+    body = client.get('/api/client/data', headers=other).get_json()
+    assert body == {'data': [], 'next_cursor': None, 'has_more': False, 'total': 0}
@@ -0,0 +1,83 @@
+import pytest
+from src.routes import client_data
+
+ROWS = (
+    ('receita-bolo', 'bolo de cenoura com cobertura de chocolate'),
+    ('receita-torta', 'torta de limão'),
+    ('chocolate', 'chocolate chocolate chocolate meio amargo'),
+    ('fornecedor', 'moinho central, entrega de farinha'),
+)
+
+
+@pytest.fixture
+def tenant(client, register):
+    headers, _ = register()
+    for key, value in ROWS:
+        client.post('/api/client/data', json={'key': key, 'value': value}, headers=headers)
+    return headers
+
+
+def search(client, headers, **params):
+    return client.get('/api/client/data/search', query_string=params, headers=headers)
+
+
+@pytest.mark.parametrize('storage', ['file', 'shared'])
+def test_results_are_ranked_and_highlighted(client, tenant):
+    body = search(client, tenant, q='chocolate').get_json()
+    assert [row['key'] for row in body['data']] == ['chocolate', 'receita-bolo']
+    assert (body['order'], body['total'], body['has_more']) == ('rank', 2, False)
+    assert body['data'][0]['highlight']['key'] == '<mark>chocolate</mark>'
+    assert '<mark>chocolate</mark>' in body['data'][1]['highlight']['value']
+
+
+def test_prefix_and_all_terms_must_match(client, tenant):
+    assert [row['key'] for row in search(client, tenant, q='fari*').get_json()['data']] == ['fornecedor']
+    assert search(client, tenant, q='torta chocolate').get_json()['total'] == 0
+
+
+def test_pages_by_offset_and_projects_fields(client, tenant):
+    first = search(client, tenant, q='de', limit=2, fields='key').get_json()
+    assert first['total'] == 3 and first['has_more'] and first['next_offset'] == 2
+    assert set(first['data'][0]) == {'key', 'highlight'}
+    second = search(client, tenant, q='de', limit=2, offset=first['next_offset']).get_json()
+    assert len(second['data']) == 1 and second['next_offset'] is None
+
+
+def test_index_follows_updates_and_deletes(client, tenant):
+    [row] = search(client, tenant, q='limão').get_json()['data']
+    client.put(f"/api/client/data/{row['id']}", json={'value': 'torta de maracujá'}, headers=tenant)
+    assert search(client, tenant, q='limão').get_json()['total'] == 0
+    assert search(client, tenant, q='maracujá').get_json()['total'] == 1
+
+    client.delete(f"/api/client/data/{row['id']}", headers=tenant)
+    assert search(client, tenant, q='maracujá').get_json()['total'] == 0
+
+
+@pytest.mark.parametrize('storage', ['file', 'shared'])
+def test_tenants_only_find_their_rows(client, register, tenant):
+    other, _ = register()
+    client.post('/api/client/data', json={'key': 'x', 'value': 'chocolate branco'}, headers=other)
+    assert search(client, other, q='chocolate').get_json()['total'] == 1
+    assert search(client, tenant, q='branco').get_json()['total'] == 0
+
+
+def test_many_matches_fall_back_to_recent_order(client, tenant, monkeypatch):
+    monkeypatch.setattr(client_data, 'MAX_RANKED_MATCHES', 1)
+    body = search(client, tenant, q='chocolate').get_json()
+    assert body['order'] == 'recent'
+    assert [row['key'] for row in body['data']] == ['chocolate', 'receita-bolo']
+
+
+def test_user_input_is_not_parsed_as_fts_syntax(client, tenant):
+    for q in ('OR', 'chocolate"', 'NEAR(a b)', 'key:chocolate'):
+        assert search(client, tenant, q=q).status_code == 200
+
+
+@pytest.mark.parametrize('params', [
+    {}, {'q': '   '}, {'q': 'a*'}, {'q': '*'}, {'q': 'bolo', 'limit': 0}, {'q': 'bolo', 'limit': 101},
+    {'q': 'bolo', 'offset': -1}, {'q': 'bolo', 'order': 'alfabetica'}, {'q': 'bolo', 'fields': 'senha'},
+])
+def test_invalid_searches_are_rejected(client, tenant, params):
+    response = search(client, tenant, **params)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Parâmetros de busca inválidos'}
@@ -0,0 +1,45 @@
+import pytest
+from src.models.database_manager import DatabaseManager
+
+
+@pytest.mark.parametrize('storage', ['file', 'shared'])
+def test_upsert_reports_the_result_of_each_key(client, register):
+    headers, _ = register()
+    response = client.post('/api/client/settings', json={'tema': 'escuro', 'idioma': 'pt'}, headers=headers)
+    assert response.get_json()['results'] == {'tema': 'created', 'idioma': 'created'}
+
+    response = client.post('/api/client/settings', json={'tema': 'claro', 'idioma': None, 'fuso': None},
+                           headers=headers)
+    assert response.status_code == 200
+    assert response.get_json()['results'] == {'tema': 'updated', 'idioma': 'deleted', 'fuso': 'not_found'}
+
+    body = client.get('/api/client/settings', headers=headers).get_json()
+    assert body['settings'] == {'tema': 'claro'}
+    assert [row['setting_key'] for row in body['raw_settings']] == ['tema']
+
+
+def test_batch_is_written_in_a_single_transaction(client, register, monkeypatch):
+    headers, _ = register()
+    client.post('/api/client/settings', json={'tema': 'escuro'}, headers=headers)
+    execute_many = DatabaseManager.execute_many
+
+    def failing_delete(self, database_name, query, seq_of_params):
+        if query.startswith('DELETE'):
+            raise RuntimeError('falha no meio do lote')
+        return execute_many(self, database_name, query, seq_of_params)
+
+    monkeypatch.setattr(DatabaseManager, 'execute_many', failing_delete)
+    response = client.post('/api/client/settings', json={'tema': 'claro', 'novo': 1, 'tema_antigo': None},
+                           headers=headers)
+    assert response.status_code == 500
+
+    monkeypatch.undo()
+    assert client.get('/api/client/settings', headers=headers).get_json()['settings'] == {'tema': 'escuro'}
+
+
+@pytest.mark.parametrize('body', [[], ['tema'], {}, 'tema'])
+def test_settings_body_must_be_an_object(client, register, body):
+    headers, _ = register()
+    response = client.post('/api/client/settings', json=body, headers=headers)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': 'Configurações são obrigatórias'}
@@ -0,0 +1,99 @@
+import pytest
+
+
+@pytest.fixture
+def receita(client, register):
+    """Produto bolo = 2 farinha + 1 ovo e produto pão = 3 farinha; retorna (headers, ids)"""
+    headers, _ = register()
+    ids = {}
+    for nome, preco in (('farinha', 5), ('ovo', 1)):
+        ids[nome] = client.post('/api/insumos', json={'nome': nome, 'preco': preco, 'fornecedor': 'Moinho'},
+                                headers=headers).get_json()['id']
+    for codigo, itens in (('bolo', [('farinha', 2), ('ovo', 1)]), ('pao', [('farinha', 3)]), ('avulso', [])):
+        ids[codigo] = client.post('/api/produtos', json={'codigo': codigo, 'descricao': codigo, 'categoria': 'X',
+                                                        'custo_unitario': 7}, headers=headers).get_json()['id']
+        if itens:
+            response = client.put(f'/api/produtos/{ids[codigo]}/insumos', headers=headers,
+                                  json=[{'insumo_id': ids[nome], 'quantidade': quantidade} for nome, quantidade in itens])
+            assert response.status_code == 200
+    return headers, ids
+
+
+def custos(client, headers):
+    return {produto['codigo']: produto['custo_unitario']
+            for produto in client.get('/api/produtos', headers=headers).get_json()['produtos']}
+
+
+@pytest.mark.parametrize('storage', ['file', 'shared'])
+def test_composition_sets_the_cost(client, receita):
+    headers, ids = receita
+    assert custos(client, headers) == {'bolo': 11, 'pao': 15, 'avulso': 7}
+    assert client.get(f"/api/produtos/{ids['bolo']}/insumos", headers=headers).get_json()['custo_total'] == 11
+
+
+@pytest.mark.parametrize('storage', ['file', 'shared'])
+def test_price_change_recalculates_only_dependent_products(client, receita):
+    headers, ids = receita
+    response = client.put(f"/api/insumos/{ids['ovo']}", json={'preco': 3}, headers=headers)
+    assert response.get_json()['produtos_recalculados'] == 1
+    assert custos(client, headers) == {'bolo': 13, 'pao': 15, 'avulso': 7}
+
+
+def test_deleting_the_only_insumo_zeroes_the_cost(client, receita):
+    headers, ids = receita
+    response = client.delete(f"/api/insumos/{ids['farinha']}", headers=headers)
+    assert response.get_json()['produtos_recalculados'] == 2
+    assert custos(client, headers) == {'bolo': 1, 'pao': 0, 'avulso': 7}
+
+
+def test_clearing_a_composition_recalculates_and_empty_stays_manual(client, receita):
+    headers, ids = receita
+    client.put(f"/api/produtos/{ids['pao']}/insumos", json=[], headers=headers)
+    client.put(f"/api/produtos/{ids['avulso']}/insumos", json=[], headers=headers)
+    assert custos(client, headers) == {'bolo': 11, 'pao': 0, 'avulso': 7}
+
+
+def test_price_list_import(client, receita):
+    headers, ids = receita
+    response = client.post('/api/insumos/importar', headers=headers, json={'fornecedor': 'Moinho', 'precos': [
+        {'id': str(ids['farinha']), 'preco': 6}, {'nome': 'ovo', 'preco': 1}, {'nome': 'sal', 'preco': 2}]})
+    body = response.get_json()
+
+    assert [resultado['status'] for resultado in body['resultados']] == ['updated', 'unchanged', 'not_found']
+    assert body['produtos_recalculados'] == 2
+    assert custos(client, headers) == {'bolo': 13, 'pao': 18, 'avulso': 7}
+
+
+@pytest.mark.parametrize('precos, error', [
+    ([{'nome': 'ovo'}], 'Cada item deve ter id ou nome e preco'),
+    ([{'nome': 'ovo', 'preco': -1}], 'Preço inválido'),
+    ([{'id': 'x', 'preco': 1}], 'Id de insumo inválido'),
+])
+def test_invalid_price_list_is_rejected_without_changes(client, receita, precos, error):
+    headers, _ = receita
+    response = client.post('/api/insumos/importar', json={'fornecedor': 'Moinho', 'precos': precos}, headers=headers)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': error}
+    assert custos(client, headers)['bolo'] == 11
+
+
+@pytest.mark.parametrize('itens, status', [
+    ([{'insumo_id': 1, 'quantidade': 0}], 400),
+    ([{'insumo_id': 1, 'quantidade': 1}, {'insumo_id': 1, 'quantidade': 2}], 400),
+    ([{'insumo_id': 999, 'quantidade': 1}], 404),
+])
+def test_invalid_compositions_are_rejected(client, receita, itens, status):
+    headers, ids = receita
+    response = client.put(f"/api/produtos/{ids['bolo']}/insumos", json=itens, headers=headers)
+    assert response.status_code == status
+    assert custos(client, headers)['bolo'] == 11
+
+
+def test_import_without_matches_publishes_nothing(app, client, register):
+    headers, body = register()
+    subscription, _ = app.extensions['event_broker'].subscribe(body['client']['database_name'])
+    response = client.post('/api/insumos/importar', json={'fornecedor': 'Moinho', 'precos': [
+        {'nome': 'sal', 'preco': 2}]}, headers=headers)
+
+    assert response.get_json()['resultados'] == [{'insumo': 'sal', 'status': 'not_found'}]
+    assert subscription.get(timeout=0) is None
@@ -0,0 +1,92 @@
+import gzip
+import pytest
+
+GZIP = {'Accept-Encoding': 'gzip'}
+
+
+@pytest.fixture
+def tenant(client, register):
+    """Cliente com produtos suficientes para a síntese passar de COMPRESS_MIN_SIZE"""
+    headers, _ = register()
+    for index in range(40):
+        client.post('/api/produtos', json={'codigo': f'p{index}', 'descricao': f'Produto {index}',
+                                           'categoria': f'Categoria {index % 4}', 'preco': 10}, headers=headers)
+    return headers
+
+
+def test_large_responses_are_gzipped_with_a_weak_etag(client, tenant):
+    plain = client.get('/api/sintese', headers=tenant)
+    response = client.get('/api/sintese', headers=dict(tenant, **GZIP))
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert gzip.decompress(response.data) == plain.data
+    assert int(response.headers['Content-Length']) == len(response.data) < len(plain.data)
+    assert response.headers['ETag'] == f"W/{plain.headers['ETag']}"
+
+
+def test_weak_etag_revalidates_with_304(client, tenant):
+    etag = client.get('/api/sintese', headers=dict(tenant, **GZIP)).headers['ETag']
+    response = client.get('/api/sintese', headers=dict(tenant, **GZIP, **{'If-None-Match': etag}))
+    assert response.status_code == 304
+    assert response.headers['ETag'] == etag
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert 'Content-Encoding' not in response.headers
+
+
+def test_uncompressed_representation_still_varies(client, tenant):
+    response = client.get('/api/sintese', headers=dict(tenant, **{'Accept-Encoding': 'identity'}))
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert not response.headers['ETag'].startswith('W/')
+
+
+def test_head_is_not_compressed(client, tenant):
+    response = client.head('/api/sintese', headers=dict(tenant, **GZIP))
+    assert response.status_code == 200
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' in response.headers['Vary']
+
+
+def test_small_responses_are_left_alone(client, register):
+    headers, _ = register()
+    response = client.get('/api/auth/me', headers=dict(headers, **GZIP))
+    assert 'Content-Encoding' not in response.headers
+    assert 'Accept-Encoding' not in response.headers.get('Vary', '')
+
+
+def test_event_stream_is_never_compressed(make_app):
+    app = make_app(EVENTS_MAX_STREAM_SECONDS=0.1, COMPRESS_MIN_SIZE=0)
+    client = app.test_client()
+    token = client.post('/api/auth/register', json={
+        'username': 'u', 'email': 'sse@example.com', 'password': 'p',
+        'client_name': 'c', 'client_email': 'sse-client@example.com'}).get_json()['access_token']
+    response = client.get('/api/client/events', headers=dict(GZIP, Authorization=f'Bearer {token}'))
+    assert 'Content-Encoding' not in response.headers
+    assert response.data.startswith(b'retry:')
+
+
+def test_streamed_listing_is_compressed_chunk_by_chunk(client, register):
+    headers, _ = register()
+    for index in range(30):
+        client.post('/api/client/data', json={'key': f'chave-{index}', 'value': 'x' * 50}, headers=headers)
+    response = client.get('/api/client/data', headers=dict(headers, **GZIP))
+
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert 'Content-Length' not in response.headers
+    body = client.application.json.loads(gzip.decompress(response.data))
+    assert len(body['data']) == 30
+
+
+def test_compression_is_measured(make_app):
+    app = make_app(METRICS_PUBLIC=True, COMPRESS_MIN_SIZE=10)
+    client = app.test_client()
+    client.get('/metrics', headers=GZIP)
+    [[responses, size_in, size_out, _]] = app.extensions['metrics'].compression.values()
+    assert responses == 1 and size_out < size_in
+
+
+def test_compression_can_be_disabled(make_app):
+    app = make_app(COMPRESS_ENABLED=False, COMPRESS_MIN_SIZE=10, METRICS_PUBLIC=True)
+    response = app.test_client().get('/metrics', headers=GZIP)
+    assert 'Content-Encoding' not in response.headers
@@ -0,0 +1,80 @@
+import sqlite3
+import pytest
+from src.models.database_manager import ConnectionCache, connection_cache
+
+MIGRATIONS = [(1, 'tabela de teste', ['CREATE TABLE itens (valor TEXT)'])]
+
+
+def create_database(path):
+    sqlite3.connect(path).close()
+    return str(path)
+
+
+def test_connections_are_reused_in_wal_mode(tmp_path):
+    cache = ConnectionCache(max_open=4)
+    path = create_database(tmp_path / 'a.db')
+
+    conn = cache.acquire(path, MIGRATIONS)
+    assert conn.execute('PRAGMA journal_mode').fetchone()[0] == 'wal'
+    assert conn.execute('PRAGMA user_version').fetchone()[0] == 1
+    cache.release(conn)
+
+    assert cache.acquire(path, MIGRATIONS) is conn
+    assert cache.stats()['open'] == 1
+
+
+def test_release_rolls_back_pending_transaction(tmp_path):
+    cache = ConnectionCache()
+    path = create_database(tmp_path / 'a.db')
+    conn = cache.acquire(path, MIGRATIONS)
+    conn.execute('BEGIN')
+    conn.execute("INSERT INTO itens VALUES ('x')")
+    cache.release(conn)
+
+    conn = cache.acquire(path, MIGRATIONS)
+    assert not conn.in_transaction
+    assert conn.execute('SELECT COUNT(*) FROM itens').fetchone()[0] == 0
+
+
+def test_least_recently_used_connection_is_closed_at_limit(tmp_path):
+    cache = ConnectionCache(max_open=2)
+    paths = [create_database(tmp_path / f'{name}.db') for name in 'abc']
+    first = cache.acquire(paths[0], MIGRATIONS)
+    cache.release(first)
+    cache.release(cache.acquire(paths[1], MIGRATIONS))
+    cache.release(cache.acquire(paths[2], MIGRATIONS))
+
+    assert cache.stats()['open'] == 2
+    with pytest.raises(sqlite3.ProgrammingError):
+        first.execute('SELECT 1')
+
+
+def test_limit_reached_with_every_connection_checked_out(tmp_path):
+    cache = ConnectionCache(max_open=1, busy_timeout=50)
+    cache.acquire(create_database(tmp_path / 'a.db'), MIGRATIONS)
+    with pytest.raises(sqlite3.OperationalError):
+        cache.acquire(create_database(tmp_path / 'b.db'), MIGRATIONS)
+
+
+def test_close_path_discards_checked_out_connection(tmp_path):
+    cache = ConnectionCache()
+    path = create_database(tmp_path / 'a.db')
+    conn = cache.acquire(path, MIGRATIONS)
+    cache.close_path(path)
+    cache.release(conn)
+    assert cache.stats() == {'open': 0, 'idle': 0, 'checked_out': 0, 'max_open': cache.max_open}
+
+
+def test_missing_database_is_not_created(tmp_path):
+    cache = ConnectionCache()
+    with pytest.raises(FileNotFoundError):
+        cache.acquire(str(tmp_path / 'missing.db'), MIGRATIONS)
+    assert not (tmp_path / 'missing.db').exists()
+    assert cache.stats()['open'] == 0
+
+
+def test_requests_return_connections_to_the_cache(client, register):
+    headers, _ = register()
+    for _ in range(3):
+        assert client.get('/api/client/data', headers=headers).status_code == 200
+    assert connection_cache.stats()['checked_out'] == 0
@@ -0,0 +1,112 @@
+import threading
+import pytest
+from src.models.events import RESYNC, EventBroker, TooManyStreamsError
+
+
+@pytest.fixture
+def app(make_app):
+    # Streams curtos: o corpo inteiro pode ser lido sem travar o teste
+    return make_app(EVENTS_MAX_STREAM_SECONDS=0.3, EVENTS_HEARTBEAT=0.1, EVENTS_RETRY_MS=2000)
+
+
+@pytest.fixture
+def tenant(register):
+    headers, body = register()
+    return headers, body['client']['database_name']
+
+
+def parse(body):
+    """Eventos SSE do corpo: lista de dicts com id/event/data, e os comentários como 'ping'"""
+    events = []
+    for block in body.decode('utf-8').split('\n\n'):
+        if block.startswith(':'):
+            events.append('ping')
+        elif block:
+            events.append(dict(line.split(': ', 1) for line in block.split('\n')))
+    return events
+
+
+def published_ids(broker, database_name, count):
+    """Publica count eventos e devolve os ids atribuídos"""
+    subscription, _ = broker.subscribe(database_name)
+    for index in range(count):
+        broker.publish(database_name, 'change', {'entity': 'client_data', 'n': index})
+    ids = [subscription.get(timeout=0).id for _ in range(count)]
+    broker.unsubscribe(subscription)
+    return ids
+
+
+def test_stream_delivers_changes_until_the_deadline(app, client, tenant):
+    headers, _ = tenant
+    # A escrita acontece com o stream já aberto
+    timer = threading.Timer(0.05, lambda: client.post('/api/client/data', json={'key': 'k'}, headers=headers))
+    timer.start()
+    response = client.get('/api/client/events', headers=headers)
+    timer.join()
+
+    assert response.mimetype == 'text/event-stream'
+    assert response.headers['Cache-Control'] == 'no-cache'
+    events = parse(response.data)
+    assert events[0] == {'retry': '2000'}
+    [change] = [event for event in events if event != 'ping' and 'event' in event]
+    assert change['event'] == 'change'
+    assert app.json.loads(change['data'])['entity'] == 'client_data'
+    assert 'ping' in events
+    # A conexão sai do broker quando a resposta é fechada
+    assert app.extensions['event_broker'].stats()['streams'] == 1
+    response.close()
+    assert app.extensions['event_broker'].stats()['streams'] == 0
+
+
+def test_last_event_id_replays_the_missed_events(app, client, tenant):
+    headers, database_name = tenant
+    ids = published_ids(app.extensions['event_broker'], database_name, 3)
+
+    response = client.get('/api/client/events', headers=dict(headers, **{'Last-Event-ID': ids[0]}))
+    replayed = [event['id'] for event in parse(response.data) if event != 'ping' and 'id' in event]
+    assert replayed == ids[1:]
+
+
+def test_unknown_last_event_id_starts_with_a_resync(client, tenant):
+    headers, _ = tenant
+    response = client.get('/api/client/events', headers=dict(headers, **{'Last-Event-ID': 'sumiu-1'}))
+    assert parse(response.data)[1] == {'event': 'resync', 'data': '{}'}
+
+
+def test_token_in_the_query_string(client, tenant):
+    headers, _ = tenant
+    token = headers['Authorization'].split(' ', 1)[1]
+    assert client.get('/api/client/events', query_string={'jwt': token}).status_code == 200
+    assert client.get('/api/client/events').status_code == 401
+
+
+def test_stream_limit_answers_503(make_app, register):
+    app = make_app(EVENTS_MAX_STREAMS=1)
+    broker = app.extensions['event_broker']
+    held, _ = broker.subscribe('outro')
+    headers, _ = register()
+    response = app.test_client().get('/api/client/events', headers=headers)
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+    broker.unsubscribe(held)
+
+
+def test_broker_history_and_overflow():
+    broker = EventBroker(history=2, max_pending=3, max_streams=2)
+    ids = published_ids(broker, 'db', 3)
+    # Só os dois últimos ficam no histórico
+    assert broker.subscribe('db', ids[0])[1] is None
+    subscription, replay = broker.subscribe('db', ids[1])
+    assert [event.id for event in replay] == [ids[2]]
+    with pytest.raises(TooManyStreamsError):
+        broker.subscribe('db')
+
+    for _ in range(4):
+        broker.publish('db', 'change', {})
+    # Fila cheia: os pendentes são descartados e a conexão recebe um único resync
+    assert subscription.get(timeout=0) is RESYNC
+    assert subscription.get(timeout=0) is None
+    broker.unsubscribe(subscription)
+    broker.unsubscribe(subscription)
+    assert broker.stats()['streams'] == 1
+
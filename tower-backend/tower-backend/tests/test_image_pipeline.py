@@ -0,0 +1,124 @@
+import io
+import os
+import time
+import pytest
+from PIL import Image
+from src.models.image_pipeline import STATUS_READY
+from src.models.user import db, User
+
+
+def image_bytes(color='red', image_format='JPEG', size=(400, 300)):
+    buffer = io.BytesIO()
+    Image.new('RGB', size, color).save(buffer, image_format)
+    return buffer.getvalue()
+
+
+def upload(client, headers, content, filename='foto.jpg'):
+    return client.post('/api/profile/upload-picture', headers=headers, content_type='multipart/form-data',
+                       data={'file': (io.BytesIO(content), filename)})
+
+
+def wait_ready(client, headers, timeout=10):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        body = client.get('/api/profile/picture/status', headers=headers).get_json()
+        if body['status'] != 'processing':
+            return body
+        time.sleep(0.02)
+    raise AssertionError('processamento da imagem não terminou')
+
+
+def uploaded_files(app):
+    folder = app.config['UPLOAD_FOLDER']
+    return {name for name in os.listdir(folder) if os.path.isfile(os.path.join(folder, name))}
+
+
+def test_upload_is_processed_into_variants(app, client, register):
+    headers, _ = register()
+    response = upload(client, headers, image_bytes())
+    assert response.status_code == 202
+    assert response.get_json()['profile_picture_status'] == 'processing'
+
+    body = wait_ready(client, headers)
+    assert body['status'] == STATUS_READY
+    assert set(body['variants']) == {'300', '150', '64'}
+    assert body['variants']['300']['width'] == 300
+    digest = os.path.basename(body['profile_picture']).rsplit('.', 1)[0]
+    assert f'{digest}_64.webp' in uploaded_files(app)
+
+
+def test_extension_is_taken_from_the_detected_format(client, register):
+    first, _ = register()
+    second, _ = register()
+    content = image_bytes(image_format='PNG')
+
+    names = [upload(client, headers, content, filename).get_json()['profile_picture']
+             for headers, filename in ((first, 'a.jpg'), (second, 'b.jpeg'))]
+    assert names[0] == names[1]
+    assert names[0].endswith('.png')
+
+
+def test_replacing_a_shared_picture_keeps_the_other_users_files(app, client, register):
+    first, _ = register()
+    second, _ = register()
+    content = image_bytes('blue')
+    upload(client, first, content, 'a.jpg')
+    upload(client, second, content, 'a.jpeg')
+    picture = wait_ready(client, second)['profile_picture']
+
+    upload(client, first, image_bytes('green'))
+    digest = os.path.basename(picture).rsplit('.', 1)[0]
+    assert {f'{digest}.json', f'{digest}_300.jpg'} <= uploaded_files(app)
+    assert 'immutable' in client.get(picture).headers['Cache-Control']
+
+
+def test_legacy_extension_with_the_same_digest_is_not_removed(app, client, register):
+    first, _ = register()
+    _, legacy_body = register()
+    picture = upload(client, first, image_bytes('blue')).get_json()['profile_picture']
+    wait_ready(client, first)
+
+    # Registro gravado antes da extensão canônica: mesmo hash, outra extensão
+    with app.app_context():
+        db.session.get(User, legacy_body['user']['id']).profile_picture = picture.replace('.jpg', '.jpeg')
+        db.session.commit()
+
+    upload(client, first, image_bytes('green'))
+    digest = os.path.basename(picture).rsplit('.', 1)[0]
+    assert f'{digest}.json' in uploaded_files(app)
+
+
+def test_unused_picture_is_removed(app, client, register):
+    headers, _ = register()
+    picture = upload(client, headers, image_bytes('blue')).get_json()['profile_picture']
+    wait_ready(client, headers)
+    digest = os.path.basename(picture).rsplit('.', 1)[0]
+
+    upload(client, headers, image_bytes('green'))
+    assert not any(name.startswith(digest) for name in uploaded_files(app))
+    assert client.get(picture).status_code == 404
+
+
+@pytest.mark.parametrize('content, filename, error', [
+    (b'nao e imagem', 'foto.jpg', 'Arquivo de imagem inválido'),
+    (image_bytes(image_format='BMP'), 'foto.png', 'Tipo de arquivo não permitido'),
+    (image_bytes(), 'foto.svg', 'Tipo de arquivo não permitido'),
+])
+def test_invalid_uploads_are_rejected(app, client, register, content, filename, error):
+    headers, _ = register()
+    response = upload(client, headers, content, filename)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': error}
+    assert os.listdir(os.path.join(app.config['UPLOAD_FOLDER'], 'originals')) == []
+
+
+def test_full_queue_asks_the_client_to_retry(app, client, register):
+    headers, _ = register()
+    pipeline = app.extensions['image_pipeline']
+    for _ in range(app.config['PROFILE_IMAGE_MAX_PENDING']):
+        pipeline._slots.acquire()
+
+    response = upload(client, headers, image_bytes())
+    assert response.status_code == 503
+    assert response.headers['Retry-After'] == '5'
+    assert client.get('/api/auth/me', headers=headers).get_json()['user']['profile_picture'] is None
@@ -0,0 +1,86 @@
+import sqlite3
+from datetime import date, datetime
+import pytest
+from src.models import json_provider
+
+
+@pytest.fixture
+def tenant(client, register):
+    headers, body = register()
+    for index in range(3):
+        client.post('/api/client/data', json={'key': f'k{index}', 'value': 'ção'}, headers=headers)
+    client.post('/api/client/settings', json={'tema': 'escuro', 'idioma': 'pt'}, headers=headers)
+    return headers, body['client']['database_name']
+
+
+@pytest.fixture
+def strict_encoder(app, monkeypatch):
+    """Falha se algum valor precisar do default do codificador"""
+    def default(o):
+        raise AssertionError(f'{type(o).__name__} passou pelo default do codificador')
+
+    monkeypatch.setattr(app.json, 'default', default)
+
+
+@pytest.mark.parametrize('row_type, expected', [
+    ('dict', {'key': 'k0', 'value': 'ção'}), ('tuple', ('k0', 'ção'))])
+def test_rows_are_built_by_the_cursor(app, tenant, row_type, expected):
+    _, database_name = tenant
+    with app.app_context():
+        rows = list(app.extensions['database_manager'].iterate_query(
+            database_name, 'SELECT key, value FROM client_data ORDER BY id', row_type=row_type))
+        [row] = app.extensions['database_manager'].execute_query(
+            database_name, 'SELECT key, value FROM client_data ORDER BY id LIMIT 1')
+    assert rows[0] == expected
+    assert type(row) is dict
+
+
+def test_default_rows_are_sqlite_rows_and_unknown_types_fail(app, tenant):
+    _, database_name = tenant
+    db_manager = app.extensions['database_manager']
+    with app.app_context():
+        rows = list(db_manager.iterate_query(database_name, 'SELECT key FROM client_data'))
+        assert isinstance(rows[0], sqlite3.Row)
+        with pytest.raises(ValueError):
+            db_manager.iterate_query(database_name, 'SELECT key FROM client_data', row_type='objeto')
+
+
+@pytest.mark.parametrize('path', ['/api/client/data', '/api/client/data?fields=key', '/api/client/settings'])
+def test_listings_never_use_the_encoder_fallback(client, tenant, strict_encoder, path):
+    headers, _ = tenant
+    response = client.get(path, headers=headers)
+    assert response.status_code == 200
+    # A listagem é gerada em streaming: o corpo precisa ser lido por inteiro
+    assert response.get_json()
+
+
+def test_settings_keep_the_raw_rows(client, tenant):
+    headers, _ = tenant
+    body = client.get('/api/client/settings', headers=headers).get_json()
+    assert body['settings'] == {'idioma': 'pt', 'tema': 'escuro'}
+    assert [row['setting_key'] for row in body['raw_settings']] == ['idioma', 'tema']
+    assert set(body['raw_settings'][0]) == {'id', 'setting_key', 'setting_value', 'created_at', 'updated_at'}
+
+
+def test_dates_and_large_integers(app):
+    provider = app.json
+    assert provider.loads(provider.dumps({'dia': date(2026, 1, 2), 'hora': datetime(2026, 1, 2, 3, 4)})) == {
+        'dia': '2026-01-02', 'hora': '2026-01-02T03:04:00'}
+    # Fora do alcance do orjson: o json da biblioteca padrão assume
+    assert provider.dumps_bytes([2 ** 70]) == b'[1180591620717411303424]'
+    with pytest.raises(TypeError):
+        provider.dumps(object())
+
+
+@pytest.mark.parametrize('count', [0, 1, 5, 6])
+def test_stream_array_in_batches(app, count):
+    chunks = list(app.json.stream_array(({'n': index} for index in range(count)), batch_size=3))
+    assert app.json.loads(b''.join(chunks)) == [{'n': index} for index in range(count)]
+    # '[', um pedaço por lote e ']'
+    assert len(chunks) == 2 + -(-count // 3)
+
+
+def test_stdlib_fallback_without_orjson(app, monkeypatch):
+    monkeypatch.setattr(json_provider, 'orjson', None)
+    assert app.json.loads(app.json.dumps({'dia': date(2026, 1, 2)})) == {'dia': '2026-01-02'}
+    assert app.json.loads(b''.join(app.json.stream_array([1, 2, 3], batch_size=2))) == [1, 2, 3]
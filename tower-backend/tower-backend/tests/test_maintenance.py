@@ -0,0 +1,150 @@
+import os
+import sqlite3
+import pytest
+from src.models.database_manager import connection_cache
+from src.models.maintenance import list_targets
+from src.models.tenant_pool import _FileLock
+
+
+@pytest.fixture
+def app(make_app):
+    # Sem pausas entre os passos; bancos recém-escritos só são pulados nos testes de atividade
+    return make_app(MAINTENANCE_PAUSE=0, MAINTENANCE_IDLE_SECONDS=0, MAINTENANCE_PAGES=8)
+
+
+@pytest.fixture
+def tenant(app, client, register):
+    """Cliente com alguns registros; retorna (banco, caminho do arquivo)"""
+    headers, body = register()
+    for index in range(5):
+        client.post('/api/client/data', json={'key': f'k{index}', 'value': 'v'}, headers=headers)
+    database_name = body['client']['database_name']
+    [target] = list_targets(app.extensions['database_manager'], [database_name])
+    return database_name, target.path
+
+
+def maintenance(app, *args):
+    return app.test_cli_runner().invoke(args=['maintenance', *args])
+
+
+def backups(app, database_name):
+    found = []
+    for root, _, files in os.walk(os.path.join(app.instance_path, 'backups')):
+        found += [os.path.join(root, name) for name in files if name.endswith('.db')]
+    return sorted(path for path in found if os.path.basename(os.path.dirname(path)) == database_name)
+
+
+def pragma(path, name):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute(f'PRAGMA {name}').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_backup_is_a_verified_copy(app, tenant):
+    database_name, _ = tenant
+    result = maintenance(app, 'backup', '--database', database_name)
+    assert result.exit_code == 0, result.output
+    assert 'Bancos processados: 1  Pulados: 0  Falhas: 0' in result.output
+
+    [copy] = backups(app, database_name)
+    assert pragma(copy, 'quick_check') == 'ok'
+    assert pragma(copy, 'journal_mode') == 'delete'
+    conn = sqlite3.connect(copy)
+    assert conn.execute('SELECT COUNT(*) FROM client_data').fetchone()[0] == 5
+    conn.close()
+
+
+def test_old_backups_are_discarded(make_app, tenant):
+    database_name, _ = tenant
+    app = make_app(MAINTENANCE_PAUSE=0, MAINTENANCE_BACKUP_KEEP=1)
+    maintenance(app, 'backup', '--database', database_name)
+    [first] = backups(app, database_name)
+    old = os.path.join(os.path.dirname(first), '19990101T000000Z.db')
+    os.replace(first, old)
+
+    assert maintenance(app, 'backup', '--database', database_name).exit_code == 0
+    [kept] = backups(app, database_name)
+    assert kept != old
+
+
+def test_compaction_returns_free_pages(app, tenant):
+    database_name, path = tenant
+    with app.app_context():
+        db_manager = app.extensions['database_manager']
+        for index in range(50):
+            db_manager.execute_query(database_name, 'INSERT INTO client_data (key, value) VALUES (?, ?)',
+                                     (f'grande{index}', 'x' * 4000))
+        db_manager.execute_query(database_name, "DELETE FROM client_data WHERE key LIKE 'grande%'")
+    connection_cache.close_all()
+    free = pragma(path, 'freelist_count')
+    assert free > 0
+
+    result = maintenance(app, 'run', '--task', 'compact', '--database', database_name, '--force')
+    assert result.exit_code == 0, result.output
+    assert pragma(path, 'freelist_count') < free
+    assert pragma(path, 'auto_vacuum') == 2
+
+
+def test_optimize_and_integrity(app, tenant):
+    database_name, _ = tenant
+    result = maintenance(app, 'run', '--task', 'optimize', '--task', 'integrity', '--database', database_name)
+    assert result.exit_code == 0, result.output
+    assert 'Falhas: 0' in result.output
+
+
+def test_tasks_wait_for_their_interval(app, tenant):
+    database_name, _ = tenant
+    assert maintenance(app, 'run', '--database', database_name).exit_code == 0
+    result = maintenance(app, 'run', '--database', database_name)
+    assert result.exit_code == 0, result.output
+    assert 'Bancos processados: 0  Pulados: 1 em dia  Falhas: 0' in result.output
+
+
+def test_recently_written_databases_are_skipped(make_app, tenant):
+    database_name, _ = tenant
+    app = make_app(MAINTENANCE_PAUSE=0, MAINTENANCE_IDLE_SECONDS=3600)
+    result = maintenance(app, 'run', '--database', database_name)
+    assert 'Pulados: 1 ativo' in result.output
+    # --force ignora a atividade recente
+    assert 'Bancos processados: 1' in maintenance(app, 'run', '--database', database_name, '--force').output
+
+
+def test_only_one_run_at_a_time(app, tenant):
+    os.makedirs(os.path.join(app.instance_path, 'maintenance'), exist_ok=True)
+    with _FileLock(os.path.join(app.instance_path, 'maintenance', '.lock')) as acquired:
+        assert acquired
+        result = maintenance(app, 'run')
+    assert result.exit_code == 1
+    assert 'Outra manutenção está em andamento' in result.output
+
+
+def test_failures_are_reported_and_recorded(app, tenant):
+    database_name, path = tenant
+    connection_cache.close_all()
+    for suffix in ('-wal', '-shm'):
+        if os.path.exists(path + suffix):
+            os.remove(path + suffix)
+    with open(path, 'wb') as file:
+        file.write(b'isto nao e um banco sqlite' * 200)
+
+    result = maintenance(app, 'run', '--task', 'integrity', '--database', database_name, '--force')
+    assert result.exit_code == 1
+    assert 'Falhas: 1' in result.output
+    assert f'{database_name} (' in result.output
+
+    status = maintenance(app, 'status', '--failures')
+    assert status.exit_code == 0, status.output
+    assert '1 bancos, 0 ok, 1 com falha' in status.output
+
+
+def test_status_summarizes_the_last_run(app, tenant):
+    assert 'Última execução: nunca' in maintenance(app, 'status').output
+    assert maintenance(app, 'run').exit_code == 0
+
+    output = maintenance(app, 'status').output
+    assert '(concluída) - 1 bancos, 1 ok, 0 com falha, 0 pulados' in output
+    assert 'Bancos: 1' in output
+    backup_line = next(line for line in output.splitlines() if line.strip().startswith('backup'))
+    assert 'atrasados: 0' in backup_line and 'falhas: 0' in backup_line
@@ -0,0 +1,83 @@
+import logging
+import pytest
+from sqlalchemy import text
+from sqlalchemy.exc import OperationalError
+from src.models.user import db
+
+
+def series(response, name):
+    """Linhas de uma métrica na saída de /metrics"""
+    return [line for line in response.get_data(as_text=True).splitlines() if line.startswith(name + '{')]
+
+
+def test_metrics_are_disabled_by_default(client):
+    response = client.get('/metrics')
+    assert response.status_code == 403
+
+
+def test_token_is_required_when_configured(make_app):
+    client = make_app(METRICS_TOKEN='segredo', METRICS_PUBLIC=True).test_client()
+    assert client.get('/metrics').status_code == 401
+    assert client.get('/metrics', headers={'Authorization': 'Bearer outro'}).status_code == 401
+    response = client.get('/metrics', headers={'Authorization': 'Bearer segredo'})
+    assert response.status_code == 200
+    assert response.mimetype == 'text/plain'
+
+
+@pytest.fixture
+def public_client(make_app):
+    return make_app(METRICS_PUBLIC=True).test_client()
+
+
+def test_requests_and_queries_are_counted_per_endpoint(public_client):
+    response = public_client.post('/api/auth/register', json={
+        'username': 'u', 'email': 'metrics@example.com', 'password': 'p',
+        'client_name': 'c', 'client_email': 'metrics-client@example.com'})
+    headers = {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+    public_client.get('/api/produtos', headers=headers)
+    public_client.get('/api/produtos', headers=headers)
+
+    response = public_client.get('/metrics')
+    assert 'http_requests_total{blueprint="auth",endpoint="auth.register",method="POST",status="201"} 1' in \
+        series(response, 'http_requests_total')
+    assert 'http_requests_total{blueprint="produtos",endpoint="produtos.get_produtos",method="GET",status="200"} 2' \
+        in series(response, 'http_requests_total')
+    tenant_queries = [line for line in series(response, 'db_queries_total')
+                      if 'produtos.get_produtos' in line and 'database="tenant"' in line]
+    assert len(tenant_queries) == 1 and not tenant_queries[0].endswith(' 0')
+    assert '\ntenant_db_connections_open ' in response.get_data(as_text=True)
+
+
+def test_unmatched_routes_are_labelled(public_client):
+    # GET cai na rota do SPA; outros métodos não têm rota
+    public_client.post('/api/nao-existe')
+    assert any('endpoint="unmatched"' in line and 'status="405"' in line
+               for line in series(public_client.get('/metrics'), 'http_requests_total'))
+
+
+def test_slow_requests_are_logged_with_their_statements(make_app, caplog):
+    client = make_app(METRICS_PUBLIC=True, METRICS_SLOW_REQUEST_MS=0).test_client()
+    with caplog.at_level(logging.WARNING, logger='src.models.metrics'):
+        client.post('/api/auth/login', json={'email': 'ninguem@example.com', 'password': 'x'})
+    message = next(record.getMessage() for record in caplog.records if 'Requisição lenta' in record.getMessage())
+    assert 'POST auth.login -> 401' in message
+    assert '[main]' in message and 'SELECT users.id' in message
+
+
+def test_failed_statements_do_not_leak_timings(public_client):
+    app = public_client.application
+    with app.app_context():
+        with db.engine.connect() as conn:
+            with pytest.raises(OperationalError):
+                conn.execute(text('SELECT * FROM nao_existe'))
+            assert conn.info['_metrics_started'] == []
+            conn.execute(text('SELECT 1'))
+            assert conn.info['_metrics_started'] == []
+
+
+def test_disabled_metrics_record_nothing(make_app):
+    app = make_app(METRICS_PUBLIC=True, METRICS_ENABLED=False)
+    client = app.test_client()
+    client.get('/api/produtos')
+    assert app.extensions['metrics'].requests == {}
+    assert series(client.get('/metrics'), 'http_requests_total') == []
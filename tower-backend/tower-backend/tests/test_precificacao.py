@@ -0,0 +1,78 @@
+import pytest
+
+
+@pytest.fixture
+def catalogo(client, register):
+    """Dois produtos por embalagem e um com composição; retorna (headers, ids)"""
+    headers, _ = register()
+    ids = {}
+    for codigo, categoria, campos in (
+            ('a', 'Bolos', {'qtd_embalagem': 10, 'custo_embalagem': 50, 'preco': 10}),
+            ('b', 'Doces', {'qtd_embalagem': 4, 'custo_embalagem': 8, 'preco': 4}),
+            ('c', 'Bolos', {'qtd_embalagem': 1, 'custo_embalagem': 1, 'preco': 30})):
+        response = client.post('/api/produtos', json=dict(campos, codigo=codigo, descricao=codigo,
+                                                          categoria=categoria), headers=headers)
+        ids[codigo] = response.get_json()['id']
+
+    insumo = client.post('/api/insumos', json={'nome': 'farinha', 'preco': 4}, headers=headers).get_json()['id']
+    response = client.put(f"/api/produtos/{ids['c']}/insumos", json=[{'insumo_id': insumo, 'quantidade': 5}],
+                          headers=headers)
+    assert response.status_code == 200
+    return headers, ids
+
+
+def produtos(client, headers):
+    return {produto['codigo']: produto for produto in client.get('/api/produtos', headers=headers).get_json()['produtos']}
+
+
+def test_simulation_does_not_write(client, catalogo):
+    headers, _ = catalogo
+    response = client.post('/api/produtos/precificacao', json={'margem_alvo': 50}, headers=headers)
+    body = response.get_json()
+
+    assert response.status_code == 200
+    assert (body['produtos'], body['produtos_alterados'], body['aplicado']) == (3, 1, False)
+    assert {linha['categoria']: linha['preco_medio'] for linha in body['categorias_depois']} == {
+        'Bolos': 25.0, 'Doces': 4.0}
+    assert produtos(client, headers)['a']['preco'] == 10
+
+
+def test_packaging_adjustment_is_applied_only_where_it_changed(client, catalogo):
+    headers, _ = catalogo
+    response = client.post('/api/produtos/precificacao', json={
+        'ajustes': [{'campo': 'custo_embalagem', 'percentual': 10, 'categoria': 'Bolos'}],
+        'aplicar': True}, headers=headers)
+    assert response.get_json()['produtos_alterados'] == 2
+
+    depois = produtos(client, headers)
+    assert depois['a']['custo_unitario'] == pytest.approx(5.5)
+    assert depois['b']['custo_unitario'] == 2
+    # Custo de produto com composição continua vindo dos insumos
+    assert depois['c']['custo_unitario'] == 20
+
+
+def test_unit_cost_adjustment_is_not_overwritten_by_packaging(client, catalogo):
+    headers, _ = catalogo
+    client.post('/api/produtos/precificacao', json={
+        'ajustes': [{'campo': 'custo_unitario', 'percentual': 100, 'categoria': 'Doces'}],
+        'aplicar': True}, headers=headers)
+    assert produtos(client, headers)['b']['custo_unitario'] == 4
+
+
+def test_empty_scenario_changes_nothing(client, catalogo):
+    headers, _ = catalogo
+    body = client.post('/api/produtos/precificacao', json={}, headers=headers).get_json()
+    assert body['produtos_alterados'] == 0
+
+
+@pytest.mark.parametrize('body, error', [
+    ({'ajustes': [{'campo': 'preco'}]}, 'Ajustes devem ter campo e percentual'),
+    ({'ajustes': [{'campo': 'codigo', 'percentual': 5}]}, 'Campo de ajuste inválido: codigo'),
+    ({'margem_alvo': 100}, 'Margem alvo deve estar entre 0 e 100%'),
+])
+def test_invalid_scenarios_are_rejected(client, catalogo, body, error):
+    headers, _ = catalogo
+    response = client.post('/api/produtos/precificacao', json=dict(body, aplicar=True), headers=headers)
+    assert response.status_code == 400
+    assert response.get_json() == {'error': error}
+    assert produtos(client, headers)['a']['preco'] == 10
@@ -0,0 +1,68 @@
+import os
+import pytest
+from tests.test_image_pipeline import image_bytes, upload, wait_ready
+
+
+@pytest.fixture
+def picture(client, register):
+    headers, _ = register()
+    upload(client, headers, image_bytes(size=(600, 400)))
+    return wait_ready(client, headers)['profile_picture']
+
+
+def test_default_variant_is_immutable_and_negotiated(client, picture):
+    response = client.get(picture, headers={'Accept': 'image/webp,*/*'})
+    assert response.status_code == 200
+    assert response.mimetype == 'image/webp'
+    assert response.headers['Vary'] == 'Accept'
+    assert 'immutable' in response.headers['Cache-Control']
+    assert response.headers['ETag'].strip('"').endswith('_300.webp')
+
+    fallback = client.get(picture, headers={'Accept': 'image/*'})
+    assert fallback.mimetype == 'image/jpeg'
+
+
+def test_revalidation_returns_304_without_a_body(client, picture):
+    etag = client.get(picture).headers['ETag']
+    response = client.get(picture, headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+    assert 'immutable' in response.headers['Cache-Control']
+
+
+def test_sizes_outside_the_pipeline_are_rendered_on_demand(app, client, picture):
+    response = client.get(picture, query_string={'size': 40})
+    assert response.status_code == 200
+    assert response.headers['ETag'].strip('"').endswith('_40.jpg')
+    cache = os.path.join(app.config['UPLOAD_FOLDER'], 'cache')
+    assert len(os.listdir(cache)) == 1
+
+    # A segunda requisição reaproveita o arquivo do cache
+    assert client.get(picture, query_string={'size': 40}).data == response.data
+    assert len(os.listdir(cache)) == 1
+
+
+def test_accel_redirect_leaves_the_body_to_nginx(make_app):
+    app = make_app(PROFILE_PICTURE_ACCEL_REDIRECT='/protegido/uploads/')
+    client = app.test_client()
+    response = client.post('/api/auth/register', json={
+        'username': 'u', 'email': 'accel@example.com', 'password': 'p',
+        'client_name': 'c', 'client_email': 'accel-client@example.com'})
+    headers = {'Authorization': f"Bearer {response.get_json()['access_token']}"}
+    upload(client, headers, image_bytes())
+    picture = wait_ready(client, headers)['profile_picture']
+
+    response = client.get(picture)
+    assert response.headers['X-Accel-Redirect'].startswith('/protegido/uploads/')
+    assert response.data == b''
+
+
+@pytest.mark.parametrize('size', [8, 5000])
+def test_size_out_of_bounds_is_rejected(client, picture, size):
+    response = client.get(picture, query_string={'size': size})
+    assert response.status_code == 400
+
+
+def test_unknown_picture_is_not_found(client):
+    assert client.get('/api/profile/picture/0123456789abcdef.jpg').status_code == 404
+    assert client.get('/api/profile/picture/semextensao').status_code == 404
@@ -0,0 +1,87 @@
+import cProfile
+import pytest
+from src.models import profiler as profiler_module
+
+TOKEN = 'perfil'
+ADMIN = {'Authorization': f'Bearer {TOKEN}'}
+
+
+@pytest.fixture
+def app(make_app, tmp_path):
+    return make_app(PROFILING_ENABLED=True, PROFILING_TOKEN=TOKEN, PROFILING_DIR=str(tmp_path / 'profiles'))
+
+
+def profiles(client):
+    return client.get('/api/admin/profiles', headers=ADMIN).get_json()['profiles']
+
+
+def test_header_runs_the_request_under_cprofile(client, register):
+    headers, _ = register()
+    response = client.get('/api/produtos', headers=dict(headers, **{'X-Profile': TOKEN}))
+    assert response.status_code == 200
+    profile_id = response.headers['X-Profile-Id']
+
+    [metadata] = profiles(client)
+    assert metadata['id'] == profile_id
+    assert (metadata['endpoint'], metadata['trigger'], metadata['pstats']) == ('produtos.get_produtos', 'header', True)
+    assert metadata['tenant'] is not None
+    assert client.get(f'/api/admin/profiles/{profile_id}.pstats', headers=ADMIN).status_code == 200
+    assert client.get(f'/api/admin/profiles/{profile_id}.collapsed', headers=ADMIN).status_code == 200
+    assert not profiler_module._cprofile_lock.locked()
+
+
+def test_requests_without_the_token_are_not_profiled(client):
+    response = client.get('/api/produtos', headers={'X-Profile': 'errado'})
+    assert 'X-Profile-Id' not in response.headers
+    assert profiles(client) == []
+    assert client.get('/api/admin/profiles').status_code == 401
+    assert client.get('/api/admin/profiles', headers={'Authorization': 'Bearer errado'}).status_code == 401
+
+
+def test_concurrent_header_requests_share_one_cprofile(app):
+    profiler = app.extensions['profiler']
+    with app.test_request_context('/api/produtos'):
+        first = profiler.start('header')
+        second = profiler.start('header')
+        assert first.profile is not None
+        assert second.profile is None
+        assert profiler.finish(second, 200)['pstats'] is False
+        assert profiler.finish(first, 200)['pstats'] is True
+    assert not profiler_module._cprofile_lock.locked()
+
+
+def test_request_while_cprofile_is_busy_falls_back_to_the_sampler(client):
+    with profiler_module._cprofile_lock:
+        response = client.get('/api/auth/me', headers={'X-Profile': TOKEN})
+    assert response.status_code == 401
+    [metadata] = profiles(client)
+    assert (metadata['trigger'], metadata['pstats']) == ('header', False)
+
+
+def test_enable_failure_does_not_fail_the_request(client, monkeypatch):
+    def enable(self, *args, **kwargs):
+        raise ValueError('Another profiling tool is already active')
+
+    monkeypatch.setattr(cProfile.Profile, 'enable', enable)
+    response = client.get('/api/auth/me', headers={'X-Profile': TOKEN})
+    assert response.status_code == 401
+    assert profiles(client)[0]['pstats'] is False
+    assert not profiler_module._cprofile_lock.locked()
+
+
+def test_sampled_requests_only_use_the_sampler(make_app, tmp_path):
+    app = make_app(PROFILING_ENABLED=True, PROFILING_TOKEN=TOKEN, PROFILING_SAMPLE_RATE=1.0,
+                   PROFILING_DIR=str(tmp_path / 'profiles'))
+    client = app.test_client()
+    client.get('/api/auth/me')
+    [metadata] = profiles(client)
+    assert (metadata['trigger'], metadata['pstats']) == ('sampled', False)
+
+    response = client.get('/api/admin/profiles/aggregate/auth', headers=ADMIN)
+    assert response.headers['X-Profile-Count'] == '1'
+
+
+def test_unknown_profile_is_not_found(client):
+    assert client.get('/api/admin/profiles/nao-existe.json', headers=ADMIN).status_code == 404
+    assert client.get('/api/admin/profiles/x.txt', headers=ADMIN).status_code == 404
+
@@ -0,0 +1,107 @@
+import sqlite3
+import pytest
+from src.models.database_manager import DatabaseManager
+from src.models.sintese import build_sintese, rebuild_sintese
+
+
+@pytest.fixture
+def loja(app, client, register):
+    """Cliente com duas categorias, produtos e vendas; retorna (headers, banco, ids)"""
+    headers, body = register()
+    ids = {}
+    for codigo, categoria, preco in (('p1', 'Bolos', 10), ('p2', 'Bolos', 20), ('p3', 'Bolos', 5),
+                                     ('p4', 'Doces', 2)):
+        response = client.post('/api/produtos', json={'codigo': codigo, 'descricao': codigo.upper(),
+                                                      'categoria': categoria, 'custo_unitario': 1,
+                                                      'preco': preco}, headers=headers)
+        assert response.status_code == 201
+        ids[codigo] = response.get_json()['id']
+    for codigo, quantidade in (('p1', 3), ('p2', 1), ('p3', 1), ('p4', 10), ('p1', 1)):
+        response = client.post('/api/vendas', json={'produto_id': ids[codigo], 'quantidade': quantidade},
+                               headers=headers)
+        assert response.status_code == 201
+    return headers, body['client']['database_name'], ids
+
+
+@pytest.mark.parametrize('storage', ['file', 'shared'])
+def test_rollups_follow_products_and_sales(client, loja):
+    headers, _, _ = loja
+    body = client.get('/api/sintese', headers=headers).get_json()
+
+    assert body['total_vendas'] == 85
+    assert body['categorias_ativas'] == 2
+    bolos, doces = body['categorias']
+    assert (bolos['nome'], bolos['total_vendas'], bolos['total_produtos']) == ('Bolos', 65, 3)
+    assert [produto['nome'] for produto in bolos['produtos']] == ['P1', 'P2', 'P3']
+    assert bolos['produtos'][0] == {'nome': 'P1', 'custo': 1, 'preco': 10, 'margem': '90%',
+                                    'desempenho': 'Alto', 'vendas': 4, 'total_vendas': 40}
+    assert (doces['nome'], doces['vendas'], doces['total_vendas']) == ('Doces', 10, 20)
+
+
+@pytest.mark.parametrize('storage', ['file', 'shared'])
+def test_rebuild_matches_the_trigger_maintained_rollups(app, loja):
+    _, database_name, _ = loja
+    db_manager = app.extensions['database_manager']
+    with app.app_context():
+        mantida = build_sintese(db_manager, database_name)
+        rebuild_sintese(db_manager, database_name)
+        assert build_sintese(db_manager, database_name) == mantida
+
+
+@pytest.mark.parametrize('storage', ['file', 'shared'])
+def test_products_are_capped_per_category_from_the_ranking_index(app, loja):
+    _, database_name, _ = loja
+    db_manager = app.extensions['database_manager']
+    queries = []
+    db_manager.add_query_observer(lambda database, query, seconds: queries.append(query))
+
+    with app.app_context():
+        sintese = build_sintese(db_manager, database_name, max_produtos=2)
+        bolos = sintese['categorias'][0]
+        assert [produto['nome'] for produto in bolos['produtos']] == ['P1', 'P2']
+        assert bolos['total_produtos'] == 3
+
+        with db_manager.connection(database_name) as conn:
+            plan = ' '.join(row['detail'] for row in conn.execute('EXPLAIN QUERY PLAN ' + queries[-1], (2,)))
+    # Cada categoria é lida do índice até o limite, sem percorrer nem ordenar todos os produtos
+    assert 'idx_sintese_produto_ranking (tenant_id=? AND categoria=?)' in plan
+
+
+def test_both_reads_see_the_same_version(app, loja, monkeypatch):
+    _, database_name, ids = loja
+    db_manager = app.extensions['database_manager']
+    execute_query = DatabaseManager.execute_query
+
+    def write_between_reads(self, database, query, params=None):
+        rows = execute_query(self, database, query, params)
+        if 'FROM sintese_categoria' in query and 'JOIN' not in query:
+            # Venda gravada por outra conexão entre a leitura das categorias e a dos produtos
+            with sqlite3.connect(self.get_client_database_path(database)) as other:
+                other.execute('INSERT INTO vendas (produto_id, quantidade, preco_unitario) VALUES (?, 100, 2)',
+                              (ids['p4'],))
+        return rows
+
+    monkeypatch.setattr(DatabaseManager, 'execute_query', write_between_reads)
+    with app.app_context():
+        sintese = build_sintese(db_manager, database_name)
+    doces = next(categoria for categoria in sintese['categorias'] if categoria['nome'] == 'Doces')
+    assert doces['total_vendas'] == sum(produto['total_vendas'] for produto in doces['produtos']) == 20
+
+
+def test_tenant_without_sales_gets_an_empty_summary(client, register):
+    headers, _ = register()
+    assert client.get('/api/sintese', headers=headers).get_json() == {
+        'total_vendas': 0, 'categorias_ativas': 0, 'categorias': []}
+
+
+def test_sale_of_unknown_product_is_rejected(client, loja):
+    headers, _, _ = loja
+    response = client.post('/api/vendas', json={'produto_id': 9999, 'quantidade': 1}, headers=headers)
+    assert response.status_code == 404
+    assert client.get('/api/sintese', headers=headers).get_json()['total_vendas'] == 85
+
+
+def test_rebuild_command_reports_failures(app, loja):
+    result = app.test_cli_runner().invoke(args=['rebuild-sintese', '--database', 'client_inexistente'])
+    assert result.exit_code == 1
+    assert 'Falhas: 1' in result.output
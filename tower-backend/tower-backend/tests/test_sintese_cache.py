@@ -0,0 +1,70 @@
+import sqlite3
+import time
+
+
+def create_produto(client, headers, codigo='p1'):
+    response = client.post('/api/produtos', json={'codigo': codigo, 'descricao': codigo, 'categoria': 'Bolos',
+                                                  'preco': 10}, headers=headers)
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def test_repeated_requests_hit_the_cache_and_revalidate(client, register):
+    headers, _ = register()
+    create_produto(client, headers)
+
+    first = client.get('/api/sintese', headers=headers)
+    second = client.get('/api/sintese', headers=headers)
+    assert (first.headers['X-Cache'], second.headers['X-Cache']) == ('MISS', 'HIT')
+    assert first.headers['ETag'] == second.headers['ETag']
+    assert first.headers['Cache-Control'] == 'private, no-cache'
+
+    revalidated = client.get('/api/sintese', headers=dict(headers, **{'If-None-Match': first.headers['ETag']}))
+    assert revalidated.status_code == 304
+    assert revalidated.data == b''
+
+
+def test_writes_through_the_api_invalidate_the_entry(client, register):
+    headers, _ = register()
+    produto_id = create_produto(client, headers)
+    etag = client.get('/api/sintese', headers=headers).headers['ETag']
+
+    client.post('/api/vendas', json={'produto_id': produto_id, 'quantidade': 2}, headers=headers)
+    response = client.get('/api/sintese', headers=dict(headers, **{'If-None-Match': etag}))
+    assert response.status_code == 200
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.get_json()['total_vendas'] == 20
+
+
+def test_writes_from_another_process_invalidate_the_entry(app, client, register):
+    headers, body = register()
+    produto_id = create_produto(client, headers)
+    client.get('/api/sintese', headers=headers)
+
+    with app.app_context():
+        path = app.extensions['database_manager'].get_client_database_path(body['client']['database_name'])
+    time.sleep(0.01)  # garante mtime diferente em sistemas de arquivos com baixa resolução
+    with sqlite3.connect(path) as other:
+        other.execute('INSERT INTO vendas (produto_id, quantidade, preco_unitario) VALUES (?, 1, 10)', (produto_id,))
+
+    response = client.get('/api/sintese', headers=headers)
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.get_json()['total_vendas'] == 10
+
+
+def test_tenants_have_separate_entries(client, register):
+    first, _ = register()
+    second, _ = register()
+    create_produto(client, first)
+
+    assert client.get('/api/sintese', headers=first).get_json()['categorias_ativas'] == 1
+    response = client.get('/api/sintese', headers=second)
+    assert response.headers['X-Cache'] == 'MISS'
+    assert response.get_json()['categorias_ativas'] == 0
+
+
+def test_stale_etag_gets_the_full_body(client, register):
+    headers, _ = register()
+    response = client.get('/api/sintese', headers=dict(headers, **{'If-None-Match': '"desatualizado"'}))
+    assert response.status_code == 200
+    assert response.get_json()['categorias'] == []
@@ -0,0 +1,110 @@
+import gzip
+import os
+import pytest
+from src.models.static_assets import StaticManifest, init_static_manifest
+
+BUNDLE = b'console.log("tower");\n' * 200
+
+
+@pytest.fixture
+def build(tmp_path):
+    """Build mínimo do frontend: index, bundle com hash, arquivo comum e uploads"""
+    folder = tmp_path / 'static'
+    (folder / 'assets').mkdir(parents=True)
+    (folder / 'uploads').mkdir()
+    (folder / 'index.html').write_bytes(b'<!doctype html><div id="root"></div>')
+    (folder / 'assets' / 'index-AbCd1234.js').write_bytes(BUNDLE)
+    (folder / 'robots.txt').write_bytes(b'User-agent: *\n')
+    (folder / 'uploads' / 'antiga.txt').write_bytes(b'upload')
+    return folder
+
+
+@pytest.fixture
+def static_client(app, build):
+    app.static_folder = str(build)
+    init_static_manifest(app)
+    return app.test_client()
+
+
+def test_manifest_indexes_the_build_without_uploads(build):
+    manifest = StaticManifest(str(build))
+    assert set(manifest.assets) == {'index.html', 'assets/index-AbCd1234.js', 'robots.txt'}
+    assert manifest.index is manifest.get('index.html')
+    assert manifest.get('assets/index-AbCd1234.js').immutable
+    assert not manifest.get('robots.txt').immutable
+    assert 'gzip' in manifest.get('assets/index-AbCd1234.js').encodings
+    # Arquivos pequenos não ganham variante comprimida
+    assert manifest.get('robots.txt').encodings == {}
+
+
+def test_missing_folder_gives_an_empty_manifest(tmp_path):
+    manifest = StaticManifest(str(tmp_path / 'nao-existe'))
+    assert manifest.assets == {} and manifest.index is None
+
+
+def test_hashed_asset_is_served_compressed_and_immutable(static_client):
+    response = static_client.get('/assets/index-AbCd1234.js', headers={'Accept-Encoding': 'gzip'})
+    assert response.status_code == 200
+    assert response.headers['Content-Encoding'] == 'gzip'
+    assert gzip.decompress(response.data) == BUNDLE
+    assert 'Accept-Encoding' in response.headers['Vary']
+    assert 'immutable' in response.headers['Cache-Control']
+
+    plain = static_client.get('/assets/index-AbCd1234.js', headers={'Accept-Encoding': 'identity'})
+    assert plain.data == BUNDLE
+    assert 'Content-Encoding' not in plain.headers
+    # Cada representação tem seu ETag
+    assert plain.headers['ETag'] != response.headers['ETag']
+
+
+def test_revalidation_returns_304(static_client):
+    etag = static_client.get('/robots.txt').headers['ETag']
+    response = static_client.get('/robots.txt', headers={'If-None-Match': etag})
+    assert response.status_code == 304
+    assert response.data == b''
+
+
+def test_spa_routes_fall_back_to_the_index(static_client):
+    for path in ('/', '/produtos/12'):
+        response = static_client.get(path)
+        assert response.status_code == 200
+        assert b'id="root"' in response.data
+        assert response.headers['Cache-Control'] == 'no-cache'
+
+
+def test_uploads_are_read_from_disk(static_client):
+    assert static_client.get('/uploads/antiga.txt').data == b'upload'
+    assert static_client.get('/uploads/nao-existe.txt').status_code == 404
+
+
+def test_without_index_spa_routes_are_not_found(app, build):
+    os.remove(build / 'index.html')
+    app.static_folder = str(build)
+    init_static_manifest(app)
+    response = app.test_client().get('/produtos')
+    assert response.status_code == 404
+    assert response.data == b'index.html not found'
+
+
+def test_compress_static_writes_variants_reused_by_the_manifest(app, build):
+    app.static_folder = str(build)
+    result = app.test_cli_runner().invoke(args=['compress-static'])
+    assert result.exit_code == 0, result.output
+    assert 'assets/index-AbCd1234.js.gz' in result.output
+    assert not (build / 'robots.txt.gz').exists()
+
+    # A variante gerada no build é usada no lugar de comprimir de novo
+    variant = build / 'assets' / 'index-AbCd1234.js.gz'
+    variant.write_bytes(b'pre-comprimido')
+    manifest = StaticManifest(str(build))
+    assert manifest.get('assets/index-AbCd1234.js').encodings['gzip'] == b'pre-comprimido'
+    assert 'assets/index-AbCd1234.js.gz' not in manifest.assets
+
+
+def test_stale_variant_is_ignored(build):
+    variant = build / 'assets' / 'index-AbCd1234.js.gz'
+    variant.write_bytes(b'antiga')
+    bundle = build / 'assets' / 'index-AbCd1234.js'
+    os.utime(variant, (1, 1))
+    manifest = StaticManifest(str(build))
+    assert gzip.decompress(manifest.get('assets/index-AbCd1234.js').encodings['gzip']) == bundle.read_bytes()
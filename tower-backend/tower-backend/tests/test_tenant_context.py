@@ -0,0 +1,103 @@
+from sqlalchemy import event
+from src.models import tenant_context
+from src.models.client import Client
+from src.models.tenant_context import tenant_cache
+from src.models.user import db, User
+
+
+def count_main_queries(app):
+    statements = []
+    with app.app_context():
+        engine = db.engine
+    event.listen(engine, 'before_cursor_execute', lambda *args: statements.append(args[2]))
+    return statements
+
+
+def test_cached_requests_skip_the_main_database(app, client, register):
+    headers, _ = register()
+    assert client.get('/api/client/data', headers=headers).status_code == 200
+
+    statements = count_main_queries(app)
+    assert client.get('/api/client/data', headers=headers).status_code == 200
+    assert statements == []
+
+
+def test_committed_profile_update_is_visible_on_next_request(client, register):
+    headers, _ = register()
+    client.get('/api/auth/me', headers=headers)
+
+    response = client.put('/api/profile/', json={'username': 'renomeado'}, headers=headers)
+    assert response.status_code == 200
+    assert client.get('/api/auth/me', headers=headers).get_json()['user']['username'] == 'renomeado'
+
+
+def test_entries_are_evicted_on_commit_not_on_flush(app, register):
+    _, body = register()
+    user_id = body['user']['id']
+    with app.app_context():
+        tenant_cache.resolve(user_id)
+        user = db.session.get(User, user_id)
+
+        user.username = 'descartado'
+        db.session.flush()
+        assert tenant_cache.get(user_id) is not None
+        db.session.rollback()
+        assert tenant_cache.get(user_id) is not None
+
+        user = db.session.get(User, user_id)
+        user.username = 'gravado'
+        db.session.commit()
+        assert tenant_cache.get(user_id) is None
+        assert tenant_cache.resolve(user_id).user_data['username'] == 'gravado'
+
+
+def test_client_update_evicts_every_user_of_the_client(app, register):
+    _, body = register()
+    user_id = body['user']['id']
+    with app.app_context():
+        assert tenant_cache.resolve(user_id).client_active is True
+
+        db.session.get(Client, body['client']['id']).is_active = False
+        db.session.commit()
+        assert tenant_cache.get(user_id) is None
+        assert tenant_cache.resolve(user_id).client_active is False
+
+
+def test_load_racing_an_invalidation_is_not_cached(app, register, monkeypatch):
+    _, body = register()
+    user_id = body['user']['id']
+    identity_class = tenant_context.TenantIdentity
+
+    def identity_after_concurrent_commit(user, client, expires_at):
+        # Outro request confirma uma alteração enquanto esta leitura está em andamento
+        tenant_cache.invalidate_user(user.id)
+        return identity_class(user, client, expires_at)
+
+    monkeypatch.setattr(tenant_context, 'TenantIdentity', identity_after_concurrent_commit)
+    with app.app_context():
+        assert tenant_cache.load(user_id) is not None
+        assert tenant_cache.get(user_id) is None
+
+
+def test_inactive_client_keeps_access(app, client, register):
+    headers, body = register()
+    with app.app_context():
+        db.session.get(Client, body['client']['id']).is_active = False
+        db.session.commit()
+    assert client.get('/api/client/data', headers=headers).status_code == 200
+
+
+def test_deleted_user_is_not_found(app, client, register):
+    headers, body = register()
+    client.get('/api/auth/me', headers=headers)
+    with app.app_context():
+        db.session.delete(db.session.get(User, body['user']['id']))
+        db.session.commit()
+
+    response = client.get('/api/auth/me', headers=headers)
+    assert response.status_code == 404
+    assert response.get_json() == {'error': 'Usuário não encontrado'}
+
+
+def test_missing_token_is_rejected(client):
+    assert client.get('/api/client/data').status_code == 401
@@ -0,0 +1,73 @@
+import sqlite3
+import pytest
+from src.models.tenant_migrations import (apply_migrations, get_version, migrate_database_file,
+                                          LATEST_VERSION, MIGRATIONS, SHARED_MIGRATIONS)
+
+
+def connect(path):
+    return sqlite3.connect(str(path), isolation_level=None)
+
+
+def names(conn, kind):
+    return {row[0] for row in conn.execute('SELECT name FROM sqlite_master WHERE type = ?', (kind,))}
+
+
+@pytest.mark.parametrize('migrations', [MIGRATIONS, SHARED_MIGRATIONS], ids=['file', 'shared'])
+def test_new_database_gets_every_migration(tmp_path, migrations):
+    conn = connect(tmp_path / 'tenant.db')
+    assert apply_migrations(conn, migrations) == (0, migrations[-1][0])
+
+    assert {'client_data', 'client_settings', 'produtos', 'vendas', 'sintese_produto', 'insumos',
+            'client_data_fts', 'change_log'} <= names(conn, 'table')
+    assert {'idx_client_data_created_at', 'idx_vendas_produto'} <= names(conn, 'index')
+    # Bancos novos já nascem com auto_vacuum incremental (usado pela manutenção)
+    assert conn.execute('PRAGMA auto_vacuum').fetchone()[0] == 2
+    assert apply_migrations(conn, migrations) == (migrations[-1][0], migrations[-1][0])
+
+
+def test_pending_migrations_resume_from_user_version(tmp_path):
+    conn = connect(tmp_path / 'tenant.db')
+    apply_migrations(conn, MIGRATIONS[:2])
+    conn.execute("INSERT INTO client_data (key, value) VALUES ('k', 'v')")
+
+    assert apply_migrations(conn, MIGRATIONS) == (2, LATEST_VERSION)
+    assert conn.execute('SELECT key, value, tenant_id FROM client_data').fetchall() == [('k', 'v', None)]
+
+
+def test_failed_migration_is_rolled_back_and_retried(tmp_path):
+    conn = connect(tmp_path / 'tenant.db')
+    broken = MIGRATIONS[:1] + [(2, 'quebrada', ['CREATE TABLE parcial (x)', 'SELECT * FROM inexistente'])]
+
+    with pytest.raises(sqlite3.OperationalError):
+        apply_migrations(conn, broken)
+    assert get_version(conn) == 1
+    assert 'parcial' not in names(conn, 'table')
+
+    assert apply_migrations(conn, MIGRATIONS) == (1, LATEST_VERSION)
+
+
+def test_migrate_database_file_reports_errors(tmp_path):
+    path = tmp_path / 'tenant.db'
+    path.write_bytes(b'isto nao e um banco sqlite' * 100)
+    db_path, start, end, error = migrate_database_file(str(path))
+    assert (start, end) == (None, None)
+    assert error
+
+
+def test_migrate_tenants_command_upgrades_old_databases(app, register):
+    _, body = register()
+    db_manager = app.extensions['database_manager']
+    with app.app_context():
+        path = db_manager.get_client_database_path(body['client']['database_name'])
+    conn = connect(path)
+    conn.execute('DROP TABLE change_log')
+    conn.execute('PRAGMA user_version = 6')
+    conn.close()
+
+    result = app.test_cli_runner().invoke(args=['migrate-tenants', '--workers', '1'])
+    assert result.exit_code == 0, result.output
+    assert 'Migrados: 1' in result.output
+
+    conn = connect(path)
+    assert get_version(conn) == LATEST_VERSION
+    assert 'change_log' in names(conn, 'table')
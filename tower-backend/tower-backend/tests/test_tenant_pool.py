@@ -0,0 +1,105 @@
+import os
+import sqlite3
+import time
+import pytest
+from src.models import tenant_pool as tenant_pool_module
+from src.models.tenant_migrations import LATEST_VERSION
+
+
+@pytest.fixture
+def pool(app, monkeypatch):
+    """Pool do app com 3 bancos e sem a thread de reabastecimento"""
+    pool = app.extensions['tenant_pool']
+    monkeypatch.setattr(pool, 'size', 3)
+    monkeypatch.setattr(pool, '_start_refiller', lambda: None)
+    return pool
+
+
+def user_version(path):
+    conn = sqlite3.connect(path)
+    try:
+        return conn.execute('PRAGMA user_version').fetchone()[0]
+    finally:
+        conn.close()
+
+
+def test_fill_creates_migrated_databases(pool):
+    assert pool.fill() == 3
+    assert pool.fill() == 0
+    assert pool.stats() == {'ready': 3, 'size': 3}
+    for name in pool.ready_files():
+        assert user_version(os.path.join(pool.pool_path, name)) == LATEST_VERSION
+
+
+def test_claim_renames_a_ready_database(pool, tmp_path):
+    pool.fill()
+    ready = set(pool.ready_files())
+    target = str(tmp_path / 'cliente.db')
+
+    assert pool.claim(target) == target
+    remaining = set(pool.ready_files())
+    assert len(remaining) == 2 and remaining < ready
+    assert user_version(target) == LATEST_VERSION
+
+
+def test_claim_with_an_empty_pool_copies_the_template(pool, tmp_path):
+    target = str(tmp_path / 'cliente.db')
+    pool.claim(target)
+    assert user_version(target) == LATEST_VERSION
+    assert pool.ready_files() == []
+
+
+def test_claim_keeps_an_existing_database(pool, tmp_path):
+    pool.fill()
+    target = tmp_path / 'cliente.db'
+    target.write_bytes(b'')
+    pool.claim(str(target))
+    assert target.read_bytes() == b''
+    assert len(pool.ready_files()) == 3
+
+
+def test_claim_skips_files_taken_by_another_process(pool, tmp_path, monkeypatch):
+    pool.fill()
+    taken = pool.ready_files()[0]
+    monkeypatch.setattr(pool, 'ready_files', lambda: [f'{taken}.sumiu', taken])
+    target = str(tmp_path / 'cliente.db')
+    pool.claim(target)
+    assert not os.path.exists(os.path.join(pool.pool_path, taken))
+
+
+def test_outdated_template_is_recreated_and_ready_files_discarded(pool, monkeypatch):
+    pool.fill()
+    monkeypatch.setattr(tenant_pool_module, 'LATEST_VERSION', LATEST_VERSION + 1)
+    pool.ensure_template()
+    assert pool.ready_files() == []
+
+
+def test_fill_is_skipped_while_another_process_holds_the_lock(pool):
+    with pool._fill_lock() as acquired:
+        assert acquired
+        assert pool.fill() == 0
+    assert pool.fill() == 3
+
+
+def test_registration_takes_from_the_pool_and_refills(make_app):
+    app = make_app(TENANT_DB_POOL_SIZE=2)
+    pool = app.extensions['tenant_pool']
+    pool.fill()
+    ready = set(pool.ready_files())
+
+    response = app.test_client().post('/api/auth/register', json={
+        'username': 'u', 'email': 'pool@example.com', 'password': 'p',
+        'client_name': 'c', 'client_email': 'pool-client@example.com'})
+    assert response.status_code == 201
+
+    deadline = time.monotonic() + 5
+    while len(pool.ready_files()) < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert len(pool.ready_files()) == 2
+    assert len(ready & set(pool.ready_files())) == 1
+
+
+def test_fill_tenant_pool_command(pool, app):
+    result = app.test_cli_runner().invoke(args=['fill-tenant-pool'])
+    assert result.exit_code == 0, result.output
+    assert result.output.strip() == '3 bancos criados; 3 prontos no pool'
@@ -0,0 +1,117 @@
+import os
+import shutil
+import pytest
+from src.models.tenant_storage import TenantMovedError, move_tenant
+
+
+def create_produto(client, headers, codigo):
+    response = client.post('/api/produtos', json={'codigo': codigo, 'descricao': codigo, 'categoria': 'Bolos',
+                                                  'preco': 10}, headers=headers)
+    assert response.status_code == 201
+    return response.get_json()['id']
+
+
+def codigos(client, headers):
+    return {produto['id']: produto['codigo']
+            for produto in client.get('/api/produtos', headers=headers).get_json()['produtos']}
+
+
+def move(app, *args):
+    return app.test_cli_runner().invoke(args=['tenant-storage', 'move', *args])
+
+
+def storage_of(app, database_name):
+    with app.app_context():
+        return app.extensions['database_manager'].locate(database_name).storage.name
+
+
+def test_round_trip_between_file_and_shared(app, client, register):
+    headers, body = register()
+    database_name = body['client']['database_name']
+    create_produto(client, headers, 'bolo')
+    with app.app_context():
+        path = app.extensions['database_manager'].get_client_database_path(database_name)
+
+    result = move(app, database_name, '--to', 'shared')
+    assert result.exit_code == 0, result.output
+    assert storage_of(app, database_name) == 'shared'
+    assert not os.path.exists(path)
+    assert set(codigos(client, headers).values()) == {'bolo'}
+    create_produto(client, headers, 'pao')
+
+    result = move(app, database_name, '--to', 'file')
+    assert result.exit_code == 0, result.output
+    assert storage_of(app, database_name) == 'file'
+    assert set(codigos(client, headers).values()) == {'bolo', 'pao'}
+
+
+def test_ids_are_shifted_past_the_other_tenants(make_app, register):
+    app = make_app(TENANT_STORAGE_DEFAULT='shared')
+    client = app.test_client()
+    first = client.post('/api/auth/register', json={
+        'username': 'u', 'email': 'shared@example.com', 'password': 'p',
+        'client_name': 'c', 'client_email': 'shared-client@example.com'}).get_json()
+    shared_headers = {'Authorization': f"Bearer {first['access_token']}"}
+    create_produto(client, shared_headers, 'outro')
+
+    headers, body = register()
+    produto_id = create_produto(client, headers, 'bolo')
+    assert move(app, body['client']['database_name'], '--to', 'shared').exit_code == 0
+
+    moved = codigos(client, headers)
+    assert list(moved.values()) == ['bolo']
+    assert list(moved) != [produto_id]
+    assert list(codigos(client, shared_headers).values()) == ['outro']
+
+
+def test_legacy_databases_are_moved_into_shards(app, client, register):
+    headers, body = register()
+    database_name = body['client']['database_name']
+    create_produto(client, headers, 'bolo')
+    db_manager = app.extensions['database_manager']
+    files = db_manager.storages['file']
+    with app.app_context():
+        db_manager.cache.close_path(files.shard_path(database_name))
+    shutil.move(files.shard_path(database_name), files.legacy_path(database_name))
+    db_manager.forget(database_name)
+
+    result = app.test_cli_runner().invoke(args=['tenant-storage', 'shard-legacy'])
+    assert result.exit_code == 0, result.output
+    assert 'Bancos movidos: 1  Falhas: 0' in result.output
+    assert not os.path.exists(files.legacy_path(database_name))
+    assert set(codigos(client, headers).values()) == {'bolo'}
+
+
+def test_writes_on_a_moved_connection_are_refused(app, register):
+    _, body = register()
+    database_name = body['client']['database_name']
+    db_manager = app.extensions['database_manager']
+
+    with app.app_context(), db_manager.connection(database_name):
+        move_tenant(db_manager, database_name, 'shared')
+        with pytest.raises(TenantMovedError):
+            with db_manager.transaction(database_name):
+                pass
+        # Escritas avulsas relocalizam o cliente e repetem
+        db_manager.execute_query(
+            database_name, "INSERT INTO client_data (tenant_id, key, value) VALUES (tenant(), 'a', '1')")
+
+    with app.app_context():
+        rows = db_manager.execute_query(
+            database_name, 'SELECT key, value FROM client_data WHERE tenant_id IS tenant()')
+    assert rows == [{'key': 'a', 'value': '1'}]
+    assert storage_of(app, database_name) == 'shared'
+
+
+def test_moving_an_unknown_tenant_fails(app):
+    result = move(app, 'nao_existe', '--to', 'shared')
+    assert result.exit_code == 1
+    assert 'nao_existe: Database nao_existe not found' in result.output
+
+
+def test_status_counts_each_storage(app, register):
+    _, body = register()
+    move(app, body['client']['database_name'], '--to', 'shared')
+    register()
+    result = app.test_cli_runner().invoke(args=['tenant-storage', 'status'])
+    assert result.output.splitlines() == ['file: 1', 'shared: 1']